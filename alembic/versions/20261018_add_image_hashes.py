@@ -0,0 +1,41 @@
+"""add car_listings.image_hash and the image hash band index
+
+Revision ID: 20261018_add_image_hashes
+Revises: 20261018_add_listing_dedupe
+Create Date: 2026-10-18 23:50:00.000000
+
+Images are hashed in the background once IMAGE_HASH_ENABLED is set, newest
+listings first, or with ``python -m app.services.images hash``.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_image_hashes'
+down_revision = '20261018_add_listing_dedupe'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('car_listings', sa.Column('image_hash', sa.BigInteger(), nullable=True))
+    op.add_column('car_listings', sa.Column('image_hashed_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_car_listings_image_hash', 'car_listings', ['image_hash'], unique=False)
+    op.create_index('ix_car_listings_image_hashed_at', 'car_listings', ['image_hashed_at'], unique=False)
+
+    op.create_table(
+        'listing_image_bands',
+        sa.Column('band_hash', sa.BigInteger(), nullable=False),
+        sa.Column('listing_id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('band_hash', 'listing_id'),
+    )
+    op.create_index('ix_listing_image_bands_listing_id', 'listing_image_bands', ['listing_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_listing_image_bands_listing_id', table_name='listing_image_bands')
+    op.drop_table('listing_image_bands')
+    op.drop_index('ix_car_listings_image_hashed_at', table_name='car_listings')
+    op.drop_index('ix_car_listings_image_hash', table_name='car_listings')
+    op.drop_column('car_listings', 'image_hashed_at')
+    op.drop_column('car_listings', 'image_hash')
@@ -0,0 +1,57 @@
+"""add duplicate detection tables and car_listings.cluster_id
+
+Revision ID: 20261018_add_listing_dedupe
+Revises: 20261018_partition_tables
+Create Date: 2026-10-18 23:30:00.000000
+
+Existing listings get their signatures and clusters with
+``python -m app.services.dedupe rebuild``.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_listing_dedupe'
+down_revision = '20261018_partition_tables'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    partitioned = op.get_context().dialect.name == 'postgresql'
+
+    op.add_column('car_listings', sa.Column('cluster_id', sa.Integer(), nullable=True))
+    op.create_index('ix_car_listings_cluster_id', 'car_listings', ['cluster_id'], unique=False)
+
+    # car_listings.id alone is not unique on the partitioned PostgreSQL table
+    foreign_key = [] if partitioned else [
+        sa.ForeignKeyConstraint(['listing_id'], ['car_listings.id'], name='fk_listing_signatures_listing_id',
+                                ondelete='CASCADE')
+    ]
+    op.create_table(
+        'listing_signatures',
+        sa.Column('listing_id', sa.Integer(), nullable=False),
+        sa.Column('block_key', sa.String(), nullable=False),
+        sa.Column('mileage_bucket', sa.Integer(), nullable=True),
+        sa.Column('price_bucket', sa.Integer(), nullable=False),
+        sa.Column('signature', sa.LargeBinary(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('listing_id'),
+        *foreign_key
+    )
+
+    op.create_table(
+        'listing_lsh_bands',
+        sa.Column('band_hash', sa.BigInteger(), nullable=False),
+        sa.Column('listing_id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('band_hash', 'listing_id'),
+    )
+    op.create_index('ix_listing_lsh_bands_listing_id', 'listing_lsh_bands', ['listing_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_listing_lsh_bands_listing_id', table_name='listing_lsh_bands')
+    op.drop_table('listing_lsh_bands')
+    op.drop_table('listing_signatures')
+    op.drop_index('ix_car_listings_cluster_id', table_name='car_listings')
+    op.drop_column('car_listings', 'cluster_id')
@@ -0,0 +1,37 @@
+"""add listing lifecycle columns and indexes
+
+Revision ID: 20261018_add_listing_lifecycle
+Revises: 20261018_add_raw_payload_archive
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_listing_lifecycle'
+down_revision = '20261018_add_raw_payload_archive'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('car_listings', sa.Column('partition_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'fk_car_listings_partition_id',
+        'car_listings', 'scrape_partitions',
+        ['partition_id'], ['id']
+    )
+    op.create_index('ix_car_listings_status_last_scraped_at', 'car_listings',
+                    ['status', 'last_scraped_at'], unique=False)
+    op.create_index('ix_car_listings_partition_status_last_scraped_at', 'car_listings',
+                    ['partition_id', 'status', 'last_scraped_at'], unique=False)
+    op.add_column('scrape_partitions', sa.Column('crawl_starts', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('scrape_partitions', 'crawl_starts')
+    op.drop_index('ix_car_listings_partition_status_last_scraped_at', table_name='car_listings')
+    op.drop_index('ix_car_listings_status_last_scraped_at', table_name='car_listings')
+    op.drop_constraint('fk_car_listings_partition_id', 'car_listings', type_='foreignkey')
+    op.drop_column('car_listings', 'partition_id')
@@ -0,0 +1,49 @@
+"""add the market_stats rollups
+
+Revision ID: 20261018_add_market_stats
+Revises: 20261018_add_image_hashes
+Create Date: 2026-10-19 01:10:00.000000
+
+The table starts empty; fill it with ``python -m app.services.market_stats
+rebuild`` after upgrading, ingest and the lifecycle keep it up to date from
+then on.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_market_stats'
+down_revision = '20261018_add_image_hashes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'market_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('brand_id', sa.Integer(), nullable=False),
+        sa.Column('model_id', sa.Integer(), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('partition_id', sa.Integer(), nullable=False),
+        sa.Column('listings', sa.Integer(), nullable=False),
+        sa.Column('price_sum', sa.Float(), nullable=False),
+        sa.Column('price_sq_sum', sa.Float(), nullable=False),
+        sa.Column('mileage_listings', sa.Integer(), nullable=False),
+        sa.Column('mileage_sum', sa.Float(), nullable=False),
+        sa.Column('mileage_sq_sum', sa.Float(), nullable=False),
+        sa.Column('mileage_price_sum', sa.Float(), nullable=False),
+        sa.Column('mileage_price_product_sum', sa.Float(), nullable=False),
+        sa.Column('removed', sa.Integer(), nullable=False),
+        sa.Column('price_digest', sa.LargeBinary(), nullable=True),
+        sa.Column('rebuilt_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('brand_id', 'model_id', 'year', 'partition_id', name='uq_market_stats_segment'),
+    )
+    op.create_index('ix_car_listings_brand_model_year', 'car_listings', ['brand_id', 'model_id', 'year'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_car_listings_brand_model_year', table_name='car_listings')
+    op.drop_table('market_stats')
@@ -0,0 +1,40 @@
+"""add raw_blobs and raw_payloads tables
+
+Revision ID: 20261018_add_raw_payload_archive
+Revises: 20261018_add_scrape_job_timings
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_raw_payload_archive'
+down_revision = '20261018_add_scrape_job_timings'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('raw_blobs',
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('digest')
+    )
+    op.create_table('raw_payloads',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('yad2_id', sa.String(), nullable=False),
+        sa.Column('scraped_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.ForeignKeyConstraint(['digest'], ['raw_blobs.digest']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_raw_payloads_yad2_id_scraped_at', 'raw_payloads', ['yad2_id', 'scraped_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_raw_payloads_yad2_id_scraped_at', table_name='raw_payloads')
+    op.drop_table('raw_payloads')
+    op.drop_table('raw_blobs')
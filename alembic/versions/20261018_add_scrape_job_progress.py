@@ -0,0 +1,29 @@
+"""add progress counters and expiry to scrape_jobs
+
+Revision ID: 20261018_add_scrape_job_progress
+Revises: 20261018_add_scrape_partitions
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_scrape_job_progress'
+down_revision = '20261018_add_scrape_partitions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('scrape_jobs', sa.Column('pages_fetched', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('scrape_jobs', sa.Column('listings_parsed', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('scrape_jobs', sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_scrape_jobs_expires_at', 'scrape_jobs', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_scrape_jobs_expires_at', table_name='scrape_jobs')
+    op.drop_column('scrape_jobs', 'expires_at')
+    op.drop_column('scrape_jobs', 'listings_parsed')
+    op.drop_column('scrape_jobs', 'pages_fetched')
@@ -0,0 +1,23 @@
+"""add per-stage timings to scrape_jobs
+
+Revision ID: 20261018_add_scrape_job_timings
+Revises: 20261018_add_scrape_job_progress
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_scrape_job_timings'
+down_revision = '20261018_add_scrape_job_progress'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('scrape_jobs', sa.Column('timings', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('scrape_jobs', 'timings')
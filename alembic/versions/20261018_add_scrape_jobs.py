@@ -0,0 +1,52 @@
+"""add scrape_jobs table
+
+Revision ID: 20261018_add_scrape_jobs
+Revises: af189eff3e7e
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_scrape_jobs'
+down_revision = 'af189eff3e7e'
+branch_labels = None
+depends_on = None
+
+job_kind = sa.Enum('SCRAPE', 'INGEST', name='jobkind')
+job_status = sa.Enum('PENDING', 'RUNNING', 'COMPLETED', 'FAILED', name='jobstatus')
+
+
+def upgrade() -> None:
+    op.create_table('scrape_jobs',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('kind', job_kind, nullable=False),
+        sa.Column('status', job_status, nullable=False),
+        sa.Column('params', sa.JSON(), nullable=True),
+        sa.Column('parent_id', sa.String(length=36), nullable=True),
+        sa.Column('worker', sa.String(), nullable=True),
+        sa.Column('total_listings', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('new_listings', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_listings', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('error_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('errors', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['parent_id'], ['scrape_jobs.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_scrape_jobs_kind', 'scrape_jobs', ['kind'], unique=False)
+    op.create_index('ix_scrape_jobs_status', 'scrape_jobs', ['status'], unique=False)
+    op.create_index('ix_scrape_jobs_parent_id', 'scrape_jobs', ['parent_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_scrape_jobs_parent_id', table_name='scrape_jobs')
+    op.drop_index('ix_scrape_jobs_status', table_name='scrape_jobs')
+    op.drop_index('ix_scrape_jobs_kind', table_name='scrape_jobs')
+    op.drop_table('scrape_jobs')
+    job_status.drop(op.get_bind(), checkfirst=True)
+    job_kind.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,56 @@
+"""add scrape_partitions table
+
+Revision ID: 20261018_add_scrape_partitions
+Revises: 20261018_add_scrape_jobs
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_scrape_partitions'
+down_revision = '20261018_add_scrape_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('scrape_partitions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('params', sa.JSON(), nullable=True),
+        sa.Column('enabled', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('interval_minutes', sa.Float(), nullable=False),
+        sa.Column('change_rate', sa.Float(), nullable=True),
+        sa.Column('next_run_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_run_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_job_id', sa.String(length=36), nullable=True),
+        sa.Column('run_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('lease_owner', sa.String(), nullable=True),
+        sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_scrape_partitions_id', 'scrape_partitions', ['id'], unique=False)
+    op.create_index('ix_scrape_partitions_key', 'scrape_partitions', ['key'], unique=True)
+    op.create_index('ix_scrape_partitions_next_run_at', 'scrape_partitions', ['next_run_at'], unique=False)
+
+    op.add_column('scrape_jobs', sa.Column('partition_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'fk_scrape_jobs_partition_id',
+        'scrape_jobs', 'scrape_partitions',
+        ['partition_id'], ['id']
+    )
+    op.create_index('ix_scrape_jobs_partition_id', 'scrape_jobs', ['partition_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_scrape_jobs_partition_id', table_name='scrape_jobs')
+    op.drop_constraint('fk_scrape_jobs_partition_id', 'scrape_jobs', type_='foreignkey')
+    op.drop_column('scrape_jobs', 'partition_id')
+    op.drop_index('ix_scrape_partitions_next_run_at', table_name='scrape_partitions')
+    op.drop_index('ix_scrape_partitions_key', table_name='scrape_partitions')
+    op.drop_index('ix_scrape_partitions_id', table_name='scrape_partitions')
+    op.drop_table('scrape_partitions')
@@ -0,0 +1,29 @@
+"""add car_listings.image_fetch_failures and image_retry_at
+
+Revision ID: 20261018_image_fetch_backoff
+Revises: 20261018_add_market_stats
+Create Date: 2026-10-19 01:30:00.000000
+
+A failed image download used to leave the listing pending, to be tried
+again first on every run. The failures are now counted and the next attempt
+waits (see app/services/images.py).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_image_fetch_backoff'
+down_revision = '20261018_add_market_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('car_listings', sa.Column('image_fetch_failures', sa.Integer(), nullable=False,
+                                            server_default='0'))
+    op.add_column('car_listings', sa.Column('image_retry_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('car_listings', 'image_retry_at')
+    op.drop_column('car_listings', 'image_fetch_failures')
@@ -0,0 +1,25 @@
+"""add scrape_partitions.current_job_id
+
+Revision ID: 20261018_partition_current_job
+Revises: 20261018_image_fetch_backoff
+Create Date: 2026-10-19 02:30:00.000000
+
+The partition lease is now taken for one scrape job, and only that job can
+release it (a conditional UPDATE on current_job_id, see app/services/scheduler.py).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_partition_current_job'
+down_revision = '20261018_image_fetch_backoff'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('scrape_partitions', sa.Column('current_job_id', sa.String(length=36), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('scrape_partitions', 'current_job_id')
@@ -0,0 +1,142 @@
+"""partition car_listings by status and car_listing_history by month
+
+Revision ID: 20261018_partition_tables
+Revises: 20261018_add_listing_lifecycle
+Create Date: 2026-10-18 23:00:00.000000
+
+PostgreSQL only: an existing table cannot be turned into a partitioned one, so
+each table is renamed, re-created partitioned with the same columns and
+defaults (LIKE), filled from the old one and the old one dropped. Its id
+sequence, non-unique indexes and foreign keys carry over; the unique keys are
+re-created with the partition key (see app/db/partitioning.py). This rewrites
+both tables under an exclusive lock: run it in a maintenance window.
+
+The catalog lookups (indexes, foreign keys, id sequence) and the month range
+of the history partitions run inside DO blocks rather than in Python, so that
+``alembic upgrade --sql`` renders a script that does the same thing.
+
+Other dialects keep plain tables and only get the new history index.
+"""
+from typing import List, Optional
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261018_partition_tables'
+down_revision = '20261018_add_listing_lifecycle'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+# One partition per month from the oldest history row (or this month) to
+# MONTHS_AHEAD months ahead; the names match app/db/partitioning.py
+HISTORY_MONTHS = f"""
+    DECLARE
+        month_start timestamp;
+        this_month timestamp := date_trunc('month', now() AT TIME ZONE 'UTC');
+    BEGIN
+        FOR month_start IN
+            SELECT generate_series(
+                least(date_trunc('month', (SELECT min(created_at) FROM car_listing_history_unpartitioned)
+                                          AT TIME ZONE 'UTC'), this_month),
+                this_month + interval '{MONTHS_AHEAD} months',
+                interval '1 month')
+        LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF car_listing_history FOR VALUES FROM (%L) TO (%L)',
+                'car_listing_history_y' || to_char(month_start, 'YYYY"m"MM'),
+                to_char(month_start, 'YYYY-MM-DD') || ' 00:00:00+00',
+                to_char(month_start + interval '1 month', 'YYYY-MM-DD') || ' 00:00:00+00');
+        END LOOP;
+    END;"""
+
+
+def _rebuild(table: str, partition_by: Optional[str], partitions: List[str],
+             skip_references: Optional[str] = None) -> None:
+    """Re-create ``table`` partitioned by ``partition_by`` (plain if None) and move its rows over.
+
+    ``partitions`` are PL/pgSQL statements creating the partitions, run before
+    the copy. Foreign keys referencing ``skip_references`` are not re-created.
+    """
+    old = f"{table}_unpartitioned" if partition_by else f"{table}_partitioned"
+    clause = f" PARTITION BY {partition_by}" if partition_by else ""
+    skip = f" AND pg_get_constraintdef(oid) NOT LIKE 'FOREIGN KEY % REFERENCES {skip_references}(%'" \
+        if skip_references else ""
+    statements = "".join(f"    {statement}\n" for statement in partitions)
+    op.execute(f"""
+DO $$
+DECLARE
+    sequence_name text := pg_get_serial_sequence('{table}', 'id');
+    definitions text[];
+    definition text;
+BEGIN
+    -- Read before the rename, the definitions already name the new table
+    SELECT coalesce(array_agg(indexdef), ARRAY[]::text[]) INTO definitions
+    FROM pg_indexes WHERE tablename = '{table}' AND indexdef NOT LIKE 'CREATE UNIQUE%';
+    SELECT definitions || coalesce(array_agg(
+               format('ALTER TABLE {table} ADD CONSTRAINT %I %s', conname, pg_get_constraintdef(oid))
+           ), ARRAY[]::text[]) INTO definitions
+    FROM pg_constraint WHERE conrelid = '{table}'::regclass AND contype = 'f'{skip};
+
+    ALTER TABLE {table} RENAME TO {old};
+    CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS){clause};
+{statements}    INSERT INTO {table} SELECT * FROM {old};
+
+    -- The sequence belongs to the old id column and would be dropped with it
+    IF sequence_name IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY NONE', sequence_name);
+    END IF;
+    DROP TABLE {old};
+    IF sequence_name IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY {table}.id', sequence_name);
+    END IF;
+    FOREACH definition IN ARRAY definitions LOOP
+        EXECUTE definition;
+    END LOOP;
+END
+$$""")
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        op.create_index('ix_car_listing_history_listing_id', 'car_listing_history', ['listing_id'], unique=False)
+        return
+
+    # History first: dropping its old table also drops its foreign key to car_listings
+    _rebuild('car_listing_history', 'RANGE (created_at)', [
+        "CREATE TABLE car_listing_history_default PARTITION OF car_listing_history DEFAULT;",
+        HISTORY_MONTHS,
+    ], skip_references='car_listings')
+    op.execute("ALTER TABLE car_listing_history ADD CONSTRAINT uq_car_listing_history_id_created_at "
+               "UNIQUE (id, created_at)")
+    op.create_index('ix_car_listing_history_listing_id', 'car_listing_history', ['listing_id'], unique=False)
+
+    _rebuild('car_listings', 'LIST (status)', [
+        "CREATE TABLE car_listings_active PARTITION OF car_listings FOR VALUES IN ('ACTIVE');",
+        "CREATE TABLE car_listings_inactive PARTITION OF car_listings FOR VALUES IN ('SOLD', 'ARCHIVED');",
+        "CREATE TABLE car_listings_default PARTITION OF car_listings DEFAULT;",
+    ])
+    op.execute("ALTER TABLE car_listings ADD CONSTRAINT uq_car_listings_id_status UNIQUE (id, status)")
+    op.create_index('ix_car_listings_yad2_id_status', 'car_listings', ['yad2_id', 'status'], unique=True)
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        op.drop_index('ix_car_listing_history_listing_id', table_name='car_listing_history')
+        return
+
+    # Detached history partitions are left as they are
+    _rebuild('car_listings', None, [])
+    op.execute("ALTER TABLE car_listings ADD PRIMARY KEY (id)")
+    op.execute("DROP INDEX IF EXISTS ix_car_listings_yad2_id")
+    op.create_index('ix_car_listings_yad2_id', 'car_listings', ['yad2_id'], unique=True)
+
+    _rebuild('car_listing_history', None, [])
+    op.execute("ALTER TABLE car_listing_history ADD PRIMARY KEY (id)")
+    op.drop_index('ix_car_listing_history_listing_id', table_name='car_listing_history')
+    op.create_foreign_key(
+        'car_listing_history_listing_id_fkey',
+        'car_listing_history', 'car_listings',
+        ['listing_id'], ['id']
+    )
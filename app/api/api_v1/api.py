@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 from .api_new import router as api_router
+from .endpoints.scraper_updated import router as scraper_router
 
 # Create main router
 router = APIRouter()
@@ -7,5 +8,8 @@ router = APIRouter()
 # Include the existing API router with /car prefix
 router.include_router(api_router, prefix="/car", tags=["car"])
 
+# Scrape jobs (enqueued here, executed by the Celery workers)
+router.include_router(scraper_router, prefix="/scrape", tags=["scrape"])
+
 # Export the router for main.py to import
 __all__ = ["router"]
@@ -1,10 +1,16 @@
-from typing import List, Dict, Optional
-from fastapi import Depends, APIRouter, HTTPException
-from sqlalchemy.orm import Session
+from typing import List, Dict, Literal, Optional
+from fastapi import Depends, APIRouter, HTTPException, Query
+from sqlalchemy import func, null
+from sqlalchemy.orm import Session, joinedload
 
+from app.core.config import settings
 from app.db.session import SessionLocal
-from app.db.models.car import CarListing as CarListingModel, CarBrand, CarModel
-from app.schemas.car import CarListing, CarBrand as CarBrandSchema, CarModel as CarModelSchema
+from app.db.models.car import CarListing as CarListingModel, CarBrand, CarModel, CarStatus
+from app.schemas.car import CarListing, CarBrand as CarBrandSchema, CarModel as CarModelSchema, MarketStats
+from app.services.car import CarService
+from app.services.images import similar_listings
+from app.services.market_stats import DEFAULT_QUANTILES, segment_stats
+from app.services.raw_archive import load_payloads
 
 # Create router
 router = APIRouter()
@@ -32,15 +38,23 @@ async def get_listings(
     min_year: Optional[int] = None,
     max_year: Optional[int] = None,
     location: Optional[str] = None,
+    status: Optional[CarStatus] = CarStatus.ACTIVE,
+    collapse_duplicates: bool = False,
     page: int = 1,
     limit: int = 20
 ):
     """
     Get paginated list of car listings with optional filters.
+
+    Only active listings are returned unless another ``status`` (sold, archived) is asked for.
+    With ``collapse_duplicates``, the ads of one car (see app/services/dedupe.py) are returned
+    once, as the most recently seen one, with the number of matching ads in ``duplicates``.
     """
     query = db.query(CarListingModel)
     
     # Apply filters
+    if status is not None:
+        query = query.filter(CarListingModel.status == status)
     if brand:
         query = query.join(CarBrand).filter(CarBrand.name.ilike(f"%{brand}%"))
     if model:
@@ -56,6 +70,31 @@ async def get_listings(
     if location:
         query = query.filter(CarListingModel.location.ilike(f"%{location}%"))
     
+    if collapse_duplicates:
+        # Rank the matching listings within their cluster (a listing without duplicates is its own)
+        cluster = func.coalesce(CarListingModel.cluster_id, CarListingModel.id)
+        ranked = query.with_entities(
+            CarListingModel.id,
+            func.row_number().over(
+                partition_by=cluster,
+                order_by=(CarListingModel.last_scraped_at.desc(), CarListingModel.id.desc())
+            ).label("rank"),
+            func.count().over(partition_by=cluster).label("duplicates")
+        ).subquery()
+        query = (
+            db.query(CarListingModel, ranked.c.duplicates)
+            .join(ranked, ranked.c.id == CarListingModel.id)
+            .filter(ranked.c.rank == 1)
+        )
+    else:
+        query = query.add_columns(null().label("duplicates"))
+    
+    # Load brand and model with the listings instead of one query per listing
+    query = query.options(
+        joinedload(CarListingModel.brand),
+        joinedload(CarListingModel.model)
+    )
+    
     # Pagination
     skip = (page - 1) * limit
     listings = query.offset(skip).limit(limit).all()
@@ -80,6 +119,7 @@ async def get_listings(
             created_at=listing.created_at,
             updated_at=listing.updated_at,
             last_scraped_at=listing.last_scraped_at,
+            duplicates=duplicates,
             brand=CarBrandSchema(
                 id=listing.brand.id,
                 name=listing.brand.name,
@@ -92,9 +132,104 @@ async def get_listings(
                 brand_id=listing.model.brand_id
             ) if listing.model else None
         )
-        for listing in listings
+        for listing, duplicates in listings
     ]
 
+@router.get("/listings/{listing_id}/raw", response_model=Dict)
+async def get_listing_raw(listing_id: int, history: bool = False, db: Session = Depends(get_db)):
+    """
+    Get the archived raw payload of a listing, or all its versions with ``history``.
+    """
+    yad2_id = db.query(CarListingModel.yad2_id).filter(CarListingModel.id == listing_id).scalar()
+    if yad2_id is None:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    payloads = load_payloads(db, yad2_id, latest_only=not history)
+    if not payloads:
+        raise HTTPException(status_code=404, detail="No raw payload archived for this listing")
+    if history:
+        return {"listing_id": listing_id, "yad2_id": yad2_id, "versions": payloads}
+    return {"listing_id": listing_id, "yad2_id": yad2_id, **payloads[0]}
+
+@router.get("/listings/{listing_id}/similar-images", response_model=Dict)
+async def get_similar_images(listing_id: int, max_distance: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    Get the listings of the same brand, model and year whose photo looks like this listing's.
+
+    ``max_distance`` is the most differing bits of the 64-bit image hashes (see
+    app/services/images.py), at most ``IMAGE_HASH_BANDS - 1``.
+    """
+    listing = db.query(CarListingModel).filter(CarListingModel.id == listing_id).first()
+    if listing is None:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    if listing.image_hash is None:
+        raise HTTPException(status_code=404, detail="The listing's image is not hashed")
+    if max_distance is not None and not 0 <= max_distance < settings.IMAGE_HASH_BANDS:
+        raise HTTPException(status_code=422, detail=f"max_distance must be between 0 and {settings.IMAGE_HASH_BANDS - 1}")
+    matches = similar_listings(db, listing_id, max_distance)
+    others = {
+        other.id: other
+        for other in db.query(CarListingModel).filter(CarListingModel.id.in_([match for match, _ in matches]))
+    }
+    return {
+        "listing_id": listing_id,
+        "image_hash": listing.image_hash,
+        "similar": [
+            {
+                "listing_id": other_id,
+                "yad2_id": others[other_id].yad2_id,
+                "distance": bits,
+                "title": others[other_id].title,
+                "price": others[other_id].price,
+                "image_url": others[other_id].image_url,
+                "status": others[other_id].status,
+                "cluster_id": others[other_id].cluster_id,
+            }
+            for other_id, bits in matches if other_id in others
+        ],
+    }
+
+@router.get("/stats", response_model=List[MarketStats])
+async def get_market_stats(
+    db: Session = Depends(get_db),
+    brand: Optional[str] = None,
+    model: Optional[str] = None,
+    min_year: Optional[int] = None,
+    max_year: Optional[int] = None,
+    group_by: Literal["year", "model", "brand"] = "year",
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Get price statistics of the active listings per brand, model and year (or per model or brand
+    with ``group_by``), largest segments first.
+
+    Read from the market_stats rollups (see app/services/market_stats.py), not from the listings.
+    """
+    return segment_stats(db, brand=brand, model=model, min_year=min_year, max_year=max_year,
+                         group_by=group_by, limit=limit)
+
+@router.get("/stats/{brand}/{model}/{year}", response_model=MarketStats)
+async def get_segment_market_stats(
+    brand: str,
+    model: str,
+    year: int,
+    q: List[float] = Query(list(DEFAULT_QUANTILES)),
+    db: Session = Depends(get_db)
+):
+    """
+    Get price statistics of one brand, model and year, with the price quantiles ``q`` (0 to 1).
+    """
+    if any(not 0 <= quantile <= 1 for quantile in q):
+        raise HTTPException(status_code=422, detail="Quantiles must be between 0 and 1")
+    stats = segment_stats(db, brand=brand, model=model, year=year, quantiles=q, exact=True)
+    if not stats:
+        raise HTTPException(status_code=404, detail="No active listings in this segment")
+    return stats[0]
+
+@router.get("/filters", response_model=Dict)
+async def get_filters(db: Session = Depends(get_db)):
+    """Get the available brands, models, year range and price range"""
+    return await CarService().get_filters(db)
+
 @router.get("/brands", response_model=List[Dict[str, str]])
 async def get_brands(db: Session = Depends(get_db)):
     """Get list of available car brands"""
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -31,6 +31,52 @@ class ScrapingSettings(BaseSettings):
     RATE_LIMIT_REQUESTS: int = 30
     RATE_LIMIT_PERIOD: int = 60  # seconds
     
+    # Parallel crawling
+    MAX_CONCURRENT_PAGES: int = 4  # browser contexts used by the parallel crawler
+    # Crawls that run to the end of the results (scheduled partitions) stop after
+    # this many pages, or stop starting pages once this many have failed
+    MAX_CRAWL_PAGES: int = 1000
+    MAX_FAILED_PAGES: int = 5
+    
+    # Listing extraction
+    # "evaluate" pulls every card in one page.evaluate call; "elements" walks the
+    # cards with per-element queries. Evaluate falls back to elements when it finds nothing.
+    EXTRACTION_MODE: str = "evaluate"
+    CARD_SELECTORS: Dict[str, str] = {
+        "card": 'div[class*="feedItemBox"], [data-test-id="feed_item"], .feeditem:not(.feeditem-premium), .feed_item',
+        "link": 'a[href*="item/"]',
+        "title": '[class*="feed-item-info_heading"], [data-test-id="title"], .title, h3',
+        "subtitle": '[class*="marketingText"], .subtitle',
+        "price": '[data-testid="price"], [data-test-id="price"], .price',
+        "info": '[class*="yearAndHandBox"], .listing-row-right, .feed_item_info',
+        "location": '[data-testid="location"], [class*="location"]',
+        "image": 'img[data-testid="image"], img',
+        "tags": '[class*="tag-list_tag"], .tag',
+        "detail": '.field, .detail',
+        "detail_label": '.field_title, .detail-label',
+        "detail_value": '.value, .detail-value',
+    }
+    
+    # HTML parsing for the plain HTTP scrapers: "auto" picks the fastest installed
+    # backend (selectolax, then lxml, then bs4)
+    HTML_PARSER_BACKEND: str = "auto"
+    # Write every fetched result page to this file for debugging (off when unset)
+    DEBUG_HTML_DUMP_PATH: Optional[str] = None
+    
+    # Read listings from the __NEXT_DATA__ JSON of a plain HTTP response and only
+    # start the browser for pages where that JSON is missing (captcha, block page)
+    NEXT_DATA_FAST_PATH: bool = True
+    
+    # Record/replay (app/scrapers/replay.py): record every response the scrapers
+    # read into this fixture directory, or send every request to this stub server
+    RECORD_DIR: Optional[str] = None
+    REPLAY_URL: Optional[str] = None
+    
+    # Keep each listing's raw card details / API item (compressed, see
+    # app/scrapers/listing_record.py) and archive it on ingest (see
+    # app/services/raw_archive.py); off, only the parsed fields are kept
+    KEEP_RAW_DATA: bool = False
+    
     # Cache settings
     CACHE_ENABLED: bool = True
     CACHE_TTL: int = 3600  # 1 hour
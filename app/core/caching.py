@@ -5,6 +5,8 @@ from typing import Any, Callable, Optional, TypeVar, cast
 import json
 import hashlib
 
+from app.core.metrics import CACHE_HITS, CACHE_MISSES
+
 # Type variable for generic function typing
 F = TypeVar('F', bound=Callable[..., Any])
 
@@ -12,6 +14,8 @@ class Cache:
     """Simple in-memory cache implementation"""
     _instance = None
     _store = {}
+    _hits = 0
+    _misses = 0
     
     def __new__(cls):
         if cls._instance is None:
@@ -23,10 +27,19 @@ class Cache:
         if key in self._store:
             value, expiry = self._store[key]
             if expiry is None or expiry > datetime.utcnow():
+                Cache._hits += 1
+                CACHE_HITS.inc()
                 return value
             del self._store[key]
+        Cache._misses += 1
+        CACHE_MISSES.inc()
         return None
     
+    def hit_ratio(self) -> float:
+        """Share of get() calls that found a live value since the process started"""
+        lookups = Cache._hits + Cache._misses
+        return Cache._hits / lookups if lookups else 0.0
+    
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """Set a value in the cache with optional TTL in seconds"""
         expiry = datetime.utcnow() + timedelta(seconds=ttl) if ttl else None
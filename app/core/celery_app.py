@@ -0,0 +1,79 @@
+"""
+Celery application used by the scrape and ingest workers.
+
+Run a worker for both queues with:
+
+    celery -A app.core.celery_app worker -Q scrape,ingest --loglevel=info
+
+and the scheduler (exactly one is enough, but more are harmless) with:
+
+    celery -A app.core.celery_app beat --loglevel=info
+
+Setting ``CELERY_TASK_ALWAYS_EAGER=true`` (and ``CELERY_BROKER_URL=memory://``)
+runs tasks inline in the calling process, which is what tests and local
+experiments should use.
+"""
+from celery import Celery
+
+from app.core.config import settings
+
+celery_app = Celery(
+    "drivez",
+    broker=settings.CELERY_BROKER_URL,
+    backend=settings.CELERY_RESULT_BACKEND,
+    include=["app.services.jobs", "app.services.scheduler", "app.services.lifecycle",
+             "app.services.partitions", "app.services.images", "app.services.market_stats"],
+)
+
+celery_app.conf.update(
+    task_always_eager=settings.CELERY_TASK_ALWAYS_EAGER,
+    task_eager_propagates=settings.CELERY_TASK_ALWAYS_EAGER,
+    # Job state lives in the scrape_jobs table; Celery results are not read back
+    task_ignore_result=True,
+    # A crawl can take minutes: only take a new job when the previous one is done,
+    # and re-deliver it if the worker dies halfway through
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    task_routes={
+        "jobs.run_scrape_job": {"queue": "scrape"},
+        "jobs.run_ingest_job": {"queue": "ingest"},
+        # Ticks only touch the database, keep them off the busy scrape queue
+        "scheduler.tick": {"queue": "ingest"},
+        "lifecycle.sweep": {"queue": "ingest"},
+        "partitions.maintain": {"queue": "ingest"},
+        "images.hash_pending": {"queue": "ingest"},
+        "market_stats.compact": {"queue": "ingest"},
+    },
+    beat_schedule={
+        "scheduler-tick": {
+            "task": "scheduler.tick",
+            "schedule": float(settings.SCHEDULER_TICK_SECONDS),
+            # A tick that waited longer than one period is superseded by the next one
+            "options": {"expires": float(settings.SCHEDULER_TICK_SECONDS)},
+        },
+        "lifecycle-sweep": {
+            "task": "lifecycle.sweep",
+            "schedule": settings.LIFECYCLE_SWEEP_MINUTES * 60.0,
+            "options": {"expires": settings.LIFECYCLE_SWEEP_MINUTES * 60.0},
+        },
+        "partition-maintenance": {
+            "task": "partitions.maintain",
+            "schedule": settings.PARTITION_MAINTENANCE_HOURS * 3600.0,
+            "options": {"expires": settings.PARTITION_MAINTENANCE_HOURS * 3600.0},
+        },
+        "image-hashing": {
+            "task": "images.hash_pending",
+            "schedule": settings.IMAGE_HASH_MINUTES * 60.0,
+            "options": {"expires": settings.IMAGE_HASH_MINUTES * 60.0},
+        },
+        "market-stats-compaction": {
+            "task": "market_stats.compact",
+            "schedule": settings.STATS_COMPACT_MINUTES * 60.0,
+            "options": {"expires": settings.STATS_COMPACT_MINUTES * 60.0},
+        },
+    },
+    task_serializer="json",
+    accept_content=["json"],
+    timezone="UTC",
+)
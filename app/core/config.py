@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Any, Dict, List
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Car Listing Aggregator"
@@ -19,6 +19,20 @@ class Settings(BaseSettings):
     # Celery
     CELERY_BROKER_URL: str = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
     CELERY_RESULT_BACKEND: str = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
+    CELERY_TASK_ALWAYS_EAGER: bool = False  # run tasks inline (tests, with CELERY_BROKER_URL=memory://)
+    
+    # Adds Server-Timing headers with the SQL profile of each request
+    DEBUG: bool = False
+    
+    # SQL profiling
+    SQL_SLOW_QUERY_MS: float = 200  # statements slower than this are logged
+    SQL_SLOW_REQUEST_MS: float = 500  # requests with more SQL time than this are logged with their statements
+    SQL_PROFILE_TOP_N: int = 5  # slowest statements kept per request
+    SQL_EXPLAIN_SAMPLE_RATE: float = 0.0  # share of slow SELECTs whose plan is captured (0 disables)
+    
+    # Tracing (app/core/tracing.py): "none", "console", "file" or "otel"
+    TRACING_EXPORTER: str = "none"
+    TRACING_FILE: str = "traces.jsonl"  # spans are appended here with TRACING_EXPORTER=file
     
     # CORS
     BACKEND_CORS_ORIGINS: List[str] = ["http://localhost:3000"]
@@ -29,6 +43,67 @@ class Settings(BaseSettings):
     
     # Scraping
     SCRAPING_INTERVAL_MINUTES: int = 15
+    # Partitions are crawled every SCRAPING_INTERVAL_MINUTES at first, then faster or
+    # slower (within these bounds) depending on how much of each crawl turned out new or changed
+    SCRAPING_MIN_INTERVAL_MINUTES: int = 5
+    SCRAPING_MAX_INTERVAL_MINUTES: int = 6 * 60
+    SCRAPING_TARGET_CHANGE_RATE: float = 0.2
+    # Search partitions crawled on a schedule (keys: key, params); empty means one "all" partition
+    SCRAPING_PARTITIONS: List[Dict[str, Any]] = []
+    SCHEDULER_TICK_SECONDS: int = 60
+    SCHEDULER_JITTER: float = 0.1  # +/- fraction of the interval
+    SCHEDULER_LEASE_MINUTES: int = 60  # a crashed run frees its partition after this long
+    SCHEDULER_MAX_DISPATCH_PER_TICK: int = 10  # spreads the catch-up after downtime
+    TASK_PROGRESS_POLL_SECONDS: float = 1.0  # how often the progress stream re-reads a job
+    SCRAPE_JOB_TTL_HOURS: int = 24 * 7  # finished jobs are reported, then purged, after this
+    PIPELINE_QUEUE_SIZE: int = 500  # listings buffered between two pipeline stages
+    PIPELINE_FLUSH_SECONDS: float = 2.0  # longest a scraped listing waits before it is written
+    
+    # Listing lifecycle (app/services/lifecycle.py)
+    LIFECYCLE_MISSED_CRAWLS: int = 3  # complete crawls of its partition a listing may miss before it is SOLD
+    LIFECYCLE_STALE_DAYS: int = 30  # ACTIVE listings not seen for this long are SOLD, whatever their partition
+    LIFECYCLE_ARCHIVE_AFTER_DAYS: int = 90  # SOLD listings not seen for this long are ARCHIVED
+    LIFECYCLE_SWEEP_MINUTES: int = 60  # how often the stale/archive sweep runs
+    
+    # Table partitioning on PostgreSQL (app/db/partitioning.py)
+    HISTORY_PARTITION_MONTHS_AHEAD: int = 3  # monthly history partitions created ahead of time
+    HISTORY_RETENTION_MONTHS: int = 24  # older history partitions are detached
+    HISTORY_DROP_EXPIRED: bool = False  # drop detached history partitions instead of keeping them as tables
+    PARTITION_MAINTENANCE_HOURS: int = 24  # how often the partition maintenance runs
+    
+    # Duplicate detection (app/services/dedupe.py)
+    DEDUPE_ENABLED: bool = True  # cluster listings into duplicates while ingesting
+    DEDUPE_NUM_PERM: int = 64  # MinHash permutations, DEDUPE_BANDS x rows per band
+    DEDUPE_BANDS: int = 16  # LSH bands; 16 x 4 rows finds pairs from a similarity of ~0.5
+    DEDUPE_THRESHOLD: float = 0.6  # estimated Jaccard similarity of duplicates
+    DEDUPE_MILEAGE_BUCKET: int = 10000  # km; duplicates are at most one bucket apart
+    DEDUPE_PRICE_BUCKET: int = 5000  # price; duplicates are at most one bucket apart
+    
+    # Image hashing (app/services/images.py), needs Pillow
+    IMAGE_HASH_ENABLED: bool = False  # fetch and hash listing images in the background
+    IMAGE_CACHE_DIR: str = "data/image_cache"  # fetched images, by URL
+    IMAGE_FETCH_CONCURRENCY: int = 16  # image downloads in flight
+    IMAGE_FETCH_TIMEOUT: float = 15.0  # seconds per image
+    IMAGE_MAX_BYTES: int = 5 * 1024 * 1024  # larger images are not hashed
+    IMAGE_HASH_BATCH_SIZE: int = 500  # listings hashed per run
+    IMAGE_RETRY_MINUTES: int = 30  # wait after a failed image download, doubled after each further failure
+    IMAGE_FETCH_MAX_ATTEMPTS: int = 6  # failed downloads before a listing counts as having no usable image
+    IMAGE_HASH_MINUTES: int = 10  # how often pending images are hashed
+    IMAGE_HASH_MAX_DISTANCE: int = 6  # differing bits of the same photo; at most IMAGE_HASH_BANDS - 1
+    IMAGE_HASH_BANDS: int = 8  # the 64-bit hash is indexed as this many bands
+    
+    # Market statistics rollups (app/services/market_stats.py)
+    STATS_ENABLED: bool = True  # maintain market_stats while ingesting and in the lifecycle
+    STATS_COMPRESSION: int = 200  # t-digest compression; a digest keeps about half as many centroids
+    STATS_KM_PER_YEAR: int = 15000  # reference mileage per year of age, for the mileage-adjusted price
+    STATS_MIN_REGRESSION_LISTINGS: int = 10  # fewer listings with a mileage give no mileage adjustment
+    STATS_STALE_RATIO: float = 0.2  # segments whose digest holds this share of removed prices are rebuilt
+    STATS_COMPACT_MINUTES: int = 60  # how often stale segments are rebuilt
+    
+    # CPU-bound parsing and normalization
+    CPU_EXECUTOR: str = "process"  # process, thread or inline (on the event loop)
+    CPU_EXECUTOR_WORKERS: int = 0  # 0 means one per CPU
+    CPU_EXECUTOR_BATCH_SIZE: int = 50  # listings per task, to amortize the IPC
     
     class Config:
         case_sensitive = True
@@ -0,0 +1,188 @@
+"""
+Executor for CPU-bound parsing and normalization work.
+
+HTML parsing, ``__NEXT_DATA__`` decoding and listing cleanup take tens of
+milliseconds per page, which stalls every other coroutine when they run on the
+event loop. ``CPUExecutor.run`` sends such a call to a process pool instead.
+
+Work sent here must be shared-nothing: a module-level function whose arguments
+and result pickle, that opens no database session and relies on no state of the
+calling process. Callers batch their inputs (``CPU_EXECUTOR_BATCH_SIZE``) so one
+round trip carries many listings.
+
+``CPU_EXECUTOR`` selects the mode: ``process`` (default), ``thread`` (for code
+that releases the GIL, or where child processes are not allowed) or ``inline``
+(run on the loop, for debugging).
+
+Daemonic processes cannot start a process pool, and Celery's default prefork
+pool children are daemonic. There the executor falls back to threads, logs it
+once and reports it as ``fallback`` in ``stats()`` and the
+``cpu_executor_fallback`` gauge; run such workers with ``--pool=solo`` to keep
+the process pool.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MODES = ("process", "thread", "inline")
+
+
+def _timed_call(fn: Callable[..., Any], args: Tuple[Any, ...]) -> Tuple[Any, float, float]:
+    """Run ``fn`` in a worker and report when it started and how long it took."""
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time() - started
+
+
+class CPUExecutor:
+    """Runs CPU-bound functions off the event loop and tracks pool saturation."""
+
+    def __init__(self, mode: str = "process", max_workers: Optional[int] = None) -> None:
+        """Initialize the executor; the pool itself starts on first use.
+
+        Args:
+            mode: One of ``process``, ``thread`` or ``inline``
+            max_workers: Pool size (default: one per CPU)
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown executor mode {mode!r}, expected one of {MODES}")
+        self.mode = mode
+        self.requested_mode = mode
+        self.fallback_reason: Optional[str] = None
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool: Optional[Executor] = None
+        self._created_at = time.time()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._busy_seconds = 0.0
+        self._queue_wait_seconds = 0.0
+        self._pool_restarts = 0
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == "process" and multiprocessing.current_process().daemon:
+                # Daemonic processes (e.g. Celery prefork workers) cannot have children
+                self._fall_back_to_threads("daemonic processes are not allowed to have children")
+            if self.mode == "process":
+                # Spawned workers start clean instead of inheriting the parent's
+                # threads, sockets and DB connections through fork()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="cpu")
+        return self._pool
+
+    def _fall_back_to_threads(self, reason: str) -> None:
+        self.fallback_reason = reason
+        logger.warning(f"Process pool unavailable ({reason}), using threads instead")
+        self.mode = "thread"
+
+    def _restart_pool(self, broken: Executor, error: BaseException) -> None:
+        # Every call in flight on the broken pool gets here; only the first one
+        # replaces it, the others retry on the pool it started
+        if self._pool is not broken:
+            return
+        logger.warning(f"Process pool broke ({str(error)}), restarting it")
+        self._pool_restarts += 1
+        self.shutdown(wait=False)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(*args)`` on the pool and return its result.
+
+        Args:
+            fn: Module-level, shared-nothing function
+            args: Picklable arguments
+
+        Returns:
+            The result of ``fn``; exceptions raised by ``fn`` propagate
+        """
+        self._submitted += 1
+        self._in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        submitted = time.time()
+        try:
+            if self.mode == "inline":
+                result, started, elapsed = _timed_call(fn, args)
+            else:
+                result, started, elapsed = await self._submit(fn, args)
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+        self._completed += 1
+        self._busy_seconds += elapsed
+        self._queue_wait_seconds += max(started - submitted, 0.0)
+        return result
+
+    async def _submit(self, fn: Callable[..., Any], args: Tuple[Any, ...]) -> Tuple[Any, float, float]:
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        try:
+            return await loop.run_in_executor(pool, _timed_call, fn, args)
+        except BrokenProcessPool as e:
+            # A worker died (killed, out of memory); start a fresh pool and retry once
+            self._restart_pool(pool, e)
+            return await loop.run_in_executor(self._get_pool(), _timed_call, fn, args)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool saturation metrics.
+
+        ``saturation`` is the share of workers busy right now (1.0 means new work
+        queues up), ``queued`` the calls waiting for a worker and ``utilization``
+        the share of worker time spent on work since the executor was created.
+        ``fallback`` is set when a process pool could not start here and the
+        executor runs on threads instead (``fallback_reason`` says why).
+        """
+        uptime = max(time.time() - self._created_at, 1e-9)
+        completed = self._completed or 1
+        return {
+            "mode": self.mode,
+            "requested_mode": self.requested_mode,
+            "fallback": self.fallback_reason is not None,
+            "fallback_reason": self.fallback_reason,
+            "pool_restarts": self._pool_restarts,
+            "workers": self.max_workers,
+            "started": self._pool is not None,
+            "in_flight": self._in_flight,
+            "queued": max(self._in_flight - self.max_workers, 0),
+            "peak_in_flight": self._peak_in_flight,
+            "saturation": round(min(self._in_flight / self.max_workers, 1.0), 3),
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "avg_task_ms": round(self._busy_seconds / completed * 1000, 2),
+            "avg_queue_wait_ms": round(self._queue_wait_seconds / completed * 1000, 2),
+            "utilization": round(min(self._busy_seconds / (uptime * self.max_workers), 1.0), 3),
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the pool; the next ``run`` starts a new one."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+
+
+_executor: Optional[CPUExecutor] = None
+
+
+def get_executor() -> CPUExecutor:
+    """Return the process-wide executor configured by the CPU_EXECUTOR settings."""
+    global _executor
+    if _executor is None:
+        _executor = CPUExecutor(settings.CPU_EXECUTOR, settings.CPU_EXECUTOR_WORKERS or None)
+    return _executor
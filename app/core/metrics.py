@@ -0,0 +1,184 @@
+"""
+Prometheus metrics for the API, the database, the cache, the scrapers and ingestion.
+
+Everything on a hot path only touches pre-created metric children (a lock and
+an add); label sets are bound once and route labels use the route template, not
+the raw path, so the series count stays bounded.
+
+Scrape ``/metrics`` on the API. The API and the Celery workers are separate
+processes: to see the worker metrics there too, point ``PROMETHEUS_MULTIPROC_DIR``
+at the same empty directory for all of them (prometheus_client multiprocess
+mode). Callback gauges (queue depths, executor saturation) are per process and
+are only reported outside multiprocess mode.
+
+Ingest throughput is ``rate(ingest_rows_total[1m])``.
+"""
+import os
+import time
+import weakref
+from typing import Any, Dict
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+
+_MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# API
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+HTTP_DB_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request", ["route"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250),
+)
+HTTP_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent in SQL per HTTP request", ["route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+# Database
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "SQL statement execution time",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+
+# Cache
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups", ["result"])
+CACHE_HITS = CACHE_REQUESTS.labels("hit")
+CACHE_MISSES = CACHE_REQUESTS.labels("miss")
+
+# Scrapers
+SCRAPER_EVENTS = Counter(
+    "scraper_events_total", "Scraper requests, outcomes and extracted listings", ["scraper", "event"]
+)
+SCRAPER_EVENT_NAMES = (
+    "requests", "successful_requests", "failed_requests", "captcha_encounters",
+    "rate_limited", "pages_processed", "listings_extracted",
+)
+
+# Ingestion
+INGEST_ROWS = Counter("ingest_rows_total", "Listings stored by ingestion", ["outcome"])
+INGEST_NEW = INGEST_ROWS.labels("new")
+INGEST_UPDATED = INGEST_ROWS.labels("updated")
+INGEST_ERRORS = INGEST_ROWS.labels("error")
+INGEST_REJECTIONS = Counter("ingest_rejections_total", "Invalid listings by the field they failed", ["field"])
+
+
+def route_label(scope) -> str:
+    """Return the route template of a served request, e.g. ``/api/v1/car/listings/{listing_id}``."""
+    # The router stores the matched route in the scope; unmatched paths share one label
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per route.
+
+    SQL usage per route is recorded by ``app.core.profiling.SQLProfilingMiddleware``.
+
+    Plain ASGI rather than ``BaseHTTPMiddleware``, which would add a task and a
+    stream copy to every request.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+        # Histogram children by (method, route, status), so labels() is resolved once per series
+        self._children: Dict[tuple, Any] = {}
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            key = (scope["method"], route_label(scope), status_code)
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = HTTP_REQUEST_DURATION.labels(key[0], key[1], str(status_code))
+            child.observe(elapsed)
+
+
+class ScraperStats(dict):
+    """The ``stats`` dict of a scraper, with its counters mirrored to ``scraper_events_total``.
+
+    Existing code keeps doing ``self.stats['requests'] += 1``; increments of the
+    known counters are also added to the Prometheus counter.
+    """
+
+    def __init__(self, scraper: str, **initial: Any) -> None:
+        super().__init__({name: 0 for name in SCRAPER_EVENT_NAMES}, **initial)
+        self._children = {name: SCRAPER_EVENTS.labels(scraper, name) for name in SCRAPER_EVENT_NAMES}
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        child = self._children.get(key)
+        if child is not None:
+            delta = value - self.get(key, 0)
+            if delta > 0:
+                child.inc(delta)
+        super().__setitem__(key, value)
+
+
+# Queues registered by running pipelines, by stage name
+_queues: Dict[str, "weakref.WeakSet"] = {}
+
+if not _MULTIPROCESS:
+    PIPELINE_QUEUE_DEPTH = Gauge("pipeline_queue_depth", "Items waiting between two pipeline stages", ["queue"])
+    CACHE_HIT_RATIO = Gauge("cache_hit_ratio", "Share of cache lookups that hit, since start")
+
+    def _cache_hit_ratio() -> float:
+        # caching imports this module for the counters
+        from app.core.caching import Cache
+        return Cache().hit_ratio()
+
+    CACHE_HIT_RATIO.set_function(_cache_hit_ratio)
+    EXECUTOR_IN_FLIGHT = Gauge("cpu_executor_in_flight", "Calls running or waiting on the CPU executor")
+    EXECUTOR_SATURATION = Gauge("cpu_executor_saturation", "Share of CPU executor workers busy")
+    EXECUTOR_UTILIZATION = Gauge("cpu_executor_utilization", "Share of CPU executor worker time spent working")
+    EXECUTOR_FALLBACK = Gauge("cpu_executor_fallback", "1 when the CPU executor fell back from processes to threads")
+    EXECUTOR_POOL_RESTARTS = Gauge("cpu_executor_pool_restarts", "Process pools replaced after a worker died")
+
+    def _executor_stat(name: str) -> float:
+        # Imported here: the executor module is only loaded by processes that use it
+        from app.core.executor import get_executor
+        return float(get_executor().stats()[name])
+
+    EXECUTOR_IN_FLIGHT.set_function(lambda: _executor_stat("in_flight"))
+    EXECUTOR_SATURATION.set_function(lambda: _executor_stat("saturation"))
+    EXECUTOR_UTILIZATION.set_function(lambda: _executor_stat("utilization"))
+    EXECUTOR_FALLBACK.set_function(lambda: _executor_stat("fallback"))
+    EXECUTOR_POOL_RESTARTS.set_function(lambda: _executor_stat("pool_restarts"))
+
+
+def track_queue(name: str, queue: Any) -> None:
+    """Report ``queue.qsize()`` under ``pipeline_queue_depth{queue=name}`` while the queue is alive."""
+    if _MULTIPROCESS:
+        return
+    if name not in _queues:
+        _queues[name] = weakref.WeakSet()
+        live = _queues[name]
+        PIPELINE_QUEUE_DEPTH.labels(name).set_function(lambda: sum(q.qsize() for q in list(live)))
+    _queues[name].add(queue)
+
+
+def render_metrics() -> tuple:
+    """Return the exposition body and its content type."""
+    if _MULTIPROCESS:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
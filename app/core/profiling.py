@@ -0,0 +1,219 @@
+"""
+Per-request SQL profiling and the slow-query log.
+
+SQLAlchemy ``before/after_cursor_execute`` events time every statement. While a
+request is being served (``SQLProfilingMiddleware``), the statements are also
+added to a ``RequestProfile``: statement count, total SQL time, the slowest
+statements and how often each statement text ran, which is what gives an N+1
+away (the same SELECT run once per row).
+
+- Statements slower than ``SQL_SLOW_QUERY_MS`` are logged, in or out of a request.
+- Requests whose SQL time exceeds ``SQL_SLOW_REQUEST_MS`` are logged with their
+  slowest and most repeated statements.
+- With ``DEBUG`` on, responses carry the profile in a ``Server-Timing`` header.
+- ``SQL_EXPLAIN_SAMPLE_RATE`` of the slow SELECTs get their plan captured
+  (plain EXPLAIN, the statement is not run again) and logged.
+
+Logged SQL is normalized (literals replaced by ``?``), bound parameters are never logged.
+"""
+import heapq
+import logging
+import random
+import re
+import time
+from contextvars import ContextVar
+from itertools import count
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.metrics import DB_QUERY_DURATION, HTTP_DB_QUERIES, HTTP_DB_SECONDS, route_label
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\([^)]+\)s|%s|:\w+|\$\d+|\?")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+_EXPLAIN_PREFIX = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN ", "mysql": "EXPLAIN "}
+
+
+def normalize_sql(statement: str, max_length: int = 500) -> str:
+    """Collapse a statement to its shape: literals and placeholders become ``?``, IN lists ``(?...)``."""
+    sql = _STRING_LITERAL.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(?...)", sql)
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    return sql if len(sql) <= max_length else sql[:max_length] + "..."
+
+
+class RequestProfile:
+    """SQL statements run while serving one request."""
+
+    __slots__ = ("count", "seconds", "slowest", "statement_counts", "_seq")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        # Min-heap of (duration, seq, statement, plan) holding the SQL_PROFILE_TOP_N slowest
+        self.slowest: List[Tuple[float, int, str, Optional[str]]] = []
+        self.statement_counts: Dict[str, int] = {}
+        self._seq = count()
+
+    def add(self, statement: str, duration: float, plan: Optional[str] = None) -> None:
+        self.count += 1
+        self.seconds += duration
+        # Bound parameters are separate, so an N+1 repeats the exact same text
+        self.statement_counts[statement] = self.statement_counts.get(statement, 0) + 1
+        entry = (duration, next(self._seq), statement, plan)
+        if len(self.slowest) < settings.SQL_PROFILE_TOP_N:
+            heapq.heappush(self.slowest, entry)
+        elif duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def top_statements(self) -> List[Dict[str, Any]]:
+        """Return the slowest statements, slowest first, with normalized SQL."""
+        return [
+            {"ms": round(duration * 1000, 2), "sql": normalize_sql(statement), "plan": plan}
+            for duration, _, statement, plan in sorted(self.slowest, reverse=True)
+        ]
+
+    def repeated_statements(self, min_count: int = 2) -> List[Tuple[int, str]]:
+        """Return (count, normalized SQL) of the statements run more than once, most repeated first."""
+        repeated = [(n, statement) for statement, n in self.statement_counts.items() if n >= min_count]
+        return [(n, normalize_sql(statement)) for n, statement in sorted(repeated, reverse=True)]
+
+
+# Set by SQLProfilingMiddleware for the duration of an HTTP request
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("sql_request_profile", default=None)
+
+
+def _explain(conn, statement: str, parameters: Any) -> Optional[str]:
+    """Return the plan of a statement that just ran, or None if it cannot be explained here."""
+    prefix = _EXPLAIN_PREFIX.get(conn.dialect.name)
+    if not prefix or not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    cursor = conn.connection.dbapi_connection.cursor()
+    savepoint = conn.dialect.name == "postgresql"
+    try:
+        # A failed statement would abort the whole transaction on PostgreSQL
+        if savepoint:
+            cursor.execute("SAVEPOINT sql_profile_explain")
+        cursor.execute(prefix + statement, parameters)
+        plan = "\n".join(" ".join(str(col) for col in row) for row in cursor.fetchall())
+        if savepoint:
+            cursor.execute("RELEASE SAVEPOINT sql_profile_explain")
+        return plan
+    except Exception as e:
+        if savepoint:
+            try:
+                cursor.execute("ROLLBACK TO SAVEPOINT sql_profile_explain")
+            except Exception:
+                pass
+        logger.debug(f"Could not EXPLAIN statement: {str(e)}")
+        return None
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    duration = time.perf_counter() - conn.info["query_start"].pop()
+    DB_QUERY_DURATION.observe(duration)
+
+    plan = None
+    if duration * 1000 >= settings.SQL_SLOW_QUERY_MS:
+        if not executemany and settings.SQL_EXPLAIN_SAMPLE_RATE and random.random() < settings.SQL_EXPLAIN_SAMPLE_RATE:
+            plan = _explain(conn, statement, parameters)
+        logger.warning(
+            f"Slow SQL ({duration * 1000:.1f} ms): {normalize_sql(statement)}"
+            + (f"\nPlan:\n{plan}" if plan else "")
+        )
+
+    profile = current_profile.get()
+    if profile is not None:
+        profile.add(statement, duration, plan)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time and profile every SQL statement run through ``engine``."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _server_timing(profile: RequestProfile, elapsed: float) -> str:
+    """Build a Server-Timing header value from a request profile."""
+    parts = [
+        f'db;dur={profile.seconds * 1000:.2f};desc="{profile.count} SQL statements"',
+        f"total;dur={elapsed * 1000:.2f}",
+    ]
+    for i, statement in enumerate(profile.top_statements()[:3], 1):
+        desc = statement["sql"][:100].replace('"', "'")
+        parts.append(f'sql{i};dur={statement["ms"]};desc="{desc}"')
+    return ", ".join(parts)
+
+
+class SQLProfilingMiddleware:
+    """ASGI middleware collecting the SQL profile of every request.
+
+    Records the statement count and SQL time per route in Prometheus, logs requests over ``SQL_SLOW_REQUEST_MS`` of SQL time and, with ``DEBUG`` on,
+    adds a ``Server-Timing`` header. Responses that start before the handler
+    is done (streaming) only report the statements run until then.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+        # Histogram children by route, so labels() is resolved once per series
+        self._children: Dict[str, Tuple[Any, Any]] = {}
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start" and settings.DEBUG:
+                headers = list(message.get("headers") or [])
+                headers.append((b"server-timing", _server_timing(profile, time.perf_counter() - start).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            route = route_label(scope)
+            children = self._children.get(route)
+            if children is None:
+                children = self._children[route] = (HTTP_DB_QUERIES.labels(route), HTTP_DB_SECONDS.labels(route))
+            children[0].observe(profile.count)
+            children[1].observe(profile.seconds)
+            if profile.seconds * 1000 >= settings.SQL_SLOW_REQUEST_MS:
+                self._log_slow_request(scope, profile, time.perf_counter() - start)
+
+    @staticmethod
+    def _log_slow_request(scope, profile: RequestProfile, elapsed: float) -> None:
+        lines = [
+            f"Slow request {scope['method']} {scope['path']}: {elapsed * 1000:.0f} ms, "
+            f"{profile.seconds * 1000:.0f} ms in {profile.count} SQL statements"
+        ]
+        for statement in profile.top_statements():
+            lines.append(f"  [{statement['ms']} ms] {statement['sql']}")
+            if statement["plan"]:
+                lines.append("    plan: " + statement["plan"].replace("\n", "\n          "))
+        for n, sql in profile.repeated_statements()[:3]:
+            lines.append(f"  ran {n}x: {sql}")
+        logger.warning("\n".join(lines))
@@ -0,0 +1,409 @@
+"""
+Span-based tracing of scrape jobs and API requests.
+
+The API follows OpenTelemetry's (``get_tracer(name).start_as_current_span(name,
+attributes=...)``, ``Span.set_attribute``, ``record_exception``, ``set_status``)
+so call sites do not change if the spans are handed to an OpenTelemetry SDK.
+``TRACING_EXPORTER`` selects where finished spans go:
+
+- ``none`` (default): not exported; job timing summaries are still collected
+- ``console``: one JSON object per span on stdout
+- ``file``: one JSON object per span appended to ``TRACING_FILE``
+- ``otel``: also opened as OpenTelemetry spans on the globally configured
+  provider (needs ``opentelemetry-api``; configure the SDK/exporter as usual)
+
+``task_context(task_id)`` ties every span started inside it, including those of
+asyncio tasks it creates, to the job: the trace id is the task id and every
+span carries a ``task.id`` attribute. It also sums the time of each span name
+into a ``TaskTrace``, whose ``summary()`` is the per-stage breakdown of the job.
+Work sent to the CPU executor runs in other processes and is only seen as the
+time its caller spent waiting.
+
+    python -m app.core.tracing report traces.jsonl [--task-id ID]
+"""
+import argparse
+import atexit
+import functools
+import inspect
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EXPORTERS = ("none", "console", "file", "otel")
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+
+class StatusCode:
+    """Span status codes, as in ``opentelemetry.trace.StatusCode``."""
+
+    UNSET = "UNSET"
+    OK = "OK"
+    ERROR = "ERROR"
+
+
+class TaskTrace:
+    """Time per span name of one task: the stage breakdown of a scrape job.
+
+    ``self`` time is a span's duration minus that of its child spans, so a
+    retry nested in a navigation is not counted twice. Spans of concurrent
+    workers overlap, so the stage totals can add up to more than the wall time.
+    """
+
+    def __init__(self, task_id: str) -> None:
+        self.task_id = task_id
+        self.started = time.perf_counter()
+        # name -> [count, total seconds, self seconds, max seconds, errors]
+        self.stages: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0, 0.0, 0])
+
+    def add(self, name: str, duration: float, self_time: float, error: bool) -> None:
+        stage = self.stages[name]
+        stage[0] += 1
+        stage[1] += duration
+        stage[2] += self_time
+        stage[3] = max(stage[3], duration)
+        stage[4] += error
+
+    def summary(self) -> Dict[str, Any]:
+        """Return the wall time and, per stage, the count and total/self/mean/max milliseconds."""
+        total_self = sum(stage[2] for stage in self.stages.values()) or 1.0
+        stages = {
+            name: {
+                "count": int(count),
+                "total_ms": round(total * 1000, 1),
+                "self_ms": round(self_time * 1000, 1),
+                "mean_ms": round(total / count * 1000, 2),
+                "max_ms": round(longest * 1000, 1),
+                "errors": int(errors),
+                "share": round(self_time / total_self, 3),
+            }
+            for name, (count, total, self_time, longest, errors) in sorted(
+                self.stages.items(), key=lambda item: -item[1][2]
+            )
+        }
+        return {
+            "task_id": self.task_id,
+            "wall_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": stages,
+        }
+
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_current_task: ContextVar[Optional[TaskTrace]] = ContextVar("current_task_trace", default=None)
+
+
+class Span:
+    """A timed operation; created by ``Tracer.start_as_current_span``."""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "attributes", "status", "description",
+        "events", "start_time", "_start", "duration", "_child_time", "_parent", "_task", "_otel",
+    )
+
+    def __init__(self, name: str, parent: Optional["Span"], task: Optional[TaskTrace],
+                 attributes: Optional[Dict[str, Any]]) -> None:
+        self.name = name
+        self._parent = parent
+        self._task = task
+        if parent is not None:
+            self.trace_id = parent.trace_id
+        elif task is not None:
+            self.trace_id = _task_trace_id(task.task_id)
+        else:
+            self.trace_id = f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        if task is not None:
+            self.attributes["task.id"] = task.task_id
+        self.status = StatusCode.UNSET
+        self.description: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration = 0.0
+        self._child_time = 0.0
+        self._otel = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+        if self._otel is not None:
+            self._otel.set_attribute(key, value)
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def update_name(self, name: str) -> None:
+        self.name = name
+        if self._otel is not None:
+            self._otel.update_name(name)
+
+    def set_status(self, status: str, description: Optional[str] = None) -> None:
+        self.status = status
+        self.description = description
+
+    def record_exception(self, exception: BaseException) -> None:
+        self.events.append({
+            "name": "exception",
+            "time": time.time(),
+            "attributes": {"exception.type": type(exception).__name__, "exception.message": str(exception)},
+        })
+        if self._otel is not None:
+            self._otel.record_exception(exception)
+
+    def end(self) -> None:
+        self.duration = time.perf_counter() - self._start
+        if self._parent is not None:
+            self._parent._child_time += self.duration
+        if self._task is not None:
+            self._task.add(self.name, self.duration, max(self.duration - self._child_time, 0.0),
+                           self.status == StatusCode.ERROR)
+        _export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The span in the shape of OpenTelemetry's JSON span export."""
+        return {
+            "name": self.name,
+            "context": {"trace_id": self.trace_id, "span_id": self.span_id},
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.start_time + self.duration,
+            "duration_ms": round(self.duration * 1000, 3),
+            "self_ms": round(max(self.duration - self._child_time, 0.0) * 1000, 3),
+            "status": {"status_code": self.status, "description": self.description},
+            "attributes": self.attributes,
+            "events": self.events,
+        }
+
+
+def _task_trace_id(task_id: str) -> str:
+    # Job ids are UUIDs, so the trace id can simply be the task id
+    try:
+        return uuid.UUID(task_id).hex
+    except ValueError:
+        return uuid.uuid5(uuid.NAMESPACE_OID, task_id).hex
+
+
+class Tracer:
+    """Starts spans; get one with ``get_tracer(__name__)``."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    @contextmanager
+    def start_as_current_span(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Span]:
+        """Time the body of the ``with`` block as a child of the current span.
+
+        Exceptions are recorded on the span, which is marked as failed, and re-raised.
+        """
+        task = _current_task.get()
+        if task is None and settings.TRACING_EXPORTER == "none":
+            # Nothing would see the span
+            yield _NOOP_SPAN
+            return
+
+        span = Span(name, _current_span.get(), task, attributes)
+        token = _current_span.set(span)
+        otel_cm = None
+        if settings.TRACING_EXPORTER == "otel" and otel_trace is not None:
+            otel_cm = otel_trace.get_tracer(self.name).start_as_current_span(name, attributes=span.attributes)
+            span._otel = otel_cm.__enter__()
+        error: Optional[BaseException] = None
+        try:
+            yield span
+        except BaseException as e:
+            error = e
+            span.set_status(StatusCode.ERROR, f"{type(e).__name__}: {e}")
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+            if otel_cm is not None:
+                otel_cm.__exit__(type(error) if error else None, error, error.__traceback__ if error else None)
+
+
+class _NoopSpan:
+    """Stands in for a span when tracing is off."""
+
+    def __getattr__(self, name: str) -> Callable[..., None]:
+        return lambda *args, **kwargs: None
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+_tracers: Dict[str, Tracer] = {}
+
+
+def get_tracer(name: str) -> Tracer:
+    """Return the tracer of a module."""
+    tracer = _tracers.get(name)
+    if tracer is None:
+        tracer = _tracers[name] = Tracer(name)
+    return tracer
+
+
+def get_current_span() -> Span:
+    """Return the current span (a no-op span outside of any)."""
+    return _current_span.get() or _NOOP_SPAN
+
+
+def traced(name: Optional[str] = None, **attributes: Any) -> Callable:
+    """Decorate a function or coroutine function to run in a span named ``name``."""
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__qualname__
+        tracer = get_tracer(fn.__module__)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.start_as_current_span(span_name, attributes):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(span_name, attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def task_context(task_id: str, name: str = "task", attributes: Optional[Dict[str, Any]] = None) -> Iterator[TaskTrace]:
+    """Run a job under a root span, tying every span started inside it to ``task_id``."""
+    trace = TaskTrace(task_id)
+    token = _current_task.set(trace)
+    # A job starts a new trace, even when run inside another span (e.g. eagerly from a request)
+    span_token = _current_span.set(None)
+    try:
+        with get_tracer(__name__).start_as_current_span(name, attributes):
+            yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_task.reset(token)
+        flush()
+
+
+# Exporters
+
+_export_lock = threading.Lock()
+_export_file = None
+
+
+def _export(span: Span) -> None:
+    exporter = settings.TRACING_EXPORTER
+    if exporter == "console":
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with _export_lock:
+            sys.stdout.write(line + "\n")
+    elif exporter == "file":
+        global _export_file
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with _export_lock:
+            if _export_file is None:
+                _export_file = open(settings.TRACING_FILE, "a", encoding="utf-8")
+            _export_file.write(line + "\n")
+
+
+def flush() -> None:
+    """Write buffered spans to the trace file."""
+    with _export_lock:
+        if _export_file is not None:
+            _export_file.flush()
+
+
+atexit.register(flush)
+
+
+class TracingMiddleware:
+    """ASGI middleware running every HTTP request in a span named after its route."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self.tracer = get_tracer(__name__)
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with self.tracer.start_as_current_span(f"HTTP {scope['method']}", {"http.method": scope["method"]}) as span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                span.update_name(f"HTTP {scope['method']} {route or 'unmatched'}")
+                span.set_attribute("http.route", route or "unmatched")
+                span.set_attribute("http.status_code", status_code)
+                task_id = (scope.get("path_params") or {}).get("task_id")
+                if task_id:
+                    span.set_attribute("task.id", task_id)
+                if status_code >= 500:
+                    span.set_status(StatusCode.ERROR)
+
+
+def report(path: str, task_id: Optional[str] = None) -> Dict[str, Any]:
+    """Summarize an exported trace file per task: the time breakdown by span name."""
+    traces: Dict[str, TaskTrace] = {}
+    walls: Dict[str, List[float]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            span = json.loads(line)
+            span_task = span["attributes"].get("task.id")
+            if not span_task or (task_id and span_task != task_id):
+                continue
+            # API requests about a task carry its id too, but are not part of its run
+            if span["context"]["trace_id"] != _task_trace_id(span_task):
+                continue
+            trace = traces.setdefault(span_task, TaskTrace(span_task))
+            trace.add(span["name"], span["duration_ms"] / 1000, span.get("self_ms", span["duration_ms"]) / 1000,
+                      span["status"]["status_code"] == StatusCode.ERROR)
+            start, end = walls.get(span_task, (span["start_time"], span["end_time"]))
+            walls[span_task] = [min(start, span["start_time"]), max(end, span["end_time"])]
+    summaries = {}
+    for span_task, trace in traces.items():
+        summary = trace.summary()
+        start, end = walls[span_task]
+        summary["wall_ms"] = round((end - start) * 1000, 1)
+        summaries[span_task] = summary
+    return summaries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time breakdown by stage of traced scrape jobs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report_parser = commands.add_parser("report", help="Summarize a trace file per task")
+    report_parser.add_argument("path", help="Trace file written with TRACING_EXPORTER=file")
+    report_parser.add_argument("--task-id", help="Only this task")
+    args = parser.parse_args()
+    print(json.dumps(report(args.path, args.task_id), indent=2))
+
+
+if __name__ == "__main__":
+    main()
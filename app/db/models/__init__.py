@@ -1,4 +1,9 @@
 from .car import CarBrand, CarModel, CarListing, CarListingHistory, CarStatus
+from .job import ScrapeJob, JobKind, JobStatus
+from .schedule import ScrapePartition
+from .raw import RawBlob, RawPayload
+from .dedupe import ListingSignature, ListingBand, ListingImageBand
+from .stats import MarketStats
 
 __all__ = [
     'CarBrand',
@@ -6,4 +11,14 @@ __all__ = [
     'CarListing',
     'CarListingHistory',
     'CarStatus',
+    'ScrapeJob',
+    'JobKind',
+    'JobStatus',
+    'ScrapePartition',
+    'RawBlob',
+    'RawPayload',
+    'ListingSignature',
+    'ListingBand',
+    'ListingImageBand',
+    'MarketStats',
 ]
@@ -1,7 +1,11 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum
+from sqlalchemy import (
+    BigInteger, Column, Integer, String, Float, DateTime, ForeignKey, ForeignKeyConstraint, Enum, Index,
+    PrimaryKeyConstraint, UniqueConstraint, event
+)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base_class import Base
+from app.db.partitioning import after_create_history, after_create_listings, partitioned, unpartitioned
 from enum import Enum as PyEnum
 from typing import Optional
 
@@ -37,9 +41,23 @@ class CarModel(Base):
 
 class CarListing(Base):
     __tablename__ = "car_listings"
+    __table_args__ = (
+        # Partitioned by status on PostgreSQL, where unique keys must include it
+        # (see app/db/partitioning.py)
+        PrimaryKeyConstraint("id").ddl_if(callable_=unpartitioned),
+        UniqueConstraint("id", "status", name="uq_car_listings_id_status").ddl_if(callable_=partitioned),
+        Index("ix_car_listings_yad2_id", "yad2_id", unique=True).ddl_if(callable_=unpartitioned),
+        Index("ix_car_listings_yad2_id_status", "yad2_id", "status", unique=True).ddl_if(callable_=partitioned),
+        # Lifecycle sweeps (app/services/lifecycle.py) and active-only reads
+        Index("ix_car_listings_status_last_scraped_at", "status", "last_scraped_at"),
+        Index("ix_car_listings_partition_status_last_scraped_at", "partition_id", "status", "last_scraped_at"),
+        # Market statistics segment rebuilds (app/services/market_stats.py)
+        Index("ix_car_listings_brand_model_year", "brand_id", "model_id", "year"),
+        {"postgresql_partition_by": "LIST (status)"},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    yad2_id = Column(String, unique=True, index=True, nullable=False)
+    yad2_id = Column(String, nullable=False)  # unique, see __table_args__
     title = Column(String, nullable=False)
     description = Column(String, nullable=True)
     price = Column(Float, nullable=False)
@@ -50,10 +68,16 @@ class CarListing(Base):
     body_type = Column(String, nullable=True)
     color = Column(String, nullable=True)
     image_url = Column(String, nullable=True)  # URL to the main car image
+    image_hash = Column(BigInteger, nullable=True, index=True)  # 64-bit dHash of the image, see app/services/images.py
+    image_hashed_at = Column(DateTime(timezone=True), nullable=True, index=True)  # NULL until image_url is fetched and hashed
+    image_fetch_failures = Column(Integer, nullable=False, default=0, server_default="0")  # failed downloads of image_url
+    image_retry_at = Column(DateTime(timezone=True), nullable=True)  # no new download attempt before this
     status = Column(Enum(CarStatus), default=CarStatus.ACTIVE)
     
     brand_id = Column(Integer, ForeignKey("car_brands.id"), nullable=False)
     model_id = Column(Integer, ForeignKey("car_models.id"), nullable=False)
+    partition_id = Column(Integer, ForeignKey("scrape_partitions.id"), nullable=True)  # last crawled by
+    cluster_id = Column(Integer, nullable=True, index=True)  # lowest listing id of its duplicates, see app/services/dedupe.py
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -66,12 +90,24 @@ class CarListing(Base):
 
 class CarListingHistory(Base):
     __tablename__ = "car_listing_history"
+    __table_args__ = (
+        # Partitioned by month on PostgreSQL, where the foreign key to the
+        # partitioned car_listings cannot be kept (see app/db/partitioning.py)
+        PrimaryKeyConstraint("id").ddl_if(callable_=unpartitioned),
+        UniqueConstraint("id", "created_at", name="uq_car_listing_history_id_created_at").ddl_if(callable_=partitioned),
+        ForeignKeyConstraint(["listing_id"], ["car_listings.id"]).ddl_if(callable_=unpartitioned),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    listing_id = Column(Integer, ForeignKey("car_listings.id"))
+    listing_id = Column(Integer, index=True)
     price = Column(Float)
     mileage = Column(Integer)
     status = Column(Enum(CarStatus))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     listing = relationship("CarListing", back_populates="history")
+
+
+event.listen(CarListing.__table__, "after_create", after_create_listings)
+event.listen(CarListingHistory.__table__, "after_create", after_create_history)
@@ -0,0 +1,51 @@
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKeyConstraint, Index, Integer, LargeBinary, String
+from sqlalchemy.sql import func
+from app.db.base_class import Base
+from app.db.partitioning import unpartitioned
+
+class ListingSignature(Base):
+    """The MinHash signature and blocking key of a listing, for duplicate detection.
+
+    Written by ``app.services.dedupe`` when a listing is stored or changes.
+    Listings without text or image have no signature and are never clustered.
+    """
+    __tablename__ = "listing_signatures"
+    __table_args__ = (
+        # car_listings.id alone is not unique on the partitioned PostgreSQL table
+        ForeignKeyConstraint(["listing_id"], ["car_listings.id"], ondelete="CASCADE").ddl_if(callable_=unpartitioned),
+    )
+
+    listing_id = Column(Integer, primary_key=True)
+    block_key = Column(String, nullable=False)  # brand_id:model_id:year
+    mileage_bucket = Column(Integer, nullable=True)
+    price_bucket = Column(Integer, nullable=False)
+    signature = Column(LargeBinary, nullable=False)  # DEDUPE_NUM_PERM uint32 minima
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ListingBand(Base):
+    """One LSH band of a listing's signature: listings sharing a band are duplicate candidates.
+
+    ``band_hash`` covers the block key, the band number and the band's values,
+    so a lookup only ever returns listings of the same brand, model and year.
+    """
+    __tablename__ = "listing_lsh_bands"
+    __table_args__ = (
+        Index("ix_listing_lsh_bands_listing_id", "listing_id"),
+    )
+
+    band_hash = Column(BigInteger, primary_key=True)
+    listing_id = Column(Integer, primary_key=True)
+
+class ListingImageBand(Base):
+    """One band of a listing's image hash: images within a few bits share at least one band.
+
+    Like ``ListingBand``, ``band_hash`` covers the block key, so only listings
+    of the same brand, model and year are candidates (see ``app.services.images``).
+    """
+    __tablename__ = "listing_image_bands"
+    __table_args__ = (
+        Index("ix_listing_image_bands_listing_id", "listing_id"),
+    )
+
+    band_hash = Column(BigInteger, primary_key=True)
+    listing_id = Column(Integer, primary_key=True)
@@ -0,0 +1,93 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, JSON
+from sqlalchemy.sql import func
+from app.db.base_class import Base
+from enum import Enum as PyEnum
+from datetime import datetime, timezone
+
+def _naive_utc(value: datetime) -> datetime:
+    # Job times are stored in UTC; drivers differ in returning them aware or naive
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+class JobKind(PyEnum):
+    SCRAPE = "scrape"
+    INGEST = "ingest"
+
+class JobStatus(PyEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class ScrapeJob(Base):
+    """A scrape or ingest job run by a Celery worker.
+
+    The row is the source of truth for the job state: the API creates it and
+    enqueues the task, the worker updates it, and status requests only read it.
+    """
+    __tablename__ = "scrape_jobs"
+
+    id = Column(String(36), primary_key=True)  # also used as the Celery task id
+    kind = Column(Enum(JobKind), nullable=False, index=True)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.PENDING, index=True)
+    params = Column(JSON, nullable=True)
+    parent_id = Column(String(36), ForeignKey("scrape_jobs.id"), nullable=True, index=True)
+    partition_id = Column(Integer, ForeignKey("scrape_partitions.id"), nullable=True, index=True)  # scheduled runs
+    worker = Column(String, nullable=True)
+
+    pages_fetched = Column(Integer, nullable=False, default=0)
+    listings_parsed = Column(Integer, nullable=False, default=0)
+    total_listings = Column(Integer, nullable=False, default=0)
+    new_listings = Column(Integer, nullable=False, default=0)
+    updated_listings = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    errors = Column(JSON, nullable=True)  # last few error messages
+    timings = Column(JSON, nullable=True)  # time per stage (app.core.tracing.TaskTrace.summary)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=True, index=True)  # set when the job finishes
+
+    @property
+    def is_complete(self) -> bool:
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED)
+
+    @property
+    def is_expired(self) -> bool:
+        return self.expires_at is not None and _naive_utc(self.expires_at) <= datetime.utcnow()
+
+    @property
+    def throughput(self) -> float:
+        """Parsed listings per second since the job started."""
+        if not self.started_at:
+            return 0.0
+        end = _naive_utc(self.finished_at) if self.finished_at else datetime.utcnow()
+        elapsed = (end - _naive_utc(self.started_at)).total_seconds()
+        return round((self.listings_parsed or 0) / elapsed, 2) if elapsed > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        """Convert the job to a dictionary for API responses."""
+        return {
+            "task_id": self.id,
+            "kind": self.kind.value,
+            "status": self.status.value,
+            "params": self.params or {},
+            "parent_id": self.parent_id,
+            "partition_id": self.partition_id,
+            "start_time": self.started_at.isoformat() if self.started_at else None,
+            "end_time": self.finished_at.isoformat() if self.finished_at else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+            "pages_fetched": self.pages_fetched,
+            "listings_parsed": self.listings_parsed,
+            "listings_per_second": self.throughput,
+            "total_listings": self.total_listings,
+            "new_listings": self.new_listings,
+            "updated_listings": self.updated_listings,
+            "listings_upserted": (self.new_listings or 0) + (self.updated_listings or 0),
+            "error_count": self.error_count,
+            "errors": self.errors or [],
+            "timings": self.timings,
+            "is_complete": self.is_complete,
+        }
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, LargeBinary
+from sqlalchemy.sql import func
+from app.db.base_class import Base
+
+class RawBlob(Base):
+    """A zstd-compressed raw payload, addressed by the SHA-256 of its JSON.
+
+    Identical payloads (a listing re-scraped unchanged, the same item on two
+    pages) are stored once. Written by ``app.services.raw_archive`` only.
+    """
+    __tablename__ = "raw_blobs"
+
+    digest = Column(String(64), primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)  # uncompressed JSON bytes
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class RawPayload(Base):
+    """The raw payload a listing had when it was scraped (append-only).
+
+    Keyed by ``yad2_id`` rather than ``car_listings.id``: payloads of listings
+    that failed normalization are archived too, so they can be re-normalized.
+    A row is only added when the payload differs from the listing's last one.
+    """
+    __tablename__ = "raw_payloads"
+    __table_args__ = (
+        Index("ix_raw_payloads_yad2_id_scraped_at", "yad2_id", "scraped_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    yad2_id = Column(String, nullable=False)
+    scraped_at = Column(DateTime(timezone=True), nullable=False)
+    digest = Column(String(64), ForeignKey("raw_blobs.digest"), nullable=False)
@@ -0,0 +1,48 @@
+from sqlalchemy import Boolean, Column, Integer, String, Float, DateTime, JSON
+from sqlalchemy.sql import func
+from app.db.base_class import Base
+
+class ScrapePartition(Base):
+    """A slice of the search space (e.g. one manufacturer) crawled on its own schedule.
+
+    ``lease_owner``/``lease_expires_at`` guarantee that at most one run of a
+    partition is in flight: the scheduler only dispatches a run after taking the
+    lease with a conditional UPDATE, and the run releases it when it finishes.
+    ``current_job_id`` is the job the lease was taken for; only it can release it.
+    """
+    __tablename__ = "scrape_partitions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, index=True, nullable=False)
+    params = Column(JSON, nullable=True)  # search parameters for Yad2Scraper
+    enabled = Column(Boolean, nullable=False, default=True)
+
+    interval_minutes = Column(Float, nullable=False)
+    change_rate = Column(Float, nullable=True)  # EWMA of the share of new/changed listings per run
+    next_run_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    last_run_at = Column(DateTime(timezone=True), nullable=True)
+    last_job_id = Column(String(36), nullable=True)
+    run_count = Column(Integer, nullable=False, default=0)
+    crawl_starts = Column(JSON, nullable=True)  # start times of the last complete crawls (lifecycle)
+
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    current_job_id = Column(String(36), nullable=True)  # job holding the lease
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def to_dict(self) -> dict:
+        """Convert the partition to a dictionary for API responses."""
+        return {
+            "key": self.key,
+            "params": self.params or {},
+            "enabled": self.enabled,
+            "interval_minutes": round(self.interval_minutes, 1),
+            "change_rate": round(self.change_rate, 3) if self.change_rate is not None else None,
+            "next_run_at": self.next_run_at.isoformat() if self.next_run_at else None,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_job_id": self.last_job_id,
+            "run_count": self.run_count,
+            "running": self.lease_owner is not None,
+        }
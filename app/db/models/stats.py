@@ -0,0 +1,37 @@
+from sqlalchemy import Column, DateTime, Float, Integer, LargeBinary, UniqueConstraint
+from sqlalchemy.sql import func
+from app.db.base_class import Base
+
+class MarketStats(Base):
+    """Running statistics of the ACTIVE listings of one segment: brand, model, year and scrape partition.
+
+    Kept up to date by ``app.services.market_stats`` in the ingest and lifecycle
+    transactions. The sums are exact; ``price_digest`` is a t-digest of the
+    prices, which can only grow, so ``removed`` counts the prices in it whose
+    listing has since changed or left the market, until the segment is rebuilt.
+    """
+    __tablename__ = "market_stats"
+    __table_args__ = (
+        UniqueConstraint("brand_id", "model_id", "year", "partition_id", name="uq_market_stats_segment"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    brand_id = Column(Integer, nullable=False)
+    model_id = Column(Integer, nullable=False)
+    year = Column(Integer, nullable=False)
+    partition_id = Column(Integer, nullable=False, default=0)  # 0 for listings of no scrape partition
+
+    listings = Column(Integer, nullable=False, default=0)
+    price_sum = Column(Float, nullable=False, default=0.0)
+    price_sq_sum = Column(Float, nullable=False, default=0.0)
+    # Over the listings with a mileage, for the price/mileage regression
+    mileage_listings = Column(Integer, nullable=False, default=0)
+    mileage_sum = Column(Float, nullable=False, default=0.0)
+    mileage_sq_sum = Column(Float, nullable=False, default=0.0)
+    mileage_price_sum = Column(Float, nullable=False, default=0.0)  # sum of their prices
+    mileage_price_product_sum = Column(Float, nullable=False, default=0.0)  # sum of price x mileage
+
+    removed = Column(Integer, nullable=False, default=0)
+    price_digest = Column(LargeBinary, nullable=True)
+    rebuilt_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,194 @@
+"""
+Declarative partitioning of the two large tables on PostgreSQL.
+
+- ``car_listings`` is LIST partitioned by ``status``: ``car_listings_active``
+  holds the ACTIVE listings the read endpoints ask for, ``car_listings_inactive``
+  the SOLD and ARCHIVED ones the lifecycle (``app.services.lifecycle``) moves
+  out of it, and ``car_listings_default`` anything else (NULL status). A status
+  UPDATE moves the row to its new partition, so an active-only query never
+  reads the inactive rows.
+- ``car_listing_history`` is RANGE partitioned by ``created_at``, one partition
+  per month (``car_listing_history_y2026m10``) plus ``car_listing_history_default``.
+  The maintenance task (``app.services.partitions``) creates the coming months
+  and detaches, or drops, the ones older than ``HISTORY_RETENTION_MONTHS``.
+
+PostgreSQL only allows unique constraints that include the partition key, so
+there the primary and unique keys become (id, status), (yad2_id, status) and
+(id, created_at), and the history loses its foreign key to ``car_listings``.
+The models declare both variants with ``ddl_if(callable_=partitioned)`` /
+``ddl_if(callable_=unpartitioned)``; SQLite (tests, benchmarks) keeps plain
+tables. The ORM identity is ``id`` either way.
+"""
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+
+PARTITIONED_DIALECTS = ("postgresql",)
+
+LISTINGS_TABLE = "car_listings"
+HISTORY_TABLE = "car_listing_history"
+
+# Partition suffix -> CarStatus names stored in it
+LISTING_STATUS_PARTITIONS = {
+    "active": ("ACTIVE",),
+    "inactive": ("SOLD", "ARCHIVED"),
+}
+
+_MONTH_SUFFIX = re.compile(r"_y(\d{4})m(\d{2})$")
+
+
+def partitioned(ddl, target, bind, dialect=None, **kw) -> bool:
+    """``ddl_if`` callable: emit the DDL only where the tables are partitioned."""
+    return dialect.name in PARTITIONED_DIALECTS
+
+
+def unpartitioned(ddl, target, bind, dialect=None, **kw) -> bool:
+    """``ddl_if`` callable: emit the DDL only where the tables are plain."""
+    return dialect.name not in PARTITIONED_DIALECTS
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def history_partition_name(month: date) -> str:
+    return f"{HISTORY_TABLE}_y{month.year}m{month.month:02d}"
+
+
+def history_partition_month(name: str) -> Optional[date]:
+    """The month a history partition covers, from its name (None for the default partition)."""
+    match = _MONTH_SUFFIX.search(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def list_partitions(conn: Connection, parent: str) -> List[str]:
+    """Names of the partitions currently attached to ``parent``."""
+    query = text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "WHERE parent.relname = :parent ORDER BY child.relname"
+    )
+    return list(conn.execute(query, {"parent": parent}).scalars())
+
+
+def create_listing_partitions(conn: Connection) -> None:
+    """Create the status partitions of ``car_listings`` that do not exist yet."""
+    for suffix, statuses in LISTING_STATUS_PARTITIONS.items():
+        values = ", ".join(f"'{status}'" for status in statuses)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {LISTINGS_TABLE}_{suffix} "
+            f"PARTITION OF {LISTINGS_TABLE} FOR VALUES IN ({values})"
+        ))
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {LISTINGS_TABLE}_default PARTITION OF {LISTINGS_TABLE} DEFAULT"))
+
+
+def create_history_partition(conn: Connection, month: date, existing: Optional[List[str]] = None) -> bool:
+    """Create the history partition of ``month`` unless it exists.
+
+    Rows of that month already in the default partition (written while the
+    partition was missing) are moved into it.
+
+    Returns:
+        bool: Whether the partition was created
+    """
+    existing = list_partitions(conn, HISTORY_TABLE) if existing is None else existing
+    name = history_partition_name(month)
+    if name in existing:
+        return False
+
+    start, end = month, add_months(month, 1)
+    create = text(
+        f"CREATE TABLE {name} PARTITION OF {HISTORY_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat()} 00:00:00+00') TO ('{end.isoformat()} 00:00:00+00')"
+    )
+    default = f"{HISTORY_TABLE}_default"
+    bounds = {
+        "start": datetime(start.year, start.month, 1, tzinfo=timezone.utc),
+        "end": datetime(end.year, end.month, 1, tzinfo=timezone.utc),
+    }
+    stray = default in existing and conn.execute(text(
+        f"SELECT 1 FROM {default} WHERE created_at >= :start AND created_at < :end LIMIT 1"
+    ), bounds).first()
+    if not stray:
+        conn.execute(create)
+        return True
+
+    # A new partition may not overlap rows of the default one: take the default
+    # out, create the month, move its rows through the parent and put it back
+    conn.execute(text(f"ALTER TABLE {HISTORY_TABLE} DETACH PARTITION {default}"))
+    conn.execute(create)
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE created_at >= :start AND created_at < :end RETURNING *) "
+        f"INSERT INTO {HISTORY_TABLE} SELECT * FROM moved"
+    ), bounds)
+    conn.execute(text(f"ALTER TABLE {HISTORY_TABLE} ATTACH PARTITION {default} DEFAULT"))
+    return True
+
+
+def ensure_history_partitions(conn: Connection, today: Optional[date] = None,
+                              months_ahead: Optional[int] = None) -> List[str]:
+    """Create the default partition and those of this month and the next ``months_ahead``.
+
+    Returns:
+        List of the partitions created
+    """
+    today = today or datetime.utcnow().date()
+    months_ahead = settings.HISTORY_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {HISTORY_TABLE}_default PARTITION OF {HISTORY_TABLE} DEFAULT"))
+    existing = list_partitions(conn, HISTORY_TABLE)
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(month_start(today), offset)
+        if create_history_partition(conn, month, existing):
+            created.append(history_partition_name(month))
+    return created
+
+
+def expire_history_partitions(conn: Connection, today: Optional[date] = None,
+                              retention_months: Optional[int] = None,
+                              drop: Optional[bool] = None) -> List[str]:
+    """Detach the history partitions of months past the retention, and drop them if asked to.
+
+    A detached partition is an ordinary table that queries on the history no
+    longer scan; it can be dumped and dropped by hand.
+
+    Returns:
+        List of the partitions detached (or dropped)
+    """
+    today = today or datetime.utcnow().date()
+    retention_months = settings.HISTORY_RETENTION_MONTHS if retention_months is None else retention_months
+    drop = settings.HISTORY_DROP_EXPIRED if drop is None else drop
+    oldest_kept = add_months(month_start(today), -retention_months)
+    expired = []
+    for name in list_partitions(conn, HISTORY_TABLE):
+        month = history_partition_month(name)
+        if month is None or month >= oldest_kept:
+            continue
+        conn.execute(text(f"ALTER TABLE {HISTORY_TABLE} DETACH PARTITION {name}"))
+        if drop:
+            conn.execute(text(f"DROP TABLE {name}"))
+        expired.append(name)
+    return expired
+
+
+def after_create_listings(target, connection: Connection, **kw) -> None:
+    """``after_create`` hook of ``car_listings``: add its partitions when ``create_all`` made it partitioned."""
+    if connection.dialect.name in PARTITIONED_DIALECTS:
+        create_listing_partitions(connection)
+
+
+def after_create_history(target, connection: Connection, **kw) -> None:
+    """``after_create`` hook of ``car_listing_history``: add its default and first monthly partitions."""
+    if connection.dialect.name in PARTITIONED_DIALECTS:
+        ensure_history_partitions(connection)
@@ -1,10 +1,12 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.profiling import instrument_engine
 from app.db.models.car import Base
 
 # Create engine
 engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
+instrument_engine(engine)
 
 # Create tables if they don't exist
 Base.metadata.create_all(bind=engine)
@@ -1,6 +1,10 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.executor import get_executor
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.core.profiling import SQLProfilingMiddleware
+from app.core.tracing import TracingMiddleware
 from app.api.api_v1.api import router as api_router
 from app.db.session import engine
 from app.db.models.car import Base
@@ -25,6 +29,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency per route
+app.add_middleware(MetricsMiddleware)
+
+# SQL statements per request, slow-request log and Server-Timing (DEBUG)
+app.add_middleware(SQLProfilingMiddleware)
+
+# A span per request (TRACING_EXPORTER); outermost, so it covers the other middleware
+app.add_middleware(TracingMiddleware)
+
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
 
@@ -36,5 +49,11 @@ async def startup_event():
 
 @app.get("/api/health")
 async def health_check():
-    """Health check endpoint."""
-    return {"status": "ok"}
+    """Health check endpoint, with the saturation of this process's CPU executor."""
+    return {"status": "ok", "executor": get_executor().stats()}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics endpoint."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
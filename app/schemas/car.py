@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 
 class CarBrandBase(BaseModel):
@@ -53,6 +53,7 @@ class CarListing(CarListingBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    duplicates: Optional[int] = None  # ads of the same car, when listed with collapse_duplicates
     brand: CarBrand
     model: CarModel
 
@@ -65,3 +66,18 @@ class CarListing(CarListingBase):
             if hasattr(obj, 'created_at') and (not hasattr(obj, 'updated_at') or obj.updated_at is None):
                 obj.updated_at = obj.created_at
             return super().model_validate(obj, strict=strict, from_attributes=from_attributes, context=context)
+
+class MarketStats(BaseModel):
+    """Price statistics of the ACTIVE listings of a brand, model or model year."""
+    brand: str
+    model: Optional[str] = None  # None when grouped by brand
+    year: Optional[int] = None  # None when grouped by brand or model
+    partitions: int  # market_stats rows merged
+    listings: int
+    mean_price: float
+    price_stddev: float
+    quantiles: Dict[str, float]  # "p50": median price, ...
+    mean_mileage: Optional[float] = None
+    price_per_10k_km: Optional[float] = None  # price drop per 10,000 km in the segment
+    reference_mileage: Optional[int] = None  # mileage of a typical car of the year
+    mileage_adjusted_price: Optional[float] = None  # median price at the reference mileage
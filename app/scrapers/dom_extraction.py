@@ -0,0 +1,205 @@
+"""
+Single round-trip extraction of listing cards from a rendered result page.
+
+Instead of walking every card with awaited ``query_selector``/``text_content``
+calls (one CDP round trip each), ``EXTRACT_CARDS_JS`` runs once per page inside
+the browser and returns the raw text of every card as one JSON array. The raw
+cards are then turned into listing dictionaries by ``parse_cards``, which is
+plain Python and does not need the browser.
+"""
+import logging
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urljoin
+
+from app.scrapers.listing_record import ListingRecord
+from app.services.brand_matcher import split_title
+
+logger = logging.getLogger(__name__)
+
+# Receives the selector set from the CARD_SELECTORS setting and returns one
+# plain object per card. Keep it free of page-specific logic: everything that
+# can be done in Python is done in parse_card.
+EXTRACT_CARDS_JS = """(selectors) => {
+    const clean = (value) => (value || '').replace(/\\s+/g, ' ').trim();
+    const first = (root, selector) => {
+        if (!selector) return null;
+        try {
+            return root.matches(selector) ? root : root.querySelector(selector);
+        } catch (e) {
+            return null;
+        }
+    };
+    const text = (root, selector) => {
+        const el = first(root, selector);
+        return el ? clean(el.textContent) : '';
+    };
+    const all = (root, selector) => {
+        if (!selector) return [];
+        try {
+            return Array.from(root.querySelectorAll(selector));
+        } catch (e) {
+            return [];
+        }
+    };
+
+    return all(document, selectors.card).map((card) => {
+        const link = first(card, selectors.link);
+        const image = first(card, selectors.image);
+        const details = {};
+        all(card, selectors.detail).forEach((detail) => {
+            const label = text(detail, selectors.detail_label);
+            const value = text(detail, selectors.detail_value);
+            if (label && value) details[label.toLowerCase()] = value;
+        });
+        return {
+            id: card.getAttribute('data-testid') || '',
+            href: link ? (link.getAttribute('href') || '') : '',
+            title: text(card, selectors.title),
+            subtitle: text(card, selectors.subtitle),
+            price: text(card, selectors.price),
+            info: text(card, selectors.info),
+            location: text(card, selectors.location),
+            image: image ? (image.getAttribute('src') || image.getAttribute('data-src') || '') : '',
+            tags: all(card, selectors.tags).map((tag) => clean(tag.textContent)).filter(Boolean),
+            details: details,
+        };
+    });
+}"""
+
+_ITEM_ID_RE = re.compile(r'item/([^/?#]+)')
+_NON_DIGIT_RE = re.compile(r'[^\d]')
+_YEAR_RE = re.compile(r'\b(?:19|20)\d{2}\b')
+_MILEAGE_RE = re.compile(r'([\d,]+)\s*ק"מ')
+_HAND_RE = re.compile(r'יד\s*(\d+)')
+
+_FUEL_KEYWORDS = ('דיזל', 'בנזין', 'היברידי', 'חשמלי')
+_TRANSMISSION_KEYWORDS = ('אוטומט', 'ידני')
+
+# Detail labels (lower-cased) mapped to listing fields, same vocabulary as the element parser
+_DETAIL_FIELDS = (
+    (('year', 'שנה', 'שנתון'), 'year'),
+    (('mileage', 'ק"מ', 'קילומטראז', 'kilometers'), 'mileage'),
+    (('location', 'מיקום', 'עיר', 'area', 'אזור'), 'location'),
+    (('fuel', 'דלק', 'סוג דלק'), 'fuel_type'),
+    (('transmission', 'gear', 'תיבת הילוכים', 'גיר'), 'transmission'),
+    (('color', 'צבע', 'צבע רכב'), 'color'),
+    (('body', 'סוג רכב'), 'body_type'),
+)
+
+
+def _to_int(text: str) -> Optional[int]:
+    """Keep only the digits of ``text`` and convert them to an int."""
+    digits = _NON_DIGIT_RE.sub('', text or '')
+    return int(digits) if digits else None
+
+
+def parse_card(raw: Dict[str, Any], base_url: str) -> Optional[ListingRecord]:
+    """Convert one raw card returned by ``EXTRACT_CARDS_JS`` into a listing.
+
+    Args:
+        raw: Raw card data (strings only) as returned by the browser
+        base_url: Base URL used to make relative links absolute
+
+    Returns:
+        Optional[ListingRecord]: The listing, or None if the card has no link to an item
+    """
+    href = raw.get('href') or ''
+    if not href:
+        return None
+    url = href if href.startswith('http') else urljoin(base_url + '/', href)
+
+    match = _ITEM_ID_RE.search(url)
+    source_id = match.group(1) if match else (raw.get('id') or url.split('?')[0].rstrip('/').split('/')[-1])
+
+    title = raw.get('title') or ''
+    subtitle = raw.get('subtitle') or ''
+    info = raw.get('info') or ''
+
+    listing: Dict[str, Any] = {
+        'source': 'yad2',
+        'source_id': source_id,
+        'yad2_id': source_id,
+        'url': url,
+        'title': f"{title} {subtitle}".strip(),
+        'price': _to_int(raw.get('price') or '') or 0,
+        'year': None,
+        'mileage': None,
+        'hand': None,
+        'location': raw.get('location') or '',
+        'image_url': None,
+        'fuel_type': '',
+        'transmission': '',
+        'body_type': '',
+        'color': '',
+        'brand': '',
+        'model': '',
+        'features': list(raw.get('tags') or []),
+        'scraped_at': datetime.utcnow().isoformat(),
+        'raw_data': dict(raw.get('details') or {}),
+    }
+
+    # Title heading is "<brand> <model>"; the subtitle carries the trim.
+    # Brands can span several words ("לנד רובר"), so split on the catalog.
+    listing['brand'], listing['model'] = split_title(title)
+
+    year_match = _YEAR_RE.search(info) or _YEAR_RE.search(title)
+    if year_match:
+        listing['year'] = int(year_match.group(0))
+    mileage_match = _MILEAGE_RE.search(info)
+    if mileage_match:
+        listing['mileage'] = int(mileage_match.group(1).replace(',', ''))
+    hand_match = _HAND_RE.search(info)
+    if hand_match:
+        listing['hand'] = int(hand_match.group(1))
+
+    for text in [info, *listing['features']]:
+        if not listing['fuel_type'] and any(k in text for k in _FUEL_KEYWORDS):
+            listing['fuel_type'] = text
+        elif not listing['transmission'] and any(k in text for k in _TRANSMISSION_KEYWORDS):
+            listing['transmission'] = text
+
+    for label, value in listing['raw_data'].items():
+        for keywords, field in _DETAIL_FIELDS:
+            if not any(k in label for k in keywords):
+                continue
+            if field == 'year':
+                year_match = _YEAR_RE.search(value)
+                if year_match:
+                    listing['year'] = int(year_match.group(0))
+            elif field == 'mileage':
+                listing['mileage'] = _to_int(value)
+            else:
+                listing[field] = value
+            break
+
+    image = raw.get('image') or ''
+    if image and not image.startswith('data:'):
+        listing['image_url'] = image if image.startswith('http') else urljoin(base_url, image)
+
+    return ListingRecord.from_dict(listing)
+
+
+def parse_cards(raw_cards: Iterable[Dict[str, Any]], base_url: str) -> List[ListingRecord]:
+    """Convert raw cards into listings, dropping cards without a link and duplicates.
+
+    Args:
+        raw_cards: Raw cards as returned by ``EXTRACT_CARDS_JS``
+        base_url: Base URL used to make relative links absolute
+
+    Returns:
+        List of listings in page order
+    """
+    listings = []
+    seen = set()
+    for raw in raw_cards or []:
+        try:
+            listing = parse_card(raw, base_url)
+        except Exception as e:
+            logger.warning(f"Error parsing card: {str(e)}")
+            continue
+        if listing and listing['url'] not in seen:
+            seen.add(listing['url'])
+            listings.append(listing)
+    return listings
@@ -0,0 +1,310 @@
+"""
+Pluggable HTML parsing for server-rendered Yad2 result pages.
+
+The HTTP scrapers only need to pull a handful of fields out of every listing
+card, so the parser is hidden behind a small backend interface and the fastest
+available library is used:
+
+- ``selectolax`` (lexbor engine, fastest, selectors are matched in C)
+- ``lxml`` with ``cssselect`` (selectors are compiled to XPath once and cached)
+- ``bs4`` with the stdlib ``html.parser`` (always available, slowest)
+
+``iter_raw_cards`` produces the same raw card dictionaries as
+``dom_extraction.EXTRACT_CARDS_JS`` does in the browser, so both paths share
+``dom_extraction.parse_card`` and the ``CARD_SELECTORS`` setting.
+"""
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.config.scraping import settings as scraping_settings
+from app.scrapers.dom_extraction import parse_card
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _clean(value: Optional[str]) -> str:
+    """Collapse whitespace the same way the in-browser extractor does."""
+    return _WHITESPACE_RE.sub(' ', value or '').strip()
+
+
+class ParserBackend:
+    """Minimal interface the card extractor needs from an HTML library."""
+
+    name = 'base'
+
+    def parse(self, html: str) -> Any:
+        """Parse a document and return its root node."""
+        raise NotImplementedError
+
+    def select(self, node: Any, selector: str) -> List[Any]:
+        """Return all descendants of ``node`` matching ``selector`` in document order."""
+        raise NotImplementedError
+
+    def select_one(self, node: Any, selector: str) -> Optional[Any]:
+        """Return the first descendant of ``node`` matching ``selector``."""
+        matches = self.select(node, selector)
+        return matches[0] if matches else None
+
+    def text(self, node: Any) -> str:
+        """Return the text content of ``node``."""
+        raise NotImplementedError
+
+    def attr(self, node: Any, name: str) -> Optional[str]:
+        """Return an attribute of ``node``."""
+        raise NotImplementedError
+
+
+class SelectolaxBackend(ParserBackend):
+    """selectolax on the lexbor engine."""
+
+    name = 'selectolax'
+
+    def __init__(self) -> None:
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser_class = LexborHTMLParser
+
+    def parse(self, html: str) -> Any:
+        return self._parser_class(html)
+
+    def select(self, node: Any, selector: str) -> List[Any]:
+        return node.css(selector)
+
+    def select_one(self, node: Any, selector: str) -> Optional[Any]:
+        return node.css_first(selector)
+
+    def text(self, node: Any) -> str:
+        return node.text(deep=True, separator='')
+
+    def attr(self, node: Any, name: str) -> Optional[str]:
+        return node.attributes.get(name)
+
+
+@lru_cache(maxsize=128)
+def _compile_lxml_selector(selector: str) -> Any:
+    """Compile a CSS selector to an lxml XPath evaluator once per process."""
+    from lxml.cssselect import CSSSelector
+    return CSSSelector(selector)
+
+
+class LxmlBackend(ParserBackend):
+    """lxml with compiled cssselect selectors."""
+
+    name = 'lxml'
+
+    def __init__(self) -> None:
+        import lxml.html
+        # cssselect is an optional lxml dependency; fail here rather than on the first select
+        import cssselect  # noqa: F401
+        self._fromstring = lxml.html.document_fromstring
+
+    def parse(self, html: str) -> Any:
+        return self._fromstring(html)
+
+    def select(self, node: Any, selector: str) -> List[Any]:
+        return _compile_lxml_selector(selector)(node)
+
+    def text(self, node: Any) -> str:
+        return node.text_content()
+
+    def attr(self, node: Any, name: str) -> Optional[str]:
+        return node.get(name)
+
+
+@lru_cache(maxsize=128)
+def _compile_soup_selector(selector: str) -> Any:
+    """Compile a CSS selector with soupsieve once per process."""
+    import soupsieve
+    return soupsieve.compile(selector)
+
+
+class SoupBackend(ParserBackend):
+    """BeautifulSoup with the stdlib parser, used when nothing faster is installed."""
+
+    name = 'bs4'
+
+    def __init__(self) -> None:
+        from bs4 import BeautifulSoup
+        self._soup_class = BeautifulSoup
+
+    def parse(self, html: str) -> Any:
+        return self._soup_class(html, 'html.parser')
+
+    def select(self, node: Any, selector: str) -> List[Any]:
+        return list(_compile_soup_selector(selector).select(node))
+
+    def select_one(self, node: Any, selector: str) -> Optional[Any]:
+        return _compile_soup_selector(selector).select_one(node)
+
+    def text(self, node: Any) -> str:
+        return node.get_text()
+
+    def attr(self, node: Any, name: str) -> Optional[str]:
+        value = node.get(name)
+        # bs4 returns multi-valued attributes (class) as lists
+        return ' '.join(value) if isinstance(value, list) else value
+
+
+BACKENDS = {
+    SelectolaxBackend.name: SelectolaxBackend,
+    LxmlBackend.name: LxmlBackend,
+    SoupBackend.name: SoupBackend,
+}
+
+# Order in which "auto" tries the backends
+_PREFERRED_BACKENDS = (SelectolaxBackend.name, LxmlBackend.name, SoupBackend.name)
+
+_backend_cache: Dict[str, ParserBackend] = {}
+
+
+def get_backend(name: Optional[str] = None) -> ParserBackend:
+    """Return a parser backend instance.
+
+    Args:
+        name: Backend name ("selectolax", "lxml", "bs4" or "auto"); defaults to
+            the HTML_PARSER_BACKEND setting
+
+    Returns:
+        ParserBackend: The requested backend, or the fastest installed one for "auto"
+
+    Raises:
+        ValueError: If the backend name is unknown
+        ImportError: If the requested backend (or, for "auto", every backend) is not installed
+    """
+    name = (name or scraping_settings.HTML_PARSER_BACKEND).lower()
+    if name in _backend_cache:
+        return _backend_cache[name]
+
+    if name == 'auto':
+        for candidate in _PREFERRED_BACKENDS:
+            try:
+                backend = get_backend(candidate)
+            except ImportError:
+                logger.debug(f"HTML parser backend {candidate} is not installed")
+                continue
+            _backend_cache[name] = backend
+            logger.info(f"Using HTML parser backend: {backend.name}")
+            return backend
+        raise ImportError("No HTML parser backend is installed (install selectolax, lxml or beautifulsoup4)")
+
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HTML parser backend: {name}")
+    backend = BACKENDS[name]()
+    _backend_cache[name] = backend
+    return backend
+
+
+def available_backends() -> List[str]:
+    """Return the names of the backends that can be imported here."""
+    names = []
+    for name in _PREFERRED_BACKENDS:
+        try:
+            get_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def iter_raw_cards(
+    html: str,
+    selectors: Optional[Dict[str, str]] = None,
+    backend: Optional[ParserBackend] = None
+) -> Iterator[Dict[str, Any]]:
+    """Parse a page once and yield its listing cards one by one.
+
+    Cards are extracted lazily, so a caller that stops after ``limit`` cards
+    does not pay for the rest of the page.
+
+    Args:
+        html: Raw page HTML
+        selectors: Selector set, defaults to the CARD_SELECTORS setting
+        backend: Parser backend, defaults to ``get_backend()``
+
+    Yields:
+        Raw card dictionaries in the ``EXTRACT_CARDS_JS`` format
+    """
+    selectors = selectors or scraping_settings.CARD_SELECTORS
+    backend = backend or get_backend()
+    document = backend.parse(html)
+
+    def text(root: Any, selector: Optional[str]) -> str:
+        element = backend.select_one(root, selector) if selector else None
+        return _clean(backend.text(element)) if element is not None else ''
+
+    for card in backend.select(document, selectors['card']):
+        link = backend.select_one(card, selectors['link'])
+        image = backend.select_one(card, selectors['image'])
+
+        details = {}
+        if selectors.get('detail'):
+            for detail in backend.select(card, selectors['detail']):
+                label = text(detail, selectors.get('detail_label'))
+                value = text(detail, selectors.get('detail_value'))
+                if label and value:
+                    details[label.lower()] = value
+
+        tags = []
+        if selectors.get('tags'):
+            tags = [t for t in (_clean(backend.text(tag)) for tag in backend.select(card, selectors['tags'])) if t]
+
+        yield {
+            'id': backend.attr(card, 'data-testid') or '',
+            'href': (backend.attr(link, 'href') or '') if link is not None else '',
+            'title': text(card, selectors.get('title')),
+            'subtitle': text(card, selectors.get('subtitle')),
+            'price': text(card, selectors.get('price')),
+            'info': text(card, selectors.get('info')),
+            'location': text(card, selectors.get('location')),
+            'image': (backend.attr(image, 'src') or backend.attr(image, 'data-src') or '') if image is not None else '',
+            'tags': tags,
+            'details': details,
+        }
+
+
+def parse_listing_cards(
+    html: str,
+    base_url: str,
+    limit: Optional[int] = None,
+    selectors: Optional[Dict[str, str]] = None,
+    backend: Optional[ParserBackend] = None
+) -> List[Dict[str, Any]]:
+    """Extract listings from a server-rendered result page.
+
+    Args:
+        html: Raw page HTML
+        base_url: Base URL used to make relative links absolute
+        limit: Stop after this many listings
+        selectors: Selector set, defaults to the CARD_SELECTORS setting
+        backend: Parser backend, defaults to ``get_backend()``
+
+    Returns:
+        List of ``ListingRecord`` listings (see ``dom_extraction.parse_card``) in page order
+    """
+    listings = []
+    seen = set()
+    for raw in iter_raw_cards(html, selectors=selectors, backend=backend):
+        try:
+            listing = parse_card(raw, base_url)
+        except Exception as e:
+            logger.warning(f"Error parsing card: {str(e)}")
+            continue
+        if not listing or listing['url'] in seen:
+            continue
+        seen.add(listing['url'])
+        listings.append(listing)
+        if limit is not None and len(listings) >= limit:
+            break
+    return listings
+
+
+def parse_page(html: str, base_url: str, limit: Optional[int] = None,
+               backend_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """``parse_listing_cards`` by backend name, for the CPU executor.
+
+    Backend objects stay in the worker process; only the name is sent.
+    """
+    return parse_listing_cards(html, base_url, limit=limit, backend=get_backend(backend_name))
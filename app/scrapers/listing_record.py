@@ -0,0 +1,147 @@
+"""
+Compact in-flight representation of a scraped listing.
+
+Scrapers used to hand every listing down the pipeline as a dict of about 20
+keys plus a ``raw_data`` copy of the card details or of the whole API item.
+A dict pays for its hash table on every listing, and the raw payload is often
+bigger than everything else together; a large crawl kept gigabytes of them
+alive in the pipeline queues.
+
+``ListingRecord`` stores the same fields in ``__slots__``. The categorical
+ones (brand, model, fuel type, gear, color, body type, location) are
+interned, so every listing of a Toyota Corolla shares one copy of the two
+strings. The raw payload is only kept when ``SCRAPING_KEEP_RAW_DATA`` is set,
+and then already encoded for the raw archive (zstd-compressed JSON, see
+``app.services.raw_archive``); it is decoded when ``raw_data`` is read.
+
+Records answer ``get``, ``[]``, ``in``, ``keys`` and ``items`` like the dicts
+they replace, so the pipeline, ``normalize_batch`` and the job payloads do
+not need to know the difference. ``to_dict`` converts one back for JSON.
+"""
+import sys
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from app.config.scraping import settings as scraping_settings
+from app.services.raw_archive import decode_raw, encode_raw
+
+FIELDS = (
+    "source", "source_id", "yad2_id", "url", "title", "price", "year", "mileage", "hand",
+    "location", "description", "fuel_type", "transmission", "body_type", "color",
+    "brand", "model", "engine_size", "image_url", "features", "scraped_at",
+)
+CATEGORICAL_FIELDS = ("source", "location", "fuel_type", "transmission", "body_type", "color", "brand", "model")
+
+# Keys of other scraper formats that map onto a field
+_FIELD_ALIASES = {"kilometers": "mileage", "gear": "transmission", "date_updated": "scraped_at"}
+
+_FIELD_SET = frozenset(FIELDS)
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+class ListingRecord:
+    """A scraped listing with slotted fields (see the module docstring)."""
+
+    __slots__ = FIELDS + ("_raw",)
+
+    def __init__(self, raw_data: Any = None, keep_raw: Optional[bool] = None, **fields: Any) -> None:
+        """Create a record from listing fields.
+
+        Args:
+            raw_data: Raw card details or API item; kept (compressed) only if ``keep_raw``
+            keep_raw: Keep ``raw_data`` (default: the SCRAPING_KEEP_RAW_DATA setting)
+            **fields: Listing fields; unknown keys are dropped
+        """
+        for name in FIELDS:
+            value = fields.get(name)
+            setattr(self, name, _intern(value) if name in CATEGORICAL_FIELDS else value)
+        for alias, name in _FIELD_ALIASES.items():
+            if getattr(self, name) is None and fields.get(alias) is not None:
+                setattr(self, name, _intern(fields[alias]) if name in CATEGORICAL_FIELDS else fields[alias])
+        if self.features is not None:
+            self.features = tuple(_intern(feature) for feature in self.features)
+        if keep_raw is None:
+            keep_raw = scraping_settings.KEEP_RAW_DATA
+        self._raw = encode_raw(raw_data) if keep_raw and raw_data else None
+
+    @classmethod
+    def from_dict(cls, listing: Dict[str, Any], keep_raw: Optional[bool] = None) -> "ListingRecord":
+        """Convert a scraper listing dict; records are returned as they are."""
+        if isinstance(listing, cls):
+            return listing
+        return cls(keep_raw=keep_raw, **listing)
+
+    @property
+    def raw_data(self) -> Dict[str, Any]:
+        """The raw payload, decompressed; empty when it was not kept."""
+        return decode_raw(self._raw) if self._raw else {}
+
+    @property
+    def raw_blob(self) -> Optional[bytes]:
+        """The kept raw payload as encoded for the archive, or None."""
+        return self._raw
+
+    @property
+    def raw_size(self) -> int:
+        """Compressed size of the kept raw payload, in bytes."""
+        return len(self._raw) if self._raw else 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _FIELD_SET:
+            value = getattr(self, key)
+            return default if value is None else value
+        if key == "raw_data":
+            return self.raw_data if self._raw else default
+        if key in _FIELD_ALIASES:
+            return self.get(_FIELD_ALIASES[key], default)
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _FIELD_SET:
+            return getattr(self, key)
+        if key == "raw_data":
+            return self.raw_data
+        if key in _FIELD_ALIASES:
+            return getattr(self, _FIELD_ALIASES[key])
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        key = _FIELD_ALIASES.get(key, key)
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        setattr(self, key, _intern(value) if key in CATEGORICAL_FIELDS else value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in _FIELD_SET or (key == "raw_data" and self._raw is not None)
+
+    def keys(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return ((name, getattr(self, name)) for name in FIELDS)
+
+    def to_dict(self, include_raw: bool = False) -> Dict[str, Any]:
+        """Return the listing as a plain dict, e.g. for a JSON payload."""
+        listing = dict(self.items())
+        if listing["features"] is not None:
+            listing["features"] = list(listing["features"])
+        if include_raw:
+            listing["raw_data"] = self.raw_data
+        return listing
+
+    def __getstate__(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state: Tuple[Any, ...]) -> None:
+        # Interning does not survive pickling (records come back from the CPU executor)
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, _intern(value) if name in CATEGORICAL_FIELDS else value)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, ListingRecord) and self.__getstate__() == other.__getstate__()
+
+    def __repr__(self) -> str:
+        return f"ListingRecord(yad2_id={self.yad2_id!r}, title={self.title!r}, price={self.price!r})"
+
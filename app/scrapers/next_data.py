@@ -0,0 +1,208 @@
+"""
+Helpers for the feed embedded in Yad2 result pages as ``window.__NEXT_DATA__``.
+
+The server-rendered HTML already contains the full feed as JSON, so a plain
+HTTP GET plus a string scan is enough to get every listing on a page without a
+browser or an HTML tree.
+"""
+import json
+import logging
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import urljoin
+
+from app.scrapers.listing_record import ListingRecord
+
+logger = logging.getLogger(__name__)
+
+_SCRIPT_MARKER = 'id="__NEXT_DATA__"'
+_SCRIPT_END = '</script>'
+_DIGITS_RE = re.compile(r'[^0-9]')
+
+BASE_URL = "https://www.yad2.co.il"
+
+# Sections of the dehydrated "feed" query that hold listings, in display order
+FEED_SECTIONS = ('platinum', 'boost', 'solo', 'commercial', 'private')
+
+
+def extract_next_data(html: str) -> Optional[Dict[str, Any]]:
+    """Pull the ``__NEXT_DATA__`` JSON out of a page without parsing the HTML.
+
+    Args:
+        html: Raw page HTML
+
+    Returns:
+        Optional[Dict]: The decoded JSON, or None if the script is missing or invalid
+    """
+    marker = html.find(_SCRIPT_MARKER)
+    if marker == -1:
+        return None
+    start = html.find('>', marker)
+    end = html.find(_SCRIPT_END, start)
+    if start == -1 or end == -1:
+        return None
+    try:
+        return json.loads(html[start + 1:end])
+    except ValueError as e:
+        logger.warning(f"Invalid __NEXT_DATA__ JSON: {str(e)}")
+        return None
+
+
+def _feed_query_data(next_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the data of the dehydrated ``feed`` query, if present."""
+    page_props = (next_data.get('props') or {}).get('pageProps') or {}
+    queries = (page_props.get('dehydratedState') or {}).get('queries') or []
+    for query in queries:
+        key = query.get('queryKey') or []
+        if key and key[0] == 'feed':
+            data = (query.get('state') or {}).get('data')
+            if isinstance(data, dict):
+                return data
+    return None
+
+
+def has_feed(next_data: Dict[str, Any]) -> bool:
+    """Check whether the page carries a feed at all (as opposed to an error or captcha page)."""
+    page_props = (next_data.get('props') or {}).get('pageProps') or {}
+    legacy_feed = ((page_props.get('initialState') or {}).get('feed') or {}).get('feed')
+    return isinstance(legacy_feed, list) or _feed_query_data(next_data) is not None
+
+
+def iter_feed_items(next_data: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yield the raw listing items of a page's feed.
+
+    Supports both the current dehydrated react-query layout and the older
+    ``initialState.feed.feed`` layout.
+
+    Args:
+        next_data: Decoded ``__NEXT_DATA__`` JSON
+
+    Yields:
+        Raw listing dictionaries as found in the feed
+    """
+    page_props = (next_data.get('props') or {}).get('pageProps') or {}
+    legacy_feed = ((page_props.get('initialState') or {}).get('feed') or {}).get('feed')
+    if isinstance(legacy_feed, list):
+        for item in legacy_feed:
+            if isinstance(item, dict):
+                yield item
+
+    data = _feed_query_data(next_data)
+    if data:
+        for section in FEED_SECTIONS:
+            for item in data.get(section) or []:
+                if isinstance(item, dict):
+                    yield item
+
+
+def extract_feed_items(html: str) -> Optional[List[Dict[str, Any]]]:
+    """Decode a page's ``__NEXT_DATA__`` and return its raw feed items.
+
+    Entry point for the CPU executor (``app.core.executor``): the JSON is decoded
+    in the worker and only the feed items are sent back.
+
+    Args:
+        html: Raw page HTML
+
+    Returns:
+        Optional[List[Dict]]: The feed items, or None if the page carries no feed
+    """
+    next_data = extract_next_data(html)
+    if not next_data or not has_feed(next_data):
+        return None
+    return list(iter_feed_items(next_data))
+
+
+def get_pagination(next_data: Dict[str, Any]) -> Dict[str, int]:
+    """Return the feed pagination info (``pages``, ``perPage``, ``total``), or an empty dict."""
+    data = _feed_query_data(next_data) or {}
+    pagination = data.get('pagination')
+    return pagination if isinstance(pagination, dict) else {}
+
+
+def field_text(value: Any) -> str:
+    """Return the display text of a feed field that may be a ``{"id", "text"}`` object."""
+    if isinstance(value, dict):
+        return str(value.get('text') or '')
+    return str(value or '')
+
+
+def parse_feed_item(item: Dict[str, Any], base_url: str = BASE_URL,
+                    keep_raw: Optional[bool] = None) -> Optional[ListingRecord]:
+    """Parse one feed item into a listing.
+
+    Handles both the legacy flat API items and the current feed items, whose
+    categorical fields are ``{"id", "text"}`` objects. Also used to re-parse
+    archived items (``app.services.backfill``).
+
+    Args:
+        item: Raw listing data from the feed or the API
+        base_url: Base URL used to make relative links absolute
+        keep_raw: Keep ``item`` in the record (default: the SCRAPING_KEEP_RAW_DATA setting)
+
+    Returns:
+        Optional[ListingRecord]: Parsed listing, or None if parsing failed
+    """
+    try:
+        # Extract basic information
+        listing_id = item.get('id') or item.get('token') or ''
+        brand = field_text(item.get('manufacturer'))
+        model = field_text(item.get('model'))
+        title = item.get('title') or ' '.join(
+            part for part in (brand, model, field_text(item.get('subModel'))) if part
+        )
+        price = item.get('price') or 0
+        
+        # Extract URL
+        url = item.get('link') or (f"/item/{item['token']}" if item.get('token') else '')
+        if url and not url.startswith('http'):
+            url = urljoin(base_url, url)
+        
+        # Extract additional details
+        meta = item.get('metaData') or {}
+        year = item.get('year') or (item.get('vehicleDates') or {}).get('yearOfProduction') or 0
+        mileage = item.get('mileage') or item.get('km') or item.get('kilometers') or 0
+        location = item.get('location') or field_text((item.get('address') or {}).get('city'))
+        description = item.get('description') or meta.get('description') or ''
+        hand = item.get('hand')
+        
+        # Extract car details
+        details = item.get('details') or {}
+        fuel_type = details.get('fuel_type') or field_text(item.get('engineType'))
+        transmission = details.get('transmission') or field_text(item.get('gearBox'))
+        body_type = details.get('body_type') or field_text(item.get('bodyType'))
+        color = details.get('color') or field_text(item.get('color'))
+        
+        # Fall back to the title for the brand
+        if not brand and title:
+            parts = title.split()
+            if parts:
+                brand = parts[0]
+        
+        return ListingRecord(
+            source='yad2',
+            source_id=str(listing_id),
+            yad2_id=str(listing_id),
+            url=url,
+            title=title,
+            price=price,
+            year=int(year) if year else 0,
+            mileage=int(_DIGITS_RE.sub('', str(mileage)) or 0) if mileage else 0,
+            hand=hand.get('id') if isinstance(hand, dict) else hand,
+            location=location,
+            description=description,
+            fuel_type=fuel_type,
+            transmission=transmission,
+            body_type=body_type,
+            color=color,
+            brand=brand,
+            model=model,
+            image_url=meta.get('coverImage') or '',
+            raw_data=item,
+            keep_raw=keep_raw,
+            scraped_at=datetime.utcnow().isoformat()
+        )
+    except Exception as e:
+        logger.warning(f"Error parsing API listing: {str(e)}")
+        return None
@@ -0,0 +1,116 @@
+"""
+Rate limiting shared between concurrent scraping workers.
+
+Throttling belongs in front of outbound requests (HTTP calls and browser
+navigations) only. Code that scrapes a site should take its limiter from
+``get_rate_limiter`` so every scraper, worker and retry talking to that site
+draws from the same budget; parsing and database work are never throttled.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from app.config.scraping import settings as scraping_settings
+
+
+class RateLimiter:
+    """Async sliding-window rate limiter with a randomized minimum spacing.
+
+    A single instance is meant to be shared by every worker that talks to the
+    same site, so the limit holds for the crawl as a whole rather than per page.
+    """
+
+    def __init__(
+        self,
+        max_requests: int,
+        period: float,
+        min_delay: float = 0.0,
+        max_delay: float = 0.0
+    ) -> None:
+        """Initialize the rate limiter.
+
+        Args:
+            max_requests: Maximum number of requests allowed within ``period``
+            period: Length of the sliding window in seconds
+            min_delay: Minimum spacing between two consecutive requests in seconds
+            max_delay: Maximum spacing between two consecutive requests in seconds
+        """
+        self.max_requests = max_requests
+        self.period = period
+        self.min_delay = min_delay
+        self.max_delay = max(max_delay, min_delay)
+        self._timestamps: Deque[float] = deque()
+        self._last_request: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def from_settings(cls) -> "RateLimiter":
+        """Create a rate limiter from the scraping settings."""
+        return cls(
+            max_requests=scraping_settings.RATE_LIMIT_REQUESTS,
+            period=scraping_settings.RATE_LIMIT_PERIOD,
+            min_delay=scraping_settings.MIN_DELAY_BETWEEN_REQUESTS,
+            max_delay=scraping_settings.MAX_DELAY_BETWEEN_REQUESTS
+        )
+
+    def _get_lock(self) -> asyncio.Lock:
+        """Return a lock bound to the running event loop.
+
+        Shared limiters outlive a single ``asyncio.run`` (scripts, Celery tasks),
+        and an asyncio lock cannot be reused across loops.
+        """
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    async def acquire(self) -> None:
+        """Wait until another request may be sent."""
+        async with self._get_lock():
+            # Keep a randomized gap between consecutive requests
+            if self._last_request is not None and self.max_delay > 0:
+                gap = random.uniform(self.min_delay, self.max_delay)
+                wait = self._last_request + gap - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+
+            # Respect the sliding window limit
+            while True:
+                now = time.monotonic()
+                while self._timestamps and now - self._timestamps[0] >= self.period:
+                    self._timestamps.popleft()
+                if len(self._timestamps) < self.max_requests:
+                    break
+                await asyncio.sleep(self.period - (now - self._timestamps[0]))
+
+            now = time.monotonic()
+            self._timestamps.append(now)
+            self._last_request = now
+
+    async def __aenter__(self) -> "RateLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        return None
+
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(name: str = "yad2") -> RateLimiter:
+    """Return the process-wide rate limiter for a site, creating it from the settings.
+
+    Args:
+        name: Name of the site (one limiter per name)
+
+    Returns:
+        RateLimiter: The shared limiter
+    """
+    if name not in _limiters:
+        _limiters[name] = RateLimiter.from_settings()
+    return _limiters[name]
@@ -0,0 +1,334 @@
+"""
+Record and replay scraper traffic without the live site.
+
+Recording (``SCRAPING_RECORD_DIR``): every response the scrapers read, from
+aiohttp (``Yad2ApiScraper``, the ``__NEXT_DATA__`` fast path) and from the
+browser's document requests, is written into a ``FixtureStore`` directory.
+
+Replaying (``SCRAPING_REPLAY_URL``): requests are sent to a local
+``StubServer`` instead of the site. The stub serves the recorded responses
+with a configurable latency and error rate, so parse throughput, concurrency
+and retry behaviour can be measured deterministically with no network.
+
+A URL is sent to the stub as ``{REPLAY_URL}/{host}{path}?{query}``, so listing
+URLs and ids built by the scrapers stay the real ones. Requests that were
+never recorded are answered with another recording of the same path (e.g.
+page 7 with one of the recorded result pages), picked by a hash of the URL.
+
+Usage:
+    python -m app.scrapers.replay import-pages fixtures/yad2      # seed from yad2_page_*.html
+    python -m app.scrapers.replay serve fixtures/yad2 --port 8765 --latency-ms 300 --error-rate 0.05
+    SCRAPING_REPLAY_URL=http://127.0.0.1:8765 python run_scraper.py
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import aiohttp
+from aiohttp import web
+
+from app.config.scraping import settings as scraping_settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+
+_EXTENSIONS = {"text/html": ".html", "application/json": ".json"}
+
+
+def request_key(method: str, url: str) -> str:
+    """Key of a request in the store: method, host, path and sorted query."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{method.upper()} {parts.netloc}{parts.path or '/'}" + (f"?{query}" if query else "")
+
+
+def _path_key(key: str) -> str:
+    return key.split("?", 1)[0]
+
+
+class FixtureStore:
+    """A directory of recorded responses with an ``index.json`` of their requests."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._index: Dict[str, Dict[str, Any]] = {}
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, encoding="utf-8") as f:
+                self._index = json.load(f)
+        self._by_path: Dict[str, List[str]] = defaultdict(list)
+        for key in sorted(self._index):
+            self._by_path[_path_key(key)].append(key)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def record(self, method: str, url: str, status: int, content_type: str, body: bytes) -> None:
+        """Store a response, replacing any earlier recording of the same request."""
+        key = request_key(method, url)
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        filename = digest + _EXTENSIONS.get(content_type, ".bin")
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, filename), "wb") as f:
+                f.write(body)
+            if key not in self._index:
+                self._by_path[_path_key(key)].append(key)
+            self._index[key] = {
+                "url": url,
+                "status": status,
+                "content_type": content_type,
+                "file": filename,
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            # Rewritten on every response so an interrupted recording keeps what it got
+            tmp_path = os.path.join(self.path, INDEX_FILE + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._index, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, os.path.join(self.path, INDEX_FILE))
+
+    def lookup(self, method: str, url: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """Return ``(metadata, body)`` of the recording for a request, or None.
+
+        Falls back to a recording of the same path when the exact request was not recorded.
+        """
+        key = request_key(method, url)
+        entry = self._index.get(key)
+        if entry is None:
+            candidates = self._by_path.get(_path_key(key))
+            if not candidates:
+                return None
+            pick = int(hashlib.sha1(key.encode()).hexdigest(), 16) % len(candidates)
+            entry = self._index[candidates[pick]]
+        with open(os.path.join(self.path, entry["file"]), "rb") as f:
+            return entry, f.read()
+
+
+_store: Optional[FixtureStore] = None
+
+
+def get_recorder() -> Optional[FixtureStore]:
+    """Return the store responses are recorded into, or None when not recording."""
+    global _store
+    if not scraping_settings.RECORD_DIR:
+        return None
+    if _store is None or _store.path != scraping_settings.RECORD_DIR:
+        _store = FixtureStore(scraping_settings.RECORD_DIR)
+    return _store
+
+
+def rewrite_url(url: str) -> str:
+    """Return the URL to request: ``url`` itself, or its stub server URL when replaying."""
+    if not scraping_settings.REPLAY_URL:
+        return url
+    parts = urlsplit(url)
+    if not parts.netloc:
+        return url
+    stub = scraping_settings.REPLAY_URL.rstrip("/")
+    return f"{stub}/{parts.netloc}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else "")
+
+
+class RecordingClientResponse(aiohttp.ClientResponse):
+    """aiohttp response that records its body into the fixture store when it is read."""
+
+    async def read(self) -> bytes:
+        body = await super().read()
+        recorder = get_recorder()
+        if recorder is not None:
+            recorder.record(self.method, str(self.url), self.status, self.content_type, body)
+        return body
+
+
+def session_kwargs() -> Dict[str, Any]:
+    """Extra ``aiohttp.ClientSession`` arguments for the current record/replay settings."""
+    return {"response_class": RecordingClientResponse} if scraping_settings.RECORD_DIR else {}
+
+
+async def handle_route(route, request) -> bool:
+    """Record or replay a browser request from a Playwright route handler.
+
+    Returns:
+        True if the request was answered here, False if the caller should handle it
+    """
+    if scraping_settings.REPLAY_URL:
+        response = await route.fetch(url=rewrite_url(request.url))
+        await route.fulfill(response=response)
+        return True
+    recorder = get_recorder()
+    if recorder is not None and request.resource_type == "document":
+        response = await route.fetch()
+        recorder.record(
+            request.method, request.url, response.status,
+            response.headers.get("content-type", "").split(";")[0], await response.body()
+        )
+        await route.fulfill(response=response)
+        return True
+    return False
+
+
+class StubServer:
+    """Local HTTP server replaying a fixture store with injected latency and errors.
+
+    Whether a request fails depends only on the seed, its URL and how many times
+    that URL was requested before, so a run's retries are the same every time
+    regardless of the order concurrent requests arrive in.
+    """
+
+    def __init__(
+        self,
+        store: FixtureStore,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        error_statuses: Sequence[int] = (503,),
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0
+    ) -> None:
+        """Initialize the stub server.
+
+        Args:
+            store: Recordings to serve
+            latency_ms: Delay before every response
+            jitter_ms: Extra random delay of up to this many milliseconds
+            error_rate: Share of requests answered with one of ``error_statuses``
+            error_statuses: Error statuses to inject, e.g. (429, 503)
+            seed: Seed of the latency and error draws
+            host: Interface to listen on
+            port: Port to listen on (0: any free port)
+        """
+        self.store = store
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.seed = seed
+        self.host = host
+        self.port = port
+        self.stats = {"requests": 0, "served": 0, "errors": 0, "missing": 0}
+        self._seen: Dict[str, int] = defaultdict(int)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        # /{host}/{path}?{query} -> https://{host}/{path}?{query}
+        url = "https:/" + request.path_qs
+        key = request_key(request.method, url)
+        self._seen[key] += 1
+        rng = random.Random(f"{self.seed}:{key}:{self._seen[key]}")
+
+        delay = self.latency_ms + rng.uniform(0, self.jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if self.error_rate and rng.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=rng.choice(self.error_statuses), text="injected error")
+
+        found = self.store.lookup(request.method, url)
+        if found is None:
+            self.stats["missing"] += 1
+            return web.Response(status=404, text=f"No recording for {key}")
+        entry, body = found
+        self.stats["served"] += 1
+        return web.Response(status=entry["status"], body=body, content_type=entry["content_type"] or None)
+
+    async def start(self) -> "StubServer":
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Resolve the port the OS picked for port 0
+        self.port = self._runner.addresses[0][1]
+        logger.info(f"Replaying {len(self.store)} recordings on {self.url}")
+        return self
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "StubServer":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
+
+
+def import_pages(store: FixtureStore, paths: Sequence[str], search_url: Optional[str] = None) -> int:
+    """Record saved result pages (``yad2_page_*.html``, ``yad2_response.html``) as pages 1..N of a search.
+
+    Returns:
+        Number of pages imported
+    """
+    search_url = search_url or scraping_settings.YAD2_BASE_URL + scraping_settings.YAD2_SEARCH_PATH
+    for page_num, path in enumerate(paths, 1):
+        with open(path, "rb") as f:
+            body = f.read()
+        url = search_url if page_num == 1 else f"{search_url}?page={page_num}"
+        store.record("GET", url, 200, "text/html", body)
+    return len(paths)
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    statuses = [int(status) for status in re.split(r"[,\s]+", args.error_statuses) if status]
+    server = StubServer(
+        FixtureStore(args.fixtures), args.latency_ms, args.jitter_ms, args.error_rate,
+        statuses, args.seed, args.host, args.port
+    )
+    async with server:
+        print(f"Serving {args.fixtures} on {server.url} (Ctrl+C to stop)")
+        await asyncio.Event().wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Record/replay fixtures for the Yad2 scrapers")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Replay a fixture store over HTTP")
+    serve.add_argument("fixtures", help="Fixture store directory")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency-ms", type=float, default=0.0)
+    serve.add_argument("--jitter-ms", type=float, default=0.0)
+    serve.add_argument("--error-rate", type=float, default=0.0)
+    serve.add_argument("--error-statuses", default="503", help="Comma-separated statuses to inject")
+    serve.add_argument("--seed", type=int, default=0)
+
+    pages = commands.add_parser("import-pages", help="Seed a fixture store from saved result pages")
+    pages.add_argument("fixtures", help="Fixture store directory")
+    pages.add_argument("pages", nargs="*", help="HTML files (default: yad2_page_*.html and yad2_response.html)")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if args.command == "serve":
+        try:
+            asyncio.run(_serve(args))
+        except KeyboardInterrupt:
+            pass
+    else:
+        paths = args.pages or sorted(glob.glob("yad2_page_*.html")) + glob.glob("yad2_response.html")
+        count = import_pages(FixtureStore(args.fixtures), paths)
+        print(f"Imported {count} pages into {args.fixtures}")
+
+
+if __name__ == "__main__":
+    main()
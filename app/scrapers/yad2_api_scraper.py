@@ -3,11 +3,17 @@ Yad2 API-based car listings scraper.
 """
 import asyncio
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
 import aiohttp
 import random
 from datetime import datetime
 
+from app.core.metrics import ScraperStats
+from app.scrapers.rate_limit import RateLimiter, get_rate_limiter
+from app.scrapers.listing_record import ListingRecord
+from app.scrapers.replay import rewrite_url, session_kwargs
+from app.services.listing_batch import column, to_floats, to_strings
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -19,20 +25,25 @@ class Yad2ApiScraper:
         max_retries: int = 3,
         delay_range: tuple = (1, 3),
         max_pages: int = 3,
-        limit: int = 25
+        limit: int = 25,
+        rate_limiter: Optional[RateLimiter] = None
     ) -> None:
         """Initialize the Yad2 API scraper.
         
         Args:
             max_retries: Maximum number of retry attempts for failed requests
-            delay_range: Range of random delays between requests in seconds
+            delay_range: Range of random backoff delays between retries in seconds
             max_pages: Maximum number of pages to scrape
             limit: Maximum number of listings to return
+            rate_limiter: Limiter applied to every request (default: the shared Yad2 limiter)
         """
         self.max_retries = max_retries
         self.delay_range = delay_range
         self.max_pages = max_pages
         self.limit = limit
+        self.rate_limiter = rate_limiter or get_rate_limiter('yad2')
+        # Counters are also exported as scraper_events_total{scraper="yad2_api"}
+        self.stats = ScraperStats('yad2_api', start_time=datetime.utcnow())
         self.session = None
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -45,7 +56,7 @@ class Yad2ApiScraper:
     
     async def __aenter__(self):
         """Async context manager entry."""
-        self.session = aiohttp.ClientSession()
+        self.session = aiohttp.ClientSession(**session_kwargs())
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -73,20 +84,27 @@ class Yad2ApiScraper:
         """
         for attempt in range(1, self.max_retries + 1):
             try:
+                await self.rate_limiter.acquire()
+                self.stats['requests'] += 1
                 logger.debug(f"Making {method} request to {url} (attempt {attempt}/{self.max_retries})")
                 
                 async with self.session.request(
                     method=method,
-                    url=url,
+                    url=rewrite_url(url),
                     params=params,
                     json=json_data,
                     headers=self.headers,
                     timeout=aiohttp.ClientTimeout(total=30)
                 ) as response:
+                    if response.status == 429:
+                        self.stats['rate_limited'] += 1
                     response.raise_for_status()
-                    return await response.json()
+                    data = await response.json()
+                    self.stats['successful_requests'] += 1
+                    return data
                     
             except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.stats['failed_requests'] += 1
                 logger.warning(f"Request failed (attempt {attempt}/{self.max_retries}): {str(e)}")
                 if attempt == self.max_retries:
                     logger.error(f"Max retries ({self.max_retries}) exceeded for URL: {url}")
@@ -106,6 +124,24 @@ class Yad2ApiScraper:
         Returns:
             List of car listing dictionaries
         """
+        all_listings = []
+        async for _, page_listings in self.iter_listing_pages(search_params):
+            all_listings.extend(page_listings or [])
+        return all_listings
+    
+    async def iter_listing_pages(self, search_params: Optional[Dict] = None) -> AsyncIterator[Tuple[int, List[Dict]]]:
+        """Fetch result pages from the Yad2 API one at a time.
+        
+        Only the current page is held in memory, so callers can store each page
+        before the next one is requested (see ``app.services.pipeline``).
+        
+        Args:
+            search_params: Additional search parameters
+            
+        Yields:
+            Tuples of (page number, listings), at most ``limit`` listings in total;
+            listings are None for a page the API did not answer, which ends the crawl
+        """
         base_url = "https://gw.yad2.co.il/vehicles/vehicles/list"
         
         # Default parameters
@@ -138,7 +174,7 @@ class Yad2ApiScraper:
                     if price_parts[1]:
                         params['priceMax'] = price_parts[1]
         
-        all_listings = []
+        count = 0
         
         try:
             for page in range(1, self.max_pages + 1):
@@ -149,85 +185,92 @@ class Yad2ApiScraper:
                 response = await self._make_request(base_url, params=params)
                 if not response or 'data' not in response or 'feed' not in response['data']:
                     logger.warning(f"No data found in API response for page {page}")
+                    yield page, None
                     break
                 
                 # Process the listings
                 page_listings = self._process_listings(response['data']['feed']['feed_items'])
-                all_listings.extend(page_listings)
+                full_page = len(page_listings)
+                self.stats['pages_processed'] += 1
+                page_listings = page_listings[:self.limit - count]
+                count += len(page_listings)
+                self.stats['listings_extracted'] += len(page_listings)
                 
                 # Log some debug info
-                logger.debug(f"Page {page} - Got {len(page_listings)} listings")
+                logger.debug(f"Page {page} - Got {full_page} listings")
                 
-                logger.info(f"Found {len(page_listings)} listings on page {page}")
+                logger.info(f"Found {full_page} listings on page {page}")
+                yield page, page_listings
                 
                 # Stop if we've reached the limit
-                if len(all_listings) >= self.limit:
-                    all_listings = all_listings[:self.limit]
+                if count >= self.limit:
                     logger.info(f"Reached the limit of {self.limit} listings")
                     break
                 
-                # Add a small delay between requests
-                if page < self.max_pages and len(page_listings) > 0:
-                    delay = random.uniform(*self.delay_range)
-                    logger.debug(f"Waiting {delay:.2f} seconds before next request...")
-                    await asyncio.sleep(delay)
-                
                 # If we got fewer results than expected, we've probably reached the end
-                if len(page_listings) < 20:  # Yad2 typically returns 20 items per page
+                if full_page < 20:  # Yad2 typically returns 20 items per page
                     logger.info("Reached the end of available listings")
                     break
             
-            return all_listings
-            
         except Exception as e:
             logger.error(f"Error getting car listings: {str(e)}", exc_info=True)
-            return all_listings
     
-    def _process_listings(self, raw_listings: List[Dict]) -> List[Dict]:
+    def _process_listings(self, raw_listings: List[Dict]) -> List[ListingRecord]:
         """Process raw listing data into a standardized format.
         
+        Fields are coerced a column at a time with the shared batch helpers
+        (``app.services.listing_batch``), so a malformed value only blanks
+        that field instead of dropping the listing.
+        
         Args:
             raw_listings: List of raw listing dictionaries from the API
             
         Returns:
-            List of processed listing dictionaries
+            List of processed listings; the API item is kept only if
+            SCRAPING_KEEP_RAW_DATA is set
         """
-        processed = []
+        # Skip invalid or missing items
+        items = [item for item in raw_listings if item.get('id')]
+        prices = to_floats(column(items, 'price'), missing=0).tolist()
+        years = to_floats(column(items, 'year'), missing=0).tolist()
+        kilometers = to_floats(column(items, 'kilometers'), missing=0).tolist()
+        engine_sizes = to_floats(column(items, 'engine_volume'), missing=0).tolist()
+        owners = to_floats(column(items, 'owner_id'), missing=0).tolist()
+        text = {
+            field: to_strings(column(items, field), intern=intern)
+            for field, intern in (('manufacturer', True), ('model', True), ('sub_title', False),
+                                  ('gear', True), ('area', True), ('fuel_type', True), ('color', True),
+                                  ('description', False), ('link', False))
+        }
+        now = datetime.utcnow()
         
-        for item in raw_listings:
-            try:
-                # Skip invalid or missing items
-                if not item.get('id'):
-                    continue
-                
-                # Extract basic information
-                listing = {
-                    'source': 'yad2',
-                    'source_id': str(item.get('id', '')),
-                    'title': f"{item.get('manufacturer', '')} {item.get('model', '')} {item.get('sub_title', '')}".strip(),
-                    'price': float(item.get('price', 0)) if item.get('price') else 0,
-                    'year': int(item.get('year', 0)) if item.get('year') else None,
-                    'kilometers': float(item.get('kilometers', 0)) if item.get('kilometers') else None,
-                    'engine_size': float(item.get('engine_volume', 0)) if item.get('engine_volume') else None,
-                    'gear': item.get('gear', '').strip(),
-                    'hand': int(item.get('owner_id', 0)) if item.get('owner_id') else None,  # Using owner_id as hand
-                    'owner_id': item.get('owner_id', ''),
-                    'date_updated': datetime.utcnow(),
-                    'url': f"https://www.yad2.co.il{item.get('link', '')}",
-                    'image_url': item.get('images', [{}])[0].get('src', '') if item.get('images') else '',
-                    'location': item.get('area', '').strip(),
-                    'fuel_type': item.get('fuel_type', '').strip(),
-                    'color': item.get('color', '').strip(),
-                    'tested': item.get('tested', False),
-                    'next_test': item.get('next_test', '').strip(),
-                    'description': item.get('description', '').strip(),
-                }
-                
-                processed.append(listing)
-                
-            except Exception as e:
-                logger.error(f"Error processing listing: {str(e)}")
-                continue
+        processed = []
+        for i, item in enumerate(items):
+            price, year, km, engine_size, owner = prices[i], years[i], kilometers[i], engine_sizes[i], owners[i]
+            brand, model = text['manufacturer'][i], text['model'][i]
+            images = item.get('images') or [{}]
+            processed.append(ListingRecord(
+                source='yad2',
+                source_id=str(item['id']),
+                yad2_id=str(item['id']),
+                brand=brand,
+                model=model,
+                title=f"{brand} {model} {text['sub_title'][i]}".strip(),
+                price=price,
+                year=int(year) or None,
+                mileage=int(km),
+                engine_size=engine_size or None,
+                transmission=text['gear'][i],
+                hand=int(owner) or None,  # Using owner_id as hand
+                scraped_at=now.isoformat(),
+                url=f"https://www.yad2.co.il{text['link'][i]}",
+                image_url=images[0].get('src', '') if isinstance(images[0], dict) else '',
+                location=text['area'][i],
+                fuel_type=text['fuel_type'][i],
+                color=text['color'][i],
+                description=text['description'][i],
+                raw_data=item,
+            ))
         
         return processed
 
@@ -251,7 +294,7 @@ async def main():
             print(f"  Title: {listing['title']}")
             print(f"  Price: {listing['price']} NIS")
             print(f"  Year: {listing['year']}")
-            print(f"  Kilometers: {listing['kilometers']}")
+            print(f"  Kilometers: {listing['mileage']}")
             print(f"  Location: {listing['location']}")
             print(f"  URL: {listing['url']}")
 
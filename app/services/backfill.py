@@ -0,0 +1,268 @@
+"""
+Re-normalization of stored listings from their archived raw payloads.
+
+When the normalizer changes (brand matching, year parsing, ...), the rows in
+``car_listings`` can be fixed without scraping the site again: the backfill
+replays the latest archived payload of every listing (``app.services.raw_archive``)
+through the current parse and cleanup and updates the rows whose output changed.
+
+    read chunk -> decode/parse/normalize (process pool) -> match brands -> bulk UPDATE
+
+Listings are walked in ``id`` order, a chunk at a time. Decoding and
+``normalize_batch`` run on the CPU executor with several chunks in flight, so
+every worker stays busy while the main process matches brands and writes.
+Each chunk is committed on its own with one executemany UPDATE of only the
+changed rows and columns, so no lock is held for long and the read endpoints
+keep working. After each commit the last listing id is written to a
+checkpoint file; a new run continues from there unless ``--restart``.
+
+A re-normalized value that comes out empty never overwrites a stored one:
+a payload can carry less than the row was built from (card details only, or
+seed defaults), and the backfill must not lose data.
+
+Usage:
+    python -m app.services.backfill run [--chunk-size 2000] [--workers 8] [--restart] [--dry-run]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.executor import CPUExecutor, get_executor
+from app.db.models import CarListing
+from app.scrapers.next_data import parse_feed_item
+from app.services.brand_matcher import get_brand_matcher
+from app.services.listing_batch import ListingBatch, normalize_batch
+from app.services.normalization import match_brand_models, resolve_brand_model
+from app.services.raw_archive import decode_raw, latest_blobs
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_CHUNK_SIZE = 2000
+DEFAULT_CHECKPOINT_PATH = "backfill_checkpoint.json"
+
+# Columns recomputed from the payload and compared with the stored row
+COMPARED_COLUMNS = (
+    "title", "description", "price", "year", "mileage", "fuel_type", "transmission",
+    "body_type", "color", "image_url", "brand_id", "model_id",
+)
+
+# Keys of the feed/API item formats; payloads without them are scraped listings
+_FEED_ITEM_KEYS = ("token", "manufacturer", "vehicleDates", "metaData")
+
+
+def listing_from_payload(yad2_id: str, payload: Any) -> Dict[str, Any]:
+    """Turn an archived payload back into a scraped listing for ``normalize_batch``.
+
+    Feed and API items are parsed again with the current parser; listings that
+    were archived as scraped (seed, ingest jobs) are used as they are. Payloads
+    that cannot be parsed (e.g. bare card details) give a listing without a
+    title, which ``normalize_batch`` rejects.
+    """
+    if not isinstance(payload, dict):
+        return {"yad2_id": yad2_id}
+    if any(key in payload for key in _FEED_ITEM_KEYS):
+        listing = parse_feed_item(payload, keep_raw=False) or {}
+    else:
+        listing = dict(payload)
+    listing["yad2_id"] = yad2_id
+    return listing
+
+
+def renormalize_payloads(entries: List[Tuple[str, bytes]]) -> ListingBatch:
+    """Decode, parse and clean archived payloads; runs on the CPU executor.
+
+    Args:
+        entries: ``(yad2_id, blob)`` pairs as returned by ``raw_archive.latest_blobs``
+    """
+    return normalize_batch([listing_from_payload(yad2_id, decode_raw(blob)) for yad2_id, blob in entries])
+
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    """Return the saved progress, or a fresh one if there is none."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"last_id": 0, "counts": {}}
+
+
+def save_checkpoint(path: str, state: Dict[str, Any]) -> None:
+    """Write the progress atomically, so a crash never leaves a torn checkpoint."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({**state, "updated_at": datetime.utcnow().isoformat()}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+async def run_backfill(
+    db: Session,
+    checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT_PATH,
+    chunk_size: int = BACKFILL_CHUNK_SIZE,
+    restart: bool = False,
+    dry_run: bool = False,
+    executor: Optional[CPUExecutor] = None,
+    on_chunk: Optional[Callable[[Dict[str, int]], None]] = None
+) -> Dict[str, Any]:
+    """Re-normalize every listing with an archived payload and update the changed rows.
+
+    Args:
+        db: Database session
+        checkpoint_path: Progress file to resume from and update (None: no checkpoint)
+        chunk_size: Listings per chunk (one executor call, one UPDATE)
+        restart: Ignore the checkpoint and start from the first listing
+        dry_run: Count the changes without writing them
+        executor: CPU executor for the decoding and cleanup (default: ``get_executor()``)
+        on_chunk: Called with the running counts after each chunk
+
+    Returns:
+        Dict with the ``last_id`` reached and the ``counts``: listings ``scanned``,
+        ``payloads`` found, ``rejected`` by the normalizer, ``unmatched`` brands or
+        models, ``changed`` rows and ``columns`` updated
+    """
+    executor = executor or get_executor()
+    state = {"last_id": 0, "counts": {}}
+    if checkpoint_path and not restart:
+        state = load_checkpoint(checkpoint_path)
+    counts = {"scanned": 0, "payloads": 0, "rejected": 0, "unmatched": 0, "changed": 0, "columns": 0,
+              **state.get("counts", {})}
+    last_id = state["last_id"]
+    if last_id:
+        logger.info(f"Resuming backfill after listing {last_id}")
+
+    matcher = get_brand_matcher(db)
+    brand_cache: Dict = {}
+    # Enough chunks in flight to keep every worker busy while one is written
+    window = max(executor.max_workers * 2, 2)
+    pending: deque = deque()
+    exhausted = False
+    started = time.perf_counter()
+
+    while True:
+        while not exhausted and len(pending) < window:
+            rows = _read_chunk(db, last_id, chunk_size)
+            if not rows:
+                exhausted = True
+                break
+            last_id = rows[-1].id
+            blobs = latest_blobs(db, [row.yad2_id for row in rows])
+            entries = [(row.yad2_id, blobs[row.yad2_id]) for row in rows if row.yad2_id in blobs]
+            task = asyncio.ensure_future(executor.run(renormalize_payloads, entries))
+            pending.append((rows, len(entries), last_id, task))
+        if not pending:
+            break
+
+        rows, payload_count, chunk_last_id, task = pending.popleft()
+        batch = await task
+        updates = _changed_rows(db, rows, batch, counts, matcher, brand_cache)
+        if updates and not dry_run:
+            db.execute(update(CarListing), updates)
+        # Also ends the read transaction of a chunk without changes
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+
+        counts["scanned"] += len(rows)
+        counts["payloads"] += payload_count
+        counts["rejected"] += len(batch.rejected)
+        counts["changed"] += len(updates)
+        counts["columns"] += sum(len(row) - 2 for row in updates)
+        state = {"last_id": chunk_last_id, "counts": counts}
+        if checkpoint_path and not dry_run:
+            save_checkpoint(checkpoint_path, state)
+        if on_chunk:
+            on_chunk(dict(counts))
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Backfill at listing {chunk_last_id}: {counts['scanned']} scanned, {counts['changed']} changed "
+            f"({counts['scanned'] / max(elapsed, 1e-9):.0f} listings/s)"
+        )
+
+    logger.info(f"Backfill done: {counts}")
+    return state
+
+
+def _read_chunk(db: Session, last_id: int, chunk_size: int) -> List[Any]:
+    """The next listings after ``last_id``, with the compared columns only."""
+    columns = [getattr(CarListing, name) for name in COMPARED_COLUMNS]
+    query = (
+        select(CarListing.id, CarListing.yad2_id, *columns)
+        .where(CarListing.id > last_id)
+        .order_by(CarListing.id)
+        .limit(chunk_size)
+    )
+    return db.execute(query).all()
+
+
+def _changed_rows(db: Session, rows: List[Any], batch: ListingBatch, counts: Dict[str, int],
+                  matcher, brand_cache: Dict) -> List[Dict[str, Any]]:
+    """Compare the re-normalized listings with the stored rows; return the UPDATE parameters."""
+    by_yad2_id = {row.yad2_id: row for row in rows}
+    values = list(batch.rows())
+    match_brand_models(values, matcher)
+
+    now = datetime.utcnow()
+    updates = []
+    for new in values:
+        if new["brand"] and new["model"]:
+            try:
+                new["brand_id"], new["model_id"] = resolve_brand_model(
+                    db, new["brand"], new["model"], brand_cache,
+                    brand_key=new["brand_key"], model_key=new["model_key"]
+                )
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Error resolving brand/model of listing {new['yad2_id']}: {str(e)}")
+                counts["unmatched"] += 1
+        else:
+            counts["unmatched"] += 1
+        row = by_yad2_id[new["yad2_id"]]
+        # Rows are (id, yad2_id, *COMPARED_COLUMNS)
+        changed = {
+            name: new[name] for name, stored in zip(COMPARED_COLUMNS, row[2:])
+            if new.get(name) not in (None, "") and stored != new[name]
+        }
+        if changed:
+            updates.append({"id": row.id, "updated_at": now, **changed})
+    return updates
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-normalize listings from their archived raw payloads")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Run or resume the backfill")
+    run_parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH, help="Progress file")
+    run_parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE)
+    run_parser.add_argument("--workers", type=int, help="Worker processes (default: CPU_EXECUTOR_WORKERS)")
+    run_parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint")
+    run_parser.add_argument("--dry-run", action="store_true", help="Count the changes without writing them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    from app.db.session import SessionLocal
+
+    executor = CPUExecutor(settings.CPU_EXECUTOR, args.workers) if args.workers else get_executor()
+    db = SessionLocal()
+    try:
+        result = asyncio.run(run_backfill(
+            db, checkpoint_path=args.checkpoint, chunk_size=args.chunk_size,
+            restart=args.restart, dry_run=args.dry_run, executor=executor
+        ))
+    finally:
+        db.close()
+        executor.shutdown()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Brand and model matching of listing titles against the car catalog.
+
+The dictionary is the ``car_brands``/``car_models`` tables merged with the
+Hebrew/English aliases in ``app.services.car_aliases``. Titles are matched in
+batches (``BrandMatcher.match_many``):
+
+1. Exact: the normalized title tokens are looked up in a token index of the
+   aliases, longest alias first, so "אלפא רומיאו ג'וליה" or "ב.מ.וו סדרה 3"
+   resolve without computing any string distance. This index is also the
+   prefilter for step 2: only titles it cannot resolve go on.
+2. Fuzzy: the leading tokens (and token pairs) of the remaining titles are
+   scored against every brand alias with a single ``rapidfuzz.process.cdist``
+   call for the whole batch. Models are then scored against the aliases of
+   their matched brand only, with one ``cdist`` call per brand.
+
+Results are cached per distinct title. A crawl repeats the same few thousand
+brand/model strings, so most lookups never reach rapidfuzz.
+"""
+import logging
+import re
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from rapidfuzz import fuzz, process
+from sqlalchemy.orm import Session
+
+from app.db.models import CarBrand, CarModel
+from app.services.car_aliases import CAR_ALIASES
+
+logger = logging.getLogger(__name__)
+
+# Minimum rapidfuzz.fuzz.ratio of a fuzzy brand/model match
+BRAND_SCORE_CUTOFF = 80
+MODEL_SCORE_CUTOFF = 80
+
+# Leading title tokens tried as fuzzy brand candidates; tokens and aliases
+# shorter than FUZZY_MIN_LENGTH are only ever matched exactly
+FUZZY_BRAND_TOKENS = 3
+FUZZY_MODEL_TOKENS = 3
+FUZZY_MIN_LENGTH = 3
+
+# Distinct titles kept in the result cache before it is cleared
+CACHE_SIZE = 100_000
+
+# Seconds before get_brand_matcher reloads the tables
+MATCHER_TTL_SECONDS = 600
+
+_DROP_RE = re.compile(r"[.\-'\"`׳״’]")
+_SPLIT_RE = re.compile(r"[^\w]+")
+
+Tokens = Tuple[str, ...]
+
+
+class BrandMatch(NamedTuple):
+    """A title's brand and model, as catalog display names and normalized keys."""
+    brand: str
+    brand_key: str
+    model: Optional[str]
+    model_key: Optional[str]
+    score: float
+
+
+def tokenize(text: str) -> Tokens:
+    """Lowercase ``text``, drop dots, dashes and quotes and split it into words.
+
+    "ב.מ.וו", "C-HR" and "ג'יפ" become "במוו", "chr" and "גיפ", so the
+    spellings used in titles meet the aliases in one form.
+    """
+    return tuple(token for token in _SPLIT_RE.split(_DROP_RE.sub("", text.lower())) if token)
+
+
+class _AliasTable:
+    """Aliases of one level of the catalog (the brands, or one brand's models)."""
+
+    def __init__(self) -> None:
+        self.names: List[str] = []
+        self.keys: List[str] = []
+        # First token -> (alias tokens, entry), longest aliases first
+        self.index: Dict[str, List[Tuple[Tokens, int]]] = {}
+        # Aliases long enough for fuzzy matching, joined back into strings
+        self.choices: List[str] = []
+        self.choice_entries: List[int] = []
+        self._seen: Set[Tuple[Tokens, int]] = set()
+
+    def add(self, key: str, name: str, aliases: Iterable[str]) -> int:
+        entry = len(self.keys)
+        self.keys.append(key)
+        self.names.append(name)
+        self.add_aliases(entry, aliases)
+        return entry
+
+    def add_aliases(self, entry: int, aliases: Iterable[str]) -> None:
+        for alias in aliases:
+            tokens = tokenize(alias)
+            if not tokens or (tokens, entry) in self._seen:
+                continue
+            self._seen.add((tokens, entry))
+            candidates = self.index.setdefault(tokens[0], [])
+            candidates.append((tokens, entry))
+            candidates.sort(key=lambda candidate: -len(candidate[0]))
+            text = " ".join(tokens)
+            if len(text) >= FUZZY_MIN_LENGTH:
+                self.choices.append(text)
+                self.choice_entries.append(entry)
+
+    def find(self, tokens: Tokens) -> Optional[Tuple[int, int, int]]:
+        """Return the (entry, start, end) of the first alias found in ``tokens``."""
+        for start, token in enumerate(tokens):
+            for alias, entry in self.index.get(token, ()):
+                if tokens[start:start + len(alias)] == alias:
+                    return entry, start, start + len(alias)
+        return None
+
+
+def _fuzzy_queries(tokens: Tokens, limit: int) -> List[Tuple[str, int, int]]:
+    """Return the leading tokens and token pairs of a title as (text, start, end)."""
+    queries = []
+    for start in range(min(limit, len(tokens))):
+        for end in (start + 1, start + 2):
+            if end <= len(tokens):
+                text = " ".join(tokens[start:end])
+                if len(text) >= FUZZY_MIN_LENGTH:
+                    queries.append((text, start, end))
+    return queries
+
+
+class BrandMatcher:
+    """Match titles to catalog brands and models (see the module docstring)."""
+
+    def __init__(self, catalog: Dict[str, Tuple[str, Iterable[str], Dict[str, Tuple[str, Iterable[str]]]]]) -> None:
+        """Build the token index and fuzzy choices of a catalog.
+
+        Args:
+            catalog: Brand key -> (display name, aliases, {model key: (display
+                name, aliases)}); see ``catalog_from_aliases``
+        """
+        self.brands = _AliasTable()
+        self.models: List[_AliasTable] = []
+        for brand_key, (brand_name, aliases, models) in catalog.items():
+            self.brands.add(brand_key, brand_name, [brand_name, brand_key.replace("_", " "), *aliases])
+            table = _AliasTable()
+            for model_key, (model_name, model_aliases) in models.items():
+                table.add(model_key, model_name, [model_name, model_key.replace("_", " "), *model_aliases])
+            self.models.append(table)
+        self._cache: Dict[str, Optional[BrandMatch]] = {}
+        self.stats = {"titles": 0, "cache_hits": 0, "exact": 0, "fuzzy": 0, "unmatched": 0}
+
+    @classmethod
+    def from_db(cls, db: Session) -> "BrandMatcher":
+        """Build a matcher from the ``car_brands``/``car_models`` tables and ``CAR_ALIASES``.
+
+        Rows whose names are aliases of a dictionary entry are merged into it
+        and lend it their name, so matches resolve to the existing rows.
+        """
+        catalog = catalog_from_aliases()
+        lookup = BrandMatcher(catalog)
+        brand_tables = dict(zip(lookup.brands.keys, lookup.models))
+        rows = (
+            db.query(CarBrand.name, CarBrand.normalized_name, CarModel.name, CarModel.normalized_name)
+            .outerjoin(CarModel, CarModel.brand_id == CarBrand.id)
+            .order_by(CarBrand.id, CarModel.id)
+            .all()
+        )
+        named: Set[Tuple[str, Optional[str]]] = set()
+        for brand_name, brand_normalized, model_name, model_normalized in rows:
+            brand_key = _catalog_key(catalog, lookup.brands, brand_name, brand_normalized)
+            if (brand_key, None) not in named:
+                # The oldest row of an entry names it
+                _, aliases, models = catalog.get(brand_key, (brand_name, set(), {}))
+                catalog[brand_key] = (brand_name, aliases, models)
+                named.add((brand_key, None))
+            _, aliases, models = catalog[brand_key]
+            aliases.update(filter(None, (brand_name, brand_normalized)))
+            if not model_name:
+                continue
+            model_key = _catalog_key(models, brand_tables.get(brand_key), model_name, model_normalized)
+            if (brand_key, model_key) not in named:
+                _, model_aliases = models.get(model_key, (model_name, set()))
+                models[model_key] = (model_name, model_aliases)
+                named.add((brand_key, model_key))
+            models[model_key][1].update(filter(None, (model_name, model_normalized)))
+        return cls(catalog)
+
+    def match(self, title: str) -> Optional[BrandMatch]:
+        """Match a single title; see ``match_many``."""
+        return self.match_many([title])[0]
+
+    def match_many(self, titles: Sequence[str]) -> List[Optional[BrandMatch]]:
+        """Match a batch of titles.
+
+        Args:
+            titles: Listing titles, or "<brand> <model>" strings
+
+        Returns:
+            A ``BrandMatch`` per title (``model`` is None when only the brand
+            was found), or None for titles without a known brand
+        """
+        self.stats["titles"] += len(titles)
+        pending = {title for title in titles if title not in self._cache}
+        self.stats["cache_hits"] += len(titles) - len(pending)
+        if pending:
+            if len(self._cache) + len(pending) > CACHE_SIZE:
+                self._cache.clear()
+            self._cache.update(self._match_distinct(list(pending)))
+        return [self._cache[title] for title in titles]
+
+    def _match_distinct(self, titles: List[str]) -> Dict[str, Optional[BrandMatch]]:
+        tokens = [tokenize(title) for title in titles]
+
+        # Brands: exact token lookups first, one cdist for the rest
+        brands: List[Optional[Tuple[int, int, int, float]]] = []
+        unmatched = []
+        for i, title_tokens in enumerate(tokens):
+            found = self.brands.find(title_tokens)
+            brands.append((*found, 100.0) if found else None)
+            if not found:
+                unmatched.append(i)
+        if unmatched and self.brands.choices:
+            owners, spans, queries = [], [], []
+            for i in unmatched:
+                for text, start, end in _fuzzy_queries(tokens[i], FUZZY_BRAND_TOKENS):
+                    owners.append(i)
+                    spans.append((start, end))
+                    queries.append(text)
+            if queries:
+                scores = process.cdist(queries, self.brands.choices, scorer=fuzz.ratio,
+                                       score_cutoff=BRAND_SCORE_CUTOFF, workers=-1)
+                best_choices = scores.argmax(axis=1)
+                for row, i in enumerate(owners):
+                    choice = int(best_choices[row])
+                    score = float(scores[row, choice])
+                    if score and (brands[i] is None or score > brands[i][3]):
+                        brands[i] = (self.brands.choice_entries[choice], *spans[row], score)
+
+        # Models: exact lookups in the brand's aliases, one cdist per brand for the rest
+        models: List[Optional[Tuple[int, float]]] = [None] * len(titles)
+        fuzzy_by_brand: Dict[int, List[int]] = {}
+        rests: Dict[int, Tokens] = {}
+        for i, brand in enumerate(brands):
+            if brand is None:
+                continue
+            entry, start, end = brand[:3]
+            # Model after the brand ("טויוטה קורולה"), or before it ("קורולה של טויוטה")
+            rests[i] = rest = tokens[i][end:] + tokens[i][:start]
+            found = self.models[entry].find(rest)
+            if found:
+                models[i] = (found[0], 100.0)
+            else:
+                fuzzy_by_brand.setdefault(entry, []).append(i)
+        for entry, members in fuzzy_by_brand.items():
+            table = self.models[entry]
+            if not table.choices:
+                continue
+            owners, queries = [], []
+            for i in members:
+                for text, _, _ in _fuzzy_queries(rests[i], FUZZY_MODEL_TOKENS):
+                    owners.append(i)
+                    queries.append(text)
+            if not queries:
+                continue
+            scores = process.cdist(queries, table.choices, scorer=fuzz.ratio,
+                                   score_cutoff=MODEL_SCORE_CUTOFF, workers=-1)
+            best_choices = scores.argmax(axis=1)
+            for row, i in enumerate(owners):
+                choice = int(best_choices[row])
+                score = float(scores[row, choice])
+                if score and (models[i] is None or score > models[i][1]):
+                    models[i] = (table.choice_entries[choice], score)
+
+        results: Dict[str, Optional[BrandMatch]] = {}
+        for i, title in enumerate(titles):
+            brand = brands[i]
+            if brand is None:
+                self.stats["unmatched"] += 1
+                results[title] = None
+                continue
+            entry, score = brand[0], brand[3]
+            model_name = model_key = None
+            if models[i] is not None:
+                table = self.models[entry]
+                model_name, model_key = table.names[models[i][0]], table.keys[models[i][0]]
+                score = min(score, models[i][1])
+            self.stats["exact" if score == 100.0 else "fuzzy"] += 1
+            results[title] = BrandMatch(self.brands.names[entry], self.brands.keys[entry], model_name, model_key,
+                                        round(score, 1))
+        return results
+
+
+def _catalog_key(entries: Dict, table: Optional[_AliasTable], name: str, normalized_name: Optional[str]) -> str:
+    """Return the key of the dictionary entry a table row belongs to, or a new key for it."""
+    if normalized_name in entries:
+        return normalized_name
+    if table is not None:
+        for alias in (name, normalized_name):
+            tokens = tokenize(alias or "")
+            found = table.find(tokens)
+            if found and found[1:] == (0, len(tokens)):
+                return table.keys[found[0]]
+    return normalized_name or name.lower()
+
+
+def catalog_from_aliases() -> Dict[str, Tuple[str, Set[str], Dict[str, Tuple[str, Set[str]]]]]:
+    """Return ``CAR_ALIASES`` as a ``BrandMatcher`` catalog, named by the first alias."""
+    return {
+        brand_key: (aliases[0], set(aliases), {
+            model_key: (model_aliases[0], set(model_aliases))
+            for model_key, model_aliases in models.items()
+        })
+        for brand_key, (aliases, models) in CAR_ALIASES.items()
+    }
+
+
+_matcher: Optional[BrandMatcher] = None
+_matcher_loaded_at = 0.0
+_matcher_from_db = False
+
+
+def get_brand_matcher(db: Optional[Session] = None) -> BrandMatcher:
+    """Return the process's matcher, reloading it every ``MATCHER_TTL_SECONDS``.
+
+    Without ``db`` (e.g. in a worker process of the CPU executor) the matcher
+    only knows ``CAR_ALIASES``; the first call with a session loads the tables.
+    """
+    global _matcher, _matcher_loaded_at, _matcher_from_db
+    now = time.monotonic()
+    stale = now - _matcher_loaded_at > MATCHER_TTL_SECONDS
+    if _matcher is None or (db is not None and (stale or not _matcher_from_db)):
+        if db is not None:
+            _matcher = BrandMatcher.from_db(db)
+            _matcher_from_db = True
+        elif _matcher is None:
+            _matcher = BrandMatcher(catalog_from_aliases())
+        _matcher_loaded_at = now
+        logger.debug(f"Loaded brand matcher with {len(_matcher.brands.keys)} brands")
+    return _matcher
+
+
+def split_title(title: str) -> Tuple[str, str]:
+    """Return the (brand, model) of a card title, falling back to its first word as the brand."""
+    found = get_brand_matcher().match(title)
+    if found is None:
+        parts = title.split()
+        return (parts[0], " ".join(parts[1:])) if parts else ("", "")
+    return found.brand, found.model or ""
@@ -1,4 +1,5 @@
 from typing import List, Dict, Optional
+from sqlalchemy import func
 from sqlalchemy.orm import Session, joinedload
 from app.db.models.car import CarListing as CarListingModel, CarBrand, CarModel
 from app.schemas.car import CarListing
@@ -60,25 +61,31 @@ class CarService:
         Returns:
             Dictionary of available filters with their values
         """
-        # Get unique brands
-        brands = [b.name for b in db.query(CarBrand).distinct().all() if b.name]
-        
-        # Get unique models (for each brand)
-        models = {}
-        for brand_name in brands:
-            brand = db.query(CarBrand).filter(CarBrand.name == brand_name).first()
-            if brand:
-                brand_models = [m.name for m in db.query(CarModel)
-                                .filter(CarModel.brand_id == brand.id)
-                                .distinct().all() if m.name]
-                if brand_models:
-                    models[brand_name] = brand_models
+        # Brands and their models in one query instead of two per brand
+        brands = set()
+        models: Dict[str, List[str]] = {}
+        rows = (
+            db.query(CarBrand.name, CarModel.name)
+            .outerjoin(CarModel, CarModel.brand_id == CarBrand.id)
+            .distinct()
+            .all()
+        )
+        for brand_name, model_name in rows:
+            if not brand_name:
+                continue
+            brands.add(brand_name)
+            if model_name:
+                models.setdefault(brand_name, []).append(model_name)
         
         # Get min/max year and price
-        min_year = db.query(db.func.min(CarListingModel.year)).scalar() or 0
-        max_year = db.query(db.func.max(CarListingModel.year)).scalar() or 0
-        min_price = db.query(db.func.min(CarListingModel.price)).scalar() or 0
-        max_price = db.query(db.func.max(CarListingModel.price)).scalar() or 0
+        min_year, max_year, min_price, max_price = db.query(
+            func.min(CarListingModel.year),
+            func.max(CarListingModel.year),
+            func.min(CarListingModel.price),
+            func.max(CarListingModel.price)
+        ).one()
+        min_year, max_year = min_year or 0, max_year or 0
+        min_price, max_price = min_price or 0, max_price or 0
         
         return {
             'brands': sorted(brands),
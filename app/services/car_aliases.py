@@ -0,0 +1,174 @@
+"""
+Hebrew and English names of the car brands and models sold in Israel.
+
+Keys are the ``normalized_name`` of ``CarBrand``/``CarModel``; the first alias
+is the display name used when a brand or model is not in the database yet
+(Hebrew, as Yad2 shows it). ``BrandMatcher`` merges this dictionary with the
+``car_brands``/``car_models`` tables.
+"""
+from typing import Dict, List, Tuple
+
+# brand key -> ([aliases], {model key: [aliases]})
+CAR_ALIASES: Dict[str, Tuple[List[str], Dict[str, List[str]]]] = {
+    "toyota": (["טויוטה", "toyota"], {
+        "corolla": ["קורולה", "corolla"], "yaris": ["יאריס", "yaris"], "camry": ["קאמרי", "camry"],
+        "rav4": ["RAV4", "ראב 4", "rav 4"], "c_hr": ["C-HR", "סי אייץ' אר", "chr"], "prius": ["פריוס", "prius"],
+        "auris": ["אוריס", "auris"], "land_cruiser": ["לנד קרוזר", "land cruiser"], "hilux": ["היילקס", "hilux"],
+        "aygo": ["אייגו", "aygo"], "corolla_cross": ["קורולה קרוס", "corolla cross"], "bz4x": ["bZ4X"],
+    }),
+    "hyundai": (["יונדאי", "hyundai"], {
+        "i10": ["i10", "איי 10"], "i20": ["i20", "איי 20"], "i25": ["i25", "איי 25"], "i30": ["i30", "איי 30"],
+        "i35": ["i35", "איי 35"], "tucson": ["טוסון", "tucson"], "ioniq": ["איוניק", "ioniq"],
+        "ioniq_5": ["איוניק 5", "ioniq 5"], "kona": ["קונה", "kona"], "santa_fe": ["סנטה פה", "santa fe"],
+        "elantra": ["אלנטרה", "elantra"], "getz": ["גטס", "getz"], "accent": ["אקסנט", "accent"],
+        "bayon": ["באיון", "bayon"],
+    }),
+    "kia": (["קיה", "kia"], {
+        "picanto": ["פיקנטו", "picanto"], "rio": ["ריו", "rio"], "sportage": ["ספורטז'", "ספורטאז'", "sportage"],
+        "niro": ["נירו", "niro"], "ceed": ["סיד", "ceed", "cee'd"], "stonic": ["סטוניק", "stonic"],
+        "sorento": ["סורנטו", "sorento"], "forte": ["פורטה", "forte"], "ev6": ["EV6"], "xceed": ["אקסיד", "xceed"],
+    }),
+    "mazda": (["מאזדה", "mazda"], {
+        "2": ["2", "מאזדה 2"], "3": ["3", "מאזדה 3"], "6": ["6", "מאזדה 6"], "cx_3": ["CX-3"],
+        "cx_30": ["CX-30"], "cx_5": ["CX-5"], "cx_9": ["CX-9"], "mx_5": ["MX-5"],
+    }),
+    "skoda": (["סקודה", "skoda"], {
+        "octavia": ["אוקטביה", "octavia"], "fabia": ["פאביה", "fabia"], "superb": ["סופרב", "superb"],
+        "kodiaq": ["קודיאק", "kodiaq"], "karoq": ["קארוק", "karoq"], "kamiq": ["קאמיק", "kamiq"],
+        "rapid": ["ראפיד", "rapid"], "scala": ["סקאלה", "scala"], "enyaq": ["אניאק", "enyaq"],
+    }),
+    "mitsubishi": (["מיצובישי", "mitsubishi"], {
+        "outlander": ["אאוטלנדר", "outlander"], "space_star": ["ספייס סטאר", "space star"],
+        "asx": ["ASX"], "lancer": ["לנסר", "lancer"], "attrage": ["אטראז'", "attrage"],
+        "eclipse_cross": ["אקליפס קרוס", "eclipse cross"], "pajero": ["פג'רו", "pajero"],
+    }),
+    "honda": (["הונדה", "honda"], {
+        "civic": ["סיוויק", "civic"], "accord": ["אקורד", "accord"], "jazz": ["ג'אז", "jazz"],
+        "cr_v": ["CR-V"], "hr_v": ["HR-V"], "insight": ["אינסייט", "insight"],
+    }),
+    "volkswagen": (["פולקסווגן", "volkswagen", "vw"], {
+        "golf": ["גולף", "golf"], "polo": ["פולו", "polo"], "passat": ["פאסאט", "passat"],
+        "tiguan": ["טיגואן", "tiguan"], "jetta": ["ג'טה", "jetta"], "t_roc": ["טי רוק", "T-Roc"],
+        "touran": ["טוראן", "touran"], "up": ["אפ", "up"], "id_4": ["ID.4"], "caddy": ["קאדי", "caddy"],
+        "transporter": ["טרנספורטר", "transporter"],
+    }),
+    "nissan": (["ניסאן", "nissan"], {
+        "micra": ["מיקרה", "micra"], "qashqai": ["קשקאי", "qashqai"], "juke": ["ג'וק", "juke"],
+        "note": ["נוט", "note"], "x_trail": ["אקס טרייל", "X-Trail"], "leaf": ["ליף", "leaf"],
+        "sentra": ["סנטרה", "sentra"], "almera": ["אלמרה", "almera"],
+    }),
+    "suzuki": (["סוזוקי", "suzuki"], {
+        "swift": ["סוויפט", "swift"], "vitara": ["ויטרה", "vitara"], "baleno": ["בלנו", "baleno"],
+        "sx4": ["SX4", "אס איקס 4"], "alto": ["אלטו", "alto"], "ignis": ["איגניס", "ignis"],
+        "jimny": ["ג'ימני", "jimny"], "celerio": ["סלריו", "celerio"], "s_cross": ["אס קרוס", "S-Cross"],
+    }),
+    "chevrolet": (["שברולט", "chevrolet"], {
+        "spark": ["ספארק", "spark"], "cruze": ["קרוז", "cruze"], "malibu": ["מאליבו", "malibu"],
+        "aveo": ["אאוו", "aveo"], "trax": ["טראקס", "trax"], "captiva": ["קפטיבה", "captiva"],
+        "sonic": ["סוניק", "sonic"],
+    }),
+    "peugeot": (["פיג'ו", "peugeot"], {
+        "108": ["108"], "208": ["208"], "2008": ["2008"], "301": ["301"], "308": ["308"],
+        "3008": ["3008"], "5008": ["5008"], "508": ["508"], "partner": ["פרטנר", "partner"],
+    }),
+    "renault": (["רנו", "renault"], {
+        "clio": ["קליאו", "clio"], "megane": ["מגאן", "megane"], "captur": ["קפצ'ור", "captur"],
+        "kadjar": ["קדג'אר", "kadjar"], "zoe": ["זואי", "zoe"], "fluence": ["פלואנס", "fluence"],
+        "kangoo": ["קנגו", "kangoo"], "arkana": ["ארקנה", "arkana"],
+    }),
+    "subaru": (["סובארו", "subaru"], {
+        "impreza": ["אימפרזה", "impreza"], "forester": ["פורסטר", "forester"], "xv": ["XV"],
+        "outback": ["אאוטבק", "outback"], "legacy": ["לגאסי", "legacy"],
+    }),
+    "bmw": (["ב.מ.וו", "במוו", "bmw"], {
+        "1_series": ["סדרה 1", "series 1", "1 series"], "2_series": ["סדרה 2", "series 2"],
+        "3_series": ["סדרה 3", "series 3", "3 series"], "5_series": ["סדרה 5", "series 5", "5 series"],
+        "x1": ["X1"], "x3": ["X3"], "x5": ["X5"], "i3": ["i3"], "ix": ["iX"],
+    }),
+    "mercedes": (["מרצדס", "mercedes", "mercedes-benz", "מרצדס בנץ"], {
+        "a_class": ["A-Class", "A קלאס", "A"], "c_class": ["C-Class", "C קלאס", "C"],
+        "e_class": ["E-Class", "E קלאס", "E"], "gla": ["GLA"], "glc": ["GLC"], "cla": ["CLA"],
+        "vito": ["ויטו", "vito"], "sprinter": ["ספרינטר", "sprinter"],
+    }),
+    "audi": (["אאודי", "audi"], {
+        "a1": ["A1"], "a3": ["A3"], "a4": ["A4"], "a6": ["A6"], "q2": ["Q2"], "q3": ["Q3"],
+        "q5": ["Q5"], "q7": ["Q7"], "e_tron": ["e-tron", "אי טרון"],
+    }),
+    "seat": (["סיאט", "seat"], {
+        "ibiza": ["איביזה", "ibiza"], "leon": ["לאון", "leon"], "arona": ["ארונה", "arona"],
+        "ateca": ["אטקה", "ateca"], "tarraco": ["טרקו", "tarraco"],
+    }),
+    "ford": (["פורד", "ford"], {
+        "focus": ["פוקוס", "focus"], "fiesta": ["פיאסטה", "fiesta"], "kuga": ["קוגה", "kuga"],
+        "mondeo": ["מונדאו", "mondeo"], "ecosport": ["אקוספורט", "ecosport"], "transit": ["טרנזיט", "transit"],
+        "mustang": ["מוסטנג", "mustang"], "puma": ["פומה", "puma"],
+    }),
+    "tesla": (["טסלה", "tesla"], {
+        "model_3": ["Model 3", "מודל 3"], "model_y": ["Model Y", "מודל Y"], "model_s": ["Model S", "מודל S"],
+        "model_x": ["Model X", "מודל X"],
+    }),
+    "volvo": (["וולוו", "volvo"], {
+        "xc40": ["XC40"], "xc60": ["XC60"], "xc90": ["XC90"], "s60": ["S60"], "v40": ["V40"],
+    }),
+    "lexus": (["לקסוס", "lexus"], {
+        "nx": ["NX"], "rx": ["RX"], "ux": ["UX"], "is": ["IS"], "ct": ["CT"], "es": ["ES"],
+    }),
+    "jeep": (["ג'יפ", "jeep"], {
+        "renegade": ["רנגייד", "renegade"], "compass": ["קומפאס", "compass"],
+        "cherokee": ["צ'ירוקי", "cherokee"], "grand_cherokee": ["גרנד צ'ירוקי", "grand cherokee"],
+        "wrangler": ["רנגלר", "wrangler"],
+    }),
+    "dacia": (["דאצ'יה", "dacia"], {
+        "duster": ["דאסטר", "duster"], "sandero": ["סנדרו", "sandero"], "logan": ["לוגאן", "logan"],
+        "jogger": ["ג'וגר", "jogger"], "spring": ["ספרינג", "spring"],
+    }),
+    "fiat": (["פיאט", "fiat"], {
+        "500": ["500"], "500x": ["500X"], "panda": ["פנדה", "panda"], "tipo": ["טיפו", "tipo"],
+        "punto": ["פונטו", "punto"], "doblo": ["דובלו", "doblo"],
+    }),
+    "citroen": (["סיטרואן", "citroen"], {
+        "c3": ["C3"], "c4": ["C4"], "c5_aircross": ["C5 איירקרוס", "C5 Aircross"], "berlingo": ["ברלינגו", "berlingo"],
+        "c_elysee": ["C-Elysee", "סי אליזה"],
+    }),
+    "opel": (["אופל", "opel"], {
+        "corsa": ["קורסה", "corsa"], "astra": ["אסטרה", "astra"], "mokka": ["מוקה", "mokka"],
+        "insignia": ["אינסיגניה", "insignia"], "crossland": ["קרוסלנד", "crossland"],
+    }),
+    "mini": (["מיני", "mini"], {
+        "cooper": ["קופר", "cooper"], "countryman": ["קאנטרימן", "countryman"], "one": ["וואן", "one"],
+    }),
+    "land_rover": (["לנד רובר", "land rover"], {
+        "range_rover": ["ריינג' רובר", "range rover"], "evoque": ["איווק", "evoque"],
+        "discovery": ["דיסקברי", "discovery"], "defender": ["דיפנדר", "defender"],
+    }),
+    "alfa_romeo": (["אלפא רומיאו", "alfa romeo"], {
+        "giulia": ["ג'וליה", "giulia"], "giulietta": ["ג'ולייטה", "giulietta"], "stelvio": ["סטלביו", "stelvio"],
+    }),
+    "porsche": (["פורשה", "porsche"], {
+        "cayenne": ["קאיין", "cayenne"], "macan": ["מקאן", "macan"], "911": ["911"], "taycan": ["טייקאן", "taycan"],
+    }),
+    "mg": (["אם ג'י", "MG"], {
+        "zs": ["ZS"], "hs": ["HS"], "mg4": ["MG4", "4"], "mg5": ["MG5", "5"], "marvel_r": ["מארוול R", "marvel r"],
+    }),
+    "chery": (["צ'רי", "chery"], {
+        "tiggo_7": ["טיגו 7", "tiggo 7"], "tiggo_8": ["טיגו 8", "tiggo 8"], "arrizo": ["אריזו", "arrizo"],
+    }),
+    "geely": (["ג'ילי", "geely"], {
+        "geometry_c": ["ג'ומטרי C", "geometry c"], "coolray": ["קולריי", "coolray"],
+    }),
+    "byd": (["BYD", "בי ווי די"], {
+        "atto_3": ["אטו 3", "atto 3"], "dolphin": ["דולפין", "dolphin"], "seal": ["סיל", "seal"], "han": ["האן", "han"],
+    }),
+    "cupra": (["קופרה", "cupra"], {
+        "formentor": ["פורמנטור", "formentor"], "born": ["בורן", "born"],
+    }),
+    "dodge": (["דודג'", "dodge"], {
+        "ram": ["ראם", "ram"], "journey": ["ג'רני", "journey"],
+    }),
+    "infiniti": (["אינפיניטי", "infiniti"], {
+        "q30": ["Q30"], "q50": ["Q50"], "qx50": ["QX50"],
+    }),
+    "ssangyong": (["סאנגיונג", "ssangyong"], {
+        "korando": ["קורנדו", "korando"], "tivoli": ["טיבולי", "tivoli"], "rexton": ["רקסטון", "rexton"],
+    }),
+}
@@ -0,0 +1,375 @@
+"""
+Duplicate detection: the same car posted as several ads.
+
+A car is often reposted, or listed by several dealers, under different ids.
+Listings are linked into clusters of likely duplicates as they are stored,
+without ever comparing all pairs:
+
+- Blocking: duplicates share brand, model and year (the ``block_key``), and
+  their mileage and price are at most one bucket (``DEDUPE_MILEAGE_BUCKET``,
+  ``DEDUPE_PRICE_BUCKET``) apart.
+- MinHash: each listing gets a signature of ``DEDUPE_NUM_PERM`` minima over the
+  character 4-grams of its title and description (without the brand, model and
+  year words, which every listing of the block shares) and its image URL. The
+  share of equal minima estimates the Jaccard similarity of two listings.
+- LSH: the signature is cut into ``DEDUPE_BANDS`` bands, each hashed together
+  with the block key into ``listing_lsh_bands``. Only listings sharing a band
+  (or the same image) are candidates, found with one indexed lookup per batch.
+  Bands shared by more than ``MAX_BAND_SIZE`` listings (a placeholder image,
+  boilerplate text) are ignored.
+
+Candidates with an estimated similarity of ``DEDUPE_THRESHOLD`` or the same
+image are duplicates. Clusters are stored as ``car_listings.cluster_id``, the
+lowest listing id of the cluster (NULL for a listing without duplicates), and
+only ever merge; ``rebuild`` recomputes them from scratch. Listings whose
+images are the same photo are linked too (``link_pairs``, see
+``app.services.images``), as long as their price and mileage are near.
+
+Usage:
+    python -m app.services.dedupe rebuild [--chunk-size 2000]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import re
+import zlib
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, delete, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import CarBrand, CarListing, CarModel, ListingBand, ListingSignature
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_SIZE = 4
+# The image counts as this many shingles: enough that a different picture
+# outweighs a short boilerplate description shared by unrelated ads
+IMAGE_WEIGHT = 8
+# A band shared by more listings than this is boilerplate, not evidence
+MAX_BAND_SIZE = 100
+REBUILD_CHUNK_SIZE = 2000
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+")
+_LOOKUP_CHUNK = 500
+
+
+@lru_cache(maxsize=4)
+def _permutations(num_perm: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Fixed seed: signatures must be comparable across processes and runs
+    rng = np.random.RandomState(1)
+    a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def _normalize_image(image_url: Optional[str]) -> Optional[str]:
+    # Resized variants of the same picture differ only in the query string
+    if not image_url:
+        return None
+    image = image_url.split("?", 1)[0].split("#", 1)[0].lower()
+    return image.split("://", 1)[-1] or None
+
+
+def shingles(title: Optional[str], description: Optional[str], image_url: Optional[str],
+             block_words: Iterable[str] = ()) -> Set[int]:
+    """32-bit hashes of a listing's text 4-grams and image, the set its MinHash is computed over."""
+    skip = {word.lower() for word in block_words}
+    words = [word for word in _WORD.findall(f"{title or ''} {description or ''}".lower()) if word not in skip]
+    text = " ".join(words)
+    grams = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)} or ({text} if text else set())
+    hashes = {zlib.crc32(gram.encode("utf-8")) for gram in grams}
+    image = _normalize_image(image_url)
+    if image:
+        hashes.update(zlib.crc32(f"{i}|{image}".encode("utf-8")) for i in range(IMAGE_WEIGHT))
+    return hashes
+
+
+def minhash(hashes: Set[int], num_perm: Optional[int] = None) -> np.ndarray:
+    """MinHash signature (uint32 minima) of a set of 32-bit hashes."""
+    a, b = _permutations(num_perm or settings.DEDUPE_NUM_PERM)
+    values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+    # a * x + b stays below 2**64 for 32-bit a, x and b
+    permuted = (np.outer(a, values) + b[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def similarity(left: np.ndarray, right: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    return float(np.count_nonzero(left == right)) / len(left)
+
+
+def _hash64(*parts: bytes) -> int:
+    digest = hashlib.blake2b(b"|".join(parts), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def band_hashes(block_key: str, signature: np.ndarray, image_url: Optional[str] = None) -> List[int]:
+    """LSH keys of a signature: one per band, plus one for the image."""
+    rows = len(signature) // settings.DEDUPE_BANDS
+    key = block_key.encode("utf-8")
+    hashes = [
+        _hash64(key, str(band).encode(), signature[band * rows:(band + 1) * rows].tobytes())
+        for band in range(settings.DEDUPE_BANDS)
+    ]
+    image = _normalize_image(image_url)
+    if image:
+        hashes.append(_image_hash(block_key, image))
+    return hashes
+
+
+def _image_hash(block_key: str, image: str) -> int:
+    return _hash64(block_key.encode("utf-8"), b"image", image.encode("utf-8"))
+
+
+def _bucket(value: Optional[float], size: int) -> Optional[int]:
+    return int(value // size) if value is not None else None
+
+
+def _near(left: Optional[int], right: Optional[int]) -> bool:
+    return left is None or right is None or abs(left - right) <= 1
+
+
+def _listing_rows(db: Session, *criteria) -> List[Any]:
+    query = (
+        select(CarListing.id, CarListing.title, CarListing.description, CarListing.image_url,
+               CarListing.price, CarListing.mileage, CarListing.year, CarListing.brand_id,
+               CarListing.model_id, CarListing.cluster_id,
+               CarBrand.name.label("brand"), CarModel.name.label("model"))
+        .join(CarBrand, CarBrand.id == CarListing.brand_id)
+        .join(CarModel, CarModel.id == CarListing.model_id)
+        .where(*criteria)
+        .order_by(CarListing.id)
+    )
+    return db.execute(query).all()
+
+
+def index_listings(db: Session, yad2_ids: List[str]) -> Dict[str, int]:
+    """Compute the signatures of stored listings and link them to their duplicates.
+
+    Called by the ingest after each upsert with the new and changed listings.
+
+    Returns:
+        Dict with the listings ``indexed`` and the clusters they were ``linked`` into
+    """
+    rows = []
+    for i in range(0, len(yad2_ids), _LOOKUP_CHUNK):
+        rows.extend(_listing_rows(db, CarListing.yad2_id.in_(yad2_ids[i:i + _LOOKUP_CHUNK])))
+    return _index(db, rows)
+
+
+def _index(db: Session, rows: List[Any]) -> Dict[str, int]:
+    entries: Dict[int, Dict[str, Any]] = {}
+    for row in rows:
+        block_words = [row.brand or "", row.model or "", str(row.year)]
+        hashes = shingles(row.title, row.description, row.image_url, block_words)
+        if not hashes:
+            continue
+        block_key = f"{row.brand_id}:{row.model_id}:{row.year}"
+        signature = minhash(hashes)
+        image = _normalize_image(row.image_url)
+        entries[row.id] = {
+            "block_key": block_key,
+            "mileage_bucket": _bucket(row.mileage, settings.DEDUPE_MILEAGE_BUCKET),
+            "price_bucket": _bucket(row.price, settings.DEDUPE_PRICE_BUCKET),
+            "signature": signature,
+            "image": _image_hash(block_key, image) if image else None,
+            "bands": band_hashes(block_key, signature, row.image_url),
+            "cluster_id": row.cluster_id,
+        }
+    if not entries:
+        return {"indexed": 0, "linked": 0}
+
+    try:
+        ids = list(entries)
+        db.execute(delete(ListingBand).where(ListingBand.listing_id.in_(ids)))
+        db.execute(delete(ListingSignature).where(ListingSignature.listing_id.in_(ids)))
+
+        # Listings per band: the stored ones, then this batch
+        members: Dict[int, List[int]] = {}
+        all_bands = list({band for entry in entries.values() for band in entry["bands"]})
+        for i in range(0, len(all_bands), _LOOKUP_CHUNK):
+            query = select(ListingBand.band_hash, ListingBand.listing_id).where(
+                ListingBand.band_hash.in_(all_bands[i:i + _LOOKUP_CHUNK])
+            )
+            for band, listing_id in db.execute(query):
+                members.setdefault(band, []).append(listing_id)
+        for listing_id, entry in entries.items():
+            for band in entry["bands"]:
+                members.setdefault(band, []).append(listing_id)
+
+        pairs = set()
+        for listing_id, entry in entries.items():
+            for band in entry["bands"]:
+                shared = members[band]
+                if len(shared) <= MAX_BAND_SIZE:
+                    pairs.update((min(listing_id, other), max(listing_id, other))
+                                 for other in shared if other != listing_id)
+
+        stored = _stored_signatures(db, {other for pair in pairs for other in pair if other not in entries})
+        candidates = {**stored, **entries}
+        duplicates = [(left, right) for left, right in pairs if _is_duplicate(candidates[left], candidates[right])]
+        linked = _link(db, duplicates, candidates)
+
+        db.execute(insert(ListingSignature), [
+            {"listing_id": listing_id, "block_key": entry["block_key"],
+             "mileage_bucket": entry["mileage_bucket"], "price_bucket": entry["price_bucket"],
+             "signature": entry["signature"].astype("<u4").tobytes()}
+            for listing_id, entry in entries.items()
+        ])
+        db.execute(insert(ListingBand), [
+            {"band_hash": band, "listing_id": listing_id}
+            for listing_id, entry in entries.items() for band in set(entry["bands"])
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {"indexed": len(entries), "linked": linked}
+
+
+def _stored_signatures(db: Session, listing_ids: Set[int]) -> Dict[int, Dict[str, Any]]:
+    ids = list(listing_ids)
+    stored = {}
+    for i in range(0, len(ids), _LOOKUP_CHUNK):
+        query = (
+            select(ListingSignature.listing_id, ListingSignature.block_key, ListingSignature.mileage_bucket,
+                   ListingSignature.price_bucket, ListingSignature.signature,
+                   CarListing.image_url, CarListing.cluster_id)
+            .join(CarListing, CarListing.id == ListingSignature.listing_id)
+            .where(ListingSignature.listing_id.in_(ids[i:i + _LOOKUP_CHUNK]))
+        )
+        for row in db.execute(query):
+            image = _normalize_image(row.image_url)
+            stored[row.listing_id] = {
+                "block_key": row.block_key,
+                "mileage_bucket": row.mileage_bucket,
+                "price_bucket": row.price_bucket,
+                "signature": np.frombuffer(row.signature, dtype="<u4"),
+                "image": _image_hash(row.block_key, image) if image else None,
+                "cluster_id": row.cluster_id,
+            }
+    return stored
+
+
+def _is_duplicate(left: Dict[str, Any], right: Dict[str, Any]) -> bool:
+    if left["block_key"] != right["block_key"]:
+        return False
+    if not (_near(left["mileage_bucket"], right["mileage_bucket"])
+            and _near(left["price_bucket"], right["price_bucket"])):
+        return False
+    if left["image"] is not None and left["image"] == right["image"]:
+        return True
+    return similarity(left["signature"], right["signature"]) >= settings.DEDUPE_THRESHOLD
+
+
+def _link(db: Session, duplicates: List[Tuple[int, int]], listings: Dict[int, Dict[str, Any]]) -> int:
+    """Merge the clusters of the duplicate pairs; return the number of clusters written."""
+    # Union-find over cluster keys: a listing's cluster id, or its own id if it has none
+    parent: Dict[int, int] = {}
+
+    def find(key: int) -> int:
+        while parent.setdefault(key, key) != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for left, right in duplicates:
+        roots = sorted((find(listings[left]["cluster_id"] or left), find(listings[right]["cluster_id"] or right)))
+        parent[roots[1]] = roots[0]
+
+    if not parent:
+        return 0
+    # The root is the lowest id of its component, so it is the merged cluster's id;
+    # each key is the id of a listing and of the cluster it headed, if any
+    table = CarListing.__table__
+    db.execute(
+        update(table)
+        .where(or_(table.c.cluster_id == bindparam("key"), table.c.id == bindparam("key")))
+        .values(cluster_id=bindparam("root")),
+        [{"key": key, "root": find(key)} for key in list(parent)]
+    )
+    return len({find(key) for key in parent})
+
+
+def link_pairs(db: Session, pairs: Iterable[Tuple[int, int]]) -> int:
+    """Merge the clusters of listing pairs matched by other evidence (``app.services.images``).
+
+    Pairs more than one price or mileage bucket apart are left alone, as in
+    ``_is_duplicate``. Does not commit.
+
+    Returns:
+        The number of clusters written
+    """
+    pairs = list(pairs)
+    ids = list({listing_id for pair in pairs for listing_id in pair})
+    listings: Dict[int, Dict[str, Any]] = {}
+    for i in range(0, len(ids), _LOOKUP_CHUNK):
+        query = select(CarListing.id, CarListing.price, CarListing.mileage, CarListing.cluster_id).where(
+            CarListing.id.in_(ids[i:i + _LOOKUP_CHUNK])
+        )
+        for row in db.execute(query):
+            listings[row.id] = {
+                "mileage_bucket": _bucket(row.mileage, settings.DEDUPE_MILEAGE_BUCKET),
+                "price_bucket": _bucket(row.price, settings.DEDUPE_PRICE_BUCKET),
+                "cluster_id": row.cluster_id,
+            }
+    duplicates = [
+        (left, right) for left, right in pairs
+        if left in listings and right in listings
+        and _near(listings[left]["mileage_bucket"], listings[right]["mileage_bucket"])
+        and _near(listings[left]["price_bucket"], listings[right]["price_bucket"])
+    ]
+    return _link(db, duplicates, listings)
+
+
+def rebuild(db: Session, chunk_size: int = REBUILD_CHUNK_SIZE) -> Dict[str, int]:
+    """Drop every signature and cluster and index all listings again, in ``id`` order."""
+    db.execute(delete(ListingBand))
+    db.execute(delete(ListingSignature))
+    db.execute(update(CarListing).where(CarListing.cluster_id.isnot(None)).values(cluster_id=None))
+    db.commit()
+
+    counts = {"scanned": 0, "indexed": 0, "linked": 0}
+    last_id = 0
+    while True:
+        ids = db.execute(
+            select(CarListing.id).where(CarListing.id > last_id).order_by(CarListing.id).limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            break
+        last_id = ids[-1]
+        result = _index(db, _listing_rows(db, CarListing.id.in_(ids)))
+        counts["scanned"] += len(ids)
+        counts["indexed"] += result["indexed"]
+        counts["linked"] += result["linked"]
+        logger.info(f"Dedupe rebuild at listing {last_id}: {counts}")
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Duplicate listing detection")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = commands.add_parser("rebuild", help="Recompute every signature and cluster")
+    rebuild_parser.add_argument("--chunk-size", type=int, default=REBUILD_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    from app.db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        result = rebuild(db, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+"""
+Perceptual hashing of listing images: the same photo behind different URLs.
+
+``app.services.dedupe`` only recognizes a reposted picture by its URL, but a
+car reposted as a new ad usually comes with the photo uploaded again: a new
+URL, and often a new size or compression. This module hashes what the images
+look like instead:
+
+- Fetching: ``fetch_images`` downloads ``IMAGE_FETCH_CONCURRENCY`` images at a
+  time through one aiohttp session, into an on-disk cache keyed by URL
+  (``IMAGE_CACHE_DIR``). Images that are gone for good (4xx, larger than
+  ``IMAGE_MAX_BYTES``) are cached as empty files and never asked for again.
+  After a timeout or server error the listing waits ``IMAGE_RETRY_MINUTES``,
+  doubled after each further failure (``image_retry_at``), so listings whose
+  image host is down do not take the head of every newest-first run; after
+  ``IMAGE_FETCH_MAX_ATTEMPTS`` failures it counts as having no usable image.
+  With ``SCRAPING_REPLAY_URL`` set, images are requested from the stub server too.
+- Hashing: a 64-bit difference hash (dHash) of the image shrunk to 9x8 gray
+  pixels, one bit per pair of neighbouring pixels, set when the right one is
+  brighter. Resizing, recompression and small edits flip a few bits, another
+  photo about half of them. JPEGs are decoded at a reduced scale
+  (``Image.draft``), on the CPU executor.
+- Index: the hash is stored in ``car_listings.image_hash`` and cut into
+  ``IMAGE_HASH_BANDS`` bands in ``listing_image_bands``, each hashed with the
+  block key (brand, model, year). Hashes at most ``IMAGE_HASH_BANDS - 1`` bits
+  apart share at least one band, so one indexed lookup finds every listing of
+  the block within ``IMAGE_HASH_MAX_DISTANCE`` bits, and only those candidates
+  are compared. As in ``dedupe``, bands shared by more than ``MAX_BAND_SIZE``
+  listings (a placeholder picture) are ignored.
+
+Listings whose images match are linked into the duplicate clusters
+(``dedupe.link_pairs``). A listing whose ``image_url`` changes is hashed again
+(``ingest.upsert_rows`` clears ``image_hashed_at``); a new hash far from the
+previous one is counted as a ``changed`` photo.
+
+Celery beat runs ``hash_pending`` every ``IMAGE_HASH_MINUTES`` when
+``IMAGE_HASH_ENABLED`` is set. Hashing needs Pillow (``pip install Pillow``).
+``dedupe rebuild`` forgets the image links; ``relink`` restores them.
+
+Usage:
+    python -m app.services.images hash [--limit 500]
+    python -m app.services.images relink [--chunk-size 2000]
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import aiohttp
+import numpy as np
+from sqlalchemy import bindparam, delete, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.executor import CPUExecutor, get_executor
+from app.db.models import CarListing, ListingImageBand
+from app.db.session import SessionLocal
+from app.scrapers.replay import rewrite_url
+from app.services.dedupe import MAX_BAND_SIZE, REBUILD_CHUNK_SIZE, link_pairs
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8  # 8 rows of 8 differences: 64 bits
+_MASK = (1 << 64) - 1
+_GONE = b""  # cached for an image that cannot be fetched for good
+_LOOKUP_CHUNK = 500
+_READ_CHUNK = 64 * 1024
+
+
+class ImageCache:
+    """Fetched images on disk, one file per URL; an empty file for an image that is gone."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def _file(self, url: str) -> str:
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, digest[:2], digest)
+
+    def get(self, url: str) -> Optional[bytes]:
+        """Return the cached body of an image, or None if it was never fetched."""
+        try:
+            with open(self._file(url), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, url: str, data: bytes) -> None:
+        """Store the body of an image atomically, so a crash never leaves a torn file."""
+        path = self._file(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+async def _fetch(session: aiohttp.ClientSession, url: str) -> Optional[bytes]:
+    try:
+        async with session.get(rewrite_url(url)) as response:
+            if response.status == 429 or response.status >= 500:
+                logger.warning(f"Image {url} returned {response.status}, will retry")
+                return None
+            if response.status >= 400:
+                logger.debug(f"Image {url} returned {response.status}")
+                return _GONE
+            if (response.content_length or 0) > settings.IMAGE_MAX_BYTES:
+                return _GONE
+            body = bytearray()
+            async for chunk in response.content.iter_chunked(_READ_CHUNK):
+                body.extend(chunk)
+                if len(body) > settings.IMAGE_MAX_BYTES:
+                    return _GONE
+            return bytes(body)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning(f"Could not fetch image {url}: {str(e) or type(e).__name__}")
+        return None
+
+
+async def fetch_images(urls: Iterable[str], cache: Optional[ImageCache] = None,
+                       concurrency: Optional[int] = None) -> Dict[str, Optional[bytes]]:
+    """Download images through the cache, a bounded number at a time.
+
+    Args:
+        urls: Image URLs; duplicates are fetched once
+        cache: Cache to read and fill (default: ``IMAGE_CACHE_DIR``)
+        concurrency: Downloads in flight (default: ``IMAGE_FETCH_CONCURRENCY``)
+
+    Returns:
+        The body of each URL: empty when the image is gone for good, None when
+        the download failed and may be retried
+    """
+    cache = cache or ImageCache(settings.IMAGE_CACHE_DIR)
+    bodies: Dict[str, Optional[bytes]] = {}
+    missing = []
+    for url in dict.fromkeys(urls):
+        body = cache.get(url)
+        if body is None:
+            missing.append(url)
+        else:
+            bodies[url] = body
+    if not missing:
+        return bodies
+
+    concurrency = concurrency or settings.IMAGE_FETCH_CONCURRENCY
+    # aiohttp's timeout includes the wait for a pooled connection, so the
+    # downloads are bounded here: a request's clock starts when it is sent
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(url: str) -> Optional[bytes]:
+        async with semaphore:
+            return await _fetch(session, url)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=settings.IMAGE_FETCH_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        fetched = await asyncio.gather(*(fetch(url) for url in missing))
+    for url, body in zip(missing, fetched):
+        if body is not None:
+            cache.put(url, body)
+        bodies[url] = body
+    return bodies
+
+
+def dhash(data: bytes) -> int:
+    """64-bit difference hash of an image, as a signed integer (it is stored as BIGINT).
+
+    Raises:
+        ImportError: Pillow is not installed
+        OSError: The data is not an image Pillow can decode
+    """
+    if Image is None:
+        raise ImportError("Image hashing needs Pillow (pip install Pillow)")
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEGs decode straight to a fraction of their size, which is most of the cost
+        image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+        small = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big", signed=True)
+
+
+def hash_images(images: List[bytes]) -> List[Optional[int]]:
+    """dHash of each image, None for one that cannot be decoded. Runs on the CPU executor."""
+    hashes: List[Optional[int]] = []
+    for data in images:
+        try:
+            hashes.append(dhash(data))
+        except ImportError:
+            raise
+        except Exception as e:
+            # Truncated, corrupt or not an image at all; also Pillow's decompression bomb check
+            logger.debug(f"Could not decode image: {str(e)}")
+            hashes.append(None)
+    return hashes
+
+
+def distance(left: int, right: int) -> int:
+    """Number of differing bits of two image hashes."""
+    return ((left ^ right) & _MASK).bit_count()
+
+
+def band_hashes(block_key: str, image_hash: int) -> List[int]:
+    """Index keys of an image hash: one per band of its bits, each with the block key."""
+    bands = settings.IMAGE_HASH_BANDS
+    value = image_hash & _MASK
+    bounds = [64 * band // bands for band in range(bands + 1)]
+    key = block_key.encode("utf-8")
+    hashes = []
+    for band in range(bands):
+        bits = (value >> bounds[band]) & ((1 << (bounds[band + 1] - bounds[band])) - 1)
+        digest = hashlib.blake2b(b"|".join((key, b"dhash", str(band).encode(), str(bits).encode())),
+                                 digest_size=8).digest()
+        hashes.append(int.from_bytes(digest, "big", signed=True))
+    return hashes
+
+
+def _block_key(row: Any) -> str:
+    return f"{row.brand_id}:{row.model_id}:{row.year}"
+
+
+def _listing_rows(db: Session, *criteria, limit: Optional[int] = None, newest_first: bool = False) -> List[Any]:
+    query = (
+        select(CarListing.id, CarListing.image_url, CarListing.image_hash, CarListing.image_fetch_failures,
+               CarListing.brand_id, CarListing.model_id, CarListing.year)
+        .where(*criteria)
+        .order_by(CarListing.id.desc() if newest_first else CarListing.id)
+        .limit(limit)
+    )
+    return db.execute(query).all()
+
+
+def _matches(db: Session, entries: Dict[int, Tuple[str, int]],
+             max_distance: Optional[int] = None) -> List[Tuple[int, int, int]]:
+    """Stored and in-batch listings whose image is within ``max_distance`` of an entry's.
+
+    Args:
+        entries: ``{listing id: (block key, image hash)}``
+        max_distance: Most differing bits (default: ``IMAGE_HASH_MAX_DISTANCE``)
+
+    Returns:
+        ``(listing id, other listing id, distance)`` triples, each pair once
+    """
+    if max_distance is None:
+        max_distance = settings.IMAGE_HASH_MAX_DISTANCE
+    bands = {listing_id: band_hashes(block_key, image_hash) for listing_id, (block_key, image_hash) in entries.items()}
+
+    # Listings per band: the stored ones, then this batch
+    members: Dict[int, Set[int]] = {}
+    all_bands = list({band for listing_bands in bands.values() for band in listing_bands})
+    for i in range(0, len(all_bands), _LOOKUP_CHUNK):
+        query = select(ListingImageBand.band_hash, ListingImageBand.listing_id).where(
+            ListingImageBand.band_hash.in_(all_bands[i:i + _LOOKUP_CHUNK])
+        )
+        for band, listing_id in db.execute(query):
+            members.setdefault(band, set()).add(listing_id)
+    for listing_id, listing_bands in bands.items():
+        for band in listing_bands:
+            members.setdefault(band, set()).add(listing_id)
+
+    candidates: Set[Tuple[int, int]] = set()
+    for listing_id, listing_bands in bands.items():
+        for band in listing_bands:
+            shared = members[band]
+            if len(shared) <= MAX_BAND_SIZE:
+                candidates.update((min(listing_id, other), max(listing_id, other))
+                                  for other in shared if other != listing_id)
+
+    hashes = {listing_id: image_hash for listing_id, (_, image_hash) in entries.items()}
+    stored = list({other for pair in candidates for other in pair if other not in hashes})
+    for i in range(0, len(stored), _LOOKUP_CHUNK):
+        query = select(CarListing.id, CarListing.image_hash).where(CarListing.id.in_(stored[i:i + _LOOKUP_CHUNK]))
+        hashes.update((listing_id, image_hash) for listing_id, image_hash in db.execute(query)
+                      if image_hash is not None)
+
+    matches = []
+    for left, right in candidates:
+        if left in hashes and right in hashes:
+            bits = distance(hashes[left], hashes[right])
+            if bits <= max_distance:
+                matches.append((left, right, bits))
+    return matches
+
+
+async def hash_pending(db: Session, limit: Optional[int] = None, cache: Optional[ImageCache] = None,
+                       executor: Optional[CPUExecutor] = None) -> Dict[str, int]:
+    """Fetch and hash the images of the listings not hashed yet, newest first, and link the matches.
+
+    Listings waiting out the backoff of a failed download are skipped.
+
+    Args:
+        db: Database session
+        limit: Most listings to hash (default: ``IMAGE_HASH_BATCH_SIZE``)
+        cache: Image cache (default: ``IMAGE_CACHE_DIR``)
+        executor: CPU executor for the decoding (default: ``get_executor()``)
+
+    Returns:
+        Dict with the listings ``hashed``, ``failed`` (retried after a backoff) and
+        ``gone`` (no usable image), the photos ``changed`` and the clusters ``linked``
+    """
+    if Image is None:
+        raise ImportError("Image hashing needs Pillow (pip install Pillow)")
+    now = datetime.utcnow()
+    rows = _listing_rows(
+        db, CarListing.image_url.isnot(None), CarListing.image_hashed_at.is_(None),
+        or_(CarListing.image_retry_at.is_(None), CarListing.image_retry_at <= now),
+        limit=limit or settings.IMAGE_HASH_BATCH_SIZE, newest_first=True
+    )
+    counts = {"hashed": 0, "failed": 0, "gone": 0, "changed": 0, "linked": 0}
+    if not rows:
+        return counts
+
+    bodies = await fetch_images([row.image_url for row in rows], cache)
+    images = [url for url, body in bodies.items() if body]
+    executor = executor or get_executor()
+    size = settings.CPU_EXECUTOR_BATCH_SIZE
+    chunks = [images[i:i + size] for i in range(0, len(images), size)]
+    results = await asyncio.gather(*(executor.run(hash_images, [bodies[url] for url in chunk]) for chunk in chunks))
+    hashes = {url: image_hash for chunk, chunk_hashes in zip(chunks, results)
+              for url, image_hash in zip(chunk, chunk_hashes)}
+
+    updates, retries, entries = [], [], {}
+    for row in rows:
+        if bodies[row.image_url] is None:
+            failures = row.image_fetch_failures + 1
+            if failures < settings.IMAGE_FETCH_MAX_ATTEMPTS:
+                counts["failed"] += 1
+                wait = timedelta(minutes=settings.IMAGE_RETRY_MINUTES * 2 ** (failures - 1))
+                retries.append({"key": row.id, "failures": failures, "retry_at": now + wait})
+                continue
+            logger.info(f"Giving up on image {row.image_url} after {failures} failed downloads")
+        image_hash = hashes.get(row.image_url)
+        updates.append({"key": row.id, "image_hash": image_hash, "hashed_at": now})
+        if image_hash is None:
+            counts["gone"] += 1
+            continue
+        counts["hashed"] += 1
+        if row.image_hash is not None and distance(row.image_hash, image_hash) > settings.IMAGE_HASH_MAX_DISTANCE:
+            counts["changed"] += 1
+        entries[row.id] = (_block_key(row), image_hash)
+
+    try:
+        table = CarListing.__table__
+        if retries:
+            db.execute(
+                update(table).where(table.c.id == bindparam("key"))
+                .values(image_fetch_failures=bindparam("failures"), image_retry_at=bindparam("retry_at")),
+                retries
+            )
+        if updates:
+            db.execute(
+                update(table).where(table.c.id == bindparam("key"))
+                .values(image_hash=bindparam("image_hash"), image_hashed_at=bindparam("hashed_at"),
+                        image_fetch_failures=0, image_retry_at=None),
+                updates
+            )
+            db.execute(delete(ListingImageBand).where(
+                ListingImageBand.listing_id.in_([values["key"] for values in updates])
+            ))
+        if entries:
+            matches = _matches(db, entries)
+            counts["linked"] = link_pairs(db, [(left, right) for left, right, _ in matches])
+            db.execute(insert(ListingImageBand), [
+                {"band_hash": band, "listing_id": listing_id}
+                for listing_id, (block_key, image_hash) in entries.items()
+                for band in set(band_hashes(block_key, image_hash))
+            ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.info(f"Hashed listing images: {counts}")
+    return counts
+
+
+def similar_listings(db: Session, listing_id: int, max_distance: Optional[int] = None) -> List[Tuple[int, int]]:
+    """Listings of the same brand, model and year whose image looks like this listing's.
+
+    Args:
+        db: Database session
+        listing_id: Listing to compare with
+        max_distance: Most differing bits, at most ``IMAGE_HASH_BANDS - 1``
+            (default: ``IMAGE_HASH_MAX_DISTANCE``)
+
+    Returns:
+        ``(listing id, distance)`` pairs, closest first; empty when the
+        listing's image is not hashed
+    """
+    rows = _listing_rows(db, CarListing.id == listing_id, CarListing.image_hash.isnot(None))
+    if not rows:
+        return []
+    row = rows[0]
+    matches = _matches(db, {row.id: (_block_key(row), row.image_hash)}, max_distance)
+    similar = [(right if left == row.id else left, bits) for left, right, bits in matches]
+    return sorted(similar, key=lambda match: (match[1], match[0]))
+
+
+def relink(db: Session, chunk_size: int = REBUILD_CHUNK_SIZE) -> Dict[str, int]:
+    """Link every hashed listing to its image matches again, in ``id`` order (after ``dedupe rebuild``)."""
+    counts = {"scanned": 0, "linked": 0}
+    last_id = 0
+    while True:
+        rows = _listing_rows(db, CarListing.id > last_id, CarListing.image_hash.isnot(None), limit=chunk_size)
+        if not rows:
+            break
+        last_id = rows[-1].id
+        try:
+            matches = _matches(db, {row.id: (_block_key(row), row.image_hash) for row in rows})
+            counts["linked"] += link_pairs(db, [(left, right) for left, right, _ in matches])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        counts["scanned"] += len(rows)
+        logger.info(f"Image relink at listing {last_id}: {counts}")
+    return counts
+
+
+@celery_app.task(name="images.hash_pending")
+def run_hash_pending() -> Dict[str, int]:
+    """Beat entry point for ``hash_pending``; does nothing unless IMAGE_HASH_ENABLED is set."""
+    if not settings.IMAGE_HASH_ENABLED:
+        return {}
+    db = SessionLocal()
+    try:
+        return asyncio.run(hash_pending(db))
+    except Exception as e:
+        logger.error(f"Image hashing failed: {str(e)}", exc_info=True)
+        return {}
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Perceptual hashing of listing images")
+    commands = parser.add_subparsers(dest="command", required=True)
+    hash_parser = commands.add_parser("hash", help="Fetch and hash the images not hashed yet")
+    hash_parser.add_argument("--limit", type=int, default=settings.IMAGE_HASH_BATCH_SIZE)
+    relink_parser = commands.add_parser("relink", help="Link every hashed listing to its image matches")
+    relink_parser.add_argument("--chunk-size", type=int, default=REBUILD_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    db = SessionLocal()
+    try:
+        if args.command == "hash":
+            result = asyncio.run(hash_pending(db, limit=args.limit))
+        else:
+            result = relink(db, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
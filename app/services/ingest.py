@@ -0,0 +1,325 @@
+"""
+Ingestion of scraped listings into the car_listings table.
+"""
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config.scraping import settings as scraping_settings
+from app.core.config import settings
+from app.core.executor import get_executor
+from app.core.metrics import INGEST_ERRORS, INGEST_NEW, INGEST_REJECTIONS, INGEST_UPDATED
+from app.core.tracing import get_current_span, traced
+from app.db.models import CarListing, CarListingHistory, CarStatus
+from app.services.brand_matcher import get_brand_matcher
+from app.services.dedupe import index_listings
+from app.services.listing_batch import normalize_batch
+from app.services.market_stats import MarketChanges, apply_changes, market_entry
+from app.services.normalization import match_brand_models, resolve_brand_model
+from app.services.raw_archive import archive_payloads, raw_blob
+
+logger = logging.getLogger(__name__)
+
+# Number of listings upserted per transaction
+INGEST_BATCH_SIZE = 200
+
+# Keep at most this many error messages per run
+MAX_ERROR_MESSAGES = 20
+
+_LISTING_COLUMNS = {c.name for c in CarListing.__table__.columns}
+_PROTECTED_COLUMNS = {"id", "created_at", "yad2_id"}
+
+
+def empty_result() -> Dict[str, Any]:
+    """Return zeroed ingest counters (see ``ingest_listings``)."""
+    return {"total": 0, "new": 0, "updated": 0, "changed": 0, "errors": 0, "rejections": {}, "error_messages": []}
+
+
+def error_recorder(result: Dict[str, Any]) -> Callable[..., None]:
+    """Return a callback that counts errors in ``result`` and keeps the first few messages.
+
+    Errors of invalid listings pass the ``field`` they were rejected for, which
+    is counted in ``result["rejections"]``. The callback may be called from
+    several threads (the database stages of ``app.services.pipeline``).
+    """
+    lock = threading.Lock()
+
+    def record_error(message: str, count: int = 1, field: Optional[str] = None) -> None:
+        INGEST_ERRORS.inc(count)
+        if field:
+            INGEST_REJECTIONS.labels(field).inc(count)
+        with lock:
+            result["errors"] += count
+            if field:
+                result["rejections"][field] = result["rejections"].get(field, 0) + count
+            if len(result["error_messages"]) < MAX_ERROR_MESSAGES:
+                result["error_messages"].append(message)
+    return record_error
+
+
+async def ingest_listings(
+    db: Session,
+    listings: Iterable[Dict[str, Any]],
+    batch_size: int = INGEST_BATCH_SIZE,
+    on_batch: Optional[Callable[[Dict[str, int]], None]] = None,
+    partition_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """Normalize scraped listings and upsert them by ``yad2_id``.
+
+    Listings are processed in batches: one query loads the existing rows of a
+    batch and one commit stores it, instead of a round trip per listing.
+
+    Args:
+        db: Database session
+        listings: Scraped listing dictionaries (scraper output format)
+        batch_size: Number of listings per transaction
+        on_batch: Called after each batch with its ``new``, ``updated`` and
+            ``errors`` counts, for progress reporting
+        partition_id: Scheduled partition the listings were crawled for, recorded on every stored listing
+
+    Returns:
+        Dict with ``total``, ``new``, ``updated``, ``changed`` (updated rows whose
+        stored values actually changed) and ``errors`` counts, the invalid
+        listings per field (``rejections``) and the first few ``error_messages``
+    """
+    result = empty_result()
+    record_error = error_recorder(result)
+    brand_cache: Dict = {}
+
+    async def flush(batch: List[Dict[str, Any]]) -> None:
+        before = {key: result[key] for key in ("new", "updated", "errors")}
+        await _ingest_batch(db, batch, result, record_error, brand_cache, partition_id)
+        if on_batch:
+            on_batch({key: result[key] - count for key, count in before.items()})
+
+    batch: List[Dict[str, Any]] = []
+    for listing in listings:
+        result["total"] += 1
+        batch.append(listing)
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+
+    logger.info(
+        f"Ingested {result['total']} listings: {result['new']} new, "
+        f"{result['updated']} updated, {result['errors']} errors"
+    )
+    return result
+
+
+async def _ingest_batch(db: Session, batch: List[Dict[str, Any]], result: Dict[str, Any], record_error,
+                        brand_cache: Optional[Dict] = None, partition_id: Optional[int] = None) -> None:
+    """Upsert one batch of listings in a single transaction."""
+    archive_listings(db, batch, record_error)
+    rows: Dict[str, Dict[str, Any]] = {}
+    for row in await normalize_listings(db, batch, record_error, brand_cache):
+        if partition_id is not None:
+            row["partition_id"] = partition_id
+        # Later duplicates in a batch win, like they would with one upsert per listing
+        rows[row["yad2_id"]] = row
+    upsert_rows(db, rows, result, record_error)
+
+
+@traced("normalize")
+async def normalize_listings(
+    db: Session,
+    listings: List[Dict[str, Any]],
+    record_error,
+    brand_cache: Optional[Dict] = None
+) -> List[Dict[str, Any]]:
+    """Normalize scraped listings into CarListing column values, dropping invalid ones.
+
+    The cleanup (``normalize_batch``) runs on the CPU executor, in chunks of
+    CPU_EXECUTOR_BATCH_SIZE;
+    brands and models are matched against the catalog (``app.services.brand_matcher``)
+    and looked up in the database here. The two halves are also available
+    separately as ``clean_listings`` and ``resolve_listings``.
+
+    Args:
+        db: Database session
+        listings: Scraped listing dictionaries
+        record_error: Error callback (see ``error_recorder``)
+        brand_cache: Dict reused across calls to skip known brand/model lookups
+    """
+    get_current_span().set_attribute("listings", len(listings))
+    return resolve_listings(db, await clean_listings(listings, record_error), record_error, brand_cache)
+
+
+async def clean_listings(listings: List[Dict[str, Any]], record_error) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Run the cleanup of ``normalize_listings`` on the CPU executor; no database access.
+
+    Returns:
+        ``(listing, values)`` pairs of the listings that passed validation
+    """
+    executor = get_executor()
+    chunk_size = settings.CPU_EXECUTOR_BATCH_SIZE
+    chunks = [listings[i:i + chunk_size] for i in range(0, len(listings), chunk_size)]
+    batches = await asyncio.gather(*(executor.run(normalize_batch, chunk) for chunk in chunks))
+
+    valid = []
+    for chunk, batch in zip(chunks, batches):
+        for i, field in batch.rejected:
+            listing = chunk[i]
+            record_error(f"Invalid listing data ({field}): {listing.get('yad2_id') or listing.get('url')}",
+                         field=field)
+        valid.extend(zip((chunk[i] for i in batch.index.tolist()), batch.rows()))
+    return valid
+
+
+def resolve_listings(
+    db: Session,
+    valid: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+    record_error,
+    brand_cache: Optional[Dict] = None
+) -> List[Dict[str, Any]]:
+    """Match and look up the brands and models of ``clean_listings`` output.
+
+    Returns:
+        CarListing column values of the listings whose brand and model resolved
+    """
+    match_brand_models([values for _, values in valid], get_brand_matcher(db))
+    rows = []
+    for listing, values in valid:
+        if not values["brand"] or not values["model"]:
+            record_error(f"Unknown brand or model: {listing.get('yad2_id')} ({values['title']})",
+                         field="brand" if not values["brand"] else "model")
+            continue
+        try:
+            values["brand_id"], values["model_id"] = resolve_brand_model(
+                db, values.pop("brand"), values.pop("model"), brand_cache,
+                brand_key=values.pop("brand_key"), model_key=values.pop("model_key")
+            )
+        except Exception as e:
+            db.rollback()
+            record_error(f"Error normalizing listing {listing.get('yad2_id')}: {str(e)}")
+            continue
+        rows.append({k: v for k, v in values.items() if k in _LISTING_COLUMNS})
+    return rows
+
+
+@traced("db.archive")
+def archive_listings(db: Session, listings: List[Dict[str, Any]], record_error) -> None:
+    """Archive the raw payloads of scraped listings (see ``app.services.raw_archive``).
+
+    Only when SCRAPING_KEEP_RAW_DATA is set. All listings with an id are
+    archived, including the ones normalization will reject, so they can be
+    re-normalized later. A failure is reported but does not stop the ingest.
+    """
+    if not scraping_settings.KEEP_RAW_DATA:
+        return
+    now = datetime.utcnow()
+    payloads = []
+    for listing in listings:
+        yad2_id = listing.get("yad2_id") or listing.get("source_id") or listing.get("id")
+        blob = raw_blob(listing)
+        if yad2_id and blob:
+            payloads.append((str(yad2_id), _scraped_at(listing.get("scraped_at")) or now, blob))
+    if not payloads:
+        return
+    try:
+        archived = archive_payloads(db, payloads)
+        get_current_span().set_attribute("payloads", archived["payloads"])
+    except Exception as e:
+        logger.error(f"Error archiving {len(payloads)} raw payloads: {str(e)}", exc_info=True)
+        record_error(f"Error archiving raw payloads: {str(e)}", count=0)
+
+
+def _scraped_at(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+@traced("db.upsert")
+def upsert_rows(db: Session, rows: Dict[str, Dict[str, Any]], result: Dict[str, Any], record_error) -> None:
+    """Insert or update normalized rows, keyed by ``yad2_id``, in a single transaction.
+
+    Adds the ``new``, ``updated`` and ``changed`` counts to ``result``. The market
+    statistics are updated in the same transaction (``app.services.market_stats``);
+    the new and changed listings are then linked to their duplicates (``dedupe_listings``).
+    """
+    if not rows:
+        return
+
+    get_current_span().set_attribute("rows", len(rows))
+    touched: List[str] = []
+    market = MarketChanges()
+    try:
+        existing = {
+            listing.yad2_id: listing
+            for listing in db.query(CarListing).filter(CarListing.yad2_id.in_(list(rows)))
+        }
+        now = datetime.utcnow()
+        new_count = updated_count = changed_count = 0
+        for yad2_id, row in rows.items():
+            listing = existing.get(yad2_id)
+            if listing:
+                before = market_entry(listing)
+                changed = False
+                for key, value in row.items():
+                    if key not in _PROTECTED_COLUMNS and getattr(listing, key) != value:
+                        setattr(listing, key, value)
+                        changed = True
+                        if key == "image_url":
+                            # A new photo: hash it again (app/services/images.py)
+                            listing.image_hashed_at = None
+                            listing.image_fetch_failures = 0
+                            listing.image_retry_at = None
+                listing.last_scraped_at = now
+                if listing.status != CarStatus.ACTIVE:
+                    # Presumed sold by the lifecycle, but it is back on the site
+                    listing.status = CarStatus.ACTIVE
+                    db.add(CarListingHistory(listing_id=listing.id, price=listing.price,
+                                             mileage=listing.mileage, status=CarStatus.ACTIVE))
+                    changed = True
+                updated_count += 1
+                changed_count += changed
+                if changed:
+                    touched.append(yad2_id)
+                    market.move(before, market_entry(listing))
+            else:
+                listing = CarListing(**row, last_scraped_at=now)
+                db.add(listing)
+                new_count += 1
+                touched.append(yad2_id)
+                market.move(None, market_entry(listing))
+        if settings.STATS_ENABLED:
+            apply_changes(db, market)
+        db.commit()
+        INGEST_NEW.inc(new_count)
+        INGEST_UPDATED.inc(updated_count)
+        result["new"] += new_count
+        result["updated"] += updated_count
+        result["changed"] += changed_count
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error saving batch of {len(rows)} listings: {str(e)}", exc_info=True)
+        record_error(f"Error saving batch: {str(e)}", count=len(rows))
+        return
+    dedupe_listings(db, touched, record_error)
+
+
+@traced("db.dedupe")
+def dedupe_listings(db: Session, yad2_ids: List[str], record_error) -> None:
+    """Link stored listings to their duplicates (see ``app.services.dedupe``).
+
+    Only when DEDUPE_ENABLED is set. A failure is reported but does not stop
+    the ingest; the listings are picked up again when they next change.
+    """
+    if not settings.DEDUPE_ENABLED or not yad2_ids:
+        return
+    try:
+        indexed = index_listings(db, yad2_ids)
+        get_current_span().set_attribute("linked", indexed["linked"])
+    except Exception as e:
+        logger.error(f"Error linking duplicates of {len(yad2_ids)} listings: {str(e)}", exc_info=True)
+        record_error(f"Error linking duplicates: {str(e)}", count=0)
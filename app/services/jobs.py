@@ -0,0 +1,250 @@
+"""
+Scrape and ingest jobs executed by Celery workers.
+
+The API process only creates a ``ScrapeJob`` row and enqueues the matching
+task; crawling and database writes happen in the worker processes, and the job
+row is the only state shared between the two. A scrape job streams its pages
+straight into the database (see ``app.services.pipeline``); ingest jobs store
+listings that were scraped elsewhere.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.config.scraping import settings as scraping_settings
+from app.core.celery_app import celery_app
+from app.core.tracing import task_context
+from app.db.models.job import JobKind, JobStatus, ScrapeJob
+from app.db.session import SessionLocal
+from app.services.ingest import MAX_ERROR_MESSAGES, ingest_listings
+from app.services.pipeline import run_pipeline
+from app.services.scheduler import complete_partition_run
+from app.services.task_registry import TaskProgress, expiry_time
+
+logger = logging.getLogger(__name__)
+
+# Scraper fields that are not stored and would only bloat the queue messages
+# (raw_data is kept when SCRAPING_KEEP_RAW_DATA archives it)
+_DROPPED_LISTING_FIELDS = ("raw_data",)
+
+
+def create_job(db: Session, kind: JobKind, params: Optional[Dict[str, Any]] = None,
+               parent_id: Optional[str] = None, partition_id: Optional[int] = None,
+               job_id: Optional[str] = None) -> ScrapeJob:
+    """Create a pending job row (with a new id unless ``job_id`` is given)."""
+    job = ScrapeJob(
+        id=job_id or str(uuid.uuid4()),
+        kind=kind,
+        status=JobStatus.PENDING,
+        params=params or {},
+        parent_id=parent_id,
+        partition_id=partition_id,
+        errors=[],
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def enqueue_scrape_job(db: Session, params: Optional[Dict[str, Any]] = None,
+                       partition_id: Optional[int] = None, job_id: Optional[str] = None) -> ScrapeJob:
+    """Create a scrape job and hand it to the scrape queue.
+
+    Args:
+        db: Database session
+        params: Search parameters passed to ``Yad2Scraper.scrape_parallel``
+        partition_id: Scheduled partition the run belongs to (None for manual runs)
+        job_id: Id for the job, e.g. the one its partition lease was taken for
+
+    Returns:
+        ScrapeJob: The new job (its id is also the Celery task id)
+    """
+    job = create_job(db, JobKind.SCRAPE, params, partition_id=partition_id, job_id=job_id)
+    run_scrape_job.apply_async(args=[job.id], task_id=job.id)
+    logger.info(f"Enqueued scrape job {job.id}")
+    return job
+
+
+def enqueue_ingest_job(db: Session, listings: List[Dict[str, Any]],
+                       parent_id: Optional[str] = None) -> ScrapeJob:
+    """Create an ingest job for already scraped listings and hand it to the ingest queue."""
+    keep_raw = scraping_settings.KEEP_RAW_DATA
+    payload = [
+        {k: v for k, v in listing.items() if keep_raw or k not in _DROPPED_LISTING_FIELDS}
+        for listing in listings
+    ]
+    if keep_raw:
+        # Records leave their raw payload out of items()
+        for values, listing in zip(payload, listings):
+            if "raw_data" in listing:
+                values["raw_data"] = listing.get("raw_data")
+    params: Dict[str, Any] = {"listing_count": len(payload)}
+    parent = get_job(db, parent_id) if parent_id else None
+    if parent and parent.partition_id is not None:
+        # The listings belong to the parent's partition, but the run and its lease stay the
+        # parent's: only the scrape job completes the partition run
+        params["partition_id"] = parent.partition_id
+    job = create_job(db, JobKind.INGEST, params, parent_id=parent_id)
+    run_ingest_job.apply_async(args=[job.id, payload], task_id=job.id)
+    logger.info(f"Enqueued ingest job {job.id} with {len(payload)} listings")
+    return job
+
+
+def get_job(db: Session, job_id: str) -> Optional[ScrapeJob]:
+    """Return a job by id."""
+    return db.query(ScrapeJob).filter(ScrapeJob.id == job_id).first()
+
+
+def get_child_jobs(db: Session, job_id: str) -> List[ScrapeJob]:
+    """Return the jobs started by a job (the ingest jobs of a scrape job)."""
+    return db.query(ScrapeJob).filter(ScrapeJob.parent_id == job_id).order_by(ScrapeJob.created_at).all()
+
+
+def list_jobs(db: Session, active_only: bool = False, limit: int = 50) -> List[ScrapeJob]:
+    """Return the most recent jobs that have not expired, newest first."""
+    query = db.query(ScrapeJob).filter(
+        or_(ScrapeJob.expires_at.is_(None), ScrapeJob.expires_at > datetime.utcnow())
+    )
+    if active_only:
+        query = query.filter(ScrapeJob.status.in_([JobStatus.PENDING, JobStatus.RUNNING]))
+    return query.order_by(ScrapeJob.created_at.desc()).limit(limit).all()
+
+
+def _start_job(db: Session, job_id: str, worker: Optional[str]) -> Optional[ScrapeJob]:
+    """Mark a job as running, or return None if it must not run (unknown or already finished)."""
+    job = get_job(db, job_id)
+    if not job:
+        logger.error(f"Job {job_id} not found")
+        return None
+    if job.is_complete:
+        # Late acks can re-deliver a job that already finished
+        logger.info(f"Job {job_id} already {job.status.value}, skipping")
+        return None
+    job.status = JobStatus.RUNNING
+    job.worker = worker
+    job.started_at = datetime.utcnow()
+    db.commit()
+    return job
+
+
+def _finish_job(db: Session, job: ScrapeJob, status: JobStatus, errors: Optional[List[str]] = None) -> None:
+    """Store the final status of a job and when it expires.
+
+    ``errors`` are only kept as messages; ``error_count`` is a progress counter.
+    """
+    if errors:
+        job.errors = ((job.errors or []) + errors)[:MAX_ERROR_MESSAGES]
+    job.status = status
+    job.finished_at = datetime.utcnow()
+    job.expires_at = expiry_time(job.finished_at)
+    db.commit()
+
+
+def _fail_job(db: Session, job_id: str, error: Exception) -> None:
+    """Mark a job as failed after an unexpected error."""
+    db.rollback()
+    job = get_job(db, job_id)
+    if job:
+        job.error_count = (job.error_count or 0) + 1
+        _finish_job(db, job, JobStatus.FAILED, [f"{type(error).__name__}: {str(error)}"])
+
+
+def _release_partition(db: Session, job_id: str) -> None:
+    """Reschedule the partition of a failed job so it is not blocked until its lease expires."""
+    try:
+        job = get_job(db, job_id)
+        if job:
+            complete_partition_run(db, job.partition_id, job.id, None)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error releasing the partition of job {job_id}: {str(e)}", exc_info=True)
+
+
+async def _scrape(db: Session, params: Dict[str, Any], progress: TaskProgress,
+                  partition_id: Optional[int] = None) -> Dict[str, Any]:
+    """Crawl for a scrape job and store the listings as the pages come in."""
+    # Imported here so the API process, which only enqueues jobs, never loads Playwright
+    from app.scrapers.yad2_updated import Yad2Scraper
+
+    def on_page(page_num: int, count: int) -> None:
+        logger.info(f"Scraped page {page_num}: {count} listings")
+        progress.incr(pages_fetched=1, listings_parsed=count)
+
+    def on_batch(counts: Dict[str, int]) -> None:
+        progress.incr(new_listings=counts["new"], updated_listings=counts["updated"],
+                      error_count=counts["errors"])
+
+    scraper = Yad2Scraper()
+    # A scheduled run has to see every listing of its partition for the lifecycle
+    # (scheduler.is_complete_crawl), so it crawls until the results run out
+    pages = scraper.scrape_parallel(params, to_end=partition_id is not None)
+    return await run_pipeline(pages, db, on_page=on_page, on_batch=on_batch, partition_id=partition_id)
+
+
+@celery_app.task(name="jobs.run_scrape_job", bind=True)
+def run_scrape_job(self, job_id: str) -> None:
+    """Crawl Yad2 for a scrape job and store the listings while crawling."""
+    db = SessionLocal()
+    try:
+        job = _start_job(db, job_id, self.request.hostname)
+        if not job:
+            return
+        logger.info(f"Starting scrape job {job_id} with params {job.params}")
+
+        progress = TaskProgress([job.id])
+        with task_context(job.id, "job.scrape", {"job.kind": "scrape"}) as trace:
+            try:
+                result = asyncio.run(_scrape(db, job.params or {}, progress, job.partition_id))
+            finally:
+                progress.flush(force=True)
+                job.timings = trace.summary()
+        logger.info(f"Scrape job {job_id} time by stage: {job.timings['stages']}")
+        job.total_listings = result["total"]
+        _finish_job(db, job, JobStatus.COMPLETED, result["error_messages"])
+        logger.info(f"Scrape job {job_id} stored {result['total']} listings from {result['pages']} pages")
+        complete_partition_run(db, job.partition_id, job.id, result, started_at=job.started_at)
+    except Exception as e:
+        logger.error(f"Error in scrape job {job_id}: {str(e)}", exc_info=True)
+        _fail_job(db, job_id, e)
+        _release_partition(db, job_id)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="jobs.run_ingest_job", bind=True)
+def run_ingest_job(self, job_id: str, listings: List[Dict[str, Any]]) -> None:
+    """Normalize and store the listings of an ingest job."""
+    db = SessionLocal()
+    try:
+        job = _start_job(db, job_id, self.request.hostname)
+        if not job:
+            return
+
+        # Counts go to the scrape job too, so its status shows the outcome as it happens
+        progress = TaskProgress([job.id, job.parent_id])
+
+        def on_batch(counts: Dict[str, int]) -> None:
+            progress.incr(new_listings=counts["new"], updated_listings=counts["updated"],
+                          error_count=counts["errors"])
+
+        with task_context(job.id, "job.ingest", {"job.kind": "ingest", "job.parent_id": job.parent_id}) as trace:
+            try:
+                result = asyncio.run(ingest_listings(
+                    db, listings, on_batch=on_batch, partition_id=(job.params or {}).get("partition_id")
+                ))
+            finally:
+                progress.flush(force=True)
+                job.timings = trace.summary()
+        job.total_listings = result["total"]
+        _finish_job(db, job, JobStatus.COMPLETED, result["error_messages"])
+    except Exception as e:
+        logger.error(f"Error in ingest job {job_id}: {str(e)}", exc_info=True)
+        _fail_job(db, job_id, e)
+    finally:
+        db.close()
@@ -0,0 +1,144 @@
+"""
+Listing lifecycle: ACTIVE -> SOLD -> ARCHIVED, by absence from the crawls.
+
+Yad2 does not tell us when an ad is removed; it just stops showing up. So a
+listing is presumed sold once it has been missing from several crawls:
+
+- After a complete crawl of a partition (the pipeline reached the end of the
+  results), ``record_complete_crawl`` remembers its start time. Once the
+  partition has ``LIFECYCLE_MISSED_CRAWLS`` of them, its ACTIVE listings whose
+  ``last_scraped_at`` is older than the oldest of those starts were missing
+  from all of them and become SOLD. Requiring several crawls absorbs the odd
+  page that failed to load.
+- ``sweep`` (Celery beat, every ``LIFECYCLE_SWEEP_MINUTES``) marks ACTIVE
+  listings not seen for ``LIFECYCLE_STALE_DAYS`` as SOLD whatever their
+  partition (manual runs, partitions that were removed), and SOLD listings not
+  seen for ``LIFECYCLE_ARCHIVE_AFTER_DAYS`` as ARCHIVED.
+
+Every transition is one set-based UPDATE on the (partition_id, status,
+last_scraped_at) or (status, last_scraped_at) index, whose RETURNING rows are
+written to ``car_listing_history`` in the same transaction. A listing that
+shows up again is made ACTIVE by the upsert (``ingest.upsert_rows``).
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.db.models.car import CarListing, CarListingHistory, CarStatus
+from app.db.models.schedule import ScrapePartition
+from app.db.session import SessionLocal
+from app.services.market_stats import MarketChanges, apply_changes, market_entry
+
+logger = logging.getLogger(__name__)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    # last_scraped_at is written as naive UTC; drivers differ in returning aware or naive times
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def transition(db: Session, criteria: List[Any], status: CarStatus, from_status: CarStatus,
+               now: Optional[datetime] = None) -> int:
+    """Move the listings in ``from_status`` matching ``criteria`` to ``status`` and record it in their history.
+
+    One UPDATE ... RETURNING plus one bulk INSERT into ``car_listing_history``,
+    committed together. ACTIVE listings leaving the market are taken out of the
+    market statistics (``app.services.market_stats``) in the same transaction.
+
+    Returns:
+        int: Number of listings moved
+    """
+    now = now or datetime.utcnow()
+    try:
+        moved = db.execute(
+            update(CarListing)
+            .where(CarListing.status == from_status, *criteria)
+            .values(status=status, updated_at=now)
+            .returning(CarListing.id, CarListing.price, CarListing.mileage, CarListing.brand_id,
+                       CarListing.model_id, CarListing.year, CarListing.partition_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if moved:
+            db.execute(insert(CarListingHistory), [
+                {"listing_id": row.id, "price": row.price, "mileage": row.mileage, "status": status, "created_at": now}
+                for row in moved
+            ])
+            if settings.STATS_ENABLED and from_status == CarStatus.ACTIVE:
+                market = MarketChanges()
+                for row in moved:
+                    market.move(market_entry(row, from_status), None)
+                apply_changes(db, market)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(moved)
+
+
+def record_complete_crawl(db: Session, partition: ScrapePartition, started_at: datetime) -> int:
+    """Remember a complete crawl of a partition and mark its listings missing from the last ones SOLD.
+
+    Args:
+        db: Database session
+        partition: Crawled partition
+        started_at: When the crawl started; listings seen by it have a later ``last_scraped_at``
+
+    Returns:
+        int: Number of listings marked SOLD
+    """
+    keep = max(settings.LIFECYCLE_MISSED_CRAWLS, 1)
+    starts = (partition.crawl_starts or []) + [_naive_utc(started_at).isoformat()]
+    partition.crawl_starts = starts[-keep:]
+    db.commit()
+    if len(starts) < keep:
+        return 0
+
+    cutoff = datetime.fromisoformat(partition.crawl_starts[0])
+    sold = transition(db, [
+        CarListing.partition_id == partition.id,
+        CarListing.last_scraped_at < cutoff,
+    ], CarStatus.SOLD, CarStatus.ACTIVE)
+    if sold:
+        logger.info(f"Partition {partition.key}: {sold} listings missing from the last {keep} crawls marked sold")
+    return sold
+
+
+def sweep(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Mark long-unseen ACTIVE listings SOLD and long-unseen SOLD listings ARCHIVED.
+
+    Returns:
+        Dict with the number of listings ``sold`` and ``archived``
+    """
+    now = now or datetime.utcnow()
+    stale_before = now - timedelta(days=settings.LIFECYCLE_STALE_DAYS)
+    archive_before = now - timedelta(days=settings.LIFECYCLE_ARCHIVE_AFTER_DAYS)
+    result = {
+        "sold": transition(db, [
+            CarListing.last_scraped_at < stale_before,
+        ], CarStatus.SOLD, CarStatus.ACTIVE, now),
+        "archived": transition(db, [
+            CarListing.last_scraped_at < archive_before,
+        ], CarStatus.ARCHIVED, CarStatus.SOLD, now),
+    }
+    if result["sold"] or result["archived"]:
+        logger.info(f"Lifecycle sweep: {result['sold']} stale listings sold, {result['archived']} archived")
+    return result
+
+
+@celery_app.task(name="lifecycle.sweep")
+def run_sweep() -> Dict[str, int]:
+    """Beat entry point for ``sweep``."""
+    db = SessionLocal()
+    try:
+        return sweep(db)
+    except Exception as e:
+        logger.error(f"Lifecycle sweep failed: {str(e)}", exc_info=True)
+        db.rollback()
+        return {}
+    finally:
+        db.close()
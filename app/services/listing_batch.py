@@ -0,0 +1,219 @@
+"""
+Columnar normalization of scraped listing batches.
+
+Every ingestion path (``ingest.normalize_listings``, ``normalization.normalize_car_data``
+and ``seed_database.py``) cleans raw listings with ``normalize_batch``, and the
+API scraper coerces its numbers with the same ``to_floats``.
+
+The batch is processed a field at a time instead of a listing at a time: each
+field is pulled out of all listings as one column, coerced with precompiled
+patterns (numpy does the whole column at once when the values are already
+numbers or plain numeric strings) and validated with array comparisons.
+Strings that repeat across listings (brand, model, fuel type, gear, color,
+body type, location) are interned, so a batch holds one copy of each.
+
+The result is a ``ListingBatch`` of columns, which is also what the CPU
+executor sends back from its worker processes. Invalid listings are counted
+per field in ``ListingBatch.rejections`` rather than dropped by a
+``try/except`` around each listing.
+"""
+import re
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MIN_YEAR = 1900
+MAX_YEAR = 2100
+
+# Everything that is not part of a number ("₪ 85,000", "120,000 ק\"מ")
+_NOT_NUMBER_RE = re.compile(r"[^\d.\-]+")
+_TITLE_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+
+# Raw keys of each field in order of precedence: the scraper, API and seed formats differ
+_FIELD_KEYS = {
+    "yad2_id": ("yad2_id", "source_id", "id"),
+    "mileage": ("mileage", "kilometers"),
+    "transmission": ("transmission", "gear"),
+}
+
+# Checked in this order; a listing is counted under the first field it fails
+REQUIRED_FIELDS = ("yad2_id", "title", "price", "year")
+
+TEXT_FIELDS = ("title", "url", "image_url", "description")
+CATEGORY_FIELDS = ("brand", "model", "fuel_type", "transmission", "body_type", "color", "location")
+
+
+def column(listings: Sequence[Dict[str, Any]], field: str) -> List[Any]:
+    """Return one field of every listing, trying the field's alternative keys in order."""
+    keys = _FIELD_KEYS.get(field)
+    if keys is None:
+        return [listing.get(field) for listing in listings]
+    values = []
+    for listing in listings:
+        value = None
+        for key in keys:
+            value = listing.get(key)
+            if value not in (None, ""):
+                break
+        values.append(value)
+    return values
+
+
+def to_floats(values: Sequence[Any], missing: Optional[float] = None) -> np.ndarray:
+    """Coerce a column to float64, with NaN (or ``missing``) where a value is missing or not a number."""
+    floats = _to_floats(values)
+    if missing is not None:
+        floats[np.isnan(floats)] = missing
+    return floats
+
+
+def _to_floats(values: Sequence[Any]) -> np.ndarray:
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    floats = []
+    for value in values:
+        if value is None or isinstance(value, bool):
+            floats.append(np.nan)
+        elif isinstance(value, (int, float)):
+            floats.append(value)
+        else:
+            try:
+                floats.append(float(_NOT_NUMBER_RE.sub("", str(value))))
+            except ValueError:
+                floats.append(np.nan)
+    return np.array(floats, dtype=np.float64)
+
+
+def to_strings(values: Sequence[Any], intern: bool = False) -> List[str]:
+    """Coerce a column to stripped strings ("" when missing), interning them if asked."""
+    strings = ["" if value is None else str(value).strip() for value in values]
+    if intern:
+        strings = [sys.intern(value) for value in strings]
+    return strings
+
+
+class ListingBatch:
+    """Normalized listings as columns (see ``normalize_batch``).
+
+    Attributes:
+        index: Position of each kept listing in the input
+        yad2_id: Listing ids
+        price: Prices (float64)
+        year: Years (int32, 0 when unknown)
+        mileage: Mileages (int64, -1 when unknown)
+        strings: Text and categorical columns by field name
+        rejections: Rejected listings per field
+        rejected: (input position, field) of each rejected listing
+    """
+
+    __slots__ = ("index", "yad2_id", "price", "year", "mileage", "strings", "rejections", "rejected")
+
+    def __init__(self, index: np.ndarray, yad2_id: List[str], price: np.ndarray, year: np.ndarray,
+                 mileage: np.ndarray, strings: Dict[str, List[str]], rejections: Dict[str, int],
+                 rejected: List[Tuple[int, str]]) -> None:
+        self.index = index
+        self.yad2_id = yad2_id
+        self.price = price
+        self.year = year
+        self.mileage = mileage
+        self.strings = strings
+        self.rejections = rejections
+        self.rejected = rejected
+
+    def __len__(self) -> int:
+        return len(self.yad2_id)
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """Return listing ``i`` as CarListing values, with ``brand``/``model`` names instead of ids."""
+        year = int(self.year[i])
+        mileage = int(self.mileage[i])
+        row = {
+            "yad2_id": self.yad2_id[i],
+            "price": float(self.price[i]),
+            "year": year or None,
+            "mileage": mileage if mileage >= 0 else None,
+        }
+        for field, values in self.strings.items():
+            row[field] = values[i]
+        return row
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over the listings as row dicts (see ``row``)."""
+        return (self.row(i) for i in range(len(self)))
+
+
+def normalize_batch(
+    listings: Sequence[Dict[str, Any]],
+    require_year: bool = True,
+    require_price: bool = True,
+    year_from_title: bool = False,
+    default_year: Optional[int] = None
+) -> ListingBatch:
+    """Clean a batch of raw listings into a ``ListingBatch``, without touching the database.
+
+    Shared-nothing, so it can run in a worker process (see app.core.executor).
+    A listing is rejected when it has no id or title, when ``require_price`` and
+    its price is not positive, or when ``require_year`` and it has no year in
+    ``MIN_YEAR``..``MAX_YEAR``. Brand and model are kept as scraped, possibly
+    empty (see ``normalization.match_brand_models``).
+
+    Args:
+        listings: Raw listings in the scraper, API or seed format
+        require_year: Reject listings without a valid year
+        require_price: Reject listings without a positive price
+        year_from_title: Take a missing year from a four-digit year in the title
+        default_year: Year of listings that still have none
+    """
+    count = len(listings)
+    yad2_id = to_strings(column(listings, "yad2_id"))
+    strings = {field: to_strings(column(listings, field)) for field in TEXT_FIELDS}
+    strings.update({field: to_strings(column(listings, field), intern=True) for field in CATEGORY_FIELDS})
+
+    price = to_floats(column(listings, "price"))
+    mileage = to_floats(column(listings, "mileage"))
+    year = to_floats(column(listings, "year"))
+    year[(year < MIN_YEAR) | (year > MAX_YEAR)] = np.nan
+    if year_from_title:
+        titles = strings["title"]
+        for i in np.flatnonzero(np.isnan(year)):
+            match = _TITLE_YEAR_RE.search(titles[i])
+            if match:
+                year[i] = int(match.group(0))
+    if default_year is not None:
+        year[np.isnan(year)] = default_year
+
+    valid = {
+        "yad2_id": np.fromiter(map(bool, yad2_id), dtype=bool, count=count),
+        "title": np.fromiter(map(bool, strings["title"]), dtype=bool, count=count),
+        "price": price > 0 if require_price else np.ones(count, dtype=bool),
+        "year": ~np.isnan(year) if require_year else np.ones(count, dtype=bool),
+    }
+    keep = np.ones(count, dtype=bool)
+    rejections: Dict[str, int] = {}
+    rejected: List[Tuple[int, str]] = []
+    for field in REQUIRED_FIELDS:
+        failed = keep & ~valid[field]
+        if failed.any():
+            positions = np.flatnonzero(failed)
+            rejections[field] = len(positions)
+            rejected.extend((int(i), field) for i in positions)
+            keep &= valid[field]
+    rejected.sort()
+
+    index = np.flatnonzero(keep)
+    kept = index.tolist()
+    price = np.where(price > 0, price, 0.0)
+    mileage = np.where(np.isnan(mileage) | (mileage < 0), -1, mileage)
+    return ListingBatch(
+        index=index,
+        yad2_id=[yad2_id[i] for i in kept],
+        price=price[index],
+        year=np.nan_to_num(year[index], nan=0).astype(np.int32),
+        mileage=mileage[index].astype(np.int64),
+        strings={field: [values[i] for i in kept] for field, values in strings.items()},
+        rejections=rejections,
+        rejected=rejected,
+    )
@@ -0,0 +1,562 @@
+"""
+Market statistics: price by brand, model and year, without scanning car_listings.
+
+The pricing dashboard needs counts, means, percentiles and mileage-adjusted
+prices per segment. Computing them from ``car_listings`` on every request
+means a scan per segment; instead ``market_stats`` keeps one row of running
+statistics per brand, model, year and scrape partition, over the ACTIVE
+listings, updated in the same transaction as the listings:
+
+- ``ingest.upsert_rows`` adds new listings and moves changed ones (the old
+  price out, the new one in); ``lifecycle.transition`` takes out the listings
+  that leave the market. Both go through ``MarketChanges``/``apply_changes``,
+  which lock the touched rows in key order.
+- Sums (count, price, squared price, and the mileage sums of a least-squares
+  fit of price on mileage) are exact: they are added to and subtracted from.
+- Percentiles come from ``price_digest``, a merging t-digest (``TDigest``):
+  a few hundred bytes per segment, accurate at the tails, and mergeable, so a
+  segment's digest is the merge of its partitions' digests and a model's the
+  merge of its years'. A digest cannot forget a value, so a price taken out
+  is only counted in ``removed``; ``compact`` (Celery beat, every
+  ``STATS_COMPACT_MINUTES``) rebuilds the segments where removed prices make
+  up ``STATS_STALE_RATIO`` of the digest.
+
+Rows are per scrape partition so that the workers crawling different
+partitions never wait on each other's locks; ``segment_stats`` merges them.
+
+The mileage-adjusted price is the median price moved along the segment's
+price/mileage slope to the mileage of a typical car of its age
+(``STATS_KM_PER_YEAR`` per year), which makes segments with different
+mileage mixes comparable.
+
+Usage:
+    python -m app.services.market_stats rebuild
+    python -m app.services.market_stats compact
+"""
+import argparse
+import json
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.db.models import CarBrand, CarListing, CarModel, CarStatus, MarketStats
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# brand_id, model_id, year, partition_id (0 for none)
+Segment = Tuple[int, int, int, int]
+
+DEFAULT_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+GROUP_BY = {"year": 3, "model": 2, "brand": 1}  # segment key columns per grouping
+REBUILD_CHUNK_SIZE = 20000
+
+_LOOKUP_CHUNK = 500
+_SEGMENT_COLUMNS = ("brand_id", "model_id", "year", "partition_id")
+_SUMS = ("listings", "price_sum", "price_sq_sum", "mileage_listings", "mileage_sum",
+         "mileage_sq_sum", "mileage_price_sum", "mileage_price_product_sum", "removed")
+_UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class TDigest:
+    """Merging t-digest: a small, mergeable sketch of a distribution for quantiles.
+
+    Values are kept as weighted centroids, with the arcsine scale function:
+    each centroid covers at most one unit of ``k(q) = compression / 2pi *
+    asin(2q - 1)``, so they are small (down to single values) near the tails
+    and larger around the median. Compressing sorts the centroids and buckets
+    them by ``k`` with numpy, which makes adding and merging the same
+    operation, in any order.
+    """
+
+    def __init__(self, compression: Optional[float] = None) -> None:
+        self.compression = float(compression or settings.STATS_COMPRESSION)
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def add(self, values: Sequence[float]) -> None:
+        """Add values, each with weight one."""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values):
+            self._merge(values, np.ones(len(values)), float(values.min()), float(values.max()))
+
+    def merge(self, other: "TDigest") -> None:
+        """Add every value of another digest."""
+        if len(other.weights):
+            self._merge(other.means, other.weights, other.min, other.max)
+
+    @classmethod
+    def merged(cls, digests: Sequence["TDigest"]) -> "TDigest":
+        """One digest of all the values of ``digests``, compressed once rather than per merge."""
+        digest = cls(digests[0].compression if digests else None)
+        digests = [other for other in digests if len(other.weights)]
+        if digests:
+            digest._merge(np.concatenate([other.means for other in digests]),
+                          np.concatenate([other.weights for other in digests]),
+                          min(other.min for other in digests), max(other.max for other in digests))
+        return digest
+
+    def _merge(self, means: np.ndarray, weights: np.ndarray, low: float, high: float) -> None:
+        means = np.concatenate((self.means, means))
+        weights = np.concatenate((self.weights, weights))
+        self.min, self.max = min(self.min, low), max(self.max, high)
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1.0, 1.0))
+        buckets = np.floor(k + self.compression / 4).astype(np.int64)
+        merged = np.bincount(buckets, weights=weights)
+        totals = np.bincount(buckets, weights=means * weights)
+        kept = merged > 0
+        self.weights = merged[kept]
+        self.means = totals[kept] / self.weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated ``q`` quantile (0 to 1), or None for an empty digest."""
+        if not len(self.weights):
+            return None
+        if len(self.weights) == 1:
+            return float(self.means[0])
+        total = self.weights.sum()
+        # Centroid means sit at the middle of their weight; the extremes are known exactly
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * total, np.concatenate(([0.0], centers, [total])),
+                               np.concatenate(([self.min], self.means, [self.max]))))
+
+    def to_bytes(self) -> bytes:
+        header = np.array([self.compression, self.min, self.max], dtype="<f8")
+        return header.tobytes() + self.means.astype("<f8").tobytes() + self.weights.astype("<f8").tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "TDigest":
+        """Digest stored by ``to_bytes``; empty for None."""
+        if not data:
+            return cls()
+        values = np.frombuffer(data, dtype="<f8")
+        digest = cls(values[0])
+        digest.min, digest.max = float(values[1]), float(values[2])
+        size = (len(values) - 3) // 2
+        digest.means = values[3:3 + size].copy()
+        digest.weights = values[3 + size:].copy()
+        return digest
+
+
+def _empty_sums() -> Dict[str, float]:
+    return {name: 0 for name in _SUMS}
+
+
+def _add_value(sums: Dict[str, float], price: float, mileage: Optional[float], sign: int) -> None:
+    sums["listings"] += sign
+    sums["price_sum"] += sign * price
+    sums["price_sq_sum"] += sign * price * price
+    if mileage is not None:
+        sums["mileage_listings"] += sign
+        sums["mileage_sum"] += sign * mileage
+        sums["mileage_sq_sum"] += sign * mileage * mileage
+        sums["mileage_price_sum"] += sign * price
+        sums["mileage_price_product_sum"] += sign * price * mileage
+
+
+def market_entry(listing: Any, status: Optional[CarStatus] = None) -> Optional[Tuple[Segment, float, Optional[float]]]:
+    """``(segment, price, mileage)`` of a listing in the market, None if it is not ACTIVE.
+
+    Args:
+        listing: ORM object or row with the segment columns, price and mileage
+        status: The listing's status, if not its ``status`` attribute
+    """
+    status = status or listing.status or CarStatus.ACTIVE
+    if status != CarStatus.ACTIVE or listing.price is None:
+        return None
+    segment = (listing.brand_id, listing.model_id, listing.year, listing.partition_id or 0)
+    return segment, float(listing.price), float(listing.mileage) if listing.mileage is not None else None
+
+
+class MarketChanges:
+    """Listings entering and leaving the market in one transaction, by segment."""
+
+    def __init__(self) -> None:
+        self.added: Dict[Segment, List[Tuple[float, Optional[float]]]] = defaultdict(list)
+        self.removed: Dict[Segment, List[Tuple[float, Optional[float]]]] = defaultdict(list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed)
+
+    def move(self, before: Optional[Tuple[Segment, float, Optional[float]]],
+             after: Optional[Tuple[Segment, float, Optional[float]]]) -> None:
+        """Record a listing going from ``before`` to ``after`` (``market_entry`` values)."""
+        if before == after:
+            return
+        if before is not None:
+            self.removed[before[0]].append(before[1:])
+        if after is not None:
+            self.added[after[0]].append(after[1:])
+
+
+def _ensure_segments(db: Session, segments: List[Segment]) -> None:
+    dialect = db.get_bind().dialect.name
+    rows = [dict(zip(_SEGMENT_COLUMNS, segment)) for segment in segments]
+    upsert = _UPSERT_DIALECTS.get(dialect)
+    if upsert is not None:
+        # Two ingest workers may create the same segment at once
+        db.execute(upsert(MarketStats).on_conflict_do_nothing(
+            index_elements=list(_SEGMENT_COLUMNS)
+        ), rows)
+        return
+    existing = set(_locked_rows(db, segments))
+    missing = [row for segment, row in zip(segments, rows) if segment not in existing]
+    if missing:
+        db.execute(insert(MarketStats), missing)
+
+
+def _locked_rows(db: Session, segments: List[Segment]) -> Dict[Segment, Any]:
+    """The segments' rows (Core rows, not ORM objects), locked until the end of the transaction."""
+    table = MarketStats.__table__
+    key = tuple_(table.c.brand_id, table.c.model_id, table.c.year, table.c.partition_id)
+    rows = {}
+    for i in range(0, len(segments), _LOOKUP_CHUNK):
+        query = (
+            select(table).where(key.in_(segments[i:i + _LOOKUP_CHUNK]))
+            .order_by(table.c.id).with_for_update()
+        )
+        rows.update(((row.brand_id, row.model_id, row.year, row.partition_id), row) for row in db.execute(query))
+    return rows
+
+
+def _update_rows(db: Session, values: List[Dict[str, Any]]) -> None:
+    """Write ``values`` (column values plus the ``row_id``) with one executemany UPDATE."""
+    if values:
+        table = MarketStats.__table__
+        db.execute(
+            update(table).where(table.c.id == bindparam("row_id"))
+            .values({name: bindparam(name) for name in values[0] if name != "row_id"}),
+            values,
+        )
+
+
+def apply_changes(db: Session, changes: MarketChanges) -> int:
+    """Add the changes to the segments' statistics, in the caller's transaction (does not commit).
+
+    Returns:
+        Number of segments updated
+    """
+    if not changes:
+        return 0
+    # Sorted, so concurrent transactions lock their segments in the same order
+    segments = sorted(set(changes.added) | set(changes.removed))
+    _ensure_segments(db, segments)
+    rows = _locked_rows(db, segments)
+    now = datetime.utcnow()
+    values = []
+    for segment in segments:
+        row = rows[segment]
+        sums = {name: row._mapping[name] or 0 for name in _SUMS}
+        for price, mileage in changes.removed.get(segment, ()):
+            _add_value(sums, price, mileage, -1)
+            sums["removed"] += 1
+        digest = row.price_digest
+        added = changes.added.get(segment, ())
+        for price, mileage in added:
+            _add_value(sums, price, mileage, 1)
+        if added:
+            tdigest = TDigest.from_bytes(digest)
+            tdigest.add([price for price, _ in added])
+            digest = tdigest.to_bytes()
+        values.append({"row_id": row.id, **sums, "price_digest": digest, "updated_at": now})
+    _update_rows(db, values)
+    return len(segments)
+
+
+def _segment_criteria(segment: Segment) -> List[Any]:
+    brand_id, model_id, year, partition_id = segment
+    return [
+        CarListing.brand_id == brand_id,
+        CarListing.model_id == model_id,
+        CarListing.year == year,
+        CarListing.partition_id == partition_id if partition_id else CarListing.partition_id.is_(None),
+        CarListing.status == CarStatus.ACTIVE,
+    ]
+
+
+def _built_values(values: List[Tuple[float, Optional[float]]], now: datetime) -> Dict[str, Any]:
+    """Statistics columns of a segment with the ``(price, mileage)`` values."""
+    sums = _empty_sums()
+    for price, mileage in values:
+        _add_value(sums, price, mileage, 1)
+    digest = TDigest()
+    digest.add([price for price, _ in values])
+    return {**sums, "price_digest": digest.to_bytes(), "rebuilt_at": now}
+
+
+def rebuild_segments(db: Session, segments: List[Segment]) -> int:
+    """Recompute segments from their listings, dropping the removed prices from their digests. Commits.
+
+    Returns:
+        Number of segments rebuilt
+    """
+    now = datetime.utcnow()
+    try:
+        rows = _locked_rows(db, sorted(segments))
+        emptied, built = [], []
+        for segment, row in rows.items():
+            values = [
+                (float(price), float(mileage) if mileage is not None else None)
+                for price, mileage in db.execute(
+                    select(CarListing.price, CarListing.mileage).where(*_segment_criteria(segment))
+                )
+            ]
+            if not values:
+                emptied.append(row.id)
+                continue
+            built.append({"row_id": row.id, **_built_values(values, now), "updated_at": now})
+        _update_rows(db, built)
+        if emptied:
+            db.execute(delete(MarketStats).where(MarketStats.id.in_(emptied)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(rows)
+
+
+def rebuild(db: Session, chunk_size: int = REBUILD_CHUNK_SIZE) -> Dict[str, int]:
+    """Recompute every segment from car_listings, in one pass ordered by segment. Commits.
+
+    Returns:
+        Dict with the ``listings`` scanned and the ``segments`` written
+    """
+    now = datetime.utcnow()
+    partition = func.coalesce(CarListing.partition_id, 0)
+    query = (
+        select(CarListing.brand_id, CarListing.model_id, CarListing.year, partition,
+               CarListing.price, CarListing.mileage)
+        .where(CarListing.status == CarStatus.ACTIVE, CarListing.price.isnot(None))
+        .order_by(CarListing.brand_id, CarListing.model_id, CarListing.year, partition)
+        .execution_options(yield_per=chunk_size)
+    )
+    counts = {"listings": 0, "segments": 0}
+    try:
+        db.execute(delete(MarketStats))
+        pending: List[Dict[str, Any]] = []
+        segment, values = None, []
+        for brand_id, model_id, year, partition_id, price, mileage in db.execute(query):
+            key = (brand_id, model_id, year, partition_id)
+            if key != segment:
+                if values:
+                    pending.append({**dict(zip(_SEGMENT_COLUMNS, segment)), **_built_values(values, now)})
+                segment, values = key, []
+            values.append((float(price), float(mileage) if mileage is not None else None))
+            counts["listings"] += 1
+            if len(pending) >= _LOOKUP_CHUNK:
+                db.execute(insert(MarketStats), pending)
+                counts["segments"] += len(pending)
+                pending = []
+        if values:
+            pending.append({**dict(zip(_SEGMENT_COLUMNS, segment)), **_built_values(values, now)})
+        if pending:
+            db.execute(insert(MarketStats), pending)
+            counts["segments"] += len(pending)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.info(f"Market stats rebuilt: {counts}")
+    return counts
+
+
+def compact(db: Session) -> Dict[str, int]:
+    """Rebuild the segments whose digest is stale (``STATS_STALE_RATIO``) or that have no listings left.
+
+    Returns:
+        Dict with the segments ``rebuilt``
+    """
+    stale = db.execute(
+        select(MarketStats.brand_id, MarketStats.model_id, MarketStats.year, MarketStats.partition_id)
+        .where(or_(
+            MarketStats.listings <= 0,
+            MarketStats.removed > settings.STATS_STALE_RATIO * (MarketStats.listings + MarketStats.removed),
+        ))
+    ).all()
+    rebuilt = 0
+    for i in range(0, len(stale), _LOOKUP_CHUNK):
+        rebuilt += rebuild_segments(db, [tuple(row) for row in stale[i:i + _LOOKUP_CHUNK]])
+    if rebuilt:
+        logger.info(f"Market stats: {rebuilt} stale segments rebuilt")
+    return {"rebuilt": rebuilt}
+
+
+def _summary(sums: Dict[str, float], digest: TDigest, quantiles: Sequence[float],
+             year: Optional[int]) -> Dict[str, Any]:
+    n = sums["listings"]
+    mean = sums["price_sum"] / n
+    variance = max(sums["price_sq_sum"] / n - mean * mean, 0.0)
+    median = digest.quantile(0.5)
+    summary: Dict[str, Any] = {
+        "listings": int(n),
+        "mean_price": round(mean, 2),
+        "price_stddev": round(math.sqrt(variance), 2),
+        "quantiles": {f"p{q * 100:g}": round(digest.quantile(q), 2) for q in quantiles},
+        "mean_mileage": None,
+        "price_per_10k_km": None,
+        "reference_mileage": None,
+        "mileage_adjusted_price": None,
+    }
+    m = sums["mileage_listings"]
+    if m <= 0:
+        return summary
+    mean_mileage = sums["mileage_sum"] / m
+    summary["mean_mileage"] = round(mean_mileage)
+    spread = m * sums["mileage_sq_sum"] - sums["mileage_sum"] ** 2
+    if m < settings.STATS_MIN_REGRESSION_LISTINGS or spread <= 0:
+        return summary
+    # Least-squares slope of price on mileage
+    slope = (m * sums["mileage_price_product_sum"] - sums["mileage_price_sum"] * sums["mileage_sum"]) / spread
+    summary["price_per_10k_km"] = round(-slope * 10000, 2)
+    if year is not None and median is not None:
+        reference = settings.STATS_KM_PER_YEAR * max(datetime.utcnow().year - year, 0)
+        summary["reference_mileage"] = reference
+        summary["mileage_adjusted_price"] = round(max(median + slope * (reference - mean_mileage), 0.0), 2)
+    return summary
+
+
+def segment_stats(
+    db: Session,
+    brand: Optional[str] = None,
+    model: Optional[str] = None,
+    year: Optional[int] = None,
+    min_year: Optional[int] = None,
+    max_year: Optional[int] = None,
+    group_by: str = "year",
+    quantiles: Sequence[float] = DEFAULT_QUANTILES,
+    exact: bool = False,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Statistics of the matching segments, merged across partitions and grouped by ``group_by``.
+
+    Args:
+        db: Database session
+        brand: Brand name, a substring match (an exact, case-insensitive one with ``exact``)
+        model: Model name, likewise
+        year, min_year, max_year: Model years
+        group_by: ``year`` (brand, model and year), ``model`` (all years) or ``brand``
+        quantiles: Price quantiles to report, between 0 and 1
+        exact: Match brand and model names exactly
+        limit: Most groups to return, the largest first
+
+    Returns:
+        One dict per group with ``brand``, ``model`` and ``year`` (None when
+        grouped over it) and its statistics
+    """
+    if group_by not in GROUP_BY:
+        raise ValueError(f"Unknown grouping {group_by!r}, expected one of {tuple(GROUP_BY)}")
+    query = (
+        select(MarketStats, CarBrand.name, CarModel.name)
+        .join(CarBrand, CarBrand.id == MarketStats.brand_id)
+        .join(CarModel, CarModel.id == MarketStats.model_id)
+        .where(MarketStats.listings > 0)
+    )
+    # Names are resolved to ids first, so the segments are read through their unique key
+    brand_match = CarBrand.name.ilike(brand if exact else f"%{brand}%")
+    if model:
+        models = select(CarModel.brand_id, CarModel.id).where(
+            CarModel.name.ilike(model if exact else f"%{model}%")
+        )
+        if brand:
+            models = models.join(CarBrand, CarBrand.id == CarModel.brand_id).where(brand_match)
+        ids = db.execute(models).all()
+        query = query.where(MarketStats.brand_id.in_({brand_id for brand_id, _ in ids}),
+                            MarketStats.model_id.in_([model_id for _, model_id in ids]))
+    elif brand:
+        query = query.where(MarketStats.brand_id.in_(db.execute(select(CarBrand.id).where(brand_match)).scalars().all()))
+    if year is not None:
+        query = query.where(MarketStats.year == year)
+    if min_year is not None:
+        query = query.where(MarketStats.year >= min_year)
+    if max_year is not None:
+        query = query.where(MarketStats.year <= max_year)
+
+    width = GROUP_BY[group_by]
+    groups: Dict[Tuple, Dict[str, Any]] = {}
+    for row, brand_name, model_name in db.execute(query):
+        key = (row.brand_id, row.model_id, row.year)[:width]
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "brand": brand_name,
+                "model": model_name if width > 1 else None,
+                "year": row.year if width > 2 else None,
+                "partitions": 0,
+                "sums": _empty_sums(),
+                "digests": [],
+            }
+        group["partitions"] += 1
+        for name in _SUMS:
+            group["sums"][name] += getattr(row, name) or 0
+        group["digests"].append(row.price_digest)
+
+    ordered = sorted(groups.values(), key=lambda group: (-group["sums"]["listings"], group["brand"],
+                                                        group["model"] or "", group["year"] or 0))
+    return [
+        {
+            "brand": group["brand"],
+            "model": group["model"],
+            "year": group["year"],
+            "partitions": group["partitions"],
+            # Only the returned groups' digests are decoded and merged
+            **_summary(group["sums"], TDigest.merged([TDigest.from_bytes(data) for data in group["digests"]]),
+                       quantiles, group["year"]),
+        }
+        for group in ordered[:limit]
+    ]
+
+
+@celery_app.task(name="market_stats.compact")
+def run_compact() -> Dict[str, int]:
+    """Beat entry point for ``compact``."""
+    db = SessionLocal()
+    try:
+        return compact(db)
+    except Exception as e:
+        logger.error(f"Market stats compaction failed: {str(e)}", exc_info=True)
+        return {}
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Market statistics rollups")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = commands.add_parser("rebuild", help="Recompute every segment from car_listings")
+    rebuild_parser.add_argument("--chunk-size", type=int, default=REBUILD_CHUNK_SIZE)
+    commands.add_parser("compact", help="Rebuild the stale segments")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            result = rebuild(db, chunk_size=args.chunk_size)
+        else:
+            result = compact(db)
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,104 +1,123 @@
-from typing import Dict, Optional, Tuple
-import rapidfuzz
+from typing import Dict, List, Optional, Tuple
 from app.db.models import CarBrand, CarModel, CarListing
 from app.core.config import settings
+from app.core.tracing import traced
 from sqlalchemy.orm import Session
 from app.db.session import SessionLocal
+from app.services.brand_matcher import BrandMatcher, get_brand_matcher
+from app.services.listing_batch import normalize_batch
 
+@traced("normalize.listing")
 async def normalize_car_data(raw_data: Dict, db: Session = None) -> Optional[Dict]:
     """
     Normalize raw car listing data and ensure it matches the CarListing model.
     """
     try:
+        result = clean_car_data(raw_data)
+        if not result:
+            return None
+
         # Get or create database session
         local_session = None
         if db is None:
             local_session = SessionLocal()
             db = local_session
-            
+
         try:
-            # Extract basic information
-            yad2_id = raw_data.get("yad2_id")
-            if not yad2_id:
-                return None
-                
-            # Get or create brand
-            brand_name = raw_data.get("brand", "").strip()
-            if not brand_name:
-                return None
-                
-            brand = db.query(CarBrand).filter(CarBrand.name == brand_name).first()
-            if not brand:
-                brand = CarBrand(name=brand_name, normalized_name=brand_name.lower())
-                db.add(brand)
-                db.commit()
-                db.refresh(brand)
-            
-            # Get or create model
-            model_name = raw_data.get("model", "").strip()
-            if not model_name:
+            match_brand_models([result], get_brand_matcher(db))
+            if not result["brand"] or not result["model"]:
                 return None
-                
-            model = db.query(CarModel).filter(
-                CarModel.name == model_name,
-                CarModel.brand_id == brand.id
-            ).first()
-            
-            if not model:
-                model = CarModel(
-                    name=model_name,
-                    normalized_name=model_name.lower(),
-                    brand_id=brand.id
-                )
-                db.add(model)
-                db.commit()
-                db.refresh(model)
-            
-            # Normalize price
-            price = float(raw_data.get("price", 0))
-            if price <= 0:
-                return None
-            
-            # Extract year
-            year = int(raw_data.get("year", 0))
-            if year < 1900 or year > 2100:  # Basic validation
-                year = None
-                
-            # Extract mileage (convert to km if needed)
-            mileage = int(raw_data.get("mileage", 0))
-            
-            # Prepare the result
-            result = {
-                "yad2_id": yad2_id,
-                "title": raw_data.get("title", "").strip(),
-                "price": price,
-                "year": year,
-                "mileage": mileage,
-                "fuel_type": raw_data.get("fuel_type", "").strip(),
-                "transmission": raw_data.get("transmission", "").strip(),
-                "body_type": raw_data.get("body_type", "").strip(),
-                "color": raw_data.get("color", "").strip(),
-                "url": raw_data.get("url", "").strip(),
-                "image_url": raw_data.get("image_url", "").strip(),
-                "location": raw_data.get("location", "").strip(),
-                "brand_id": brand.id,
-                "model_id": model.id
-            }
-            
-            # Ensure required fields are present
-            if not all([result["yad2_id"], result["title"], result["price"] > 0]):
-                return None
-                
+            result["brand_id"], result["model_id"] = resolve_brand_model(
+                db, result.pop("brand"), result.pop("model"),
+                brand_key=result.pop("brand_key"), model_key=result.pop("model_key")
+            )
             return result
-            
+
         finally:
             if local_session:
                 local_session.close()
-                
+
     except Exception as e:
         print(f"Error normalizing car data: {str(e)}")
         return None
 
+def clean_car_data(raw_data: Dict) -> Optional[Dict]:
+    """
+    Validate and clean one raw listing without touching the database.
+
+    A batch of one for ``normalize_batch`` (app.services.listing_batch);
+    prefer that for more than one listing. Returns the CarListing values with
+    the scraped ``brand`` and ``model`` names (possibly empty; see
+    ``match_brand_models``) in place of their ids, or None if the listing is
+    invalid.
+    """
+    batch = normalize_batch([raw_data], require_year=False)
+    return batch.row(0) if len(batch) else None
+
+def match_brand_models(rows: List[Dict], matcher: BrandMatcher) -> None:
+    """
+    Replace the scraped ``brand`` and ``model`` of cleaned rows with catalog names.
+
+    Each row is matched on its "<brand> <model>" and, when that finds no model,
+    on its title. Rows the catalog does not know keep their scraped names.
+    Adds the ``brand_key`` and ``model_key`` to pass to ``resolve_brand_model``.
+    """
+    matches = matcher.match_many([f"{row['brand']} {row['model']}".strip() or row["title"] for row in rows])
+    retry = [i for i, match in enumerate(matches) if (match is None or match.model is None) and rows[i]["title"]]
+    for i, match in zip(retry, matcher.match_many([rows[i]["title"] for i in retry])):
+        if match is not None and (matches[i] is None or match.model is not None):
+            matches[i] = match
+
+    for row, match in zip(rows, matches):
+        row["brand_key"] = row["model_key"] = None
+        if match is None:
+            continue
+        row["brand"], row["brand_key"] = match.brand, match.brand_key
+        if match.model is not None:
+            row["model"], row["model_key"] = match.model, match.model_key
+
+def resolve_brand_model(db: Session, brand_name: str, model_name: str,
+                        cache: Optional[Dict[Tuple[str, str], Tuple[int, int]]] = None,
+                        brand_key: Optional[str] = None, model_key: Optional[str] = None) -> Tuple[int, int]:
+    """
+    Return the (brand_id, model_id) for the names, creating the rows if needed.
+
+    Pass the same ``cache`` dict for a whole batch or crawl to skip the lookups
+    of names that were already resolved. ``brand_key`` and ``model_key`` are
+    the catalog keys stored as the ``normalized_name`` of new rows.
+    """
+    key = (brand_name, model_name)
+    if cache is not None and key in cache:
+        return cache[key]
+
+    # Get or create brand
+    brand = db.query(CarBrand).filter(CarBrand.name == brand_name).first()
+    if not brand:
+        brand = CarBrand(name=brand_name, normalized_name=brand_key or brand_name.lower())
+        db.add(brand)
+        db.commit()
+        db.refresh(brand)
+
+    # Get or create model
+    model = db.query(CarModel).filter(
+        CarModel.name == model_name,
+        CarModel.brand_id == brand.id
+    ).first()
+
+    if not model:
+        model = CarModel(
+            name=model_name,
+            normalized_name=model_key or model_name.lower(),
+            brand_id=brand.id
+        )
+        db.add(model)
+        db.commit()
+        db.refresh(model)
+
+    if cache is not None:
+        cache[key] = (brand.id, model.id)
+    return brand.id, model.id
+
 def _normalize_price(price_str: str) -> Optional[float]:
     """Extract and normalize price from string"""
     try:
@@ -109,26 +128,11 @@ def _normalize_price(price_str: str) -> Optional[float]:
         return None
 
 def _extract_brand_model(title: str) -> tuple:
-    """Extract brand and model from title using fuzzy matching"""
-    # TODO: Load brand and model dictionaries
-    brands = ["toyota", "honda", "bmw", "mercedes"]
-    models = {"toyota": ["corolla", "camry"], "honda": ["civic", "accord"]}
-    
-    # Find best matching brand
-    brand_scores = {
-        brand: rapidfuzz.fuzz.ratio(title.lower(), brand)
-        for brand in brands
-    }
-    best_brand = max(brand_scores, key=brand_scores.get)
-    
-    # Find best matching model for the brand
-    model_scores = {
-        model: rapidfuzz.fuzz.ratio(title.lower(), model)
-        for model in models.get(best_brand, [])
-    }
-    best_model = max(model_scores, key=model_scores.get)
-    
-    return best_brand, best_model
+    """Extract brand and model keys from title using the brand matcher"""
+    match = get_brand_matcher().match(title)
+    if match is None:
+        return None, None
+    return match.brand_key, match.model_key
 
 def _normalize_location(location: str) -> str:
     """Normalize location using predefined mappings"""
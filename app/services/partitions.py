@@ -0,0 +1,87 @@
+"""
+Maintenance of the PostgreSQL partitions (see ``app.db.partitioning``).
+
+Run by Celery beat every ``PARTITION_MAINTENANCE_HOURS``: creates the monthly
+``car_listing_history`` partitions ``HISTORY_PARTITION_MONTHS_AHEAD`` months in
+advance, so history rows never pile up in the default partition, and detaches
+(with ``HISTORY_DROP_EXPIRED``, drops) the months older than
+``HISTORY_RETENTION_MONTHS``. Every step is idempotent; running it twice, or
+from two beat processes, is harmless. On other databases it does nothing.
+
+Usage:
+    python -m app.services.partitions run
+"""
+import argparse
+import json
+import logging
+from datetime import date
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.celery_app import celery_app
+from app.db.partitioning import (
+    HISTORY_TABLE, PARTITIONED_DIALECTS, ensure_history_partitions, expire_history_partitions
+)
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def maintain_partitions(db: Session, today: Optional[date] = None) -> Dict[str, List[str]]:
+    """Create the coming history partitions and expire the old ones, in one transaction.
+
+    Returns:
+        Dict with the partitions ``created`` and ``expired``
+    """
+    conn = db.connection()
+    if conn.dialect.name not in PARTITIONED_DIALECTS:
+        logger.debug(f"{conn.dialect.name} tables are not partitioned, nothing to maintain")
+        return {"created": [], "expired": []}
+    try:
+        result = {
+            "created": ensure_history_partitions(conn, today),
+            "expired": expire_history_partitions(conn, today),
+        }
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if result["created"] or result["expired"]:
+        logger.info(
+            f"{HISTORY_TABLE} partitions created: {result['created'] or 'none'}, "
+            f"expired: {result['expired'] or 'none'}"
+        )
+    return result
+
+
+@celery_app.task(name="partitions.maintain")
+def run_maintenance() -> Dict[str, List[str]]:
+    """Beat entry point for ``maintain_partitions``."""
+    db = SessionLocal()
+    try:
+        return maintain_partitions(db)
+    except Exception as e:
+        logger.error(f"Partition maintenance failed: {str(e)}", exc_info=True)
+        return {}
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain the PostgreSQL table partitions")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("run", help="Create the coming history partitions and expire the old ones")
+    parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    db = SessionLocal()
+    try:
+        result = maintain_partitions(db)
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
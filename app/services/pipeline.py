@@ -0,0 +1,191 @@
+"""
+Streaming pipeline from a scraper to the car_listings table.
+
+    fetch/parse -> normalize -> batch -> upsert
+
+Each stage runs as its own task and hands listings to the next one through a
+bounded ``asyncio.Queue``. When the database falls behind, the queues fill up
+and the scraper blocks on ``put`` instead of piling listings up in memory, so
+memory stays flat however many pages are crawled. A batch is written when it
+reaches ``batch_size`` rows or has waited ``flush_seconds``, so listings show up
+in the database seconds after their page was fetched, even on a slow crawl.
+With SCRAPING_KEEP_RAW_DATA, the normalize stage also archives the raw payloads
+of each chunk (``ingest.archive_listings``).
+
+The database work of the normalize and upsert stages (brand lookups, archive,
+upsert) runs in threads through ``asyncio.to_thread``, each stage with its own
+session on the caller's engine, so queries and commits never stall the
+scraper's event loop.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.executor import get_executor
+from app.core.metrics import track_queue
+from app.services.ingest import (
+    INGEST_BATCH_SIZE, archive_listings, clean_listings, empty_result, error_recorder, resolve_listings, upsert_rows
+)
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the stream on a queue
+_DONE = object()
+
+# Listings are None for a page that failed to load, empty for a page past the last result
+Page = Tuple[int, Optional[List[Dict[str, Any]]]]
+
+
+async def run_pipeline(
+    pages: AsyncIterable[Page],
+    db: Session,
+    batch_size: int = INGEST_BATCH_SIZE,
+    queue_size: Optional[int] = None,
+    flush_seconds: Optional[float] = None,
+    on_page: Optional[Callable[[int, int], None]] = None,
+    on_batch: Optional[Callable[[Dict[str, int]], None]] = None,
+    partition_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """Stream scraped pages into the database.
+
+    Args:
+        pages: Async iterable of ``(page number, listings)``, e.g.
+            ``Yad2Scraper.scrape_parallel`` or ``Yad2ApiScraper.iter_listing_pages``
+        db: Database session whose engine the normalize and upsert stages open
+            their own sessions on
+        batch_size: Maximum number of rows per upsert transaction
+        queue_size: Capacity of each queue between stages (default: PIPELINE_QUEUE_SIZE)
+        flush_seconds: Longest time a row waits for its batch to fill (default: PIPELINE_FLUSH_SECONDS)
+        on_page: Called with the page number and its listing count as each page arrives
+        on_batch: Called after each upsert with its ``new``, ``updated`` and ``errors`` counts
+        partition_id: Scheduled partition being crawled, recorded on every stored listing
+
+    Returns:
+        Dict with ``pages``, ``failed_pages``, ``reached_end`` (a page came back
+        with an empty result feed and no later page had listings, so the crawl
+        went past the last result) and the counts of ``ingest_listings``
+    """
+    queue_size = queue_size or settings.PIPELINE_QUEUE_SIZE
+    flush_seconds = flush_seconds or settings.PIPELINE_FLUSH_SECONDS
+    result = {**empty_result(), "pages": 0, "failed_pages": 0, "reached_end": False}
+    record_error = error_recorder(result)
+    listing_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    row_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    track_queue("listings", listing_queue)
+    track_queue("rows", row_queue)
+    # One session per stage: each is only ever used by one thread at a time
+    normalize_db = Session(bind=db.get_bind(), autoflush=False)
+    upsert_db = Session(bind=db.get_bind(), autoflush=False)
+
+    # First page with an empty feed and last page with listings; pages arrive out of order
+    empty_page: Optional[int] = None
+    last_full_page = 0
+
+    async def fetch() -> None:
+        nonlocal empty_page, last_full_page
+        try:
+            async for page_num, listings in pages:
+                result["pages"] += 1
+                if listings is None:
+                    result["failed_pages"] += 1
+                    continue
+                if listings:
+                    last_full_page = max(last_full_page, page_num)
+                else:
+                    empty_page = page_num if empty_page is None else min(empty_page, page_num)
+                if on_page:
+                    on_page(page_num, len(listings))
+                for listing in listings:
+                    result["total"] += 1
+                    await listing_queue.put(listing)
+        finally:
+            # Runs the scraper's own cleanup (browser, HTTP session) even when cancelled
+            aclose = getattr(pages, "aclose", None)
+            if aclose:
+                await aclose()
+        await listing_queue.put(_DONE)
+
+    brand_cache: Dict = {}
+
+    def store_chunk(chunk: List[Dict[str, Any]], cleaned: List) -> List[Dict[str, Any]]:
+        archive_listings(normalize_db, chunk, record_error)
+        return resolve_listings(normalize_db, cleaned, record_error, brand_cache)
+
+    async def normalize() -> None:
+        done = False
+        while not done:
+            # Take whatever is waiting (up to one executor batch) so the cleanup
+            # runs off the event loop in chunks rather than per listing
+            chunk = [await listing_queue.get()]
+            while len(chunk) < settings.CPU_EXECUTOR_BATCH_SIZE and not listing_queue.empty():
+                chunk.append(listing_queue.get_nowait())
+            if chunk[-1] is _DONE:
+                chunk.pop()
+                done = True
+            cleaned = await clean_listings(chunk, record_error)
+            for row in await asyncio.to_thread(store_chunk, chunk, cleaned):
+                await row_queue.put(row)
+        await row_queue.put(_DONE)
+
+    reported_errors = 0
+
+    async def write(batch: Dict[str, Dict[str, Any]]) -> None:
+        nonlocal reported_errors
+        before = {key: result[key] for key in ("new", "updated")}
+        if partition_id is not None:
+            for row in batch.values():
+                row["partition_id"] = partition_id
+        # Only this stage changes the new and updated counts, so reading them around the thread is safe
+        await asyncio.to_thread(upsert_rows, upsert_db, batch, result, record_error)
+        if on_batch:
+            errors, reported_errors = result["errors"] - reported_errors, result["errors"]
+            on_batch({**{key: result[key] - count for key, count in before.items()}, "errors": errors})
+
+    async def upsert() -> None:
+        batch: Dict[str, Dict[str, Any]] = {}
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                row = await asyncio.wait_for(row_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                row = None
+            if row is _DONE:
+                break
+            if row is not None:
+                # Later duplicates in a batch win, like they would with one upsert per listing
+                batch[row["yad2_id"]] = row
+                deadline = deadline or time.monotonic() + flush_seconds
+            if batch and (len(batch) >= batch_size or time.monotonic() >= deadline):
+                await write(batch)
+                batch, deadline = {}, None
+        if batch:
+            await write(batch)
+
+    tasks = [asyncio.create_task(stage()) for stage in (fetch, normalize, upsert)]
+    try:
+        # The first failure cancels the other stages instead of leaving them blocked on a queue
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        normalize_db.close()
+        upsert_db.close()
+
+    result["reached_end"] = empty_page is not None and last_full_page < empty_page
+    logger.info(
+        f"Pipeline stored {result['total']} listings from {result['pages']} pages "
+        f"({result['failed_pages']} failed): "
+        f"{result['new']} new, {result['updated']} updated, {result['errors']} errors"
+    )
+    logger.info(f"CPU executor: {get_executor().stats()}")
+    return result
@@ -0,0 +1,167 @@
+"""
+Archive of the raw payloads behind the listings.
+
+The scrapers' raw card details and API items (and the fetched listings of
+``seed_database.py``) hold more than the normalized ``car_listings`` columns.
+Storing them in that table would widen every row the read endpoints scan, so
+they go to two append-only tables instead:
+
+- ``raw_blobs``: zstd-compressed canonical JSON, addressed by the SHA-256 of
+  the JSON, so a payload that did not change is stored once
+- ``raw_payloads``: (``yad2_id``, ``scraped_at``, digest), one row per change
+
+``archive_payloads`` writes a batch with one lookup per table and one bulk
+insert each. Payloads are only decompressed when read: by
+``GET /car/listings/{id}/raw`` (``load_payloads``) or to re-normalize listings
+(``app.services.backfill``, with ``latest_blobs``).
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import zstandard
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.db.models.raw import RawBlob, RawPayload
+
+logger = logging.getLogger(__name__)
+
+# Fixed so that the same payload always compresses to the same blob
+ZSTD_LEVEL = 6
+
+_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+_decompressor = zstandard.ZstdDecompressor()
+
+# Keep the IN (...) lists of the lookups well below the drivers' parameter limits
+_LOOKUP_CHUNK = 500
+
+
+def encode_raw(raw_data: Any) -> bytes:
+    """Serialize a raw payload to compressed canonical JSON."""
+    return _compressor.compress(_canonical_json(raw_data))
+
+
+def decode_raw(blob: bytes) -> Any:
+    """Decode a blob written by ``encode_raw``."""
+    return json.loads(_decompressor.decompress(blob))
+
+
+def _canonical_json(raw_data: Any) -> bytes:
+    return json.dumps(raw_data, ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+                      default=str).encode("utf-8")
+
+
+def raw_blob(listing: Any) -> Optional[bytes]:
+    """The encoded raw payload of a scraped listing (a ``ListingRecord`` or dict), if it has one."""
+    blob = getattr(listing, "raw_blob", None)
+    if blob is not None:
+        return blob
+    raw_data = listing.get("raw_data")
+    return encode_raw(raw_data) if raw_data else None
+
+
+def archive_payloads(db: Session, payloads: Iterable[Tuple[str, datetime, bytes]]) -> Dict[str, int]:
+    """Append encoded payloads to the archive in one transaction.
+
+    A payload is skipped when it is the one last archived for its listing, and
+    its blob is only inserted when no listing had the same payload before.
+
+    Args:
+        db: Database session
+        payloads: ``(yad2_id, scraped_at, blob)`` with blobs from ``encode_raw``
+
+    Returns:
+        Dict with the ``payloads`` and ``blobs`` added and the compressed ``bytes`` written
+    """
+    entries: Dict[str, Tuple[datetime, str]] = {}
+    blobs: Dict[str, Tuple[bytes, int]] = {}
+    for yad2_id, scraped_at, blob in payloads:
+        data = _decompressor.decompress(blob)
+        digest = hashlib.sha256(data).hexdigest()
+        # Later payloads of a listing in the same batch win
+        entries[yad2_id] = (scraped_at, digest)
+        blobs.setdefault(digest, (blob, len(data)))
+    if not entries:
+        return {"payloads": 0, "blobs": 0, "bytes": 0}
+
+    latest = _latest_digests(db, list(entries))
+    rows = [
+        {"yad2_id": yad2_id, "scraped_at": scraped_at, "digest": digest}
+        for yad2_id, (scraped_at, digest) in entries.items()
+        if latest.get(yad2_id) != digest
+    ]
+    needed = {row["digest"] for row in rows}
+    stored = _existing_digests(db, list(needed))
+    blob_rows = [
+        {"digest": digest, "data": blobs[digest][0], "size": blobs[digest][1]}
+        for digest in needed - stored
+    ]
+    try:
+        if blob_rows:
+            db.execute(insert(RawBlob), blob_rows)
+        if rows:
+            db.execute(insert(RawPayload), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {
+        "payloads": len(rows),
+        "blobs": len(blob_rows),
+        "bytes": sum(len(row["data"]) for row in blob_rows),
+    }
+
+
+def _latest_digests(db: Session, yad2_ids: List[str]) -> Dict[str, str]:
+    latest: Dict[str, str] = {}
+    for i in range(0, len(yad2_ids), _LOOKUP_CHUNK):
+        query = (
+            select(RawPayload.yad2_id, RawPayload.digest)
+            .where(RawPayload.yad2_id.in_(yad2_ids[i:i + _LOOKUP_CHUNK]))
+            .order_by(RawPayload.scraped_at, RawPayload.id)
+        )
+        # Ordered oldest first, so the last digest of a listing is its latest
+        latest.update(db.execute(query).all())
+    return latest
+
+
+def _existing_digests(db: Session, digests: List[str]) -> set:
+    existing = set()
+    for i in range(0, len(digests), _LOOKUP_CHUNK):
+        query = select(RawBlob.digest).where(RawBlob.digest.in_(digests[i:i + _LOOKUP_CHUNK]))
+        existing.update(db.execute(query).scalars())
+    return existing
+
+
+def latest_blobs(db: Session, yad2_ids: List[str]) -> Dict[str, bytes]:
+    """Return the encoded latest payload of each listing that has one, without decoding it."""
+    digests = _latest_digests(db, yad2_ids)
+    unique = list(set(digests.values()))
+    data: Dict[str, bytes] = {}
+    for i in range(0, len(unique), _LOOKUP_CHUNK):
+        query = select(RawBlob.digest, RawBlob.data).where(RawBlob.digest.in_(unique[i:i + _LOOKUP_CHUNK]))
+        data.update(db.execute(query).all())
+    return {yad2_id: data[digest] for yad2_id, digest in digests.items()}
+
+
+def load_payloads(db: Session, yad2_id: str, latest_only: bool = True) -> List[Dict[str, Any]]:
+    """Read the archived payloads of a listing, newest first.
+
+    Returns:
+        List of dicts with ``scraped_at``, ``digest``, ``size`` and the decoded ``raw_data``
+    """
+    query = (
+        select(RawPayload.scraped_at, RawBlob.digest, RawBlob.size, RawBlob.data)
+        .join(RawBlob, RawBlob.digest == RawPayload.digest)
+        .where(RawPayload.yad2_id == yad2_id)
+        .order_by(RawPayload.scraped_at.desc(), RawPayload.id.desc())
+    )
+    if latest_only:
+        query = query.limit(1)
+    return [
+        {"scraped_at": scraped_at, "digest": digest, "size": size, "raw_data": decode_raw(data)}
+        for scraped_at, digest, size, data in db.execute(query)
+    ]
@@ -0,0 +1,310 @@
+"""
+Periodic scheduling of scrape jobs per search partition.
+
+Every ``SCHEDULER_TICK_SECONDS`` Celery beat runs ``tick``, which enqueues a
+scrape job for each partition whose ``next_run_at`` has passed. Guarantees:
+
+- No overlap: a run is only dispatched after taking the partition lease with a
+  conditional UPDATE, so two beat processes (or a slow previous run) can never
+  crawl the same partition at once. The lease is released when the run has
+  stored its listings, or expires after ``SCHEDULER_LEASE_MINUTES`` if a worker died.
+  It is taken for one job (``current_job_id``), and only that job can release
+  it, so a run that outlived its lease cannot end the run that replaced it.
+- Catch-up: after downtime, overdue partitions run once (missed runs are
+  coalesced, not replayed), most overdue first, at most
+  ``SCHEDULER_MAX_DISPATCH_PER_TICK`` per tick.
+- Adaptive intervals: each run updates an EWMA of the share of listings that
+  were new or changed. Partitions that change more than
+  ``SCRAPING_TARGET_CHANGE_RATE`` are crawled more often, stale ones less,
+  within the configured bounds. Every interval gets +/- ``SCHEDULER_JITTER``.
+"""
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.db.models.schedule import ScrapePartition
+from app.db.session import SessionLocal
+from app.services.lifecycle import record_complete_crawl
+from app.services.task_registry import purge_expired_jobs
+
+logger = logging.getLogger(__name__)
+
+# Weight of the latest run in the change-rate average
+CHANGE_RATE_ALPHA = 0.3
+_MIN_CHANGE_RATE = 0.001
+
+DEFAULT_PARTITIONS = [{"key": "all", "params": {}}]
+
+
+def _jittered(minutes: float) -> timedelta:
+    """Return ``minutes`` +/- the configured jitter as a timedelta."""
+    jitter = settings.SCHEDULER_JITTER
+    return timedelta(minutes=minutes * (1 + random.uniform(-jitter, jitter)))
+
+
+def _lease_owner() -> str:
+    """Identify this process as a lease holder."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def adapt_interval(change_rate: Optional[float]) -> float:
+    """Return the crawl interval in minutes for a partition with the given change rate.
+
+    The interval scales inversely with the change rate so each run finds roughly
+    ``SCRAPING_TARGET_CHANGE_RATE`` of its listings new or changed.
+    """
+    base = float(settings.SCRAPING_INTERVAL_MINUTES)
+    if change_rate is None:
+        return base
+    interval = base * settings.SCRAPING_TARGET_CHANGE_RATE / max(change_rate, _MIN_CHANGE_RATE)
+    return min(max(interval, settings.SCRAPING_MIN_INTERVAL_MINUTES), settings.SCRAPING_MAX_INTERVAL_MINUTES)
+
+
+def sync_partitions(db: Session, specs: Optional[List[Dict[str, Any]]] = None) -> List[ScrapePartition]:
+    """Create or update partitions from their specs and disable the ones no longer listed.
+
+    New partitions get their first run spread over one base interval so they do
+    not all start on the same tick.
+
+    Args:
+        db: Database session
+        specs: Partition specs (``key`` and ``params``), default: SCRAPING_PARTITIONS
+
+    Returns:
+        List of the enabled partitions
+    """
+    specs = specs or settings.SCRAPING_PARTITIONS or DEFAULT_PARTITIONS
+    existing = {p.key: p for p in db.query(ScrapePartition).all()}
+    now = datetime.utcnow()
+    base = float(settings.SCRAPING_INTERVAL_MINUTES)
+
+    enabled = []
+    for spec in specs:
+        key = spec["key"]
+        params = spec.get("params") or {}
+        partition = existing.pop(key, None)
+        if partition is None:
+            partition = ScrapePartition(
+                key=key,
+                params=params,
+                enabled=True,
+                interval_minutes=base,
+                next_run_at=now + timedelta(minutes=random.uniform(0, base)),
+                run_count=0,
+            )
+            db.add(partition)
+            logger.info(f"Added scrape partition {key}")
+        else:
+            if partition.params != params:
+                partition.params = params
+            partition.enabled = True
+        enabled.append(partition)
+
+    for partition in existing.values():
+        if partition.enabled:
+            partition.enabled = False
+            logger.info(f"Disabled scrape partition {partition.key}")
+
+    db.commit()
+    return enabled
+
+
+def acquire_lease(db: Session, partition_id: int, owner: str, job_id: str,
+                  now: Optional[datetime] = None) -> bool:
+    """Take the lease of a due partition for the job that is about to run it.
+
+    The UPDATE only matches if the partition is due and nobody holds a live
+    lease, so concurrent schedulers cannot both win.
+
+    Returns:
+        bool: True if this caller now holds the lease
+    """
+    now = now or datetime.utcnow()
+    result = db.execute(
+        update(ScrapePartition)
+        .where(
+            ScrapePartition.id == partition_id,
+            ScrapePartition.enabled.is_(True),
+            ScrapePartition.next_run_at <= now,
+            or_(ScrapePartition.lease_owner.is_(None), ScrapePartition.lease_expires_at < now),
+        )
+        .values(
+            lease_owner=owner,
+            lease_expires_at=now + timedelta(minutes=settings.SCHEDULER_LEASE_MINUTES),
+            current_job_id=job_id,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def dispatch_due_partitions(db: Session, now: Optional[datetime] = None) -> List[str]:
+    """Enqueue a scrape job for every due partition whose lease can be taken.
+
+    Returns:
+        List of the enqueued job ids
+    """
+    # jobs imports this module to report finished runs
+    from app.services.jobs import enqueue_scrape_job
+
+    now = now or datetime.utcnow()
+    owner = _lease_owner()
+    due = (
+        db.query(ScrapePartition)
+        .filter(
+            ScrapePartition.enabled.is_(True),
+            ScrapePartition.next_run_at <= now,
+            or_(ScrapePartition.lease_owner.is_(None), ScrapePartition.lease_expires_at < now),
+        )
+        .order_by(ScrapePartition.next_run_at)
+        .limit(settings.SCHEDULER_MAX_DISPATCH_PER_TICK)
+        .all()
+    )
+
+    job_ids = []
+    for partition in due:
+        # The job id is known before the job exists: the job may finish (and release
+        # the lease it was given) before enqueue_scrape_job returns
+        job_id = str(uuid.uuid4())
+        if not acquire_lease(db, partition.id, owner, job_id, now):
+            continue
+        db.refresh(partition)
+
+        overdue = (now - partition.next_run_at).total_seconds() / 60
+        if overdue > partition.interval_minutes:
+            logger.info(
+                f"Partition {partition.key} is {overdue:.0f} min overdue; "
+                f"coalescing {int(overdue // partition.interval_minutes)} missed runs into one"
+            )
+
+        try:
+            job = enqueue_scrape_job(db, partition.params or {}, partition_id=partition.id, job_id=job_id)
+        except Exception as e:
+            logger.error(f"Failed to enqueue partition {partition.key}: {str(e)}", exc_info=True)
+            db.rollback()
+            release_lease(db, partition.id, job_id)
+            continue
+        partition.last_job_id = job.id
+        db.commit()
+        job_ids.append(job.id)
+        logger.info(f"Dispatched scrape job {job.id} for partition {partition.key}")
+
+    return job_ids
+
+
+def release_lease(db: Session, partition_id: int, job_id: str, **values: Any) -> bool:
+    """Release the lease a job holds on a partition, setting ``values`` in the same UPDATE.
+
+    Like ``acquire_lease`` this is a compare-and-set: the UPDATE only matches
+    while the lease is still held for ``job_id``. A job that outlived its lease,
+    which was then taken for a newer run, releases (and records) nothing.
+
+    Returns:
+        bool: True if the job held the lease
+    """
+    result = db.execute(
+        update(ScrapePartition)
+        .where(ScrapePartition.id == partition_id, ScrapePartition.current_job_id == job_id)
+        .values(lease_owner=None, lease_expires_at=None, current_job_id=None, **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def is_complete_crawl(result: Optional[Dict[str, Any]]) -> bool:
+    """Whether a run saw every listing of its partition: it found some, no page failed and it reached the end."""
+    return bool(result and result.get("total") and not result.get("failed_pages") and result.get("reached_end"))
+
+
+def complete_partition_run(db: Session, partition_id: Optional[int], job_id: str,
+                           result: Optional[Dict[str, Any]], started_at: Optional[datetime] = None) -> bool:
+    """Record the outcome of a scheduled run, reschedule the partition and release its lease.
+
+    A crawl that went through to the end of the results (``reached_end``), found
+    listings and had no failed page is also recorded for the listing lifecycle
+    (``lifecycle.record_complete_crawl``). Anything less, e.g. a blocked crawl
+    whose pages all failed, must not mark the partition's listings sold.
+
+    Args:
+        db: Database session
+        partition_id: Partition of the run (None for manual runs, which are ignored)
+        job_id: Scrape job of the run; nothing is recorded unless it still holds the lease
+        result: Pipeline result (``total``, ``new``, ``changed``, ``reached_end``,
+            ``failed_pages``), or None if the run failed
+        started_at: When the run started, needed to record a complete crawl
+
+    Returns:
+        bool: True if the run was recorded (its job held the lease)
+    """
+    if partition_id is None:
+        return False
+    partition = db.query(ScrapePartition).filter(ScrapePartition.id == partition_id).first()
+    if not partition:
+        return False
+
+    now = datetime.utcnow()
+    values: Dict[str, Any] = {}
+    observed = None
+    if result and result.get("total"):
+        observed = (result.get("new", 0) + result.get("changed", 0)) / result["total"]
+        if partition.change_rate is None:
+            change_rate = observed
+        else:
+            change_rate = CHANGE_RATE_ALPHA * observed + (1 - CHANGE_RATE_ALPHA) * partition.change_rate
+        next_in = adapt_interval(change_rate)
+        values.update(change_rate=change_rate, interval_minutes=next_in, last_run_at=now,
+                      run_count=(partition.run_count or 0) + 1)
+    else:
+        # Failed or empty run: retry at the base interval at the latest, without learning from it
+        next_in = min(partition.interval_minutes, float(settings.SCRAPING_INTERVAL_MINUTES))
+
+    if not release_lease(db, partition_id, job_id, next_run_at=now + _jittered(next_in), **values):
+        logger.warning(f"Job {job_id} no longer holds the lease of partition {partition.key}; its run is not recorded")
+        return False
+    db.refresh(partition)
+    if observed is not None:
+        logger.info(
+            f"Partition {partition.key}: {observed:.1%} new/changed this run, "
+            f"rate {partition.change_rate:.1%}, next run in ~{next_in:.0f} min"
+        )
+    else:
+        logger.warning(f"Partition {partition.key} run failed or found nothing; retrying in ~{next_in:.0f} min")
+
+    if is_complete_crawl(result) and started_at:
+        try:
+            record_complete_crawl(db, partition, started_at)
+        except Exception as e:
+            logger.error(f"Error updating listing lifecycle of partition {partition.key}: {str(e)}", exc_info=True)
+    return True
+
+
+def list_partitions(db: Session) -> List[ScrapePartition]:
+    """Return all partitions, next due first."""
+    return db.query(ScrapePartition).order_by(ScrapePartition.next_run_at).all()
+
+
+@celery_app.task(name="scheduler.tick")
+def tick() -> List[str]:
+    """Beat entry point: sync the partitions, dispatch the due ones and purge expired jobs."""
+    db = SessionLocal()
+    try:
+        sync_partitions(db)
+        purge_expired_jobs(db)
+        return dispatch_due_partitions(db)
+    except Exception as e:
+        logger.error(f"Scheduler tick failed: {str(e)}", exc_info=True)
+        db.rollback()
+        return []
+    finally:
+        db.close()
@@ -10,7 +10,8 @@ from datetime import datetime
 from app.config.scraping import ScrapingSettings
 from app.services.normalization import normalize_car_data
 from app.core.caching import cache
-from app.exceptions.scraping import ScrapingError, FatalError
+from app.exceptions.scraping import ScrapingError, FatalError, RateLimitError
+from app.scrapers.rate_limit import get_rate_limiter
 from app.utils.error_handling import ErrorHandler
 
 logger = logging.getLogger(__name__)
@@ -19,7 +20,7 @@ settings = ScrapingSettings()
 class ScrapingService:
     def __init__(self):
         self.yad2_scraper = Yad2Scraper()
-        self._last_request_time = 0
+        self.rate_limiter = get_rate_limiter('yad2')
         self._retry_count = 0
 
     @staticmethod
@@ -32,19 +33,14 @@ class ScrapingService:
         )
 
     async def _rate_limit(self):
-        """Implement rate limiting between requests"""
-        current_time = time.time()
-        delay = self._get_random_delay()
-        
-        if current_time - self._last_request_time < delay:
-            await asyncio.sleep(delay - (current_time - self._last_request_time))
-        
-        self._last_request_time = time.time()
+        """Wait for the shared Yad2 rate limiter before an outbound request"""
+        await self.rate_limiter.acquire()
 
     async def _retry_with_backoff(self, func: Type[callable], *args, **kwargs) -> Optional[any]:
         """Retry a function with sophisticated error handling"""
         for attempt in range(settings.MAX_RETRIES):
             try:
+                await self._rate_limit()  # Only the scrape call talks to the site
                 result = await func(*args, **kwargs)
                 return result
             except Exception as e:
@@ -61,7 +57,7 @@ class ScrapingService:
                 
                 # Adjust rate limits if we're hitting them frequently
                 if isinstance(scraping_error, RateLimitError):
-                    self._adjust_rate_limits()
+                    await self._adjust_rate_limits()
 
     async def _process_listing(self, db: Session, listing_data: Dict) -> Optional[CarListing]:
         """Process a single listing with sophisticated error handling"""
@@ -98,11 +94,13 @@ class ScrapingService:
             return None
 
     async def _adjust_rate_limits(self):
-        """Adjust rate limits if we're hitting them too frequently"""
-        current_delay = settings.MAX_DELAY_BETWEEN_REQUESTS
-        settings.MAX_DELAY_BETWEEN_REQUESTS = min(current_delay * 1.5, 10.0)  # Cap at 10 seconds
-        settings.MIN_DELAY_BETWEEN_REQUESTS = min(current_delay * 1.2, 5.0)  # Cap at 5 seconds
-        logger.warning(f"Adjusted rate limits: min={settings.MIN_DELAY_BETWEEN_REQUESTS}s, max={settings.MAX_DELAY_BETWEEN_REQUESTS}s")
+        """Slow the shared Yad2 rate limiter down if we're hitting rate limits too frequently"""
+        # Only the limiter changes; the settings stay the configured defaults
+        limiter = self.rate_limiter
+        current_delay = limiter.max_delay
+        limiter.min_delay = min(current_delay * 1.2, 5.0)  # Cap at 5 seconds
+        limiter.max_delay = max(min(current_delay * 1.5, 10.0), limiter.min_delay)  # Cap at 10 seconds
+        logger.warning(f"Adjusted rate limits: min={limiter.min_delay}s, max={limiter.max_delay}s")
 
     async def trigger_scrape_yad2(self, db: Session):
         """
@@ -121,9 +119,8 @@ class ScrapingService:
                 
             processed_listings = []
             
+            # Listings are already downloaded; processing them is local work
             for listing_data in listings:
-                await self._rate_limit()  # Rate limit between requests
-                
                 try:
                     listing = await self._process_listing(db, listing_data)
                     if listing:
@@ -131,9 +128,8 @@ class ScrapingService:
                 except Exception as e:
                     scraping_error = ErrorHandler.handle_scraping_error(e)
                     if isinstance(scraping_error, RateLimitError):
-                        # If we hit rate limits during processing, adjust and retry
+                        # The slower limiter paces the next request; processing itself need not wait
                         await self._adjust_rate_limits()
-                        await asyncio.sleep(settings.MAX_DELAY_BETWEEN_REQUESTS)
                         continue
                     logger.error(f"Failed to process listing: {str(scraping_error)}")
                     
@@ -0,0 +1,179 @@
+"""
+Live progress of scrape tasks, keyed by task id.
+
+Workers count progress in memory with ``TaskProgress`` and flush the deltas to
+the ``scrape_jobs`` rows at most every ``flush_interval`` seconds, as atomic
+``col = col + n`` updates so a scrape job and its ingest job can both add to the
+same row. The API side only reads those rows (``get_task_status``,
+``iter_task_updates``); nothing is kept alive in the API process.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.tracing import get_tracer
+from app.db.models.job import ScrapeJob
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+tracer = get_tracer(__name__)
+
+COUNTERS = ("pages_fetched", "listings_parsed", "new_listings", "updated_listings", "error_count")
+
+
+class TaskProgress:
+    """Buffered progress counters for one or more job rows.
+
+    Example:
+        progress = TaskProgress([job.id, job.parent_id])
+        progress.incr(pages_fetched=1, listings_parsed=40)
+        ...
+        progress.flush(force=True)
+    """
+
+    def __init__(self, job_ids: Iterable[Optional[str]], flush_interval: float = 1.0,
+                 session_factory=SessionLocal) -> None:
+        """Initialize the counters.
+
+        Args:
+            job_ids: Rows to add the counts to (None entries are ignored)
+            flush_interval: Minimum number of seconds between two writes
+            session_factory: Session factory used for the writes
+        """
+        self.job_ids = [job_id for job_id in job_ids if job_id]
+        self.flush_interval = flush_interval
+        self._session_factory = session_factory
+        self._pending: Dict[str, int] = {}
+        self._last_flush = 0.0
+
+    def incr(self, **counts: int) -> None:
+        """Add to the counters and flush if the last write is old enough."""
+        for name, value in counts.items():
+            if name not in COUNTERS:
+                raise ValueError(f"Unknown progress counter: {name}")
+            if value:
+                self._pending[name] = self._pending.get(name, 0) + value
+        self.flush()
+
+    def flush(self, force: bool = False) -> None:
+        """Write the pending deltas in one UPDATE."""
+        if not self._pending or not self.job_ids:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+
+        with tracer.start_as_current_span("db.progress"):
+            values = {name: getattr(ScrapeJob, name) + delta for name, delta in self._pending.items()}
+            db = self._session_factory()
+            try:
+                db.execute(
+                    update(ScrapeJob)
+                    .where(ScrapeJob.id.in_(self.job_ids))
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                self._pending = {}
+                self._last_flush = now
+            except Exception as e:
+                # Progress is best effort; keep the deltas for the next flush
+                db.rollback()
+                logger.warning(f"Failed to flush progress for {self.job_ids}: {str(e)}")
+            finally:
+                db.close()
+
+
+def get_task_status(db: Session, task_id: str) -> Optional[Dict[str, Any]]:
+    """Return the status of a task and its child jobs, or None if it is unknown or expired."""
+    job = db.query(ScrapeJob).filter(ScrapeJob.id == task_id).first()
+    if not job or job.is_expired:
+        return None
+    result = job.to_dict()
+    children = db.query(ScrapeJob).filter(ScrapeJob.parent_id == job.id).order_by(ScrapeJob.created_at).all()
+    result["children"] = [child.to_dict() for child in children]
+    return result
+
+
+def _read_status(task_id: str) -> Optional[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        return get_task_status(db, task_id)
+    finally:
+        db.close()
+
+
+# Recomputed from the clock on every read, so they differ between any two polls
+_TIME_DERIVED = ("listings_per_second",)
+
+
+def _progress(status: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of a status that only changes when the job makes progress."""
+    progress = {key: value for key, value in status.items() if key not in _TIME_DERIVED}
+    progress["children"] = [
+        {key: value for key, value in child.items() if key not in _TIME_DERIVED}
+        for child in status.get("children", [])
+    ]
+    return progress
+
+
+async def iter_task_updates(task_id: str, poll_interval: Optional[float] = None,
+                            heartbeat: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """Yield the task status every time it changes, until the task completes.
+
+    Yields None as a keep-alive when nothing changed for ``heartbeat`` seconds.
+    Stops after yielding the final status, or immediately if the task is unknown.
+    Time-derived fields (``listings_per_second``) are sent but do not count as a change.
+    """
+    poll_interval = poll_interval or settings.TASK_PROGRESS_POLL_SECONDS
+    last = None
+    last_sent = time.monotonic()
+    while True:
+        status = await asyncio.to_thread(_read_status, task_id)
+        if status is None:
+            return
+        progress = _progress(status)
+        if progress != last:
+            last = progress
+            last_sent = time.monotonic()
+            yield status
+            if status["is_complete"] and all(child["is_complete"] for child in status["children"]):
+                return
+        elif time.monotonic() - last_sent >= heartbeat:
+            last_sent = time.monotonic()
+            yield None
+        await asyncio.sleep(poll_interval)
+
+
+def expiry_time(finished_at: Optional[datetime] = None) -> datetime:
+    """Return when a job that finished at ``finished_at`` stops being reported."""
+    return (finished_at or datetime.utcnow()) + timedelta(hours=settings.SCRAPE_JOB_TTL_HOURS)
+
+
+def purge_expired_jobs(db: Session, now: Optional[datetime] = None) -> int:
+    """Delete expired job rows (children first, they reference their parent).
+
+    Returns:
+        int: Number of deleted rows
+    """
+    now = now or datetime.utcnow()
+    deleted = 0
+    for children_only in (True, False):
+        query = delete(ScrapeJob).where(ScrapeJob.expires_at.is_not(None), ScrapeJob.expires_at < now)
+        if children_only:
+            query = query.where(ScrapeJob.parent_id.is_not(None))
+        else:
+            # A parent stays while any of its children is still reported
+            live_children = select(ScrapeJob.parent_id).where(ScrapeJob.parent_id.is_not(None))
+            query = query.where(ScrapeJob.id.not_in(live_children))
+        deleted += db.execute(query.execution_options(synchronize_session=False)).rowcount
+    db.commit()
+    if deleted:
+        logger.info(f"Purged {deleted} expired scrape jobs")
+    return deleted
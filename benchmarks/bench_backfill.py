@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Throughput of the re-normalization backfill (``app.services.backfill``).
+
+Builds a throwaway SQLite catalog (``benchmarks/catalog.py``), archives every
+listing as its scraped payload, then damages a share of the stored rows (wrong
+year, lost mileage) as a normalizer bug would, and runs the backfill over the
+whole table. While it runs, a second connection keeps reading listings.
+
+Reports listings/s, the rows changed against the rows damaged, the reads served
+during the backfill and their slowest latency, and how long a second run
+(resumed from the checkpoint, nothing left to do) takes.
+
+Usage:
+    python benchmarks/bench_backfill.py --size 200000 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add the project root to the Python path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+# Point the app at a throwaway database before anything imports the session module
+_db_dir = tempfile.mkdtemp(prefix='bench_backfill_')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ARCHIVE_CHUNK = 5000
+
+
+def archive_catalog(db) -> int:
+    """Archive every listing as the scraped listing it was built from."""
+    from sqlalchemy import select
+    from app.db.models.car import CarBrand, CarListing, CarModel
+    from app.services.raw_archive import archive_payloads, encode_raw
+
+    query = (
+        select(CarListing.yad2_id, CarListing.title, CarListing.description, CarListing.price,
+               CarListing.year, CarListing.mileage, CarListing.fuel_type, CarListing.transmission,
+               CarListing.body_type, CarListing.color, CarListing.image_url,
+               CarBrand.name.label('brand'), CarModel.name.label('model'))
+        .join(CarBrand, CarBrand.id == CarListing.brand_id)
+        .join(CarModel, CarModel.id == CarListing.model_id)
+    )
+    now = datetime.utcnow()
+    rows = db.execute(query).mappings().all()
+    for i in range(0, len(rows), ARCHIVE_CHUNK):
+        archive_payloads(db, [(row['yad2_id'], now, encode_raw(dict(row))) for row in rows[i:i + ARCHIVE_CHUNK]])
+    return len(rows)
+
+
+def damage_rows(db, share: float, seed: int) -> int:
+    """Break the year or the mileage of a share of the rows; return how many."""
+    from sqlalchemy import select, update
+    from app.db.models.car import CarListing
+
+    rng = random.Random(seed)
+    ids = [listing_id for listing_id in db.scalars(select(CarListing.id)) if rng.random() < share]
+    for i in range(0, len(ids), ARCHIVE_CHUNK):
+        chunk = ids[i:i + ARCHIVE_CHUNK]
+        half = len(chunk) // 2
+        db.execute(update(CarListing).where(CarListing.id.in_(chunk[:half])).values(year=CarListing.year - 1))
+        db.execute(update(CarListing).where(CarListing.id.in_(chunk[half:])).values(mileage=None))
+    db.commit()
+    return len(ids)
+
+
+def read_while(stop: threading.Event, stats: dict) -> None:
+    """Keep reading pages of listings until ``stop`` is set."""
+    from sqlalchemy import select
+    from app.db.models.car import CarListing
+    from app.db.session import SessionLocal
+
+    db = SessionLocal()
+    rng = random.Random(0)
+    try:
+        while not stop.is_set():
+            start = time.perf_counter()
+            db.execute(select(CarListing).where(CarListing.id > rng.randint(0, stats['size'])).limit(20)).all()
+            db.rollback()
+            elapsed = (time.perf_counter() - start) * 1000
+            stats['reads'] += 1
+            stats['max_read_ms'] = max(stats['max_read_ms'], elapsed)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the re-normalization backfill')
+    parser.add_argument('--size', type=int, default=100000, help='Number of listings')
+    parser.add_argument('--damage', type=float, default=0.1, help='Share of rows to damage')
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from app.core.executor import CPUExecutor
+    from app.db.base_class import Base
+    from app.db.session import SessionLocal, engine
+    from app.services.backfill import run_backfill
+    from benchmarks.catalog import populate
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    executor = CPUExecutor('process', args.workers)
+    checkpoint = os.path.join(_db_dir, 'checkpoint.json')
+    try:
+        populate(db, args.size, seed=args.seed)
+        archive_catalog(db)
+        damaged = damage_rows(db, args.damage, args.seed)
+
+        stop = threading.Event()
+        reads = {'size': args.size, 'reads': 0, 'max_read_ms': 0.0}
+        reader = threading.Thread(target=read_while, args=(stop, reads))
+        reader.start()
+        start = time.perf_counter()
+        try:
+            result = asyncio.run(run_backfill(db, checkpoint_path=checkpoint, chunk_size=args.chunk_size,
+                                              executor=executor))
+        finally:
+            elapsed = time.perf_counter() - start
+            stop.set()
+            reader.join()
+
+        start = time.perf_counter()
+        asyncio.run(run_backfill(db, checkpoint_path=checkpoint, chunk_size=args.chunk_size, executor=executor))
+        resumed = time.perf_counter() - start
+    finally:
+        db.close()
+        executor.shutdown()
+
+    counts = result['counts']
+    print(json.dumps({
+        'listings': args.size,
+        'workers': executor.max_workers,
+        'damaged': damaged,
+        'counts': counts,
+        'seconds': round(elapsed, 2),
+        'listings_per_second': round(counts['scanned'] / elapsed, 1),
+        'reads_during_backfill': reads['reads'],
+        'max_read_ms': round(reads['max_read_ms'], 1),
+        'resumed_run_seconds': round(resumed, 3),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
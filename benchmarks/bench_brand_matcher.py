@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Accuracy and throughput of the brand/model matcher (``app/services/brand_matcher.py``).
+
+- Accuracy on the labelled titles in ``benchmarks/fixtures/brand_titles.jsonl``
+  (Hebrew and English spellings, typos, noise words, unknown vehicles), next to
+  the old "first word is the brand" split.
+- Accuracy and titles/s on synthetic titles built from ``CAR_ALIASES``: a random
+  alias of a brand and model, a trim and a year, with a typo in ``--typo-rate``
+  of them. ``cold`` matches distinct titles with an empty cache; ``warm``
+  matches a crawl-like stream where titles repeat (Zipf over the distinct ones).
+
+Only the alias dictionary is used, so no database is needed.
+
+Usage:
+    python benchmarks/bench_brand_matcher.py
+    python benchmarks/bench_brand_matcher.py --titles 50000 --batch-size 500 --typo-rate 0.2
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+from app.services.brand_matcher import BrandMatcher, catalog_from_aliases, tokenize
+from app.services.car_aliases import CAR_ALIASES
+
+logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+FIXTURES = ROOT / 'benchmarks' / 'fixtures' / 'brand_titles.jsonl'
+TRIMS = ['', 'פרימיום', 'הייבריד', 'אוטומט', 'Sport', '1.6', '2.0 טורבו', 'יד ראשונה', 'GT Line']
+
+
+def load_fixtures(path: Path) -> list:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def typo(word: str, rng: random.Random) -> str:
+    """Swap, drop or double one letter of a word."""
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    kind = rng.choice(['swap', 'drop', 'double'])
+    if kind == 'swap':
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if kind == 'drop':
+        return word[:i] + word[i + 1:]
+    return word[:i] + word[i] + word[i:]
+
+
+def synthetic_titles(count: int, typo_rate: float, seed: int) -> list:
+    """Return ``count`` distinct-ish labelled titles as dicts like the fixture file."""
+    rng = random.Random(seed)
+    brands = [(key, aliases, models) for key, (aliases, models) in CAR_ALIASES.items() if models]
+    titles = []
+    for _ in range(count):
+        brand_key, brand_aliases, models = rng.choice(brands)
+        model_key = rng.choice(list(models))
+        brand = rng.choice(brand_aliases)
+        model = rng.choice(models[model_key])
+        if rng.random() < typo_rate:
+            if rng.random() < 0.5:
+                brand = typo(brand, rng)
+            else:
+                model = typo(model, rng)
+        title = f"{brand} {model} {rng.choice(TRIMS)} {rng.randint(2005, 2025)}".replace('  ', ' ')
+        titles.append({'title': title, 'brand': brand_key, 'model': model_key})
+    return titles
+
+
+def accuracy(matcher: BrandMatcher, labelled: list, batch_size: int) -> dict:
+    brand_hits = model_hits = 0
+    misses = []
+    for start in range(0, len(labelled), batch_size):
+        batch = labelled[start:start + batch_size]
+        for item, match in zip(batch, matcher.match_many([item['title'] for item in batch])):
+            brand = match.brand_key if match else None
+            model = match.model_key if match else None
+            brand_hits += brand == item['brand']
+            model_hits += brand == item['brand'] and model == item['model']
+            if (brand, model) != (item['brand'], item['model']) and len(misses) < 10:
+                misses.append({'title': item['title'], 'expected': [item['brand'], item['model']],
+                               'got': [brand, model]})
+    return {
+        'titles': len(labelled),
+        'brand_accuracy': round(brand_hits / len(labelled), 4),
+        'brand_model_accuracy': round(model_hits / len(labelled), 4),
+        'misses': misses,
+    }
+
+
+def first_word_accuracy(labelled: list) -> float:
+    """Share of titles whose first word is an alias of their brand (the old split)."""
+    aliases = {key: {tokenize(alias) for alias in [key, *names]} for key, (names, _) in CAR_ALIASES.items()}
+    hits = sum(
+        bool(item['title'].split()) and tokenize(item['title'].split()[0]) in aliases.get(item['brand'], ())
+        for item in labelled
+    )
+    return round(hits / len(labelled), 4)
+
+
+def throughput(matcher: BrandMatcher, titles: list, batch_size: int) -> dict:
+    start = time.perf_counter()
+    for i in range(0, len(titles), batch_size):
+        matcher.match_many(titles[i:i + batch_size])
+    elapsed = time.perf_counter() - start
+    return {'titles': len(titles), 'seconds': round(elapsed, 3),
+            'titles_per_second': round(len(titles) / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the brand/model matcher')
+    parser.add_argument('--titles', type=int, default=20000, help='Distinct synthetic titles')
+    parser.add_argument('--stream', type=int, default=200000, help='Titles in the warm (repeating) stream')
+    parser.add_argument('--batch-size', type=int, default=200, help='Titles per match_many call')
+    parser.add_argument('--typo-rate', type=float, default=0.15)
+    parser.add_argument('--fixtures', default=str(FIXTURES))
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    labelled = load_fixtures(Path(args.fixtures))
+    synthetic = synthetic_titles(args.titles, args.typo_rate, args.seed)
+    distinct = list(dict.fromkeys(item['title'] for item in synthetic))
+    rng = random.Random(args.seed)
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(len(distinct))]
+    stream = rng.choices(distinct, weights=weights, k=args.stream)
+
+    start = time.perf_counter()
+    catalog = catalog_from_aliases()
+    matcher = BrandMatcher(catalog)
+    build_seconds = time.perf_counter() - start
+
+    result = {
+        'catalog': {'brands': len(catalog), 'models': sum(len(models) for _, _, models in catalog.values()),
+                    'brand_aliases': len(matcher.brands.choices), 'build_seconds': round(build_seconds, 4)},
+        'fixtures': {**accuracy(BrandMatcher(catalog), labelled, args.batch_size),
+                     'first_word_brand_accuracy': first_word_accuracy(labelled)},
+        'synthetic': {k: v for k, v in accuracy(BrandMatcher(catalog), synthetic, args.batch_size).items()
+                      if k != 'misses'},
+        'cold': throughput(BrandMatcher(catalog), distinct, args.batch_size),
+        'warm': throughput(matcher, stream, args.batch_size),
+    }
+    result['warm']['cache_hit_ratio'] = round(matcher.stats['cache_hits'] / matcher.stats['titles'], 4)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Event-loop lag while parsing pages inline, on a thread pool or on a process pool.
+
+Parses the saved Yad2 pages (yad2_page_*.html, yad2_response.html) through
+``CPUExecutor`` in the given mode, the way the scraper does it for every page
+(``__NEXT_DATA__`` decoding and card extraction), while a probe coroutine that
+wakes up every 5 ms records how late it runs. A late probe is time during which
+no other coroutine (rate limiter, HTTP reads, DB writes) could run.
+
+Usage:
+    python benchmarks/bench_cpu_offload.py --mode inline --pages 40
+    python benchmarks/bench_cpu_offload.py --mode process --pages 40
+"""
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+from app.core.executor import MODES, CPUExecutor
+from app.scrapers.html_parser import get_backend, parse_page
+from app.scrapers.next_data import extract_feed_items
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://www.yad2.co.il"
+PROBE_INTERVAL = 0.005
+
+
+async def probe(lags: list, stop: asyncio.Event) -> None:
+    """Record how late the loop wakes up a coroutine that sleeps PROBE_INTERVAL."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def run(mode: str, pages: list, workers: int) -> dict:
+    executor = CPUExecutor(mode, workers or None)
+    backend = get_backend().name
+    # Start the pool outside the measurement
+    await executor.run(extract_feed_items, '')
+
+    lags: list = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    start = time.perf_counter()
+    listings = 0
+    for html in pages:
+        items, cards = await asyncio.gather(
+            executor.run(extract_feed_items, html),
+            executor.run(parse_page, html, BASE_URL, None, backend),
+        )
+        listings += len(items or []) + len(cards)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+    stats = executor.stats()
+    executor.shutdown()
+
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    return {
+        'mode': mode,
+        'pages': len(pages),
+        'listings': listings,
+        'seconds': round(elapsed, 3),
+        'loop_lag_max_ms': round(lags_ms[-1], 1),
+        'loop_lag_p95_ms': round(lags_ms[int(len(lags_ms) * 0.95) - 1 if len(lags_ms) > 1 else 0], 1),
+        'loop_lag_mean_ms': round(statistics.mean(lags_ms), 2),
+        'executor': stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure event-loop lag of page parsing per executor mode')
+    parser.add_argument('--mode', choices=MODES, default='process')
+    parser.add_argument('--pages', type=int, default=40, help='Number of pages to parse')
+    parser.add_argument('--workers', type=int, default=0, help='Pool size (0: one per CPU)')
+    args = parser.parse_args()
+
+    fixtures = sorted(glob.glob(str(ROOT / 'yad2_page_*.html'))) + [str(ROOT / 'yad2_response.html')]
+    fixtures = [path for path in fixtures if os.path.exists(path)]
+    if not fixtures:
+        sys.exit('No saved Yad2 pages found in the project root')
+    html = [Path(path).read_text(encoding='utf-8') for path in fixtures]
+    pages = [html[i % len(html)] for i in range(args.pages)]
+
+    print(json.dumps(asyncio.run(run(args.mode, pages, args.workers)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Duplicate detection (``app.services.dedupe``): throughput and accuracy.
+
+Builds a throwaway SQLite catalog (``benchmarks/catalog.py``) and reposts a
+share of its listings under new ids: half with the same picture (as a resized
+URL) and a slightly different price, half with a new picture and a few words
+added to the seller's description, as a dealer would. The catalog's own
+descriptions are short boilerplate shared by many unrelated listings, which is
+what precision is measured against. Then clusters the whole table with
+``rebuild`` and reports:
+
+- listings/s of the rebuild
+- ``recall``: share of the reposts clustered with their original
+- ``precision``: share of the clustered pairs that are a repost and its original
+- ``batch_ms``: time to link one ingest batch of new reposts into the full
+  table, which should not grow with the table size
+
+Usage:
+    python benchmarks/bench_dedupe.py --size 200000
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+# Add the project root to the Python path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+# Point the app at a throwaway database before anything imports the session module
+_db_dir = tempfile.mkdtemp(prefix='bench_dedupe_')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+INSERT_CHUNK = 5000
+
+WORDS = (
+    'רכב', 'שמור', 'מטופל', 'במוסך', 'מורשה', 'בעלים', 'ראשונים', 'טסט', 'לשנה', 'צמיגים', 'חדשים',
+    'מזגן', 'עובד', 'מצוין', 'ללא', 'תאונות', 'מולטימדיה', 'מצלמה', 'אחורית', 'חיישני', 'חניה',
+    'גיר', 'אוטומטי', 'חסכוני', 'בדלק', 'נסיעה', 'שקטה', 'פנים', 'עור', 'גג', 'נפתח', 'ספר', 'טיפולים',
+)
+
+
+def seller_description(rng: random.Random) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(12, 30)))
+
+
+def repost(db, share: float, seed: int, prefix: str = 'dup') -> dict:
+    """Insert reposts of a share of the listings; return ``{repost yad2_id: original yad2_id}``."""
+    from sqlalchemy import bindparam, insert, select, update
+    from app.db.models.car import CarListing
+
+    rng = random.Random(seed)
+    columns = [c for c in CarListing.__table__.columns if c.name not in ('id', 'cluster_id')]
+    originals = [row for row in db.execute(select(*columns)).mappings() if rng.random() < share]
+    pairs, rows, described = {}, [], []
+    for index, original in enumerate(originals):
+        row = dict(original)
+        row['yad2_id'] = f"{prefix}{index:08d}"
+        row['price'] = round(row['price'] * rng.uniform(0.97, 1.03), -2)
+        if index % 2:
+            row['image_url'] = f"{row['image_url']}?w=800"
+        else:
+            description = seller_description(rng)
+            described.append({'key': original['yad2_id'], 'text': description})
+            row['image_url'] = f"https://img.yad2.co.il/Pic/synthetic/{prefix}{index}.jpg"
+            row['description'] = f"{description}, מחיר סופי, אפשרות למימון"
+        pairs[row['yad2_id']] = original['yad2_id']
+        rows.append(row)
+    if described:
+        table = CarListing.__table__
+        db.execute(update(table).where(table.c.yad2_id == bindparam('key')).values(description=bindparam('text')),
+                   described)
+    for i in range(0, len(rows), INSERT_CHUNK):
+        db.execute(insert(CarListing), rows[i:i + INSERT_CHUNK])
+    db.commit()
+    return pairs
+
+
+def accuracy(db, pairs: dict) -> dict:
+    """Recall of the planted reposts and precision of all clustered pairs."""
+    from sqlalchemy import select
+    from app.db.models.car import CarListing
+
+    clusters = dict(db.execute(select(CarListing.yad2_id, CarListing.cluster_id)).all())
+    found = sum(1 for dup, original in pairs.items()
+                if clusters[dup] is not None and clusters[dup] == clusters[original])
+    sizes = Counter(cluster for cluster in clusters.values() if cluster is not None)
+    clustered_pairs = sum(n * (n - 1) // 2 for n in sizes.values())
+    return {
+        'reposts': len(pairs),
+        'recall': round(found / max(len(pairs), 1), 4),
+        'precision': round(found / max(clustered_pairs, 1), 4),
+        'clusters': len(sizes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark duplicate detection')
+    parser.add_argument('--size', type=int, default=100000, help='Number of listings')
+    parser.add_argument('--reposts', type=float, default=0.05, help='Share of listings reposted')
+    parser.add_argument('--batch', type=int, default=200, help='Listings per incremental batch')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from app.db.base_class import Base
+    from app.db.session import SessionLocal, engine
+    from app.services.dedupe import index_listings, rebuild
+    from benchmarks.catalog import populate
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        populate(db, args.size, seed=args.seed)
+        pairs = repost(db, args.reposts, args.seed)
+
+        start = time.perf_counter()
+        counts = rebuild(db)
+        elapsed = time.perf_counter() - start
+        result = accuracy(db, pairs)
+
+        late = repost(db, args.batch / args.size, args.seed + 1, prefix='late')
+        start = time.perf_counter()
+        index_listings(db, list(late))
+        batch_ms = (time.perf_counter() - start) * 1000
+    finally:
+        db.close()
+
+    print(json.dumps({
+        'listings': counts['scanned'],
+        'indexed': counts['indexed'],
+        'seconds': round(elapsed, 2),
+        'listings_per_second': round(counts['scanned'] / elapsed, 1),
+        **result,
+        'batch': len(late),
+        'batch_ms': round(batch_ms, 1),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark single-evaluate DOM extraction against the per-element parser.
+
+Loads the saved result pages (yad2_page_*.html, yad2_response.html) into a
+headless browser with all network requests blocked, then times both extraction
+modes of Yad2Scraper on the same DOM.
+
+Usage:
+    python benchmarks/bench_extraction.py --iterations 5
+"""
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+from playwright.async_api import async_playwright
+
+from app.config.scraping import settings as scraping_settings
+from app.scrapers.yad2_updated import Yad2Scraper
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+async def extract_with_elements(scraper: Yad2Scraper, page) -> list:
+    """Per-element extraction: one awaited round trip per query."""
+    scraper.processed_urls.clear()
+    listings = []
+    for item in await page.query_selector_all(scraping_settings.CARD_SELECTORS['card']):
+        listing = await scraper._extract_listing_data(item)
+        if listing:
+            listings.append(listing)
+    return listings
+
+
+async def extract_with_evaluate(scraper: Yad2Scraper, page) -> list:
+    """Single-evaluate extraction: one round trip per page."""
+    return await scraper._extract_page_listings_evaluate(page)
+
+
+async def time_mode(func, scraper: Yad2Scraper, page, iterations: int) -> dict:
+    """Run an extraction mode several times and return timing statistics."""
+    timings = []
+    count = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        listings = await func(scraper, page)
+        timings.append((time.perf_counter() - start) * 1000)
+        count = len(listings)
+    timings.sort()
+    return {
+        'listings': count,
+        'min_ms': round(timings[0], 2),
+        'median_ms': round(timings[len(timings) // 2], 2),
+        'max_ms': round(timings[-1], 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Compare DOM extraction modes on saved Yad2 pages')
+    parser.add_argument('--iterations', type=int, default=5, help='Timed runs per mode and fixture')
+    parser.add_argument('--fixtures', nargs='*', help='HTML files to load (default: saved Yad2 pages)')
+    args = parser.parse_args()
+
+    fixtures = args.fixtures or sorted(glob.glob(str(ROOT / 'yad2_page_*.html'))) + [str(ROOT / 'yad2_response.html')]
+    scraper = Yad2Scraper()
+    results = []
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await browser.new_context(java_script_enabled=False)
+        # Fixtures are static snapshots; never let them reach the network
+        await context.route('**/*', lambda route: route.abort())
+        page = await context.new_page()
+
+        for path in fixtures:
+            if not os.path.exists(path):
+                logger.warning(f"Fixture not found: {path}")
+                continue
+            with open(path, encoding='utf-8') as f:
+                await page.set_content(f.read(), wait_until='domcontentloaded')
+
+            results.append({
+                'fixture': os.path.basename(path),
+                'elements': await time_mode(extract_with_elements, scraper, page, args.iterations),
+                'evaluate': await time_mode(extract_with_evaluate, scraper, page, args.iterations),
+            })
+
+        await browser.close()
+
+    for result in results:
+        elements, evaluate = result['elements'], result['evaluate']
+        if evaluate['median_ms']:
+            result['speedup'] = round(elements['median_ms'] / evaluate['median_ms'], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark the HTML parser backends on the saved Yad2 pages.
+
+For every fixture (yad2_page_*.html, yad2_response.html) and every installed
+backend this times the document parse alone and the full card extraction, and
+compares them with the previous fetch_listings approach (two BeautifulSoup
+parses, a prettify dump and a loop over fallback selectors).
+
+Usage:
+    python benchmarks/bench_html_parsing.py --iterations 10
+"""
+import argparse
+import glob
+import io
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Add the project root to the Python path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+from app.scrapers.html_parser import available_backends, get_backend, parse_listing_cards
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://www.yad2.co.il"
+
+# Selectors the old fetch_listings tried one after another
+LEGACY_SELECTORS = [
+    'div.feeditem',
+    'div[class*="feeditem"]',
+    'div[data-test-id="feed-item"]',
+    'div.feed-item',
+    'div[class*="feed-item"]',
+    'div.listing-item',
+    'div[class*="listing-item"]',
+    'div[data-test="feed-item"]',
+    'div[data-testid="feed-item"]',
+]
+
+
+def legacy_fetch_listings_parse(html: str) -> int:
+    """Reproduce the parsing work of the old fetch_listings (dump written to memory)."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    soup = BeautifulSoup(html, 'html.parser')
+    io.StringIO().write(soup.prettify())
+    for selector in LEGACY_SELECTORS:
+        elements = soup.select(selector)
+        if elements:
+            return len(elements)
+    return 0
+
+
+def time_call(func, iterations: int) -> dict:
+    """Run ``func`` several times and return timing and peak Python heap statistics.
+
+    tracemalloc only sees Python allocations, so memory held inside C libraries
+    (lxml, lexbor) is not included.
+    """
+    timings = []
+    result = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'result': result,
+        'min_ms': round(timings[0], 2),
+        'median_ms': round(timings[len(timings) // 2], 2),
+        'max_ms': round(timings[-1], 2),
+        'py_heap_peak_mb': round(peak / (1024 * 1024), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare HTML parser backends on saved Yad2 pages')
+    parser.add_argument('--iterations', type=int, default=10, help='Timed runs per backend and fixture')
+    parser.add_argument('--fixtures', nargs='*', help='HTML files to parse (default: saved Yad2 pages)')
+    parser.add_argument('--skip-legacy', action='store_true', help='Do not time the old BeautifulSoup flow')
+    args = parser.parse_args()
+
+    fixtures = args.fixtures or sorted(glob.glob(str(ROOT / 'yad2_page_*.html'))) + [str(ROOT / 'yad2_response.html')]
+    results = []
+
+    for path in fixtures:
+        if not os.path.exists(path):
+            logger.warning(f"Fixture not found: {path}")
+            continue
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+
+        result = {'fixture': os.path.basename(path), 'size_kb': len(html.encode('utf-8')) // 1024, 'backends': {}}
+        if not args.skip_legacy:
+            legacy = time_call(lambda: legacy_fetch_listings_parse(html), args.iterations)
+            legacy['elements'] = legacy.pop('result')
+            result['legacy'] = legacy
+
+        for name in available_backends():
+            backend = get_backend(name)
+            parse = time_call(lambda: backend.parse(html), args.iterations)
+            parse.pop('result')
+            extract = time_call(lambda: parse_listing_cards(html, BASE_URL, backend=backend), args.iterations)
+            extract['listings'] = len(extract.pop('result'))
+            result['backends'][name] = {'parse': parse, 'extract': extract}
+            if 'legacy' in result and extract['median_ms']:
+                result['backends'][name]['speedup_vs_legacy'] = round(
+                    result['legacy']['median_ms'] / extract['median_ms'], 1
+                )
+
+        results.append(result)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Image hashing (``app.services.images``): fetch and hash throughput, accuracy.
+
+Builds a throwaway SQLite catalog (``benchmarks/catalog.py``) and serves its
+images from a local fixture server through ``SCRAPING_REPLAY_URL``, so no
+request leaves the machine. Every image is a synthetic photo drawn from its
+URL; a share of the listings is reposted under new ids with the photo
+uploaded again (a new URL, resized, cropped by a few pixels, recompressed and
+brightened), and a share of the images is missing (404). Then reports:
+
+- ``cold``: images/s of ``hash_pending`` with an empty cache, with
+  ``--latency-ms`` of server delay per image and ``--concurrency`` downloads
+  in flight
+- ``warm``: the same run again from the on-disk cache
+- ``recall``: share of the reposts whose photo is linked to the original
+- ``false_links``: listings linked to a photo that is not theirs
+- ``lookup_ms``: mean time of one ``similar_listings`` lookup
+
+Usage:
+    python benchmarks/bench_image_hash.py --size 5000 --latency-ms 50 --concurrency 16
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+# Point the app at a throwaway database before anything imports the session module
+_db_dir = tempfile.mkdtemp(prefix='bench_image_hash_')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+import numpy as np
+from aiohttp import web
+from PIL import Image, ImageEnhance
+
+logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+INSERT_CHUNK = 5000
+PHOTO = re.compile(r"/(?:synthetic|repost)/(?:[a-z]+)?(\d+)\.jpg(?:\?|$)")
+
+
+def photo(index: int) -> Image.Image:
+    """A 320x240 synthetic photo: smooth shapes (what dHash sees) plus grain."""
+    rng = np.random.RandomState(index)
+    coarse = Image.fromarray(rng.randint(0, 256, (6, 8, 3), dtype=np.uint8)).resize((320, 240), Image.BICUBIC)
+    grain = rng.randint(-12, 13, (240, 320, 3))
+    return Image.fromarray(np.clip(np.asarray(coarse, dtype=np.int16) + grain, 0, 255).astype(np.uint8))
+
+
+def reupload(image: Image.Image, rng: random.Random) -> Image.Image:
+    """The same photo uploaded again: cropped, resized and brightened a little."""
+    crop = rng.randint(0, 6)
+    image = image.crop((crop, crop, image.width - crop, image.height - crop))
+    image = image.resize((int(image.width * rng.uniform(0.6, 1.4)), int(image.height * rng.uniform(0.6, 1.4))))
+    return ImageEnhance.Brightness(image).enhance(rng.uniform(0.9, 1.1))
+
+
+def jpeg(image: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+class ImageServer:
+    """Serves the synthetic photos of the catalog URLs, with a delay and missing images."""
+
+    def __init__(self, latency_ms: float, missing: float, seed: int) -> None:
+        self.latency_ms = latency_ms
+        self.missing = missing
+        self.seed = seed
+        self.requests = 0
+        self._runner = None
+        self.url = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        match = PHOTO.search(request.path)
+        rng = random.Random(f"{self.seed}:{request.path}")
+        if match is None or rng.random() < self.missing:
+            return web.Response(status=404)
+        # Drawn off the loop, which the client under test shares
+        body = await asyncio.to_thread(self._draw, int(match.group(1)), '/repost/' in request.path, rng)
+        return web.Response(body=body, content_type='image/jpeg')
+
+    @staticmethod
+    def _draw(index: int, reposted: bool, rng: random.Random) -> bytes:
+        image = photo(index)
+        if reposted:
+            image = reupload(image, rng)
+        return jpeg(image, rng.randint(60, 90))
+
+    async def start(self) -> 'ImageServer':
+        app = web.Application()
+        app.router.add_route('GET', '/{tail:.*}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', 0).start()
+        self.url = f"http://127.0.0.1:{self._runner.addresses[0][1]}"
+        return self
+
+    async def stop(self) -> None:
+        await self._runner.cleanup()
+
+
+def repost(db, share: float, seed: int) -> dict:
+    """Insert reposts of a share of the listings with the photo uploaded again; return ``{repost id: original id}``."""
+    from sqlalchemy import insert, select
+    from app.db.models.car import CarListing
+
+    rng = random.Random(seed)
+    columns = [c for c in CarListing.__table__.columns if c.name not in ('id', 'cluster_id')]
+    originals = [row for row in db.execute(select(CarListing.id, *columns)).mappings() if rng.random() < share]
+    rows = []
+    for index, original in enumerate(originals):
+        row = {key: value for key, value in original.items() if key != 'id'}
+        photo_index = int(PHOTO.search(original['image_url']).group(1))
+        row['yad2_id'] = f"dup{index:08d}"
+        row['image_url'] = f"https://img.yad2.co.il/Pic/repost/r{photo_index}.jpg?v={index}"
+        rows.append(row)
+    for i in range(0, len(rows), INSERT_CHUNK):
+        db.execute(insert(CarListing), rows[i:i + INSERT_CHUNK])
+    db.commit()
+    ids = dict(db.execute(select(CarListing.yad2_id, CarListing.id)).all())
+    return {ids[f"dup{index:08d}"]: original['id'] for index, original in enumerate(originals)}
+
+
+def accuracy(db, pairs: dict) -> dict:
+    """Recall of the reposts and the listings linked to a photo that is not theirs."""
+    from sqlalchemy import select
+    from app.db.models.car import CarListing
+
+    rows = db.execute(select(CarListing.id, CarListing.cluster_id, CarListing.image_url)).all()
+    clusters = {row.id: row.cluster_id for row in rows}
+    photos = {row.id: int(PHOTO.search(row.image_url).group(1)) for row in rows}
+    found = sum(1 for dup, original in pairs.items()
+                if clusters[dup] is not None and clusters[dup] == clusters[original])
+    members = {}
+    for listing_id, cluster in clusters.items():
+        if cluster is not None:
+            members.setdefault(cluster, set()).add(photos[listing_id])
+    false_links = sum(len(photo_set) - 1 for photo_set in members.values())
+    return {
+        'reposts': len(pairs),
+        'recall': round(found / max(len(pairs), 1), 4),
+        'false_links': false_links,
+    }
+
+
+async def run(args) -> dict:
+    from sqlalchemy import select, update
+    from app.config.scraping import settings as scraping_settings
+    from app.core.config import settings
+    from app.db.base_class import Base
+    from app.db.models.car import CarListing
+    from app.db.session import SessionLocal, engine
+    from app.services.images import ImageCache, hash_pending, similar_listings
+    from benchmarks.catalog import populate
+
+    settings.IMAGE_FETCH_CONCURRENCY = args.concurrency
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    server = await ImageServer(args.latency_ms, args.missing, args.seed).start()
+    scraping_settings.REPLAY_URL = server.url
+    cache = ImageCache(os.path.join(_db_dir, 'images'))
+    try:
+        populate(db, args.size, seed=args.seed)
+        pairs = repost(db, args.reposts, args.seed)
+        total = db.query(CarListing).count()
+
+        start = time.perf_counter()
+        cold = await hash_pending(db, limit=total, cache=cache)
+        cold_seconds = time.perf_counter() - start
+        requests = server.requests
+        result = accuracy(db, pairs)
+
+        db.execute(update(CarListing).values(image_hashed_at=None))
+        db.commit()
+        start = time.perf_counter()
+        warm = await hash_pending(db, limit=total, cache=cache)
+        warm_seconds = time.perf_counter() - start
+
+        sample = db.execute(
+            select(CarListing.id).where(CarListing.image_hash.isnot(None)).limit(args.lookups)
+        ).scalars().all()
+        start = time.perf_counter()
+        for listing_id in sample:
+            similar_listings(db, listing_id)
+        lookup_ms = (time.perf_counter() - start) * 1000 / max(len(sample), 1)
+    finally:
+        await server.stop()
+        db.close()
+
+    return {
+        'listings': total,
+        'cold': {**cold, 'requests': requests, 'seconds': round(cold_seconds, 2),
+                 'images_per_second': round(total / cold_seconds, 1)},
+        'warm': {'requests': server.requests - requests, 'seconds': round(warm_seconds, 2),
+                 'images_per_second': round(total / warm_seconds, 1), 'hashed': warm['hashed']},
+        **result,
+        'lookup_ms': round(lookup_ms, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark image fetching and hashing')
+    parser.add_argument('--size', type=int, default=5000, help='Number of listings')
+    parser.add_argument('--reposts', type=float, default=0.05, help='Share of listings reposted')
+    parser.add_argument('--missing', type=float, default=0.02, help='Share of images answered with 404')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='Server delay per image')
+    parser.add_argument('--concurrency', type=int, default=16, help='Image downloads in flight')
+    parser.add_argument('--lookups', type=int, default=200, help='similar_listings lookups to time')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Memory held by scraped listings, as dicts and as ``ListingRecord``.
+
+Decodes the feed items of a saved result page (yad2_page_*.html), replicates
+them with new ids up to ``--listings`` and parses them with
+``Yad2Scraper._parse_api_listing``. Each item is a fresh copy, as it is when
+every page is decoded on its own. Reports the bytes per listing still
+allocated (tracemalloc) once the items themselves are released:
+
+- ``dict``: the previous format, a dict with the item as ``raw_data``
+- ``dict_no_raw``: the same dict without ``raw_data``
+- ``record``: ``ListingRecord`` without the raw payload (the default)
+- ``record_keep_raw``: ``ListingRecord`` with ``SCRAPING_KEEP_RAW_DATA``
+
+Usage:
+    python benchmarks/bench_listing_memory.py --listings 20000
+"""
+import argparse
+import glob
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Add the project root to the Python path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+from app.scrapers.listing_record import ListingRecord
+from app.scrapers.next_data import extract_feed_items
+from app.scrapers.yad2_updated import Yad2Scraper
+
+logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def load_items(pattern: str) -> list:
+    """Feed items of the saved pages, serialized so that each copy is decoded fresh."""
+    items = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, encoding='utf-8') as f:
+            items.extend(extract_feed_items(f.read()) or [])
+    return [json.dumps(item, ensure_ascii=False) for item in items]
+
+
+def make_items(templates: list, count: int) -> list:
+    """``count`` decoded items with distinct ids and tokens."""
+    items = []
+    for i in range(count):
+        item = json.loads(templates[i % len(templates)])
+        item['id'] = item['token'] = f"bench{i}"
+        items.append(item)
+    return items
+
+
+def measure(build, templates: list, count: int) -> dict:
+    """Allocate the listings ``build`` makes from fresh items; return bytes held after the items are dropped."""
+    tracemalloc.start()
+    items = make_items(templates, count)
+    start = time.perf_counter()
+    listings = build(items)
+    elapsed = time.perf_counter() - start
+    del items
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'listings': len(listings),
+        'bytes_per_listing': round(held / len(listings)),
+        'mb_total': round(held / 1e6, 1),
+        'listings_per_second': round(len(listings) / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the memory held by scraped listings')
+    parser.add_argument('--listings', type=int, default=20000)
+    parser.add_argument('--pages', default=str(ROOT / 'yad2_page_*.html'), help='Glob of saved result pages')
+    args = parser.parse_args()
+
+    templates = load_items(args.pages)
+    if not templates:
+        parser.error(f"No feed items in {args.pages}")
+    scraper = Yad2Scraper()
+    parse = scraper._parse_api_listing
+
+    def as_dicts(keep_raw):
+        def build(items):
+            listings = []
+            for item in items:
+                listing = parse(item).to_dict()
+                if keep_raw:
+                    listing['raw_data'] = item
+                listings.append(listing)
+            return listings
+        return build
+
+    def as_records(keep_raw):
+        def build(items):
+            listings = []
+            for item in items:
+                record = parse(item)
+                listings.append(ListingRecord(raw_data=item, keep_raw=keep_raw, **record.to_dict()))
+            return listings
+        return build
+
+    results = {
+        'dict': measure(as_dicts(True), templates, args.listings),
+        'dict_no_raw': measure(as_dicts(False), templates, args.listings),
+        'record': measure(as_records(False), templates, args.listings),
+        'record_keep_raw': measure(as_records(True), templates, args.listings),
+    }
+    baseline = results['dict']['bytes_per_listing']
+    for result in results.values():
+        result['vs_dict'] = round(result['bytes_per_listing'] / baseline, 3)
+
+    print(json.dumps({'feed_items': len(templates), **results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Market statistics rollups (``app.services.market_stats``): accuracy, query
+latency and ingest overhead.
+
+Builds a throwaway SQLite catalog (``benchmarks/catalog.py``) with the
+listings spread over ``--partitions`` scrape partitions, rebuilds
+``market_stats`` and reports:
+
+- ``rebuild``: seconds of the full rebuild and the segments written
+- ``quantile_rank_error``: the largest and mean rank error of the merged
+  digests' quantiles against the exact ones from the listings, for
+  model-year segments and whole models (digests merged across partitions
+  and years)
+- ``query_ms``: mean time of one ``segment_stats`` lookup of a model year and
+  of the model-year listing of a brand, against computing the same from
+  ``car_listings`` (``*_scan``: reading the prices and exact percentiles)
+- ``ingest``: listings/s of ``ingest_listings`` with and without
+  ``STATS_ENABLED``
+- ``compaction``: segments made stale by the lifecycle sweep and rebuilt by
+  ``compact``, and whether the result equals a full rebuild
+
+Usage:
+    python benchmarks/bench_market_stats.py --size 100000 --partitions 8
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the project root to the Python path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+# Point the app at a throwaway database before anything imports the session module
+_db_dir = tempfile.mkdtemp(prefix='bench_market_stats_')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ.setdefault('CPU_EXECUTOR', 'inline')
+
+import numpy as np
+
+logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95)
+
+
+def assign_partitions(db, count: int, seed: int) -> None:
+    """Create ``count`` scrape partitions and spread the listings over them."""
+    from sqlalchemy import bindparam, select, update
+    from app.db.models import CarListing, ScrapePartition
+
+    now = datetime.utcnow()
+    partitions = [ScrapePartition(key=f"p{index}", interval_minutes=15, next_run_at=now) for index in range(count)]
+    db.add_all(partitions)
+    db.flush()
+    rng = random.Random(seed)
+    ids = db.execute(select(CarListing.id)).scalars().all()
+    db.execute(
+        update(CarListing.__table__).where(CarListing.__table__.c.id == bindparam('listing_id'))
+        .values(partition_id=bindparam('partition')),
+        [{'listing_id': listing_id, 'partition': rng.choice(partitions).id} for listing_id in ids],
+    )
+    db.commit()
+
+
+def exact_prices(db) -> dict:
+    """Active prices by (brand_id, model_id, year)."""
+    from sqlalchemy import select
+    from app.db.models import CarListing, CarStatus
+
+    prices = defaultdict(list)
+    for brand_id, model_id, year, price in db.execute(
+        select(CarListing.brand_id, CarListing.model_id, CarListing.year, CarListing.price)
+        .where(CarListing.status == CarStatus.ACTIVE)
+    ):
+        prices[(brand_id, model_id, year)].append(price)
+    return prices
+
+
+def rank_errors(digest, values) -> list:
+    """|rank of the digest's quantile - q| for each of ``QUANTILES``."""
+    values = np.sort(np.asarray(values, dtype=float))
+    errors = []
+    for q in QUANTILES:
+        estimate = digest.quantile(q)
+        low = np.searchsorted(values, estimate, side='left') / len(values)
+        high = np.searchsorted(values, estimate, side='right') / len(values)
+        errors.append(0.0 if low <= q <= high else min(abs(low - q), abs(high - q)))
+    return errors
+
+
+def accuracy(db, min_listings: int) -> dict:
+    """Rank errors of the merged digests against the listings, per model year and per model."""
+    from sqlalchemy import select
+    from app.db.models import MarketStats
+    from app.services.market_stats import TDigest
+
+    prices = exact_prices(db)
+    parts = defaultdict(list)
+    for row in db.execute(select(MarketStats)).scalars():
+        digest = TDigest.from_bytes(row.price_digest)
+        parts[(row.brand_id, row.model_id, row.year)].append(digest)
+        parts[(row.brand_id, row.model_id)].append(digest)
+    digests = {key: TDigest.merged(group) for key, group in parts.items()}
+    by_model = defaultdict(list)
+    for key, values in prices.items():
+        by_model[key[:2]].extend(values)
+
+    result = {}
+    for name, groups in (('model_year', prices), ('model', by_model)):
+        errors = [error for key, values in groups.items() if len(values) >= min_listings
+                  for error in rank_errors(digests[key], values)]
+        result[name] = {
+            'segments': sum(1 for values in groups.values() if len(values) >= min_listings),
+            'max': round(max(errors), 4) if errors else None,
+            'mean': round(float(np.mean(errors)), 4) if errors else None,
+        }
+    return result
+
+
+def scan(db, brand_id: int, model_id: int, year: int) -> dict:
+    """The ad-hoc alternative: read the segment's active listings and compute the statistics."""
+    from sqlalchemy import select
+    from app.db.models import CarListing, CarStatus
+
+    prices = np.array(db.execute(
+        select(CarListing.price).where(CarListing.brand_id == brand_id, CarListing.model_id == model_id,
+                                       CarListing.year == year, CarListing.status == CarStatus.ACTIVE)
+    ).scalars().all(), dtype=float)
+    return {'mean': prices.mean(), 'quantiles': np.quantile(prices, QUANTILES)}
+
+
+def brand_scan(db, brand_id: int) -> dict:
+    """The ad-hoc alternative of a brand listing: its active listings grouped by model and year."""
+    from sqlalchemy import select
+    from app.db.models import CarListing, CarStatus
+
+    prices = defaultdict(list)
+    for model_id, year, price in db.execute(
+        select(CarListing.model_id, CarListing.year, CarListing.price)
+        .where(CarListing.brand_id == brand_id, CarListing.status == CarStatus.ACTIVE)
+    ):
+        prices[(model_id, year)].append(price)
+    return {key: np.quantile(values, QUANTILES) for key, values in prices.items()}
+
+
+def latency(db, lookups: int, seed: int) -> dict:
+    """Mean ms of a model-year lookup and a brand listing, from the rollups and from car_listings."""
+    from sqlalchemy import select
+    from app.db.models import CarBrand, CarModel, MarketStats
+    from app.services.market_stats import segment_stats
+
+    segments = db.execute(
+        select(MarketStats.brand_id, MarketStats.model_id, MarketStats.year, CarBrand.name, CarModel.name)
+        .join(CarBrand, CarBrand.id == MarketStats.brand_id)
+        .join(CarModel, CarModel.id == MarketStats.model_id)
+        .where(MarketStats.listings > 0).distinct()
+    ).all()
+    sample = random.Random(seed).choices(segments, k=lookups)
+
+    def timed(fn) -> float:
+        start = time.perf_counter()
+        for segment in sample:
+            fn(segment)
+        return round((time.perf_counter() - start) * 1000 / lookups, 3)
+
+    return {
+        'segment': timed(lambda s: segment_stats(db, brand=s[3], model=s[4], year=s[2], quantiles=QUANTILES, exact=True)),
+        'segment_scan': timed(lambda s: scan(db, s[0], s[1], s[2])),
+        'brand_by_year': timed(lambda s: segment_stats(db, brand=s[3], exact=True)),
+        'brand_by_year_scan': timed(lambda s: brand_scan(db, s[0])),
+    }
+
+
+async def ingest_rate(db, count: int, enabled: bool, prefix: str, seed: int) -> float:
+    from app.core.config import settings
+    from app.services.ingest import ingest_listings
+    from benchmarks.catalog import scraped_listings
+
+    settings.STATS_ENABLED = enabled
+    listings = list(scraped_listings(count, seed=seed, prefix=prefix))
+    start = time.perf_counter()
+    await ingest_listings(db, listings)
+    return round(count / (time.perf_counter() - start), 1)
+
+
+def snapshot(db) -> dict:
+    from sqlalchemy import select
+    from app.db.models import MarketStats
+
+    return {
+        (row.brand_id, row.model_id, row.year, row.partition_id): (row.listings, round(row.price_sum, 2))
+        for row in db.execute(select(MarketStats)).scalars() if row.listings
+    }
+
+
+async def run(args) -> dict:
+    from sqlalchemy import func, select, update
+    from app.core.config import settings
+    from app.db.base_class import Base
+    from app.db.models import CarListing, MarketStats
+    from app.db.session import SessionLocal, engine
+    from app.services.lifecycle import sweep
+    from app.services.market_stats import compact, rebuild
+    from benchmarks.catalog import populate
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        populate(db, args.size, seed=args.seed)
+        assign_partitions(db, args.partitions, args.seed)
+
+        start = time.perf_counter()
+        built = rebuild(db)
+        rebuild_seconds = time.perf_counter() - start
+
+        result = {
+            'listings': args.size,
+            'rebuild': {**built, 'seconds': round(rebuild_seconds, 2)},
+            'quantile_rank_error': accuracy(db, args.min_listings),
+            'query_ms': latency(db, args.lookups, args.seed),
+        }
+
+        # Alternate so that the table growing does not favour either
+        rates = {True: [], False: []}
+        for round_index in range(args.ingest_rounds):
+            for enabled in (False, True):
+                rates[enabled].append(await ingest_rate(db, args.ingest, enabled, f"i{round_index}{int(enabled)}",
+                                                        args.seed + round_index))
+        # The listings ingested with the statistics off are missing from them
+        settings.STATS_ENABLED = True
+        rebuild(db)
+        result['ingest'] = {
+            'listings': args.ingest,
+            'stats_off_per_second': round(float(np.median(rates[False])), 1),
+            'stats_on_per_second': round(float(np.median(rates[True])), 1),
+        }
+
+        # Age a share of the listings past the stale cutoff so the sweep sells them
+        stale = datetime.utcnow() - timedelta(days=settings.LIFECYCLE_STALE_DAYS + 1)
+        db.execute(update(CarListing).where(CarListing.id % 5 == 0).values(last_scraped_at=stale))
+        db.commit()
+        swept = sweep(db)
+        start = time.perf_counter()
+        compacted = compact(db)
+        compact_seconds = time.perf_counter() - start
+        incremental = snapshot(db)
+        rebuild(db)
+        result['compaction'] = {
+            **swept,
+            'segments': db.scalar(select(func.count()).select_from(MarketStats)),
+            **compacted,
+            'seconds': round(compact_seconds, 2),
+            'matches_rebuild': incremental == snapshot(db),
+        }
+    finally:
+        db.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the market statistics rollups')
+    parser.add_argument('--size', type=int, default=100000, help='Number of listings')
+    parser.add_argument('--partitions', type=int, default=8, help='Scrape partitions the listings are spread over')
+    parser.add_argument('--min-listings', type=int, default=50, help='Smallest segment checked for accuracy')
+    parser.add_argument('--lookups', type=int, default=200, help='Lookups timed per query')
+    parser.add_argument('--ingest', type=int, default=2000, help='Listings ingested per timed run')
+    parser.add_argument('--ingest-rounds', type=int, default=3, help='Timed ingest runs with stats on and off')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
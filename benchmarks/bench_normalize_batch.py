@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Throughput of the columnar batch normalizer.
+
+Normalizes synthetic scraped listings (``benchmarks/catalog.py``, with prices
+and mileages formatted as displayed and a share of them made invalid) with
+``normalize_batch`` in batches and one listing at a time (``clean_car_data``),
+and reports listings/s of both and the rejections per field.
+
+Usage:
+    python benchmarks/bench_normalize_batch.py --listings 100000 --batch-size 500
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+# app.services.normalization imports the session module; point it at a throwaway database first
+_db_dir = tempfile.mkdtemp(prefix='bench_normalize_batch_')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+from app.services.listing_batch import normalize_batch
+from app.services.normalization import clean_car_data
+from benchmarks.catalog import scraped_listings
+
+logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def make_listings(count: int, invalid_rate: float, seed: int) -> list:
+    """Scraper-format listings with prices and mileages as displayed, some of them invalid."""
+    rng = random.Random(seed)
+    listings = []
+    for listing in scraped_listings(count, seed=seed):
+        listing['price'] = f"₪ {int(listing['price']):,}"
+        listing['mileage'] = f"{listing['mileage']:,} ק\"מ"
+        if rng.random() < invalid_rate:
+            listing[rng.choice(['price', 'year', 'title'])] = ''
+        listings.append(listing)
+    return listings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the columnar batch normalizer')
+    parser.add_argument('--listings', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=500, help='Listings per normalize_batch call')
+    parser.add_argument('--invalid-rate', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    listings = make_listings(args.listings, args.invalid_rate, args.seed)
+    batches = [listings[i:i + args.batch_size] for i in range(0, len(listings), args.batch_size)]
+
+    start = time.perf_counter()
+    normalized = [normalize_batch(batch) for batch in batches]
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for listing in listings:
+        clean_car_data(listing)
+    single_elapsed = time.perf_counter() - start
+
+    rejections: dict = {}
+    for batch in normalized:
+        for field, count in batch.rejections.items():
+            rejections[field] = rejections.get(field, 0) + count
+
+    print(json.dumps({
+        'listings': len(listings),
+        'batch_size': args.batch_size,
+        'kept': sum(len(batch) for batch in normalized),
+        'rejections': rejections,
+        'seconds': round(elapsed, 3),
+        'listings_per_second': round(len(listings) / elapsed, 1),
+        'one_at_a_time_listings_per_second': round(len(listings) / single_elapsed, 1),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
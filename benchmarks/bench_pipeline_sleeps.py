@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Wall-clock benchmark of the seed_database pipeline on a synthetic result page.
+
+Serves a generated page with N listing cards (default 500) from a local
+aiohttp server and runs fetch_listings -> normalize_listings ->
+save_listings_to_db against a throwaway SQLite database.
+
+``--legacy-sleeps`` re-adds the per-item sleeps the pipeline used to have
+(1-3 s after every parsed listing, 0.1 s after every saved row) around the same
+calls, to reproduce the old timings.
+
+Usage:
+    python benchmarks/bench_pipeline_sleeps.py --listings 500
+    python benchmarks/bench_pipeline_sleeps.py --listings 500 --legacy-sleeps
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+# Point the app at a throwaway database before anything imports the session module
+_db_dir = tempfile.mkdtemp(prefix='bench_pipeline_')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+from aiohttp import web
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BRANDS = [
+    ('טויוטה', ['קורולה', 'יאריס', 'RAV4']),
+    ('יונדאי', ['i20', 'i30', 'טוסון']),
+    ('קיה', ['פיקנטו', 'ספורטאז\'', 'נירו']),
+    ('מאזדה', ['3', 'CX-5']),
+    ('סקודה', ['אוקטביה', 'פאביה']),
+]
+
+CARD_TEMPLATE = (
+    '<div class="feed-item-base_feedItemBox__b3nch" data-testid="{token}">'
+    '<a href="item/{token}?opened-from=feed">'
+    '<img data-testid="image" src="https://img.yad2.co.il/Pic/{token}.jpeg">'
+    '<h2><span class="feed-item-info_heading__b3nch">{brand} {model}</span>'
+    '<span class="feed-item-info_marketingText__b3nch">{trim}</span></h2>'
+    '<span class="feed-item-info_yearAndHandBox__b3nch">{year} • יד {hand}</span>'
+    '<span data-testid="price">{price:,} ₪</span>'
+    '</a></div>'
+)
+
+
+def build_page(count: int, seed: int = 42) -> str:
+    """Generate a result page with ``count`` listing cards in the current Yad2 markup."""
+    rng = random.Random(seed)
+    cards = []
+    for i in range(count):
+        brand, models = rng.choice(BRANDS)
+        cards.append(CARD_TEMPLATE.format(
+            token=f"b{i:06d}",
+            brand=brand,
+            model=rng.choice(models),
+            trim=f"{rng.choice(['אוט׳', 'ידני'])} {rng.choice(['1.2', '1.6', '2.0'])}",
+            year=rng.randint(2008, 2024),
+            hand=rng.randint(1, 4),
+            price=rng.randrange(20000, 250000, 500),
+        ))
+    return f"<html><body><main>{''.join(cards)}</main></body></html>"
+
+
+async def serve(html: str):
+    """Serve ``html`` on a free localhost port and return (runner, url)."""
+    async def handler(request):
+        return web.Response(text=html, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/vehicles/private-cars', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/vehicles/private-cars"
+
+
+async def run(count: int, legacy_sleeps: bool) -> dict:
+    """Run the pipeline once and return per-stage wall-clock times."""
+    import seed_database
+    from app.db.session import SessionLocal
+
+    runner, url = await serve(build_page(count))
+    timings = {}
+    try:
+        start = time.perf_counter()
+        listings = await seed_database.fetch_listings(limit=count, url=url)
+        if legacy_sleeps:
+            for _ in listings[1:]:
+                await asyncio.sleep(random.uniform(1.0, 3.0))
+        timings['fetch_parse_s'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        normalized = seed_database.normalize_listings(listings)
+        timings['normalize_s'] = time.perf_counter() - start
+
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            if legacy_sleeps:
+                saved = 0
+                for listing in normalized:
+                    saved += seed_database.save_listings_to_db([listing], db)[0]
+                    time.sleep(0.1)
+            else:
+                saved, _ = seed_database.save_listings_to_db(normalized, db)
+            timings['save_s'] = time.perf_counter() - start
+        finally:
+            db.close()
+    finally:
+        await runner.cleanup()
+
+    return {
+        'listings': count,
+        'parsed': len(listings),
+        'saved': saved,
+        'legacy_sleeps': legacy_sleeps,
+        **{k: round(v, 2) for k, v in timings.items()},
+        'total_s': round(sum(timings.values()), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the seed pipeline on a synthetic result page')
+    parser.add_argument('--listings', type=int, default=500, help='Number of listing cards on the page')
+    parser.add_argument('--legacy-sleeps', action='store_true', help='Re-add the old per-listing sleeps')
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args.listings, args.legacy_sleeps)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
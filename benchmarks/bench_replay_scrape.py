@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Scrape throughput, concurrency and retries against replayed responses.
+
+Starts a ``StubServer`` (``app/scrapers/replay.py``) on a fixture store and
+points the scrapers at it, so no request leaves the machine:
+
+- ``fast_path``: ``Yad2Scraper`` result pages through the ``__NEXT_DATA__``
+  fast path, fetched by ``--concurrency`` workers the way ``scrape_parallel``
+  does. Pages that fail would fall back to the browser; they are counted.
+- ``api``: ``Yad2ApiScraper.iter_listing_pages`` with its retries. Needs API
+  responses recorded with ``SCRAPING_RECORD_DIR``.
+
+Without ``--fixtures``, the saved pages in the project root are imported into a
+temporary store. Latency and errors are injected deterministically from
+``--seed``, so two runs with the same arguments make the same requests.
+
+Usage:
+    python benchmarks/bench_replay_scrape.py --pages 200 --concurrency 8 --latency-ms 150
+    python benchmarks/bench_replay_scrape.py --pages 200 --error-rate 0.1 --error-statuses 429,503
+    python benchmarks/bench_replay_scrape.py --mode api --fixtures fixtures/yad2 --pages 20
+"""
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+from app.config.scraping import settings as scraping_settings
+from app.core.executor import get_executor
+from app.scrapers.rate_limit import RateLimiter
+from app.scrapers.replay import FixtureStore, StubServer, import_pages
+
+logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def unlimited() -> RateLimiter:
+    """A limiter that never waits, so the stub's latency is the only pacing."""
+    return RateLimiter(max_requests=10 ** 9, period=1)
+
+
+async def bench_fast_path(pages: int, concurrency: int) -> dict:
+    from app.scrapers.yad2_updated import Yad2Scraper
+
+    scraper = Yad2Scraper(rate_limiter=unlimited())
+    page_queue: asyncio.Queue = asyncio.Queue()
+    for page_num in range(1, pages + 1):
+        page_queue.put_nowait(page_num)
+    listings, fallbacks = 0, 0
+
+    async def worker() -> None:
+        nonlocal listings, fallbacks
+        while not page_queue.empty():
+            page_num = page_queue.get_nowait()
+            url = scraper._build_search_url({'page': page_num})
+            page_listings = await scraper._fetch_next_data_listings(url)
+            if page_listings is None:
+                fallbacks += 1
+            else:
+                listings += len(page_listings)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        if scraper._http_session is not None:
+            await scraper._http_session.close()
+    return {'listings': listings, 'browser_fallbacks': fallbacks, 'scraper': dict(scraper.stats)}
+
+
+async def bench_api(pages: int) -> dict:
+    from app.scrapers.yad2_api_scraper import Yad2ApiScraper
+
+    async with Yad2ApiScraper(max_pages=pages, limit=10 ** 9, delay_range=(0.01, 0.02),
+                              rate_limiter=unlimited()) as scraper:
+        listings = 0
+        async for _, page_listings in scraper.iter_listing_pages():
+            listings += len(page_listings or [])
+    return {'listings': listings, 'scraper': dict(scraper.stats)}
+
+
+async def run(args: argparse.Namespace, store: FixtureStore) -> dict:
+    statuses = [int(status) for status in args.error_statuses.split(',') if status]
+    server = StubServer(store, args.latency_ms, args.jitter_ms, args.error_rate, statuses, args.seed)
+    async with server:
+        scraping_settings.REPLAY_URL = server.url
+        # Start the parse pool outside the measurement
+        await get_executor().run(len, '')
+        start = time.perf_counter()
+        if args.mode == 'fast_path':
+            result = await bench_fast_path(args.pages, args.concurrency)
+        else:
+            result = await bench_api(args.pages)
+        elapsed = time.perf_counter() - start
+    get_executor().shutdown()
+
+    stats = result.pop('scraper')
+    return {
+        'mode': args.mode,
+        'pages': stats['pages_processed'],
+        'concurrency': args.concurrency if args.mode == 'fast_path' else 1,
+        'latency_ms': args.latency_ms,
+        'error_rate': args.error_rate,
+        'seconds': round(elapsed, 2),
+        'pages_per_second': round(stats['pages_processed'] / elapsed, 1),
+        'listings_per_second': round(result['listings'] / elapsed, 1),
+        **result,
+        'requests': stats['requests'],
+        'failed_requests': stats['failed_requests'],
+        'rate_limited': stats['rate_limited'],
+        'stub': server.stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the scrapers against replayed responses')
+    parser.add_argument('--mode', choices=['fast_path', 'api'], default='fast_path')
+    parser.add_argument('--fixtures', help='Fixture store (default: the saved pages in the project root)')
+    parser.add_argument('--pages', type=int, default=100, help='Result pages to fetch')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent page fetches (fast_path)')
+    parser.add_argument('--latency-ms', type=float, default=100.0)
+    parser.add_argument('--jitter-ms', type=float, default=50.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-statuses', default='503', help='Comma-separated statuses to inject')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.fixtures:
+        store = FixtureStore(args.fixtures)
+    else:
+        pages = sorted(glob.glob(str(ROOT / 'yad2_page_*.html'))) + glob.glob(str(ROOT / 'yad2_response.html'))
+        if not pages:
+            sys.exit('No saved Yad2 pages found in the project root')
+        store = FixtureStore(tempfile.mkdtemp(prefix='bench_replay_'))
+        import_pages(store, pages)
+    if not len(store):
+        sys.exit(f'No recordings in {store.path}')
+
+    print(json.dumps(asyncio.run(run(args, store)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Memory and latency benchmark of storing a crawl: collect-then-save vs the streaming pipeline.
+
+Generates N pages of synthetic listings (scraper output format, with a raw_data
+blob the size of a real card) from an async generator that waits ``--page-delay``
+seconds per page, like a rate-limited crawl, and stores them in a throwaway
+SQLite database either
+
+- ``collect``: gather every page into a list, then ``ingest_listings`` (the old
+  scrape job flow), or
+- ``stream``: ``run_pipeline`` with its bounded queues.
+
+Reports the wall time, the time until the first listing is committed and the
+peak Python heap (tracemalloc; C allocations of the DB driver are not included).
+
+Usage:
+    python benchmarks/bench_streaming_ingest.py --pages 200 --mode stream
+    python benchmarks/bench_streaming_ingest.py --pages 200 --mode collect
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Add the project root to the Python path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+# Point the app at a throwaway database before anything imports the session module
+_db_dir = tempfile.mkdtemp(prefix='bench_streaming_')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BRANDS = {
+    'Toyota': ['Corolla', 'Yaris', 'RAV4'],
+    'Hyundai': ['i20', 'i30', 'Tucson'],
+    'Kia': ['Picanto', 'Sportage', 'Niro'],
+    'Mazda': ['3', 'CX-5'],
+}
+
+
+async def generate_pages(pages: int, per_page: int, page_delay: float, seed: int = 42):
+    """Yield ``(page number, listings)`` like ``Yad2Scraper.scrape_parallel`` does."""
+    rng = random.Random(seed)
+    for page_num in range(1, pages + 1):
+        await asyncio.sleep(page_delay)
+        listings = []
+        for i in range(per_page):
+            brand = rng.choice(list(BRANDS))
+            token = f"p{page_num:04d}i{i:03d}"
+            listings.append({
+                'yad2_id': token,
+                'title': f"{brand} {token}",
+                'brand': brand,
+                'model': rng.choice(BRANDS[brand]),
+                'year': rng.randint(2008, 2024),
+                'price': rng.randrange(20000, 250000, 500),
+                'mileage': rng.randrange(0, 300000, 1000),
+                'url': f"https://www.yad2.co.il/item/{token}",
+                'raw_data': {'html': rng.randbytes(1024).hex()},
+            })
+        yield page_num, listings
+
+
+async def run(mode: str, pages: int, per_page: int, page_delay: float) -> dict:
+    from app.db.session import SessionLocal
+    from app.services.ingest import ingest_listings
+    from app.services.pipeline import run_pipeline
+
+    db = SessionLocal()
+    start = time.perf_counter()
+    first_commit = None
+
+    def on_batch(counts):
+        nonlocal first_commit
+        if first_commit is None and counts['new'] + counts['updated']:
+            first_commit = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        source = generate_pages(pages, per_page, page_delay)
+        if mode == 'collect':
+            listings = []
+            async for _, page_listings in source:
+                listings.extend(page_listings)
+            result = await ingest_listings(db, listings, on_batch=on_batch)
+        else:
+            result = await run_pipeline(source, db, on_batch=on_batch)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        db.close()
+
+    return {
+        'mode': mode,
+        'pages': pages,
+        'listings': result['total'],
+        'stored': result['new'] + result['updated'],
+        'seconds': round(time.perf_counter() - start, 2),
+        'first_commit_seconds': round(first_commit, 2) if first_commit is not None else None,
+        'py_heap_peak_mb': round(peak / 1024 / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark collect-then-save vs streaming ingestion')
+    parser.add_argument('--mode', choices=['collect', 'stream'], default='stream')
+    parser.add_argument('--pages', type=int, default=200, help='Number of result pages')
+    parser.add_argument('--per-page', type=int, default=40, help='Listings per page')
+    parser.add_argument('--page-delay', type=float, default=0.2, help='Seconds to "fetch" one page')
+    args = parser.parse_args()
+
+    from app.db.base_class import Base
+    from app.db.session import engine
+    Base.metadata.create_all(bind=engine)
+
+    print(json.dumps(asyncio.run(run(args.mode, args.pages, args.per_page, args.page_delay)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
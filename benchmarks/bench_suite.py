@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the read endpoints and ingestion, for comparing commits.
+
+Builds a synthetic catalog (``benchmarks/catalog.py``: Zipf-skewed brands and
+models, Hebrew names) of ``--size`` listings, then runs each scenario in-process
+through the ASGI app (no network, no live site):
+
+- ``listings``: ``/car/listings`` first page, no filters
+- ``listings_brand``: filtered by a brand, drawn with the catalog's skew
+- ``listings_price_year``: price range and minimum year
+- ``listings_deep_page``: pages from the back half of the unfiltered results
+- ``filters``: ``/car/filters``
+- ``ingest``: ``ingest_listings`` of ``--ingest`` new listings, then the same
+  listings again (updates); reports rows/s. Its rows are deleted afterwards so
+  the catalog stays the same for the next run.
+
+Request scenarios report p50/p95/p99/mean latency and the mean SQL statements
+and SQL time per request (from the ``Server-Timing`` header). The catalog is
+kept in the temp directory (or the ``--db-url`` database) and reused by later
+runs of the same size and seed. Pass ``--baseline`` with the JSON of an earlier
+run to add the latency ratios.
+
+Usage:
+    python benchmarks/bench_suite.py --size 100000 --output bench_main.json
+    python benchmarks/bench_suite.py --size 100000 --baseline bench_main.json
+    python benchmarks/bench_suite.py --db-url postgresql://localhost/drivez_bench --size 1000000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ['listings', 'listings_brand', 'listings_price_year', 'listings_deep_page', 'filters', 'ingest']
+PAGE_SIZE = 20
+INGEST_PREFIX = 'benching'
+
+_SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) SQL')
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(q / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_requests(client, make_url, requests: int, warmup: int = 5) -> dict:
+    """Time ``requests`` GETs of ``make_url()`` after ``warmup`` untimed ones."""
+    for _ in range(warmup):
+        client.get(make_url())
+
+    latencies, statements, db_ms = [], [], []
+    for _ in range(requests):
+        url = make_url()
+        start = time.perf_counter()
+        response = client.get(url)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}: {response.text[:200]}")
+        timing = _SERVER_TIMING_DB.search(response.headers.get('server-timing', ''))
+        if timing:
+            db_ms.append(float(timing.group(1)))
+            statements.append(int(timing.group(2)))
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(statistics.mean(latencies), 2),
+        'sql_statements_mean': round(statistics.mean(statements), 1) if statements else None,
+        'sql_ms_mean': round(statistics.mean(db_ms), 2) if db_ms else None,
+    }
+
+
+def run_ingest(count: int, seed: int) -> dict:
+    """Ingest ``count`` new listings, then update them, and delete them again."""
+    from sqlalchemy import delete, func, select
+
+    from app.db.models.car import CarBrand, CarListing, CarModel
+    from app.db.session import SessionLocal
+    from app.services.ingest import ingest_listings
+    from catalog import scraped_listings
+
+    db = SessionLocal()
+    try:
+        max_brand = db.scalar(select(func.max(CarBrand.id))) or 0
+        max_model = db.scalar(select(func.max(CarModel.id))) or 0
+        listings = list(scraped_listings(count, seed=seed, prefix=INGEST_PREFIX))
+        runs = {}
+        for name in ('insert', 'update'):
+            start = time.perf_counter()
+            result = asyncio.run(ingest_listings(db, listings))
+            elapsed = time.perf_counter() - start
+            stored = result['new'] + result['updated']
+            runs[name] = {
+                'listings': count,
+                'stored': stored,
+                'errors': result['errors'],
+                'seconds': round(elapsed, 2),
+                'rows_per_second': round(stored / elapsed, 1),
+            }
+    finally:
+        db.rollback()
+        db.execute(delete(CarListing).where(CarListing.yad2_id.like(f"{INGEST_PREFIX}%")))
+        db.execute(delete(CarModel).where(CarModel.id > max_model))
+        db.execute(delete(CarBrand).where(CarBrand.id > max_brand))
+        db.commit()
+        db.close()
+    return runs
+
+
+def prepare_catalog(size: int, seed: int) -> dict:
+    """Create the schema and the catalog, unless the database already holds it."""
+    from sqlalchemy import func, select
+
+    from app.db.base_class import Base
+    from app.db.models.car import CarListing
+    from app.db.session import SessionLocal, engine
+    from catalog import populate
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        existing = db.scalar(select(func.count()).select_from(CarListing))
+        if existing == size:
+            return {'listings': size, 'seconds': 0, 'reused': True}
+        if existing:
+            sys.exit(f"The database holds {existing} listings, not {size}; use an empty database")
+        logger.warning(f"Generating a catalog of {size} listings...")
+        return {**populate(db, size, seed), 'reused': False}
+    finally:
+        db.close()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the read endpoints and ingestion on a synthetic catalog')
+    parser.add_argument('--size', type=int, default=100000, help='Number of listings in the catalog (10k to 5M)')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the catalog and the request parameters')
+    parser.add_argument('--db-url', help='Database to use (default: a SQLite file in the temp directory)')
+    parser.add_argument('--requests', type=int, default=200, help='Timed requests per scenario')
+    parser.add_argument('--ingest', type=int, default=5000, help='Listings in the ingest scenario')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--baseline', help='JSON output of an earlier run to compare with')
+    parser.add_argument('--output', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    db_url = args.db_url or "sqlite:///" + os.path.join(
+        tempfile.gettempdir(), f"drivez_bench_catalog_{args.size}_{args.seed}.db"
+    )
+    # Must be set before anything imports the session module
+    os.environ['SQLALCHEMY_DATABASE_URI'] = db_url
+
+    from app.core.config import settings
+    # Server-Timing carries the SQL statement count and time of each request
+    settings.DEBUG = True
+    settings.SQL_SLOW_REQUEST_MS = float('inf')
+    settings.SQL_SLOW_QUERY_MS = float('inf')
+
+    catalog = prepare_catalog(args.size, args.seed)
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from catalog import BRANDS, brand_weights
+
+    rng = random.Random(args.seed)
+    weights = brand_weights()
+    last_page = max(args.size // PAGE_SIZE, 1)
+    urls = {
+        'listings': lambda: f"/api/v1/car/listings?limit={PAGE_SIZE}",
+        'listings_brand': lambda: (
+            f"/api/v1/car/listings?limit={PAGE_SIZE}&brand={rng.choices(BRANDS, weights=weights)[0][0]}"
+        ),
+        'listings_price_year': lambda: (
+            f"/api/v1/car/listings?limit={PAGE_SIZE}&min_price={rng.randrange(20000, 150000, 5000)}"
+            f"&max_price={rng.randrange(150000, 400000, 5000)}&min_year={rng.randint(2010, 2022)}"
+        ),
+        'listings_deep_page': lambda: (
+            f"/api/v1/car/listings?limit={PAGE_SIZE}&page={rng.randint(last_page // 2, last_page)}"
+        ),
+        'filters': lambda: "/api/v1/car/filters",
+    }
+
+    results = {}
+    with TestClient(app) as client:
+        for scenario in args.scenarios:
+            if scenario == 'ingest':
+                continue
+            results[scenario] = run_requests(client, urls[scenario], args.requests)
+    # Last, so the read scenarios never see its rows
+    if 'ingest' in args.scenarios:
+        results['ingest'] = run_ingest(args.ingest, args.seed)
+
+    report = {
+        'revision': git_revision(),
+        'database': db_url.split(':', 1)[0],
+        'size': args.size,
+        'seed': args.seed,
+        'catalog': catalog,
+        'scenarios': results,
+    }
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())['scenarios']
+        comparison = {}
+        for scenario, result in results.items():
+            before = baseline.get(scenario)
+            if not before:
+                continue
+            if scenario == 'ingest':
+                comparison[scenario] = {
+                    run: round(result[run]['rows_per_second'] / before[run]['rows_per_second'], 2)
+                    for run in result if run in before and before[run]['rows_per_second']
+                }
+            else:
+                comparison[scenario] = {
+                    key: round(result[key] / before[key], 2) for key in ('p50_ms', 'p95_ms', 'p99_ms') if before[key]
+                }
+        report['vs_baseline'] = comparison
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Synthetic car catalog for the benchmarks.
+
+Brands, models and listings shaped like the Yad2 data (Hebrew names with an
+English ``normalized_name``, as in ``add_test_data.py``), with the skew of the
+real market: brand popularity follows a Zipf distribution, so a few brands
+hold most of the listings and the long tail has a handful each. Everything is
+derived from a seed, so two runs with the same ``--size`` and ``--seed`` build
+the same catalog.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.db.models.car import CarBrand, CarListing, CarModel, CarStatus
+
+# (name, normalized_name, [(model name, normalized_name)]), most popular first
+BRANDS: List[Tuple[str, str, List[Tuple[str, str]]]] = [
+    ("טויוטה", "toyota", [("קורולה", "corolla"), ("יאריס", "yaris"), ("RAV4", "rav4"), ("קאמרי", "camry"), ("C-HR", "c_hr")]),
+    ("יונדאי", "hyundai", [("i10", "i10"), ("i20", "i20"), ("i30", "i30"), ("טוסון", "tucson"), ("איוניק", "ioniq")]),
+    ("קיה", "kia", [("פיקנטו", "picanto"), ("ריו", "rio"), ("ספורטאז'", "sportage"), ("נירו", "niro")]),
+    ("מאזדה", "mazda", [("3", "3"), ("6", "6"), ("CX-5", "cx_5"), ("CX-30", "cx_30")]),
+    ("סקודה", "skoda", [("אוקטביה", "octavia"), ("פאביה", "fabia"), ("קודיאק", "kodiaq")]),
+    ("מיצובישי", "mitsubishi", [("אאוטלנדר", "outlander"), ("ספייס סטאר", "space_star"), ("ASX", "asx")]),
+    ("הונדה", "honda", [("סיוויק", "civic"), ("אקורד", "accord"), ("ג'אז", "jazz"), ("CR-V", "cr_v")]),
+    ("פולקסווגן", "volkswagen", [("גולף", "golf"), ("פולו", "polo"), ("פאסאט", "passat"), ("טיגואן", "tiguan")]),
+    ("ניסאן", "nissan", [("מיקרה", "micra"), ("קשקאי", "qashqai"), ("ג'וק", "juke")]),
+    ("סוזוקי", "suzuki", [("סוויפט", "swift"), ("ויטרה", "vitara"), ("בלנו", "baleno")]),
+    ("שברולט", "chevrolet", [("ספארק", "spark"), ("קרוז", "cruze"), ("מאליבו", "malibu")]),
+    ("פיג'ו", "peugeot", [("208", "208"), ("308", "308"), ("3008", "3008")]),
+    ("רנו", "renault", [("קליאו", "clio"), ("מגאן", "megane"), ("קפצ'ור", "captur")]),
+    ("סובארו", "subaru", [("אימפרזה", "impreza"), ("פורסטר", "forester"), ("XV", "xv")]),
+    ("ב.מ.וו", "bmw", [("סדרה 1", "1_series"), ("סדרה 3", "3_series"), ("סדרה 5", "5_series"), ("X3", "x3")]),
+    ("מרצדס", "mercedes", [("C-Class", "c_class"), ("E-Class", "e_class"), ("A-Class", "a_class")]),
+    ("אאודי", "audi", [("A3", "a3"), ("A4", "a4"), ("Q5", "q5")]),
+    ("סיאט", "seat", [("איביזה", "ibiza"), ("לאון", "leon"), ("ארונה", "arona")]),
+    ("פורד", "ford", [("פוקוס", "focus"), ("פיאסטה", "fiesta"), ("קוגה", "kuga")]),
+    ("טסלה", "tesla", [("Model 3", "model_3"), ("Model Y", "model_y")]),
+    ("וולוו", "volvo", [("XC40", "xc40"), ("XC60", "xc60")]),
+    ("לקסוס", "lexus", [("NX", "nx"), ("RX", "rx")]),
+    ("ג'יפ", "jeep", [("רנגייד", "renegade"), ("קומפאס", "compass")]),
+    ("דאצ'יה", "dacia", [("דאסטר", "duster"), ("סנדרו", "sandero")]),
+    ("פיאט", "fiat", [("500", "500"), ("טיפו", "tipo")]),
+    ("אלפא רומיאו", "alfa_romeo", [("ג'וליה", "giulia")]),
+    ("פורשה", "porsche", [("קאיין", "cayenne"), ("מקאן", "macan")]),
+]
+
+FUEL_TYPES = ["בנזין", "בנזין", "בנזין", "היברידי", "היברידי", "דיזל", "חשמלי"]
+TRANSMISSIONS = ["אוטומטית"] * 9 + ["ידנית"]
+BODY_TYPES = ["סדאן", "האצ'בק", "קרוסאובר", "SUV", "סטיישן", "מיניוואן"]
+COLORS = ["לבן", "שחור", "כסוף", "אפור", "כחול", "אדום"]
+STATUSES = [CarStatus.ACTIVE] * 8 + [CarStatus.SOLD, CarStatus.ARCHIVED]
+
+ZIPF_EXPONENT = 1.1
+
+
+def brand_weights(exponent: float = ZIPF_EXPONENT) -> List[float]:
+    """Zipf weights of ``BRANDS`` by popularity rank."""
+    return [1 / (rank ** exponent) for rank in range(1, len(BRANDS) + 1)]
+
+
+def _listing_fields(rng: random.Random, brand: str, model: str, index: int) -> Dict[str, Any]:
+    """Random but plausible listing attributes; price falls with age and mileage."""
+    year = rng.choices(range(2005, 2026), weights=[1 + i for i in range(21)])[0]
+    age = 2026 - year
+    mileage = max(0, int(rng.gauss(15000 * age, 6000 * max(age, 1) ** 0.5)))
+    price = max(5000, round(rng.lognormvariate(12.1, 0.45) * 0.9 ** age - mileage * 0.05, -2))
+    return {
+        "title": f"{brand} {model} {year}",
+        "description": f"יד {rng.randint(1, 4)}, {rng.choice(['מצב מצוין', 'שמור', 'טסט לשנה', 'ללא תאונות'])}",
+        "price": float(price),
+        "year": year,
+        "mileage": mileage,
+        "fuel_type": rng.choice(FUEL_TYPES),
+        "transmission": rng.choice(TRANSMISSIONS),
+        "body_type": rng.choice(BODY_TYPES),
+        "color": rng.choice(COLORS),
+        "image_url": f"https://img.yad2.co.il/Pic/synthetic/{index}.jpg",
+    }
+
+
+def create_brands(db: Session) -> Dict[str, Tuple[int, List[int]]]:
+    """Insert the catalog brands and models.
+
+    Returns:
+        ``{normalized brand: (brand id, [model ids])}``
+    """
+    ids: Dict[str, Tuple[int, List[int]]] = {}
+    for name, normalized, models in BRANDS:
+        brand = CarBrand(name=name, normalized_name=normalized)
+        db.add(brand)
+        db.flush()
+        rows = [CarModel(name=model, normalized_name=model_norm, brand_id=brand.id) for model, model_norm in models]
+        db.add_all(rows)
+        db.flush()
+        ids[normalized] = (brand.id, [row.id for row in rows])
+    db.commit()
+    return ids
+
+
+def populate(db: Session, size: int, seed: int = 42, chunk_size: int = 20000) -> Dict[str, Any]:
+    """Fill an empty database with ``size`` listings.
+
+    Uses Core executemany inserts in chunks, which is what makes millions of
+    rows feasible; no ORM objects are created for the listings.
+
+    Returns:
+        Dict with the number of listings and the seconds it took
+    """
+    if db.scalar(select(func.count()).select_from(CarBrand)):
+        raise RuntimeError("The catalog database is not empty")
+
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    ids = create_brands(db)
+    brands = [(name, ids[normalized][0], models, ids[normalized][1]) for name, normalized, models in BRANDS]
+    weights = brand_weights()
+    now = datetime.utcnow()
+
+    chunk: List[Dict[str, Any]] = []
+    for index in range(size):
+        brand_name, brand_id, models, model_ids = rng.choices(brands, weights=weights)[0]
+        # Earlier models of a brand are the more popular ones
+        pick = min(int(rng.expovariate(1.0)), len(models) - 1)
+        scraped = now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+        chunk.append({
+            "yad2_id": f"syn{index:08d}",
+            **_listing_fields(rng, brand_name, models[pick][0], index),
+            "status": rng.choice(STATUSES),
+            "brand_id": brand_id,
+            "model_id": model_ids[pick],
+            "created_at": scraped - timedelta(days=rng.randint(0, 180)),
+            "updated_at": scraped,
+            "last_scraped_at": scraped,
+        })
+        if len(chunk) >= chunk_size:
+            db.execute(insert(CarListing), chunk)
+            db.commit()
+            chunk = []
+    if chunk:
+        db.execute(insert(CarListing), chunk)
+        db.commit()
+
+    return {"listings": size, "seconds": round(time.perf_counter() - start, 2)}
+
+
+def scraped_listings(count: int, seed: int = 7, prefix: str = "ing") -> Iterator[Dict[str, Any]]:
+    """Yield ``count`` listings in scraper output format (the input of ``ingest_listings``)."""
+    rng = random.Random(seed)
+    weights = brand_weights()
+    for index in range(count):
+        name, normalized, models = rng.choices(BRANDS, weights=weights)[0]
+        model = models[min(int(rng.expovariate(1.0)), len(models) - 1)][0]
+        token = f"{prefix}{index:08d}"
+        yield {
+            "yad2_id": token,
+            "brand": name,
+            "model": model,
+            **_listing_fields(rng, name, model, index),
+            "url": f"https://www.yad2.co.il/item/{token}",
+        }
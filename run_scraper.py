@@ -5,12 +5,10 @@ Script to run the Yad2 car listings scraper and save results to the database.
 import asyncio
 import logging
 import argparse
-from typing import List, Dict, Any
-from datetime import datetime
 
 from app.scrapers.yad2_api_scraper import Yad2ApiScraper
 from app.db.session import SessionLocal
-from app.db.models.car import CarListing
+from app.services.pipeline import run_pipeline
 
 # Configure logging
 logging.basicConfig(
@@ -23,46 +21,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-async def save_listings_to_db(listings: List[Dict[str, Any]]) -> None:
-    """Save scraped listings to the database."""
-    db = SessionLocal()
-    try:
-        for listing_data in listings:
-            try:
-                # Check if listing already exists
-                existing = db.query(CarListing).filter_by(
-                    source=listing_data['source'],
-                    source_id=listing_data['source_id']
-                ).first()
-                
-                if existing:
-                    # Update existing listing
-                    for key, value in listing_data.items():
-                        if hasattr(existing, key) and key != 'id':
-                            setattr(existing, key, value)
-                    existing.updated_at = datetime.utcnow()
-                    logger.info(f"Updated listing: {listing_data['title']}")
-                else:
-                    # Create new listing
-                    listing = CarListing(**listing_data)
-                    db.add(listing)
-                    logger.info(f"Added new listing: {listing_data['title']}")
-                
-                # Commit after each listing to ensure data is saved
-                db.commit()
-                
-            except Exception as e:
-                db.rollback()
-                logger.error(f"Error saving listing {listing_data.get('title', 'unknown')}: {str(e)}")
-                continue
-                
-    except Exception as e:
-        logger.error(f"Error saving listing to database: {str(e)}")
-        db.rollback()
-        
-    finally:
-        db.close()
-
 async def main():
     """Main function to run the scraper."""
     # Parse command line arguments
@@ -115,15 +73,16 @@ async def main():
             max_retries=3,
             delay_range=(1, 3)
         ) as scraper:
-            # Start scraping
+            # Each page is saved while the next ones are being fetched
             logger.info("Starting to fetch car listings...")
-            listings = await scraper.get_car_listings(search_params)
+            db = SessionLocal()
+            try:
+                result = await run_pipeline(scraper.iter_listing_pages(search_params), db)
+            finally:
+                db.close()
             
-            # Save listings to database
-            if listings:
-                logger.info(f"Found {len(listings)} listings. Saving to database...")
-                await save_listings_to_db(listings)
-                logger.info("Successfully saved all listings to database")
+            if result['total']:
+                logger.info(f"Saved {result['new']} new and {result['updated']} updated listings")
             else:
                 logger.warning("No listings found!")
                 
@@ -13,9 +13,6 @@ from sqlalchemy.orm import Session
 from urllib.parse import urlparse, urljoin
 import shutil
 
-# Yad2 Scraper
-from yad2_scraper import Yad2Scraper, Yad2Category
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,8 +25,12 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Import database models and session after logging is configured
+from app.config.scraping import settings as scraping_settings
 from app.db.session import SessionLocal
 from app.db.models.car import CarListing, CarBrand, CarModel, CarStatus
+from app.services.brand_matcher import split_title
+from app.services.listing_batch import normalize_batch
+from app.services.raw_archive import archive_payloads, encode_raw
 
 # Yad2 configuration
 BASE_URL = "https://www.yad2.co.il"
@@ -39,13 +40,35 @@ SEARCH_URL = f"{BASE_URL}/vehicles/private-cars"
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-async def fetch_listings(limit: int = 25) -> List[dict]:
-    """Fetch car listings from Yad2 using direct HTTP requests and parse HTML."""
+async def _dump_html(html_content: str, path: str) -> None:
+    """Write a fetched page to disk without blocking the event loop."""
+    def write() -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+    
+    try:
+        await asyncio.to_thread(write)
+        logger.info(f"Saved HTML response to {path} for debugging")
+    except OSError as e:
+        logger.warning(f"Failed to save HTML response to {path}: {str(e)}")
+
+async def fetch_listings(limit: int = 25, dump_html_path: Optional[str] = None,
+                         url: Optional[str] = None) -> List[dict]:
+    """Fetch car listings from Yad2 using direct HTTP requests and parse HTML.
+    
+    Args:
+        limit: Maximum number of listings to return
+        url: Result page to fetch instead of the default private-cars search
+        dump_html_path: Write the raw response here for debugging; defaults to the
+            SCRAPING_DEBUG_HTML_DUMP_PATH setting and is skipped when neither is set
+    """
     logger.info(f"Fetching up to {limit} listings...")
     
-    from bs4 import BeautifulSoup
-    import re
     import aiohttp
+    from app.config.scraping import settings as scraping_settings
+    from app.core.executor import get_executor
+    from app.scrapers.html_parser import get_backend, parse_page
+    from app.scrapers.rate_limit import get_rate_limiter
     
     # We'll use aiohttp directly instead of Yad2Scraper
     headers = {
@@ -69,12 +92,15 @@ async def fetch_listings(limit: int = 25) -> List[dict]:
     # Build the URL with query parameters
     base_url = "https://www.yad2.co.il/vehicles/private-cars"
     query_string = '&'.join([f"{k}={v}" for k, v in query_params.items()])
-    url = f"{base_url}?{query_string}"
+    url = url or f"{base_url}?{query_string}"
+    dump_html_path = dump_html_path or scraping_settings.DEBUG_HTML_DUMP_PATH
+    dump_task = None
     
     try:
         # Create a new aiohttp session
         async with aiohttp.ClientSession(headers=headers) as session:
-            # Make the request
+            # Make the request; the shared limiter is the only throttle in this pipeline
+            await get_rate_limiter('yad2').acquire()
             logger.info(f"Fetching URL: {url}")
             async with session.get(url) as response:
                 if response.status != 200:
@@ -83,117 +109,39 @@ async def fetch_listings(limit: int = 25) -> List[dict]:
                 
                 # Read the response text
                 html_content = await response.text()
-                
-                # Parse the HTML response
-                soup = BeautifulSoup(html_content, 'html.parser')
-        
-                # Parse the HTML response
-                soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Save the HTML content to a file for debugging
-        with open('yad2_response.html', 'w', encoding='utf-8') as f:
-            f.write(soup.prettify())
-        logger.info("Saved HTML response to yad2_response.html for debugging")
-        
-        # Try different selectors to find listing elements
-        listing_elements = []
-        
-        # Common Yad2 listing selectors
-        possible_selectors = [
-            'div.feeditem',
-            'div[class*="feeditem"]',
-            'div[data-test-id="feed-item"]',
-            'div.feed-item',
-            'div[class*="feed-item"]',
-            'div.listing-item',
-            'div[class*="listing-item"]',
-            'div[data-test="feed-item"]',
-            'div[data-testid="feed-item"]',
-        ]
         
-        # Try each selector until we find some elements
-        for selector in possible_selectors:
-            listing_elements = soup.select(selector)
-            if listing_elements:
-                logger.info(f"Found {len(listing_elements)} listing elements with selector: {selector}")
-                break
-        else:
-            # If no elements found with any selector, try a more general approach
-            logger.warning("No listing elements found with standard selectors. Trying more general approach...")
-            listing_elements = soup.find_all(attrs={"data-test": True})
-            if not listing_elements:
-                listing_elements = soup.find_all(class_=True)
+        # Save the raw HTML in the background while the page is parsed
+        if dump_html_path:
+            dump_task = asyncio.create_task(_dump_html(html_content, dump_html_path))
         
-        logger.info(f"Total listing elements found: {len(listing_elements)}")
+        # Parse the page once, off the event loop, and stop as soon as we have enough cards
+        backend = get_backend()
+        parsed_listings = await get_executor().run(parse_page, html_content, BASE_URL, limit, backend.name)
+        logger.info(f"Total listing elements found: {len(parsed_listings)} (parser: {backend.name})")
         
         # If we still don't have elements, log the first 500 chars of the HTML for debugging
-        if not listing_elements:
+        if not parsed_listings:
             logger.warning(f"No listing elements found in the page. First 500 chars: {html_content[:500]}...")
         
         listings = []
-        for idx, element in enumerate(listing_elements[:limit], 1):
+        for idx, parsed in enumerate(parsed_listings, 1):
             try:
-                # Extract listing data - these selectors will need to be adjusted
-                # based on the actual HTML structure of Yad2's listings
-                title_elem = element.select_one('div.feeditem-title')
-                price_elem = element.select_one('div.price')
-                year_km_elem = element.select_one('div.row_3xJNX')
-                location_elem = element.select_one('div.row_3xJNX + div')
-                image_elem = element.select_one('img')
-                link_elem = element.select_one('a')
-                
-                # Clean and format the data
-                title = title_elem.get_text(strip=True) if title_elem else ""
-                price_text = price_elem.get_text(strip=True) if price_elem else ""
-                price = float(re.sub(r'[^\d.]', '', price_text)) if price_text else 0
-                
-                # Extract year and mileage if available
-                year = None
-                mileage = None
-                if year_km_elem:
-                    text = year_km_elem.get_text()
-                    year_match = re.search(r'(\d{4})', text)
-                    km_match = re.search(r'(\d+,\d+)\s*ק"מ', text)
-                    if year_match:
-                        year = int(year_match.group(1))
-                    if km_match:
-                        mileage = int(km_match.group(1).replace(',', ''))
-                
-                # Get location
-                location = location_elem.get_text(strip=True) if location_elem else ""
-                
-                # Get image URL
-                image_url = image_elem.get('src', '') if image_elem else ""
-                if image_url and not image_url.startswith(('http://', 'https://')):
-                    image_url = urljoin(base_url, image_url)
-                
-                # Get listing URL
-                listing_url = ""
-                if link_elem and link_elem.get('href'):
-                    listing_url = link_elem['href']
-                    if not listing_url.startswith(('http://', 'https://')):
-                        listing_url = urljoin(base_url, listing_url)
-                
                 # Create listing dictionary
                 listing_data = {
-                    'id': str(idx),
-                    'title': title,
-                    'price': price,
-                    'year': year,
-                    'mileage': mileage,
-                    'location': location,
-                    'image_url': image_url,
-                    'url': listing_url,
+                    'id': parsed['source_id'] or str(idx),
+                    'title': parsed['title'],
+                    'price': float(parsed['price'] or 0),
+                    'year': parsed['year'],
+                    'mileage': parsed['mileage'],
+                    'location': parsed['location'],
+                    'image_url': parsed['image_url'] or "",
+                    'url': parsed['url'],
                     'description': ""  # Will be populated when fetching full details
                 }
                 
                 listings.append(listing_data)
-                logger.info(f"Extracted listing: {title[:50]}...")
+                logger.info(f"Extracted listing: {listing_data['title'][:50]}...")
                 
-                # Be nice to the server
-                if idx < len(listing_elements[:limit]):
-                    await asyncio.sleep(random.uniform(1.0, 3.0))
-                    
             except Exception as e:
                 logger.error(f"Error processing listing {idx}: {str(e)}", exc_info=True)
                 continue
@@ -203,92 +151,44 @@ async def fetch_listings(limit: int = 25) -> List[dict]:
     except Exception as e:
         logger.error(f"Error in fetch_listings: {str(e)}", exc_info=True)
         return []
-    except Exception as e:
-        logger.error(f"Error in fetch_listings: {str(e)}", exc_info=True)
-        return []
+    finally:
+        if dump_task:
+            await dump_task
 
-def normalize_listing(listing: Dict) -> Dict:
-    """Normalize listing data to match our database schema."""
-    try:
-        listing_id = str(listing.get('id', ''))
-        
-        # Set default values for required fields
-        title = listing.get('title', '').strip()
-        description = listing.get('description', '').strip()
-        price = max(0, float(listing.get('price', 0)))  # Ensure non-negative price
-        
-        # Try to extract year from title if not provided
-        year = None
-        if listing.get('year'):
-            try:
-                year = int(listing['year'])
-            except (ValueError, TypeError):
-                pass
-        
-        # If year is still None, try to extract it from the title
-        if year is None and title:
-            import re
-            year_match = re.search(r'(20\d{2})', title)
-            if year_match:
-                try:
-                    year = int(year_match.group(1))
-                except (ValueError, TypeError):
-                    pass
-        
-        # Set a default year if still None (required field)
-        if year is None:
-            year = 2020  # Default to current year - 5
-        
-        # Extract mileage
-        mileage = None
-        if listing.get('mileage'):
-            try:
-                mileage = int(str(listing['mileage']).replace(',', '').replace('.', ''))
-            except (ValueError, TypeError):
-                pass
-        
-        # Extract basic information with proper defaults
-        listing_data = {
-            "yad2_id": listing_id or f"generated_{int(time.time())}",
-            "title": title or "No Title",
-            "description": description or "No description available",
-            "price": price,
-            "year": year,
-            "mileage": mileage,
-            "fuel_type": listing.get('fuel_type', 'Unknown'),
-            "transmission": listing.get('transmission', 'Unknown'),
-            "body_type": listing.get('body_type', 'Sedan'),
-            "color": listing.get('color', 'Not specified'),
-            "image_url": listing.get('image_url', ''),
+def normalize_listings(listings: List[Dict]) -> List[Dict]:
+    """Normalize fetched listings to match our database schema.
+    
+    Uses the shared batch normalizer (app.services.listing_batch) with the
+    seed's defaults: a missing year is taken from the title or set to 2020.
+    """
+    batch = normalize_batch(listings, require_price=False, year_from_title=True, default_year=2020)
+    for field, count in batch.rejections.items():
+        logger.warning(f"Skipped {count} listings without a valid {field}")
+    
+    normalized = []
+    now = datetime.utcnow()
+    for i, row in zip(batch.index.tolist(), batch.rows()):
+        listing = listings[i]
+        manufacturer, model = split_title(row["title"])
+        normalized.append({
+            "yad2_id": row["yad2_id"],
+            "title": row["title"],
+            "description": row["description"] or "No description available",
+            "price": row["price"],
+            "year": row["year"],
+            "mileage": row["mileage"],
+            "fuel_type": row["fuel_type"] or "Unknown",
+            "transmission": row["transmission"] or "Unknown",
+            "body_type": row["body_type"] or "Sedan",
+            "color": row["color"] or "Not specified",
+            "image_url": row["image_url"],
             "status": CarStatus.ACTIVE,
-            "last_scraped_at": datetime.utcnow(),
-            "extra_data": {k: v for k, v in listing.items() if k not in [
-                'id', 'title', 'description', 'price', 'year', 'mileage', 
-                'fuel_type', 'transmission', 'body_type', 'color', 
-                'image_url', 'url', 'status'
-            ]}  # Store the remaining data for reference
-        }
-        
-        # Extract manufacturer and model from title if available
-        if title:
-            parts = title.split()
-            if parts:
-                listing_data["manufacturer"] = parts[0]
-                if len(parts) > 1:
-                    listing_data["model"] = " ".join(parts[1:3]) if len(parts) > 2 else parts[1]
-        
-        # Ensure we have at least a default manufacturer and model
-        if 'manufacturer' not in listing_data or not listing_data['manufacturer']:
-            listing_data['manufacturer'] = 'Unknown'
-        if 'model' not in listing_data or not listing_data['model']:
-            listing_data['model'] = 'Unknown'
-        
-        return listing_data
-        
-    except Exception as e:
-        logger.error(f"Error normalizing listing: {str(e)}", exc_info=True)
-        logger.debug(f"Problematic listing data: {listing}")
-        return None  # Return None instead of empty dict to indicate failure
+            "last_scraped_at": now,
+            "raw_data": listing,  # archived as fetched (SCRAPING_KEEP_RAW_DATA)
+            "manufacturer": manufacturer or "Unknown",
+            "model": model or "Unknown",
+        })
+    return normalized
 
 def get_or_create_brand(db: Session, brand_name: str) -> CarBrand:
     """Get or create a car brand."""
@@ -357,6 +257,7 @@ def save_listings_to_db(listings: List[Dict], db: Session) -> Tuple[int, int]:
     
     saved_count = 0
     error_count = 0
+    raw_payloads = []
     
     try:
         for listing_data in listings:
@@ -366,6 +267,10 @@ def save_listings_to_db(listings: List[Dict], db: Session) -> Tuple[int, int]:
                     error_count += 1
                     continue
                 
+                raw_data = listing_data.pop('raw_data', None)
+                if raw_data and scraping_settings.KEEP_RAW_DATA:
+                    raw_payloads.append((str(listing_data['yad2_id']), datetime.utcnow(), encode_raw(raw_data)))
+                
                 # Extract brand and model information
                 manufacturer = listing_data.pop('manufacturer', 'Unknown')
                 model_name = listing_data.pop('model', 'Unknown')
@@ -418,9 +323,6 @@ def save_listings_to_db(listings: List[Dict], db: Session) -> Tuple[int, int]:
                 db.commit()
                 saved_count += 1
                 
-                # Add a small delay between database operations
-                time.sleep(0.1)
-                
             except Exception as e:
                 db.rollback()
                 logger.error(f"Error saving listing to database: {str(e)}", exc_info=True)
@@ -429,6 +331,9 @@ def save_listings_to_db(listings: List[Dict], db: Session) -> Tuple[int, int]:
                 continue
                 
         logger.info(f"Successfully saved {saved_count} listings to database")
+        if raw_payloads:
+            archived = archive_payloads(db, raw_payloads)
+            logger.info(f"Archived {archived['payloads']} raw payloads ({archived['bytes']} bytes compressed)")
         if error_count > 0:
             logger.warning(f"Failed to save {error_count} listings due to errors")
             
@@ -460,17 +365,7 @@ async def main_async():
             return
             
         # Normalize listings
-        normalized_listings = []
-        for listing in listings:
-            try:
-                normalized = normalize_listing(listing)
-                if normalized:  # Only append if normalization was successful
-                    normalized_listings.append(normalized)
-                else:
-                    logger.warning("Skipping listing due to normalization failure")
-            except Exception as e:
-                logger.error(f"Error normalizing listing: {str(e)}", exc_info=True)
-                continue
+        normalized_listings = normalize_listings(listings)
         
         # Save to database
         saved, errors = save_listings_to_db(normalized_listings, db)
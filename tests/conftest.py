@@ -0,0 +1,45 @@
+"""
+Shared fixtures.
+
+The app reads its settings at import time, so the environment is set up here,
+before anything under ``app`` is imported: a throwaway SQLite database, Celery
+running tasks eagerly on an in-memory broker, and inline CPU work. No Redis,
+PostgreSQL or browser is needed.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_db_dir = tempfile.mkdtemp(prefix="drivez_tests_")
+os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ["CELERY_TASK_ALWAYS_EAGER"] = "true"
+os.environ["CELERY_BROKER_URL"] = "memory://"
+os.environ["CELERY_RESULT_BACKEND"] = "cache+memory://"
+os.environ["CPU_EXECUTOR"] = "inline"
+os.environ["TASK_PROGRESS_POLL_SECONDS"] = "0.01"
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+from sqlalchemy import delete
+
+import app.db.models  # noqa: F401  registers every table on Base.metadata
+from app.db.base_class import Base
+from app.db.session import SessionLocal, engine
+
+
+@pytest.fixture
+def db():
+    """A session on an empty schema; every table is emptied again afterwards."""
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        for table in reversed(Base.metadata.sorted_tables):
+            session.execute(delete(table))
+        session.commit()
+        session.close()
+
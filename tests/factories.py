@@ -0,0 +1,17 @@
+"""Builders for test data."""
+from typing import Any, Dict
+
+
+def make_listing(yad2_id: str, **fields: Any) -> Dict[str, Any]:
+    """A scraped listing in scraper output format (the input of ``ingest_listings``)."""
+    return {
+        "yad2_id": yad2_id,
+        "title": f"Toyota Corolla {yad2_id}",
+        "brand": "Toyota",
+        "model": "Corolla",
+        "year": 2019,
+        "price": 85000,
+        "mileage": 60000,
+        "url": f"https://www.yad2.co.il/item/{yad2_id}",
+        **fields,
+    }
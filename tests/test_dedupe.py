@@ -0,0 +1,115 @@
+"""Duplicate clusters (``app.services.dedupe``), built as listings are ingested and from scratch."""
+import asyncio
+
+from app.core.config import settings
+from app.db.models import CarListing
+from app.services import dedupe
+from app.services.ingest import ingest_listings
+from tests.factories import make_listing
+
+TITLE = "Toyota Corolla 2019 automatic"
+DESCRIPTION = (
+    "Private owner, first hand. Serviced at the dealer every 15,000 km with a full history. "
+    "No accidents, new tyres and brakes last winter, reversing camera, cruise control and "
+    "keyless entry. Garaged in Haifa, non smoker, both keys and the manual included."
+)
+OTHER_DESCRIPTION = (
+    "Leasing return in excellent condition, sunroof, leather seats, lane assist and a "
+    "two year warranty from the importer. Trade-ins welcome, financing available on site."
+)
+
+
+def ad(yad2_id, description=DESCRIPTION, **fields):
+    """A listing of the same car with the shared title: only the text, image, price and mileage tell ads apart."""
+    return make_listing(yad2_id, title=TITLE, description=description, **fields)
+
+
+def _store(db, *listings):
+    asyncio.run(ingest_listings(db, list(listings)))
+
+
+def _clusters(db):
+    db.expire_all()
+    return {row.yad2_id: row.cluster_id for row in db.query(CarListing)}
+
+
+def _ids(db):
+    return {row.yad2_id: row.id for row in db.query(CarListing)}
+
+
+def test_reposts_and_near_duplicate_text_are_clustered(db):
+    _store(
+        db,
+        ad("original", image_url="https://img.yad2.co.il/Pic/1234.jpg?w=800"),
+        ad("unrelated", description=OTHER_DESCRIPTION),
+        ad("too-cheap", price=60000),  # the same text, but the price is several buckets off
+    )
+    # Reposted later: the same photo at another size, or the text lightly edited
+    _store(
+        db,
+        ad("repost", price=84000, image_url="https://img.yad2.co.il/Pic/1234.jpg?w=200",
+           description="Price drop! " + DESCRIPTION),
+        ad("edited", mileage=61000, description=DESCRIPTION.replace("Haifa", "Nesher")),
+    )
+
+    clusters, ids = _clusters(db), _ids(db)
+    assert clusters["original"] == ids["original"]
+    assert clusters["repost"] == clusters["edited"] == ids["original"]
+    assert clusters["unrelated"] is None
+    assert clusters["too-cheap"] is None
+
+
+def test_other_cars_are_never_candidates(db):
+    _store(db, ad("corolla"), ad("niro", brand="Kia", model="Niro"), ad("older", year=2017))
+
+    assert set(_clusters(db).values()) == {None}
+
+
+def test_clusters_merge_transitively_to_the_lowest_id(db, monkeypatch):
+    monkeypatch.setattr(settings, "DEDUPE_ENABLED", False)
+    _store(db, *(ad(name, description=f"{name} {OTHER_DESCRIPTION}") for name in ("a", "b", "c", "d")))
+    _store(db, ad("far", price=150000))
+    ids = _ids(db)
+
+    assert dedupe.link_pairs(db, [(ids["c"], ids["d"])]) == 1
+    assert dedupe.link_pairs(db, [(ids["b"], ids["a"])]) == 1
+    db.commit()
+    clusters = _clusters(db)
+    assert clusters["c"] == clusters["d"] == ids["c"]
+    assert clusters["a"] == clusters["b"] == ids["a"]
+
+    # One pair across the two clusters merges all four into the older one
+    assert dedupe.link_pairs(db, [(ids["d"], ids["b"]), (ids["far"], ids["a"])]) == 1
+    db.commit()
+    clusters = _clusters(db)
+    assert {clusters[name] for name in "abcd"} == {ids["a"]}
+    assert clusters["far"] is None  # more than a price bucket away
+
+
+def test_a_new_listing_joins_an_existing_cluster(db):
+    _store(db, ad("first"), ad("second", mileage=62000))
+    ids = _ids(db)
+    assert _clusters(db)["second"] == ids["first"]
+
+    _store(db, ad("third", price=86000))
+
+    assert _clusters(db)["third"] == ids["first"]
+
+
+def test_rebuild_reproduces_the_incremental_clusters(db):
+    # Batches of reposts, edits and unrelated ads of a few cars, linked as they come in
+    for batch in range(3):
+        _store(db, *(
+            ad(f"{car}-{batch}-{copy}", brand=brand, model=model, year=2019 + batch % 2,
+               price=85000 - 1000 * copy, mileage=60000 + 2000 * copy,
+               description=f"{brand} ad {batch}. " + (DESCRIPTION if copy < 2 else OTHER_DESCRIPTION))
+            for car, (brand, model) in enumerate((("Toyota", "Corolla"), ("Kia", "Niro")))
+            for copy in range(3)
+        ))
+    incremental = _clusters(db)
+    assert len({cluster for cluster in incremental.values() if cluster}) >= 2
+
+    counts = dedupe.rebuild(db, chunk_size=5)
+
+    assert counts["scanned"] == len(incremental)
+    assert _clusters(db) == incremental
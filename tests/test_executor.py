@@ -0,0 +1,89 @@
+"""Process pool failures of ``CPUExecutor``."""
+import asyncio
+import logging
+import multiprocessing.process
+import os
+import time
+
+import pytest
+
+from app.core.executor import CPUExecutor
+
+
+def _slow(value):
+    time.sleep(0.3)
+    return value
+
+
+def _check(value):
+    assert value, "value must be set"
+    return value
+
+
+def _die_once(marker):
+    # The first call kills its worker, which breaks the pool for every call in flight
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return "retried"
+
+
+def test_broken_pool_is_restarted_once(tmp_path):
+    executor = CPUExecutor("process", max_workers=2)
+
+    async def run():
+        slow = [executor.run(_slow, value) for value in range(3)]
+        return await asyncio.gather(executor.run(_die_once, str(tmp_path / "died")), *slow)
+
+    try:
+        assert asyncio.run(run()) == ["retried", 0, 1, 2]
+    finally:
+        executor.shutdown()
+    stats = executor.stats()
+    assert stats["pool_restarts"] == 1
+    assert stats["mode"] == "process"
+    assert not stats["fallback"]
+
+
+def test_daemonic_process_falls_back_to_threads(monkeypatch, caplog):
+    # Like a Celery prefork child: multiprocessing refuses to start children
+    monkeypatch.setitem(multiprocessing.process.current_process()._config, "daemon", True)
+    executor = CPUExecutor("process", max_workers=2)
+
+    async def run():
+        return await asyncio.gather(*(executor.run(_slow, value) for value in range(4)))
+
+    with caplog.at_level(logging.WARNING, logger="app.core.executor"):
+        try:
+            assert asyncio.run(run()) == [0, 1, 2, 3]
+        finally:
+            executor.shutdown()
+
+    stats = executor.stats()
+    assert stats["mode"] == "thread"
+    assert stats["requested_mode"] == "process"
+    assert stats["fallback"]
+    assert "daemonic" in stats["fallback_reason"]
+    assert len([record for record in caplog.records if "using threads" in record.message]) == 1
+
+
+def test_errors_of_the_function_propagate():
+    executor = CPUExecutor("process", max_workers=1)
+
+    async def run():
+        return await executor.run(_check, 0)
+
+    try:
+        with pytest.raises(AssertionError, match="value must be set"):
+            asyncio.run(run())
+    finally:
+        executor.shutdown()
+    stats = executor.stats()
+    assert stats["mode"] == "process"
+    assert not stats["fallback"]
+    assert stats["failed"] == 1
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        CPUExecutor("fork")
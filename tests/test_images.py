@@ -0,0 +1,201 @@
+"""Perceptual hashing of listing images (``app.services.images``) against a local image server."""
+import asyncio
+import io
+import random
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from aiohttp import web
+
+# Pillow is only needed when IMAGE_HASH_ENABLED is set
+pytest.importorskip("PIL")
+from PIL import Image, ImageEnhance  # noqa: E402
+
+from app.core.config import settings
+from app.core.executor import CPUExecutor
+from app.db.models import CarListing
+from app.services import images
+from app.services.images import ImageCache, band_hashes, dhash, distance, hash_pending
+from app.services.ingest import ingest_listings
+from tests.factories import make_listing
+
+
+def photo(index: int) -> Image.Image:
+    """A 320x240 synthetic photo: smooth shapes (what dHash sees) plus grain."""
+    rng = np.random.RandomState(index)
+    coarse = Image.fromarray(rng.randint(0, 256, (6, 8, 3), dtype=np.uint8)).resize((320, 240), Image.BICUBIC)
+    grain = rng.randint(-12, 13, (240, 320, 3))
+    return Image.fromarray(np.clip(np.asarray(coarse, dtype=np.int16) + grain, 0, 255).astype(np.uint8))
+
+
+def reupload(image: Image.Image) -> Image.Image:
+    """The same photo uploaded again: cropped, shrunk and brightened a little."""
+    image = image.crop((4, 4, image.width - 4, image.height - 4)).resize((200, 150))
+    return ImageEnhance.Brightness(image).enhance(1.05)
+
+
+def jpeg(image: Image.Image, quality: int = 85) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+class ImageServer:
+    """Serves ``/photo/<n>.jpg``, ``/repost/<n>.jpg`` (photo n uploaded again) and a failing ``/down/``.
+
+    Runs on its own loop in a thread, so the code under test can use ``asyncio.run``.
+    """
+
+    def __init__(self) -> None:
+        self.requests = []
+        self.url = None
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+        self._thread = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests.append(request.path)
+        kind, name = request.match_info["kind"], request.match_info["name"]
+        if kind == "down":
+            return web.Response(status=503)
+        image = photo(int(name.split(".")[0]))
+        if kind == "repost":
+            image = reupload(image)
+        return web.Response(body=jpeg(image), content_type="image/jpeg")
+
+    async def _start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/{kind}/{name}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", 0).start()
+        self.url = f"http://127.0.0.1:{self._runner.addresses[0][1]}"
+
+    def start(self) -> "ImageServer":
+        self._loop.run_until_complete(self._start())
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop.close()
+
+
+@pytest.fixture
+def server():
+    server = ImageServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def hash_images(tmp_path):
+    cache = ImageCache(str(tmp_path / "images"))
+    executor = CPUExecutor("inline")
+
+    def run(db, **kwargs):
+        return asyncio.run(hash_pending(db, cache=cache, executor=executor, **kwargs))
+
+    return run
+
+
+def _store(db, *listings):
+    asyncio.run(ingest_listings(db, list(listings)))
+    return {row.yad2_id: row.id for row in db.query(CarListing)}
+
+
+def test_dhash_matches_a_reupload_and_not_another_photo():
+    original = dhash(jpeg(photo(1)))
+
+    assert dhash(jpeg(photo(1))) == original
+    assert distance(dhash(jpeg(reupload(photo(1)), quality=60)), original) <= settings.IMAGE_HASH_MAX_DISTANCE
+    assert distance(dhash(jpeg(photo(2))), original) > 16
+    with pytest.raises(OSError):
+        dhash(b"not an image")
+
+
+def test_hashes_a_few_bits_apart_share_a_band():
+    rng = random.Random(7)
+    for _ in range(200):
+        image_hash = rng.getrandbits(64)
+        flipped = image_hash
+        for bit in rng.sample(range(64), settings.IMAGE_HASH_BANDS - 1):
+            flipped ^= 1 << bit
+        assert set(band_hashes("1:2:2019", image_hash)) & set(band_hashes("1:2:2019", flipped))
+        # Other cars never come up, however alike their photos
+        assert not set(band_hashes("1:2:2019", image_hash)) & set(band_hashes("1:2:2020", image_hash))
+
+
+def test_links_a_repost_by_its_photo(db, server, hash_images, monkeypatch):
+    # Same car, close prices and mileages: with attribute dedupe off, only the photos tell them apart
+    monkeypatch.setattr(settings, "DEDUPE_ENABLED", False)
+    ids = _store(
+        db,
+        make_listing("original", price=85000, mileage=60000, image_url=f"{server.url}/photo/1.jpg"),
+        make_listing("other", price=84000, mileage=62000, image_url=f"{server.url}/photo/2.jpg"),
+        make_listing("repost", price=82000, mileage=64000, image_url=f"{server.url}/repost/1.jpg"),
+    )
+
+    counts = hash_images(db)
+
+    assert counts["hashed"] == 3
+    assert counts["failed"] == counts["gone"] == 0
+    assert counts["linked"] >= 1
+    db.expire_all()
+    clusters = {row.yad2_id: row.cluster_id for row in db.query(CarListing)}
+    assert clusters["original"] is not None
+    assert clusters["repost"] == clusters["original"]
+    assert clusters["other"] != clusters["original"]
+    assert [listing_id for listing_id, _ in images.similar_listings(db, ids["original"])] == [ids["repost"]]
+
+    # Hashed listings are not fetched again
+    requests = len(server.requests)
+    assert hash_images(db)["hashed"] == 0
+    assert len(server.requests) == requests
+
+
+def test_failed_downloads_back_off_and_give_up(db, server, hash_images, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_FETCH_MAX_ATTEMPTS", 3)
+    ids = _store(
+        db,
+        make_listing("older", image_url=f"{server.url}/photo/3.jpg"),
+        make_listing("newer", image_url=f"{server.url}/down/1.jpg"),
+    )
+    newer = ids["newer"]
+    assert newer > ids["older"]
+
+    # The newest listing's image host is down; it must not take every run
+    assert hash_images(db, limit=1)["failed"] == 1
+    assert hash_images(db, limit=1)["hashed"] == 1
+    db.expire_all()
+    listing = db.get(CarListing, newer)
+    assert listing.image_fetch_failures == 1
+    assert listing.image_hashed_at is None
+    first_wait = listing.image_retry_at - datetime.utcnow()
+    assert timedelta(minutes=settings.IMAGE_RETRY_MINUTES - 1) < first_wait <= timedelta(
+        minutes=settings.IMAGE_RETRY_MINUTES)
+
+    def retry_now():
+        db.get(CarListing, newer).image_retry_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+
+    retry_now()
+    assert hash_images(db)["failed"] == 1
+    db.expire_all()
+    listing = db.get(CarListing, newer)
+    assert listing.image_fetch_failures == 2
+    assert listing.image_retry_at - datetime.utcnow() > first_wait
+
+    retry_now()
+    assert hash_images(db)["gone"] == 1
+    db.expire_all()
+    listing = db.get(CarListing, newer)
+    assert listing.image_hashed_at is not None
+    assert listing.image_hash is None
+    assert listing.image_fetch_failures == 0
+    assert server.requests.count("/down/1.jpg") == 3
@@ -0,0 +1,165 @@
+"""Scrape and ingest jobs (``app.services.jobs``) on an eager, in-memory Celery."""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.api_v1.api import router
+from app.core.celery_app import celery_app
+from app.db.models import CarListing, JobKind, JobStatus
+from app.db.models.schedule import ScrapePartition
+from app.services import jobs
+from app.services.pipeline import run_pipeline
+from app.services.scheduler import sync_partitions
+from tests.factories import make_listing
+
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1")
+    return TestClient(app)
+
+
+@pytest.fixture
+def fake_crawl(monkeypatch):
+    """Replace the browser crawl with two result pages and an empty one past the end."""
+    pages = [
+        (1, [make_listing("a1"), make_listing("a2", price=91000)]),
+        (2, [make_listing("a3", brand="Kia", model="Niro")]),
+        (3, []),
+    ]
+
+    async def crawl():
+        for page in pages:
+            yield page
+
+    async def scrape(db, params, progress, partition_id=None):
+        def on_page(page_num, count):
+            progress.incr(pages_fetched=1, listings_parsed=count)
+
+        def on_batch(counts):
+            progress.incr(new_listings=counts["new"], updated_listings=counts["updated"],
+                          error_count=counts["errors"])
+
+        return await run_pipeline(crawl(), db, on_page=on_page, on_batch=on_batch, partition_id=partition_id)
+
+    monkeypatch.setattr(jobs, "_scrape", scrape)
+    return pages
+
+
+def test_tasks_run_eagerly_with_late_acks():
+    assert celery_app.conf.task_always_eager
+    assert celery_app.conf.task_acks_late
+    assert celery_app.conf.task_reject_on_worker_lost
+    assert celery_app.conf.worker_prefetch_multiplier == 1
+
+
+def test_enqueue_scrape_then_status(client, db, fake_crawl):
+    response = client.post("/api/v1/scrape/yad2", json={"max_pages": 3})
+    assert response.status_code == 202
+    task_id = response.json()["task_id"]
+
+    status = client.get(f"/api/v1/scrape/status/{task_id}").json()
+    assert status["status"] == JobStatus.COMPLETED.value
+    assert status["is_complete"]
+    assert status["pages_fetched"] == 3
+    assert status["listings_parsed"] == 3
+    assert status["new_listings"] == 3
+    assert status["total_listings"] == 3
+    assert db.query(CarListing).count() == 3
+
+    assert client.get("/api/v1/scrape/status/no-such-task").status_code == 404
+    listed = client.get("/api/v1/scrape/tasks").json()
+    assert [task["task_id"] for task in listed["tasks"]] == [task_id]
+
+
+def test_ingest_job_stores_listings_and_counts(db):
+    listings = [make_listing("b1"), make_listing("b2"), make_listing("b3", price="not a price")]
+    job = jobs.enqueue_ingest_job(db, listings)
+
+    db.expire_all()
+    job = jobs.get_job(db, job.id)
+    assert job.kind == JobKind.INGEST
+    assert job.status == JobStatus.COMPLETED
+    assert job.total_listings == 3
+    assert job.new_listings == 2
+    assert job.error_count == 1
+    assert {row.yad2_id for row in db.query(CarListing)} == {"b1", "b2"}
+
+
+def test_ingest_job_adds_its_counts_to_the_scrape_job(db):
+    parent = jobs.create_job(db, JobKind.SCRAPE)
+    jobs.enqueue_ingest_job(db, [make_listing("c1"), make_listing("c2")], parent_id=parent.id)
+
+    db.expire_all()
+    assert jobs.get_job(db, parent.id).new_listings == 2
+    assert [child.kind for child in jobs.get_child_jobs(db, parent.id)] == [JobKind.INGEST]
+
+
+def test_redelivered_finished_job_is_skipped(db):
+    listings = [make_listing("d1"), make_listing("d2")]
+    job = jobs.enqueue_ingest_job(db, listings)
+    db.expire_all()
+    finished_at = jobs.get_job(db, job.id).finished_at
+
+    # With late acks, a worker lost after finishing but before the ack gets the same message again
+    jobs.run_ingest_job.apply(args=[job.id, listings], task_id=job.id)
+
+    db.expire_all()
+    job = jobs.get_job(db, job.id)
+    assert job.status == JobStatus.COMPLETED
+    assert job.finished_at == finished_at
+    assert job.new_listings == 2
+    assert db.query(CarListing).count() == 2
+
+
+def test_redelivered_interrupted_job_runs_again_without_duplicates(db):
+    listings = [make_listing("e1"), make_listing("e2")]
+    job = jobs.enqueue_ingest_job(db, listings[:1])
+    # A worker died halfway through the job: the row is RUNNING and some listings are stored
+    job.status = JobStatus.RUNNING
+    job.finished_at = None
+    db.commit()
+
+    jobs.run_ingest_job.apply(args=[job.id, listings], task_id=job.id)
+
+    db.expire_all()
+    assert jobs.get_job(db, job.id).status == JobStatus.COMPLETED
+    assert sorted(row.yad2_id for row in db.query(CarListing)) == ["e1", "e2"]
+
+
+def test_failed_job_is_marked_failed(db, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(jobs, "ingest_listings", broken)
+    job = jobs.enqueue_ingest_job(db, [make_listing("f1")])
+
+    db.expire_all()
+    job = jobs.get_job(db, job.id)
+    assert job.status == JobStatus.FAILED
+    assert job.errors == ["RuntimeError: database went away"]
+
+
+def test_ingest_job_of_a_scheduled_run_leaves_the_partition_to_its_scrape_job(db):
+    partition = sync_partitions(db)[0]
+    partition.lease_owner = "scheduler"
+    partition.lease_expires_at = datetime.utcnow() + timedelta(minutes=5)
+    db.commit()
+    next_run_at = partition.next_run_at
+    parent = jobs.create_job(db, JobKind.SCRAPE, partition_id=partition.id)
+
+    child = jobs.enqueue_ingest_job(db, [make_listing("g1"), make_listing("g2")], parent_id=parent.id)
+
+    db.expire_all()
+    child = jobs.get_job(db, child.id)
+    assert child.status == JobStatus.COMPLETED
+    assert child.partition_id is None
+    assert {row.partition_id for row in db.query(CarListing)} == {partition.id}
+    # The scrape job still holds the lease and completes the run
+    partition = db.get(ScrapePartition, partition.id)
+    assert partition.lease_owner == "scheduler"
+    assert partition.run_count == 0
+    assert partition.next_run_at == next_run_at
@@ -0,0 +1,163 @@
+"""Complete crawls and the listing lifecycle (``scheduler.complete_partition_run``, ``lifecycle``)."""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.core.config import settings
+from app.db.models import CarListing, CarStatus, ScrapePartition
+from app.services.ingest import ingest_listings
+from app.services.pipeline import run_pipeline
+from app.scrapers.yad2_updated import Yad2Scraper
+from app.services.scheduler import complete_partition_run, dispatch_due_partitions, is_complete_crawl, sync_partitions
+from tests.factories import make_listing
+
+
+async def _pages(*pages):
+    for page in pages:
+        yield page
+
+
+def _run(db, *pages, partition_id=None):
+    return asyncio.run(run_pipeline(_pages(*pages), db, partition_id=partition_id, flush_seconds=0.01))
+
+
+def _lease(db, partition):
+    """Give the partition's lease to a new job, as ``dispatch_due_partitions`` would, and return the job id."""
+    job_id = str(uuid.uuid4())
+    db.query(ScrapePartition).filter(ScrapePartition.id == partition.id).update(
+        {ScrapePartition.lease_owner: "scheduler", ScrapePartition.current_job_id: job_id}
+    )
+    db.commit()
+    return job_id
+
+
+@pytest.fixture
+def partition(db):
+    partition = ScrapePartition(key="toyota", params={}, interval_minutes=15, next_run_at=datetime.utcnow())
+    db.add(partition)
+    db.commit()
+    return partition
+
+
+@pytest.fixture
+def stale_listings(db, partition):
+    """Two ACTIVE listings of the partition, last seen before any of the crawls below."""
+    asyncio.run(ingest_listings(db, [make_listing("old1"), make_listing("old2")]))
+    db.query(CarListing).update({
+        CarListing.partition_id: partition.id,
+        CarListing.last_scraped_at: datetime.utcnow() - timedelta(days=1),
+    })
+    db.commit()
+
+
+def test_empty_feed_reaches_the_end(db):
+    result = _run(db, (1, [make_listing("p1")]), (2, []))
+    assert result["reached_end"]
+    assert result["failed_pages"] == 0
+    assert is_complete_crawl(result)
+
+
+def test_failed_pages_are_not_the_end(db):
+    result = _run(db, (1, None), (2, None), (3, None))
+    assert result["pages"] == 3
+    assert result["failed_pages"] == 3
+    assert not result["reached_end"]
+    assert not is_complete_crawl(result)
+
+
+def test_a_failed_page_makes_the_crawl_incomplete(db):
+    result = _run(db, (1, [make_listing("p1")]), (2, None), (3, []))
+    assert result["reached_end"]
+    assert not is_complete_crawl(result)
+
+
+def test_listings_after_the_empty_page_are_not_the_end(db):
+    # Pages complete out of order; page 2 came back empty but page 3 had listings
+    result = _run(db, (3, [make_listing("p3")]), (2, []), (1, [make_listing("p1")]))
+    assert not result["reached_end"]
+
+
+def test_an_empty_crawl_is_not_complete(db):
+    result = _run(db, (1, []))
+    assert result["reached_end"]
+    assert not is_complete_crawl(result)
+
+
+def test_blocked_crawls_never_sell_listings(db, partition, stale_listings):
+    for _ in range(settings.LIFECYCLE_MISSED_CRAWLS + 1):
+        job_id = _lease(db, partition)
+        started_at = datetime.utcnow()
+        result = _run(db, (1, None), (2, None), partition_id=partition.id)
+        assert complete_partition_run(db, partition.id, job_id, result, started_at=started_at)
+
+    db.expire_all()
+    assert {listing.status for listing in db.query(CarListing)} == {CarStatus.ACTIVE}
+    assert not db.get(ScrapePartition, partition.id).crawl_starts
+
+
+def test_complete_crawls_sell_the_missing_listings(db, partition, stale_listings):
+    for crawl in range(settings.LIFECYCLE_MISSED_CRAWLS):
+        job_id = _lease(db, partition)
+        started_at = datetime.utcnow()
+        result = _run(db, (1, [make_listing("seen")]), (2, []), partition_id=partition.id)
+        assert complete_partition_run(db, partition.id, job_id, result, started_at=started_at)
+
+    db.expire_all()
+    statuses = {listing.yad2_id: listing.status for listing in db.query(CarListing)}
+    assert statuses == {"old1": CarStatus.SOLD, "old2": CarStatus.SOLD, "seen": CarStatus.ACTIVE}
+
+
+def test_default_scheduled_run_crawls_to_the_end(db, monkeypatch):
+    # More pages than a manual run's default of 3, then the end of the results
+    feed = {page: [make_listing(f"s{page}a"), make_listing(f"s{page}b")] for page in range(1, 8)}
+    fetched = []
+
+    async def fetch(self, url):
+        page = int(parse_qs(urlparse(url).query).get("page", ["1"])[0])
+        fetched.append(page)
+        return feed.get(page, [])
+
+    monkeypatch.setattr(Yad2Scraper, "_fetch_next_data_listings", fetch)
+    (partition,) = sync_partitions(db)
+    partition.next_run_at = datetime.utcnow() - timedelta(minutes=1)
+    db.commit()
+
+    # Celery runs the scrape job eagerly, inside the dispatch
+    (job_id,) = dispatch_due_partitions(db)
+
+    db.expire_all()
+    assert db.query(CarListing).count() == 14
+    assert 8 in fetched
+    partition = db.get(ScrapePartition, partition.id)
+    assert len(partition.crawl_starts) == 1
+    assert partition.lease_owner is None
+    assert partition.current_job_id is None
+    assert partition.last_job_id == job_id
+
+
+def test_a_run_that_lost_its_lease_records_nothing(db, partition, stale_listings):
+    # The first run outlived its lease, which was taken for a second run
+    stale_job_id = _lease(db, partition)
+    job_id = _lease(db, partition)
+    next_run_at = db.get(ScrapePartition, partition.id).next_run_at
+
+    for _ in range(settings.LIFECYCLE_MISSED_CRAWLS):
+        started_at = datetime.utcnow()
+        result = _run(db, (1, [make_listing("seen")]), (2, []), partition_id=partition.id)
+        assert not complete_partition_run(db, partition.id, stale_job_id, result, started_at=started_at)
+
+    db.expire_all()
+    partition = db.get(ScrapePartition, partition.id)
+    assert partition.lease_owner == "scheduler"
+    assert partition.current_job_id == job_id
+    assert partition.next_run_at == next_run_at
+    assert partition.run_count == 0
+    assert not partition.crawl_starts
+    assert {listing.status for listing in db.query(CarListing)} == {CarStatus.ACTIVE}
+
+    assert complete_partition_run(db, partition.id, job_id, result)
+    db.expire_all()
+    assert db.get(ScrapePartition, partition.id).lease_owner is None
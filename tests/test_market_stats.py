@@ -0,0 +1,215 @@
+"""Running market statistics (``app.services.market_stats``) against values recomputed from ``car_listings``."""
+import asyncio
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.db.models import CarBrand, CarListing, CarModel, CarStatus, MarketStats
+from app.services.ingest import ingest_listings
+from app.services.lifecycle import transition
+from app.services.market_stats import TDigest, compact, rebuild, segment_stats
+from app.services.scheduler import sync_partitions
+from tests.factories import make_listing
+
+CARS = [("Toyota", "Corolla", 2019), ("Toyota", "Corolla", 2020), ("Kia", "Niro", 2019)]
+
+
+def _ingest(db, listings, partition_id=None):
+    asyncio.run(ingest_listings(db, listings, partition_id=partition_id))
+
+
+def _expire(db, *yad2_ids):
+    transition(db, [CarListing.yad2_id.in_(yad2_ids)], CarStatus.SOLD, CarStatus.ACTIVE)
+
+
+def _active_values(db):
+    """``(brand, model, year, partition) -> [(price, mileage)]`` of the ACTIVE listings, straight from car_listings."""
+    values = defaultdict(list)
+    query = (
+        db.query(CarBrand.name, CarModel.name, CarListing.year, CarListing.partition_id,
+                 CarListing.price, CarListing.mileage)
+        .join(CarBrand, CarBrand.id == CarListing.brand_id)
+        .join(CarModel, CarModel.id == CarListing.model_id)
+        .filter(CarListing.status == CarStatus.ACTIVE)
+    )
+    for brand, model, year, partition_id, price, mileage in query:
+        values[(brand, model, year, partition_id or 0)].append((price, mileage))
+    return values
+
+
+def assert_rows_match_listings(db):
+    """Every segment row holds the exact sums of its partition's ACTIVE listings."""
+    expected = _active_values(db)
+    names = {brand.id: brand.name for brand in db.query(CarBrand)}
+    models = {model.id: model.name for model in db.query(CarModel)}
+    rows = {
+        (names[row.brand_id], models[row.model_id], row.year, row.partition_id): row
+        for row in db.query(MarketStats) if row.listings > 0
+    }
+    assert set(rows) == set(expected)
+    for segment, values in expected.items():
+        row = rows[segment]
+        prices = [price for price, _ in values]
+        driven = [(price, mileage) for price, mileage in values if mileage is not None]
+        assert row.listings == len(values)
+        assert row.price_sum == pytest.approx(sum(prices))
+        assert row.price_sq_sum == pytest.approx(sum(price * price for price in prices))
+        assert row.mileage_listings == len(driven)
+        assert row.mileage_sum == pytest.approx(sum(mileage for _, mileage in driven))
+        assert row.mileage_sq_sum == pytest.approx(sum(mileage * mileage for _, mileage in driven))
+        assert row.mileage_price_sum == pytest.approx(sum(price for price, _ in driven))
+        assert row.mileage_price_product_sum == pytest.approx(sum(price * mileage for price, mileage in driven))
+
+
+def assert_stats_match_listings(db, quantiles=True):
+    """``segment_stats`` agrees with the statistics recomputed over all partitions of each segment.
+
+    Quantiles are only comparable once no removed price is left in the digests.
+    """
+    expected = defaultdict(list)
+    for (brand, model, year, _), values in _active_values(db).items():
+        expected[(brand, model, year)].extend(values)
+    stats = {(group["brand"], group["model"], group["year"]): group
+             for group in segment_stats(db, quantiles=(0.1, 0.5, 0.9))}
+    assert set(stats) == set(expected)
+    for key, values in expected.items():
+        group = stats[key]
+        prices = np.array([price for price, _ in values])
+        mileages = [mileage for _, mileage in values if mileage is not None]
+        assert group["listings"] == len(values)
+        assert group["mean_price"] == pytest.approx(prices.mean(), abs=0.01)
+        assert group["price_stddev"] == pytest.approx(prices.std(), abs=0.01)
+        assert group["mean_mileage"] == (round(float(np.mean(mileages))) if mileages else None)
+        for q in (0.1, 0.5, 0.9) if quantiles else ():
+            # A digest of few values interpolates between them like the Hazen quantile
+            assert group["quantiles"][f"p{q * 100:g}"] == pytest.approx(np.quantile(prices, q, method="hazen"))
+
+
+@pytest.fixture
+def partitions(db):
+    return [partition.id for partition in sync_partitions(db, [{"key": "north"}, {"key": "south"}])]
+
+
+@pytest.fixture
+def churned(db, partitions):
+    """Listings in both partitions, then repriced, moved between segments and expired."""
+    north, south = partitions
+    for partition_id, prefix in ((north, "n"), (south, "s")):
+        _ingest(db, [
+            make_listing(f"{prefix}{i}", brand=brand, model=model, year=year,
+                         price=60000 + 1500 * i + (7000 if prefix == "s" else 0), mileage=20000 + 9000 * i)
+            for i, (brand, model, year) in enumerate(CARS * 4)
+        ], partition_id)
+    assert_rows_match_listings(db)
+
+    _ingest(db, [
+        make_listing("n0", price=58000, mileage=21000),                 # repriced
+        make_listing("n3", price=71000, year=2020),                     # moved to another year
+        make_listing("s1", brand="Kia", model="Niro", price=64000),     # moved to another model
+        make_listing("s4", price=69000, mileage=None),                  # mileage no longer known
+    ])
+    _ingest(db, [make_listing("n5", brand="Kia", model="Niro")], south)  # moved to the other partition
+    _expire(db, "n6", "s7", "s2")
+    return partitions
+
+
+def _segment(db, yad2_id):
+    """``(brand_id, model_id)`` the listing was matched to."""
+    listing = db.query(CarListing).filter(CarListing.yad2_id == yad2_id).one()
+    return listing.brand_id, listing.model_id
+
+
+def test_ingest_and_expiry_keep_exact_sums(db, churned):
+    assert_rows_match_listings(db)
+    assert_stats_match_listings(db, quantiles=False)
+    assert db.query(MarketStats).filter(MarketStats.removed > 0).count() > 0
+
+
+def test_segments_merge_their_partitions(db, churned):
+    for group in segment_stats(db):
+        assert group["partitions"] == 2
+    _, model_id = _segment(db, "n0")
+    corolla = db.get(CarModel, model_id).name
+    (group,) = [group for group in segment_stats(db, group_by="model") if group["model"] == corolla]
+    assert group["year"] is None
+    assert group["listings"] == db.query(CarListing).filter(
+        CarListing.status == CarStatus.ACTIVE, CarListing.model_id == model_id
+    ).count()
+
+
+def test_partition_digests_merge_into_the_segment_quantiles(db, partitions):
+    rng = np.random.RandomState(3)
+    prices = {partition_id: np.round(rng.lognormal(11.3 + 0.2 * i, 0.3, 300)) for i, partition_id in
+              enumerate(partitions)}
+    for partition_id, values in prices.items():
+        _ingest(db, [make_listing(f"{partition_id}-{i}", price=float(price)) for i, price in enumerate(values)],
+                partition_id)
+
+    everything = np.concatenate(list(prices.values()))
+    (group,) = segment_stats(db, quantiles=(0.1, 0.25, 0.5, 0.75, 0.9))
+    assert group["partitions"] == 2
+    assert group["listings"] == len(everything)
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9):
+        assert group["quantiles"][f"p{q * 100:g}"] == pytest.approx(
+            np.quantile(everything, q), abs=0.01 * np.ptp(everything))
+
+    # Merging is the same operation as adding, in any order
+    halves = []
+    for values in prices.values():
+        digest = TDigest()
+        digest.add(values)
+        halves.append(digest)
+    sequential = TDigest()
+    for digest in reversed(halves):
+        sequential.merge(digest)
+    merged = TDigest.merged(halves)
+    assert merged.count == sequential.count == len(everything)
+    assert (merged.min, merged.max) == (everything.min(), everything.max())
+    for q in (0.1, 0.5, 0.9):
+        assert merged.quantile(q) == pytest.approx(sequential.quantile(q), abs=0.005 * np.ptp(everything))
+
+
+def test_compact_rebuilds_only_the_stale_segments(db):
+    _ingest(db, [make_listing(f"t{i}", price=80000 + 1000 * i) for i in range(10)])
+    _ingest(db, [make_listing(f"k{i}", brand="Kia", model="Niro", price=90000 + 1000 * i) for i in range(10)])
+    _ingest(db, [make_listing(f"m{i}", brand="Mazda", model="3", price=70000) for i in range(2)])
+    # Half the Corollas repriced: their old prices stay in the digest
+    _ingest(db, [make_listing(f"t{i}", price=60000 + 1000 * i) for i in range(5)])
+    _expire(db, "m0", "m1")
+
+    rows = {row.brand_id: row for row in db.query(MarketStats)}
+    toyota, kia, mazda = (_segment(db, yad2_id)[0] for yad2_id in ("t0", "k0", "m0"))
+    assert rows[toyota].removed == 5
+    assert TDigest.from_bytes(rows[toyota].price_digest).count == 15
+    assert rows[toyota].removed > settings.STATS_STALE_RATIO * (rows[toyota].listings + rows[toyota].removed)
+    assert rows[mazda].listings == 0
+
+    assert compact(db) == {"rebuilt": 2}
+
+    db.expire_all()
+    rows = {row.brand_id: row for row in db.query(MarketStats)}
+    assert set(rows) == {toyota, kia}  # the emptied segment is gone
+    assert rows[toyota].removed == 0
+    assert rows[toyota].rebuilt_at is not None
+    assert TDigest.from_bytes(rows[toyota].price_digest).count == 10
+    assert rows[kia].rebuilt_at is None
+    assert_rows_match_listings(db)
+    assert_stats_match_listings(db)
+    assert compact(db) == {"rebuilt": 0}
+
+
+def test_rebuild_reproduces_the_incremental_statistics(db, churned):
+    incremental = segment_stats(db)
+
+    counts = rebuild(db)
+
+    assert counts["listings"] == db.query(CarListing).filter(CarListing.status == CarStatus.ACTIVE).count()
+    assert db.query(MarketStats).filter(MarketStats.removed > 0).count() == 0
+    assert_rows_match_listings(db)
+    assert_stats_match_listings(db)
+    rebuilt = segment_stats(db)
+    for before, after in zip(incremental, rebuilt):
+        assert {key: value for key, value in before.items() if key != "quantiles"} == pytest.approx(
+            {key: value for key, value in after.items() if key != "quantiles"})
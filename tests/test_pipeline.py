@@ -0,0 +1,55 @@
+"""Streaming ingest (``app.services.pipeline``)."""
+import asyncio
+import threading
+import time
+
+from app.db.models import CarListing
+from app.services import pipeline
+from app.services.pipeline import run_pipeline
+from tests.factories import make_listing
+
+
+async def _pages(*pages):
+    for page in pages:
+        yield page
+
+
+def test_database_stages_do_not_block_the_event_loop(db, monkeypatch):
+    upsert_rows = pipeline.upsert_rows
+    threads = set()
+
+    def slow_upsert(*args):
+        threads.add(threading.get_ident())
+        time.sleep(0.3)
+        upsert_rows(*args)
+
+    monkeypatch.setattr(pipeline, "upsert_rows", slow_upsert)
+
+    async def run():
+        ticks = 0
+        crawl = asyncio.create_task(run_pipeline(
+            _pages((1, [make_listing("a1"), make_listing("a2")]), (2, [])), db, flush_seconds=0.01
+        ))
+        while not crawl.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return ticks, crawl.result()
+
+    ticks, result = asyncio.run(run())
+
+    assert ticks >= 10
+    assert threading.get_ident() not in threads
+    assert result["new"] == 2
+    assert db.query(CarListing).count() == 2
+
+
+def test_batch_counts_include_rejected_listings(db):
+    batches = []
+    listings = [make_listing("b1"), make_listing("b2", price="not a price"), make_listing("b3")]
+
+    result = asyncio.run(run_pipeline(_pages((1, listings)), db, flush_seconds=0.01, on_batch=batches.append))
+
+    assert result["new"] == 2
+    assert result["errors"] == 1
+    assert sum(batch["new"] for batch in batches) == 2
+    assert sum(batch["errors"] for batch in batches) == 1
@@ -0,0 +1,119 @@
+"""Browser start-up of ``Yad2Scraper.scrape_parallel`` and ``Yad2Scraper.scrape``."""
+import asyncio
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.config.scraping import settings as scraping_settings
+from app.scrapers import yad2_updated
+from app.scrapers.yad2_updated import Yad2Scraper
+from tests.factories import make_listing
+
+
+class FakePlaywright:
+    """Stands in for ``async_playwright()``: counts launches, never starts Chromium."""
+
+    def __init__(self):
+        self.launches = 0
+        self.chromium = self
+
+    def __call__(self):
+        return self
+
+    async def start(self):
+        return self
+
+    async def launch(self, **kwargs):
+        self.launches += 1
+        return self
+
+    async def close(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class FakeContext:
+    """A browser context that is also its only page."""
+
+    def __init__(self):
+        self.context = self
+
+    async def new_page(self):
+        return self
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def playwright(monkeypatch):
+    fake = FakePlaywright()
+    monkeypatch.setattr(yad2_updated, "async_playwright", fake)
+    return fake
+
+
+def _crawl(scraper, feed, max_pages):
+    async def fetch(url):
+        return feed[int(parse_qs(urlparse(url).query).get("page", ["1"])[0])]
+
+    scraper._fetch_next_data_listings = fetch
+
+    async def collect():
+        return sorted([item async for item in scraper.scrape_parallel({}, max_pages=max_pages, concurrency=2)],
+                      key=lambda item: item[0])
+
+    return asyncio.run(collect())
+
+
+def test_fast_path_never_launches_the_browser(playwright):
+    feed = {1: [make_listing("a1")], 2: [make_listing("a2")], 3: []}
+
+    pages = _crawl(Yad2Scraper(), feed, max_pages=3)
+
+    assert [(page_num, [listing["yad2_id"] for listing in listings]) for page_num, listings in pages] == [
+        (1, ["a1"]), (2, ["a2"]), (3, []),
+    ]
+    assert playwright.launches == 0
+
+
+def test_fast_path_miss_launches_the_browser_once(playwright):
+    scraper = Yad2Scraper()
+    contexts = []
+
+    async def new_context(browser):
+        contexts.append(browser)
+        return FakeContext()
+
+    async def navigate(page, url, fresh_session=False):
+        return False
+
+    scraper._new_isolated_context = new_context
+    scraper._navigate_to_page = navigate
+    feed = {1: [make_listing("b1")], 2: None, 3: None, 4: []}
+
+    pages = _crawl(scraper, feed, max_pages=4)
+
+    assert [(page_num, listings is None) for page_num, listings in pages] == [
+        (1, False), (2, True), (3, True), (4, False),
+    ]
+    assert playwright.launches == 1
+    assert 1 <= len(contexts) <= 2
+    assert scraper.browser is None
+
+
+def test_scrape_returns_the_fast_path_listings(playwright, monkeypatch):
+    monkeypatch.setattr(scraping_settings, "NEXT_DATA_FAST_PATH", True)
+    scraper = Yad2Scraper()
+    feed = {1: [make_listing("c1"), make_listing("c2")], 2: [make_listing("c3")], 3: []}
+
+    async def fetch(url):
+        return feed[int(parse_qs(urlparse(url).query).get("page", ["1"])[0])]
+
+    scraper._fetch_next_data_listings = fetch
+
+    listings = asyncio.run(scraper.scrape({"max_pages": 3}))
+
+    assert [listing["yad2_id"] for listing in listings] == ["c1", "c2", "c3"]
+    assert playwright.launches == 0
@@ -0,0 +1,39 @@
+"""Progress updates of running jobs (``app.services.task_registry``)."""
+import asyncio
+from datetime import datetime, timedelta
+
+from app.db.models import JobKind, JobStatus
+from app.services import jobs
+from app.services.task_registry import iter_task_updates
+
+
+def test_updates_are_sent_only_when_the_job_progresses(db):
+    job = jobs.create_job(db, JobKind.SCRAPE)
+    jobs.create_job(db, JobKind.INGEST, parent_id=job.id)
+    for row in (job, *jobs.get_child_jobs(db, job.id)):
+        # listings_per_second of a running job changes on every read
+        row.status = JobStatus.RUNNING
+        row.started_at = datetime.utcnow() - timedelta(minutes=1)
+        row.listings_parsed = 100
+    db.commit()
+
+    async def watch():
+        updates = []
+
+        async def collect():
+            async for update in iter_task_updates(job.id, poll_interval=0.01, heartbeat=60):
+                updates.append(update)
+
+        watcher = asyncio.create_task(collect())
+        await asyncio.sleep(0.3)
+        idle = len(updates)
+        job.pages_fetched = 1
+        db.commit()
+        await asyncio.sleep(0.3)
+        watcher.cancel()
+        return idle, updates
+
+    idle, updates = asyncio.run(watch())
+
+    assert idle == 1
+    assert [update["pages_fetched"] for update in updates] == [0, 1]